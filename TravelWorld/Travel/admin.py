@@ -23,6 +23,8 @@ admin.site.register(Hotelprice)
 admin.site.register(PackagePricingOption)
 admin.site.register(HouseboatBooking)
 admin.site.register(ItineraryPricingOption)
+admin.site.register(RateChange)
+admin.site.register(LeadIntake)
 admin.site.register(StandaloneInclusionBooking)
 class HouseboatImageInline(admin.TabularInline):  # or StackedInline for bigger previews
     model = HouseboatImage
@@ -0,0 +1,126 @@
+# catalog_options.py
+"""
+Room type / meal plan options of one hotel or houseboat for a date window.
+
+The booking modals ask for these on every date change. The answer is
+cached per (supplier, window) and keyed on two revisions (database
+counters, see revisions.py, so an edit on one worker retires the entries
+of all of them): one per supplier, bumped by signals.py when one of its
+rate rows or the supplier itself changes, and one for the room type /
+meal plan names. Each entry carries an ETag and the later revision's
+change time as Last-Modified, so a browser revalidating an unchanged
+window gets a 304 without the options being rebuilt.
+"""
+import hashlib
+import json
+from django.core.cache import cache
+from .models import Hotel, Hotelprice, Houseboat, HouseboatPrice
+from . import revisions
+
+
+REVISION_NAME = 'catalog_options:{}:{}'
+NAMES_REVISION = 'catalog_options:names'
+OPTIONS_KEY = 'catalog_options:{}:{}:{}:{}:{}:{}'
+OPTIONS_TIMEOUT = 60 * 60 * 24
+
+
+# kind -> (supplier model, rate model, rate FK field, label)
+SOURCES = {
+    'hotel': (Hotel, Hotelprice, 'hotel', 'Hotel'),
+    'houseboat': (Houseboat, HouseboatPrice, 'houseboat', 'Houseboat'),
+}
+
+# Supplier or rate model -> (kind, attribute holding the supplier id), for signals.py
+SUPPLIER_OF = {
+    Hotel: ('hotel', 'id'),
+    Houseboat: ('houseboat', 'id'),
+    Hotelprice: ('hotel', 'hotel_id'),
+    HouseboatPrice: ('houseboat', 'houseboat_id'),
+}
+
+
+# ==========================================
+# REVISIONS
+# ==========================================
+def touch(kind, *supplier_ids):
+    """Retire the cached options of these suppliers (bulk writers must call it themselves)."""
+    revisions.bump(*(REVISION_NAME.format(kind, i) for i in supplier_ids if i))
+
+
+def touch_names():
+    """A room type or meal plan was renamed or removed: retire every cached option list."""
+    revisions.bump(NAMES_REVISION)
+
+
+def _revisions(kind, supplier_id):
+    """[(value, changed_at)] of the supplier's and the names' revision."""
+    names = [REVISION_NAME.format(kind, supplier_id), NAMES_REVISION]
+    found = revisions.current(*names)
+    return [found[name] for name in names]
+
+
+# ==========================================
+# OPTIONS
+# ==========================================
+def build_options(kind, supplier_id, checkin, checkout):
+    """
+    (status, body) in the shape the booking modals read: the room types and
+    meal plans of every rate overlapping ``checkin``..``checkout``, in the
+    order the rates are stored. One query for the supplier, one for the rates.
+    """
+    model, price_model, field, label = SOURCES[kind]
+    supplier = model.objects.filter(id=supplier_id, status=True).only('id', 'name').first()
+    if supplier is None:
+        return 404, {'success': False, 'error': f'{label} not found'}
+
+    room_types = {}
+    meal_plans = {}
+    rows = (
+        price_model.objects
+        .filter(**{field: supplier}, from_date__lte=checkout, to_date__gte=checkin)
+        .order_by('id')
+        .values_list('room_type_id', 'room_type__name', 'meal_plan_id', 'meal_plan__name')
+    )
+    for room_type_id, room_type_name, meal_plan_id, meal_plan_name in rows:
+        room_types.setdefault(room_type_id, room_type_name)
+        meal_plans.setdefault(meal_plan_id, meal_plan_name)
+
+    if not room_types:
+        return 200, {
+            'success': False,
+            'error': f'No pricing available for {supplier.name} from {checkin} to {checkout}',
+            'roomtypes': [],
+            'mealplans': []
+        }
+
+    return 200, {
+        'success': True,
+        f'{kind}_name': supplier.name,
+        'roomtypes': [{'id': i, 'name': name} for i, name in room_types.items()],
+        'mealplans': [{'id': i, 'name': name} for i, name in meal_plans.items()],
+        'room_type_count': len(room_types),
+        'meal_plan_count': len(meal_plans)
+    }
+
+
+def get_options(kind, supplier_id, checkin, checkout):
+    """
+    Cached ``build_options`` result as a dict with ``status``, ``body``,
+    ``etag`` and ``last_modified`` (a Unix timestamp, or None).
+    """
+    (supplier_rev, supplier_time), (names_rev, names_time) = _revisions(kind, supplier_id)
+    key = OPTIONS_KEY.format(kind, supplier_id, checkin.isoformat(), checkout.isoformat(), supplier_rev, names_rev)
+    entry = cache.get(key)
+    if entry is None:
+        status, body = build_options(kind, supplier_id, checkin, checkout)
+        changed = [moment for moment in (supplier_time, names_time) if moment]
+        content = json.dumps(body, sort_keys=True).encode()
+        entry = {
+            'status': status,
+            'body': body,
+            'etag': hashlib.md5(content, usedforsecurity=False).hexdigest(),
+            # None until either revision has been bumped once
+            'last_modified': int(max(moment.timestamp() for moment in changed)) if changed else None,
+        }
+        cache.set(key, entry, OPTIONS_TIMEOUT)
+    return entry
@@ -0,0 +1,202 @@
+# hotel_search.py
+"""
+Hotel availability search for a destination and date window.
+
+The day planner, the manual hotel picker and the change-hotel dialog all
+ask "which active hotels in this destination have a rate for these dates".
+Rather than a DISTINCT join over Hotelprice per request, the rate rows of
+the shared RateIndex are regrouped into one IntervalList per destination,
+so a search is a bisect plus a scan of the overlapping rules, and every
+hotel found comes back with its cheapest matching rate.
+
+The destination index is rebuilt when the rate index version moves (any
+Hotelprice change, see signals.py) or a hotel, room type or meal plan is
+edited.
+
+``cheapest_stays`` builds on the same index for quick quoting: every
+hotel of a destination is priced for a whole stay and room configuration
+in one pass over the rate calendar, and the cheapest few per category
+are returned.
+"""
+from datetime import timedelta
+from decimal import Decimal
+from .models import Hotel, HotelBooking, RoomType, MealPlan
+from .pricing import HOTEL_BED_FIELDS, hotel_per_night, stay_nights
+from .rate_index import RATE_INDEX_REVISION, IntervalList, get_rate_index
+from . import revisions
+
+
+HOTEL_SEARCH_REVISION = 'hotel_search'
+
+CATEGORY_LABELS = dict(Hotel.CATEGORY_CHOICES)
+
+
+class HotelAvailabilityIndex:
+    """Active hotels and their rate rows, one interval list per destination."""
+
+    def __init__(self, rates, hotels, destinations, room_types, meal_plans):
+        self.rates = rates
+        self.hotels = hotels
+        self.destinations = destinations
+        self.room_types = room_types
+        self.meal_plans = meal_plans
+        # hotel id -> [(room type id, meal plan id), ...] it has rates for
+        self.rate_keys = {}
+        for hotel_id, room_type_id, meal_plan_id in rates.hotels:
+            if hotel_id in hotels:
+                self.rate_keys.setdefault(hotel_id, []).append((room_type_id, meal_plan_id))
+
+    @classmethod
+    def build(cls, rates=None):
+        """Three small queries; the rate rows come from the shared RateIndex."""
+        rates = rates or get_rate_index()
+        hotels = {
+            row['id']: row
+            for row in Hotel.objects.filter(status=True).values('id', 'name', 'category', 'destination_id')
+        }
+        grouped = {}
+        for (hotel_id, _, _), intervals in rates.hotels.items():
+            hotel = hotels.get(hotel_id)
+            if hotel:
+                grouped.setdefault(hotel['destination_id'], []).extend(intervals.rules)
+        return cls(
+            rates,
+            hotels,
+            {destination_id: IntervalList(rules) for destination_id, rules in grouped.items()},
+            dict(RoomType.objects.values_list('id', 'name')),
+            dict(MealPlan.objects.values_list('id', 'name')),
+        )
+
+    def search(self, destination_id, start, end, full_cover=False):
+        """
+        Hotels in ``destination_id`` with a rate overlapping ``start``..``end``
+        (or, with ``full_cover``, one rate spanning the whole window), ordered
+        by name, each with the cheapest such rate by double-bed price.
+        """
+        intervals = self.destinations.get(destination_id)
+        if not intervals or not start or not end:
+            return []
+
+        if full_cover:
+            def matches(rule):
+                return rule.from_date <= start and rule.to_date >= end
+        else:
+            def matches(rule):
+                return rule.from_date <= end and rule.to_date >= start
+
+        cheapest = {}
+        for rule in intervals.overlapping(min(start, end), max(start, end)):
+            if not matches(rule):
+                continue
+            best = cheapest.get(rule.hotel_id)
+            if best is None or (rule.double_bed, rule.pk) < (best.double_bed, best.pk):
+                cheapest[rule.hotel_id] = rule
+
+        results = [self._describe(hotel_id, rule) for hotel_id, rule in cheapest.items()]
+        results.sort(key=lambda hotel: (hotel['name'], hotel['id']))
+        return results
+
+    def cheapest_stays(self, destination_id, check_in, check_out, beds, room_type_id=None, meal_plan_id=None, limit=3):
+        """
+        Price a ``check_in``..``check_out`` stay with ``beds`` (quantities keyed
+        by the HotelBooking bed fields) at every hotel in ``destination_id``
+        whose rate calendar covers each night, using its cheapest room type /
+        meal plan among those allowed. Returns {category: [stays]} with at
+        most ``limit`` stays per category, cheapest first.
+        """
+        intervals = self.destinations.get(destination_id)
+        if not intervals or not check_in or not check_out or check_out < check_in:
+            return {}
+
+        nights = stay_nights(check_in, check_out)
+        last_night = check_in + timedelta(days=nights - 1)
+        config = HotelBooking(**{qty: beds.get(qty, 0) for qty, _ in HOTEL_BED_FIELDS})
+        candidates = {rule.hotel_id for rule in intervals.overlapping(check_in, last_night)}
+
+        by_category = {}
+        for hotel_id in candidates:
+            best = None
+            for key in self.rate_keys.get(hotel_id, ()):
+                if (room_type_id and key[0] != room_type_id) or (meal_plan_id and key[1] != meal_plan_id):
+                    continue
+                night_rules = self.rates.hotel_nights(hotel_id, *key, check_in, nights)
+                if not all(night_rules):
+                    continue
+                nightly = [hotel_per_night(config, rule) for rule in night_rules]
+                total = sum(nightly, Decimal('0.00'))
+                if best is None or total < best[0]:
+                    best = (total, key, nightly)
+            if best:
+                stay = self._stay(hotel_id, *best)
+                by_category.setdefault(stay['category'], []).append(stay)
+
+        return {
+            category: sorted(stays, key=lambda stay: (Decimal(stay['total']), stay['name'], stay['id']))[:limit]
+            for category, stays in by_category.items()
+        }
+
+    def _stay(self, hotel_id, total, key, nightly):
+        hotel = self.hotels[hotel_id]
+        return {
+            'id': hotel_id,
+            'name': hotel['name'],
+            'category': hotel['category'],
+            'room_type_id': key[0],
+            'room_type': self.room_types.get(key[0], ''),
+            'meal_plan_id': key[1],
+            'meal_plan': self.meal_plans.get(key[1], ''),
+            'nights': len(nightly),
+            'nightly': [str(amount) for amount in nightly],
+            'total': str(total),
+        }
+
+    def _describe(self, hotel_id, rule):
+        hotel = self.hotels[hotel_id]
+        return {
+            'id': hotel_id,
+            'name': hotel['name'],
+            'category': hotel['category'],
+            'category_display': CATEGORY_LABELS.get(hotel['category'], hotel['category']),
+            'destination_id': hotel['destination_id'],
+            'cheapest_rate': {
+                'id': rule.pk,
+                'room_type_id': rule.room_type_id,
+                'room_type': self.room_types.get(rule.room_type_id, ''),
+                'meal_plan_id': rule.meal_plan_id,
+                'meal_plan': self.meal_plans.get(rule.meal_plan_id, ''),
+                'double_bed': str(rule.double_bed),
+                'from_date': rule.from_date.isoformat(),
+                'to_date': rule.to_date.isoformat(),
+            },
+        }
+
+
+# ----------------------------------------------------------------------
+# Process-wide shared index (follows the rate index version)
+# ----------------------------------------------------------------------
+_shared = {'version': None, 'index': None}
+
+
+def get_hotel_index():
+    """Destination index shared across requests, rebuilt when rates or hotels change (on any worker)."""
+    found = revisions.current(RATE_INDEX_REVISION, HOTEL_SEARCH_REVISION)
+    version = (found[RATE_INDEX_REVISION][0], found[HOTEL_SEARCH_REVISION][0])
+    if _shared['index'] is None or _shared['version'] != version:
+        _shared['index'] = HotelAvailabilityIndex.build()
+        _shared['version'] = version
+    return _shared['index']
+
+
+def invalidate_hotel_index():
+    revisions.bump(HOTEL_SEARCH_REVISION)
+    _shared['index'] = None
+
+
+def search_hotels(destination_id, start, end, full_cover=False):
+    """Active hotels with a rate for the window, each with its cheapest matching rate."""
+    return get_hotel_index().search(destination_id, start, end, full_cover)
+
+
+def cheapest_stays(destination_id, check_in, check_out, beds, room_type_id=None, meal_plan_id=None, limit=3):
+    """The ``limit`` cheapest fully priced stays per hotel category (see HotelAvailabilityIndex)."""
+    return get_hotel_index().cheapest_stays(destination_id, check_in, check_out, beds, room_type_id, meal_plan_id, limit)
@@ -0,0 +1,287 @@
+# itinerary_versioning.py
+"""
+Bulk cloning of an itinerary into a new version.
+
+Editing, restoring or re-dating a proposal used to copy every day plan,
+each of its six M2M sets, every booking and every inclusion with its own
+``create()``. Here the source is read once per table and the copy written
+with one bulk_create per model (and one per day plan M2M through table),
+so a new version costs a fixed number of queries however long the trip is.
+Cached line prices travel with the copied bookings, so lines whose inputs
+did not change are not repriced on the new version.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from django.db import transaction
+from django.db.models.fields.files import FieldFile
+from .models import (
+    ItineraryDayPlan, HotelBooking, HotelBookingInclusion, HouseboatBooking, HouseboatBookingInclusion,
+    VehicleBooking, ActivityBooking, StandaloneInclusionBooking, ItineraryPricingOption
+)
+from .pricing_summary import refresh_pricing_summaries
+from . import version_diff
+
+
+DAY_PLAN_M2M = ('hotels', 'houseboats', 'activities', 'meal_plans', 'vehicles', 'inclusions')
+
+
+@dataclass
+class VersionRows:
+    """Everything hanging off one itinerary, loaded once."""
+    day_plans: list
+    links: dict = field(default_factory=dict)
+    hotels: list = field(default_factory=list)
+    houseboats: list = field(default_factory=list)
+    vehicles: list = field(default_factory=list)
+    activities: list = field(default_factory=list)
+    standalone: list = field(default_factory=list)
+    pricing_options: list = field(default_factory=list)
+
+
+def _through(name):
+    m2m = ItineraryDayPlan._meta.get_field(name)
+    return m2m.remote_field.through, m2m.m2m_field_name(), m2m.m2m_reverse_field_name()
+
+
+def load_version_rows(itinerary, with_pricing=True):
+    """Day plans, their M2M links, bookings with inclusions and pricing options (15 queries)."""
+    rows = VersionRows(day_plans=list(itinerary.day_plans.order_by('day_number', 'id')))
+    for name in DAY_PLAN_M2M:
+        through, source, target = _through(name)
+        links = defaultdict(list)
+        for day_plan_id, target_id in (
+            through.objects.filter(**{f'{source}__itinerary': itinerary})
+            .order_by('id').values_list(f'{source}_id', f'{target}_id')
+        ):
+            links[day_plan_id].append(target_id)
+        rows.links[name] = links
+
+    rows.hotels = list(
+        HotelBooking.objects.filter(itinerary=itinerary).select_related('hotel')
+        .prefetch_related('inclusion_items__special_inclusion').order_by('id')
+    )
+    rows.houseboats = list(
+        HouseboatBooking.objects.filter(itinerary=itinerary).select_related('houseboat')
+        .prefetch_related('inclusion_items__special_inclusion').order_by('id')
+    )
+    rows.vehicles = list(VehicleBooking.objects.filter(itinerary=itinerary).select_related('vehicle').order_by('id'))
+    rows.activities = list(ActivityBooking.objects.filter(itinerary=itinerary).select_related('activity').order_by('id'))
+    rows.standalone = list(
+        StandaloneInclusionBooking.objects.filter(itinerary=itinerary).select_related('special_inclusion').order_by('id')
+    )
+    if with_pricing:
+        rows.pricing_options = list(ItineraryPricingOption.objects.filter(itinerary=itinerary).order_by('id'))
+    return rows
+
+
+def copy_row(instance, **changes):
+    """Unsaved copy of ``instance`` (every concrete field but the primary key), then ``changes``."""
+    values = {}
+    for model_field in type(instance)._meta.concrete_fields:
+        if model_field.primary_key:
+            continue
+        value = getattr(instance, model_field.attname)
+        values[model_field.attname] = value.name if isinstance(value, FieldFile) else value
+    clone = type(instance)(**values)
+    for name, value in changes.items():
+        setattr(clone, name, value)
+    return clone
+
+
+@dataclass
+class VersionPlan:
+    """Unsaved rows of the new version, parents before children."""
+    day_plans: list = field(default_factory=list)
+    links: list = field(default_factory=list)
+    hotels: list = field(default_factory=list)
+    hotel_inclusions: list = field(default_factory=list)
+    houseboats: list = field(default_factory=list)
+    houseboat_inclusions: list = field(default_factory=list)
+    vehicles: list = field(default_factory=list)
+    activities: list = field(default_factory=list)
+    standalone: list = field(default_factory=list)
+    pricing_options: list = field(default_factory=list)
+
+    @property
+    def counts(self):
+        return {
+            'days': len(self.day_plans),
+            'hotels': len(self.hotels),
+            'vehicles': len(self.vehicles),
+            'activities': len(self.activities),
+            'houseboats': len(self.houseboats),
+            'standalone_inclusions': len(self.standalone),
+            'pricing_options': len(self.pricing_options),
+        }
+
+    def add_links(self, rows, old_day_id, new_day):
+        for name in DAY_PLAN_M2M:
+            for target_id in rows.links[name].get(old_day_id, []):
+                self.links.append((name, new_day, target_id))
+
+    def add_hotel(self, source, **changes):
+        booking = copy_row(source, **changes)
+        booking.normalize_fields()
+        self.hotels.append(booking)
+        for item in source.inclusion_items.all():
+            inclusion = copy_row(item, hotel_booking=booking, special_inclusion=item.special_inclusion)
+            inclusion.price = inclusion.calculate_price()
+            self.hotel_inclusions.append(inclusion)
+        return booking
+
+    def add_houseboat(self, source, **changes):
+        booking = copy_row(source, **changes)
+        booking.normalize_fields()
+        self.houseboats.append(booking)
+        for item in source.inclusion_items.all():
+            inclusion = copy_row(item, houseboat_booking=booking, special_inclusion=item.special_inclusion)
+            inclusion.price = inclusion.calculate_price()
+            self.houseboat_inclusions.append(inclusion)
+        return booking
+
+    def add_standalone(self, source, **changes):
+        booking = copy_row(source, special_inclusion=source.special_inclusion, **changes)
+        booking.calculate_prices()
+        self.standalone.append(booking)
+        return booking
+
+
+def write_version(plan, itinerary):
+    """One bulk_create per model, then the pricing summary of the new version."""
+    ItineraryDayPlan.objects.bulk_create(plan.day_plans)
+    grouped = defaultdict(list)
+    for name, day, target_id in plan.links:
+        through, source, target = _through(name)
+        grouped[name].append(through(**{f'{source}_id': day.id, f'{target}_id': target_id}))
+    for name, links in grouped.items():
+        _through(name)[0].objects.bulk_create(links)
+
+    HotelBooking.objects.bulk_create(plan.hotels)
+    HotelBookingInclusion.objects.bulk_create(plan.hotel_inclusions)
+    HouseboatBooking.objects.bulk_create(plan.houseboats)
+    HouseboatBookingInclusion.objects.bulk_create(plan.houseboat_inclusions)
+    VehicleBooking.objects.bulk_create(plan.vehicles)
+    ActivityBooking.objects.bulk_create(plan.activities)
+    StandaloneInclusionBooking.objects.bulk_create(plan.standalone)
+    ItineraryPricingOption.objects.bulk_create(plan.pricing_options)
+    # bulk_create skips the post_save signals that flag the summary and diffs
+    refresh_pricing_summaries([itinerary.id])
+    version_diff.touch(itinerary.id)
+
+
+def clone_itinerary(source, target, with_pricing=True):
+    """
+    Copy the day plans, bookings, inclusions and (``with_pricing``) pricing
+    options of ``source`` into ``target`` unchanged. Returns the row counts.
+    """
+    rows = load_version_rows(source, with_pricing)
+    plan = VersionPlan()
+    days = {}
+
+    for old_day in rows.day_plans:
+        new_day = copy_row(old_day, itinerary=target)
+        plan.day_plans.append(new_day)
+        plan.add_links(rows, old_day.id, new_day)
+        days[old_day.id] = new_day
+
+    def owner(booking):
+        return {'itinerary': target, 'day_plan': days.get(booking.day_plan_id)}
+
+    for booking in rows.hotels:
+        plan.add_hotel(booking, **owner(booking))
+    for booking in rows.houseboats:
+        plan.add_houseboat(booking, **owner(booking))
+    for booking in rows.standalone:
+        plan.add_standalone(booking, **owner(booking))
+    plan.vehicles = [copy_row(booking, **owner(booking)) for booking in rows.vehicles]
+    plan.activities = [copy_row(booking, **owner(booking)) for booking in rows.activities]
+    plan.pricing_options = [copy_row(option, itinerary=target) for option in rows.pricing_options]
+
+    with transaction.atomic():
+        write_version(plan, target)
+    return plan.counts
+
+
+def clone_for_new_dates(source, target):
+    """
+    Copy ``source`` into ``target`` shifted to the target's travel dates.
+
+    Day plans 1..target.total_days take the details of the same day in the
+    source. Hotels checking in after the new end date are skipped, other
+    hotel stays are clamped to the new range, activities falling outside it
+    move to the first day. Pricing options are left to the caller.
+    Returns (copied_counts, skipped_items) keyed by booking type.
+    """
+    rows = load_version_rows(source, with_pricing=False)
+    shift = (target.travel_from - source.travel_from) if source.travel_from and target.travel_from else timedelta(0)
+
+    def moved(value):
+        return value + shift if value else value
+
+    plan = VersionPlan()
+    skipped = {'hotels': [], 'activities': [], 'vehicles': [], 'houseboats': [], 'standalone_inclusions': []}
+
+    old_days = {}
+    old_numbers = {}
+    for old_day in rows.day_plans:
+        old_days.setdefault(old_day.day_number, old_day)
+        old_numbers[old_day.id] = old_day.day_number
+
+    days = {}
+
+    def day_for(number):
+        if number not in days:
+            old_day = old_days.get(number) if number <= (target.total_days or 0) else None
+            if old_day:
+                days[number] = copy_row(old_day, itinerary=target)
+                plan.add_links(rows, old_day.id, days[number])
+            else:
+                days[number] = ItineraryDayPlan(itinerary=target, day_number=number)
+            plan.day_plans.append(days[number])
+        return days[number]
+
+    for number in range(1, (target.total_days or 0) + 1):
+        day_for(number)
+
+    def owner(booking):
+        return {'itinerary': target, 'day_plan': day_for(old_numbers.get(booking.day_plan_id, 1))}
+
+
+    for booking in rows.hotels:
+        check_in = moved(booking.check_in_date)
+        if target.travel_to and check_in > target.travel_to:
+            skipped['hotels'].append({'hotel': str(booking.hotel), 'reason': 'Check-in date outside new itinerary range'})
+            continue
+        check_in = max(check_in, target.travel_from) if target.travel_from else check_in
+        check_out = check_in + (booking.check_out_date - booking.check_in_date)
+        if target.travel_to and check_out > target.travel_to:
+            check_out = target.travel_to
+        new_booking = plan.add_hotel(booking, check_in_date=check_in, check_out_date=check_out, **owner(booking))
+        if not new_booking.day_plan.destination_id:
+            new_booking.day_plan.destination_id = booking.destination_id
+
+    for booking in rows.activities:
+        booking_date = moved(booking.booking_date)
+        if target.travel_from and target.travel_to and not (target.travel_from <= booking_date <= target.travel_to):
+            booking_date = target.travel_from
+        plan.activities.append(copy_row(booking, booking_date=booking_date, **owner(booking)))
+
+    for booking in rows.vehicles:
+        plan.vehicles.append(copy_row(booking, pickup_date=moved(booking.pickup_date), **owner(booking)))
+
+    for booking in rows.houseboats:
+        plan.add_houseboat(
+            booking, check_in_date=moved(booking.check_in_date), check_out_date=moved(booking.check_out_date),
+            **owner(booking)
+        )
+
+    for booking in rows.standalone:
+        plan.add_standalone(booking, booking_date=moved(booking.booking_date), **owner(booking))
+
+    with transaction.atomic():
+        write_version(plan, target)
+
+    counts = plan.counts
+    copied = {key: counts[key] for key in skipped}
+    return copied, skipped
@@ -0,0 +1,257 @@
+# lead_intake.py
+"""
+Batch lead intake for the PHP site's webhook.
+
+Campaign bursts used to arrive as one HTTP call and one INSERT per lead.
+``ingest`` takes a whole array instead: it validates it with
+``LeadInSerializer(many=True)``, drops leads whose normalised phone (last
+ten digits) or email already arrived within DEDUP_WINDOW (earlier in the
+same batch included; older leads are found through the indexed
+``Lead.phone_key`` / ``email_key`` columns), fills the derived tracking fields once per lead and
+writes the rest with one ``bulk_create``. Duplicates report the id of the
+lead they repeat.
+
+In staging mode the API only appends the raw payloads to LeadIntake and
+acknowledges; ``process_staged`` (``manage.py drain_lead_intake``) claims
+pending rows oldest first and runs them through ``ingest``, recording
+each row's outcome. bulk_create skips the Lead signals, so both paths
+index the new leads for search themselves.
+"""
+import json
+import time
+import uuid
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q, F, Min
+from django.utils import timezone
+from .models import Lead, LeadIntake
+from .serializers import LeadInSerializer
+from . import search_index
+
+
+DEDUP_WINDOW = timedelta(hours=24)
+MAX_BATCH = 1000
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+
+# ==========================================
+# DUPLICATES
+# ==========================================
+def recent_keys(phones, emails, window=DEDUP_WINDOW):
+    """
+    ({phone key: lead id}, {email key: lead id}) of the leads received
+    within ``window`` that share one of ``phones`` / ``emails`` (the
+    earliest such lead per key). Reads the indexed key columns only.
+    """
+    phones, emails = set(phones) - {''}, set(emails) - {''}
+    if not (phones or emails):
+        return {}, {}
+    matches = Q()
+    if phones:
+        matches |= Q(phone_key__in=phones)
+    if emails:
+        matches |= Q(email_key__in=emails)
+    found_phones, found_emails = {}, {}
+    recent = Lead.objects.filter(matches, created_at__gte=timezone.now() - window).order_by('id')
+    for pk, phone, email in recent.values_list('id', 'phone_key', 'email_key'):
+        if phone in phones:
+            found_phones.setdefault(phone, pk)
+        if email in emails:
+            found_emails.setdefault(email, pk)
+    return found_phones, found_emails
+
+
+# ==========================================
+# INGESTION
+# ==========================================
+def validate(items):
+    """[(validated data, None) or (None, errors)] per item, in order."""
+    serializer = LeadInSerializer(data=items, many=True)
+    if serializer.is_valid():
+        return [(data, None) for data in serializer.validated_data]
+    # Keep the valid items of a partly invalid batch. DRF reports the
+    # errors as a list per item, or (3.16+) a dict of the failing indexes.
+    errors = serializer.errors
+    if not isinstance(errors, dict):
+        errors = dict(enumerate(errors))
+    return [
+        (None, errors[index]) if errors.get(index) else (serializer.child.run_validation(item), None)
+        for index, item in enumerate(items)
+    ]
+
+
+def build_lead(data, source=''):
+    lead = Lead(
+        name=data.get('name'),
+        email=data.get('email') or '',
+        phone=data.get('phone') or '',
+        message=data.get('message'),
+        from_url=data.get('from_url'),
+        source=source,
+    )
+    lead.apply_tracking()
+    return lead
+
+
+def ingest(items, source='', window=DEDUP_WINDOW):
+    """
+    Validate, de-duplicate and insert a batch of lead payloads. Returns
+    {'created', 'duplicates', 'invalid', 'results'} with one result per
+    item: {'index', 'status': created | duplicate | invalid, 'id' or 'errors'}.
+    """
+    checked = [(build_lead(data, source), None) if data is not None else (None, errors) for data, errors in validate(items)]
+    phones, emails = recent_keys(
+        [lead.phone_key for lead, _ in checked if lead], [lead.email_key for lead, _ in checked if lead], window
+    )
+    outcomes = []  # (status, Lead / lead id / errors)
+    new = []
+    for lead, errors in checked:
+        if errors:
+            outcomes.append(('invalid', errors))
+            continue
+        phone, email = lead.phone_key, lead.email_key
+        earlier = (phones.get(phone) if phone else None) or (emails.get(email) if email else None)
+        if earlier is not None:
+            outcomes.append(('duplicate', earlier))
+            continue
+        if phone:
+            phones[phone] = lead
+        if email:
+            emails[email] = lead
+        new.append(lead)
+        outcomes.append(('created', lead))
+
+    with transaction.atomic():
+        Lead.objects.bulk_create(new, batch_size=BATCH_SIZE)
+    search_index.reindex('lead', [lead.pk for lead in new])
+
+    results = []
+    for index, (status, value) in enumerate(outcomes):
+        if status == 'invalid':
+            results.append({'index': index, 'status': status, 'errors': value})
+        else:
+            results.append({'index': index, 'status': status, 'id': value.pk if isinstance(value, Lead) else value})
+    return {
+        'created': len(new),
+        'duplicates': sum(1 for status, _ in outcomes if status == 'duplicate'),
+        'invalid': sum(1 for status, _ in outcomes if status == 'invalid'),
+        'results': results,
+    }
+
+
+# ==========================================
+# STAGING
+# ==========================================
+def stage(items, source=''):
+    """Append raw payloads for the background drain; returns how many were staged."""
+    return len(LeadIntake.objects.bulk_create(
+        [LeadIntake(payload=item, source=source) for item in items], batch_size=BATCH_SIZE
+    ))
+
+
+def pending():
+    return LeadIntake.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Take up to ``batch_size`` pending rows (oldest first) for this worker; stale claims are retaken."""
+    token = uuid.uuid4().hex
+    moment = timezone.now()
+    free = Q(claimed_by__isnull=True) | Q(claimed_at__lt=moment - CLAIM_TIMEOUT)
+    ids = list(pending().filter(free).order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return token, []
+    LeadIntake.objects.filter(free, id__in=ids).update(claimed_by=token, claimed_at=moment)
+    return token, list(LeadIntake.objects.filter(claimed_by=token).order_by('id'))
+
+
+def _ingest_rows(rows, source, window):
+    """Ingest ``rows`` as one unit: the leads and the rows' outcomes commit together."""
+    with transaction.atomic():
+        ingested = ingest([row.payload for row in rows], source=source, window=window)
+        moment = timezone.now()
+        for row, outcome in zip(rows, ingested['results']):
+            row.processed_at = moment
+            row.attempts = F('attempts') + 1
+            row.outcome = outcome['status']
+            row.lead_id = outcome.get('id')
+            row.error = json.dumps(outcome['errors']) if 'errors' in outcome else ''
+        LeadIntake.objects.bulk_update(rows, ['processed_at', 'attempts', 'outcome', 'lead', 'error'], batch_size=BATCH_SIZE)
+    return ingested
+
+
+def process_staged(batch_size=BATCH_SIZE, window=DEDUP_WINDOW):
+    """
+    Ingest one batch of staged payloads. Returns counts, elapsed seconds
+    and the lag (age of the oldest row) the batch cleared. When a group
+    fails to insert, its rows are retried one by one so a single bad
+    payload only holds back itself: it is released with the error for a
+    later attempt (up to MAX_ATTEMPTS) and counted in ``failed``.
+    """
+    started = time.perf_counter()
+    token, rows = claim(batch_size)
+    result = {
+        'rows': len(rows), 'created': 0, 'duplicates': 0, 'invalid': 0, 'failed': 0,
+        'lag_seconds': 0.0, 'seconds': 0.0, 'error': None,
+    }
+    if not rows:
+        return result
+
+    # One ingest per source so every lead keeps the source it was staged with
+    by_source = {}
+    for row in rows:
+        by_source.setdefault(row.source, []).append(row)
+    for source, group in by_source.items():
+        try:
+            done = [_ingest_rows(group, source, window)]
+        except Exception:
+            done = []
+            for row in group:
+                try:
+                    done.append(_ingest_rows([row], source, window))
+                except Exception as e:
+                    LeadIntake.objects.filter(id=row.id, claimed_by=token).update(
+                        claimed_by=None, claimed_at=None, attempts=F('attempts') + 1, error=str(e)[:1000]
+                    )
+                    result['failed'] += 1
+                    result['error'] = str(e)
+        for ingested in done:
+            for name in ('created', 'duplicates', 'invalid'):
+                result[name] += ingested[name]
+
+    result['lag_seconds'] = (timezone.now() - min(row.received_at for row in rows)).total_seconds()
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def drain(batch_size=BATCH_SIZE, max_batches=None):
+    """
+    Process batches until nothing is pending; yields each batch result.
+    Stops early only when a whole batch failed (nothing could be written).
+    """
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        result = process_staged(batch_size)
+        if not result['rows']:
+            return
+        batches += 1
+        yield result
+        if result['failed'] == result['rows']:
+            return
+
+
+def purge_processed(older_than=timedelta(days=30)):
+    """Delete processed rows older than ``older_than``; returns how many went."""
+    deleted, _ = LeadIntake.objects.filter(processed_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+def intake_metrics():
+    waiting = pending().aggregate(oldest=Min('received_at'))
+    return {
+        'pending': pending().count(),
+        'failed': LeadIntake.objects.filter(processed_at__isnull=True, attempts__gte=MAX_ATTEMPTS).count(),
+        'lag_seconds': round((timezone.now() - waiting['oldest']).total_seconds(), 3) if waiting['oldest'] else 0.0,
+    }
@@ -0,0 +1,44 @@
+import json
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from Travel.lead_intake import BATCH_SIZE, drain, purge_processed, intake_metrics
+
+
+class Command(BaseCommand):
+    help = "Turn the lead payloads staged by the batch intake API into Leads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Staged payloads claimed per batch")
+        parser.add_argument('--loop', action='store_true', help="Keep polling instead of exiting when nothing is pending")
+        parser.add_argument('--interval', type=float, default=2.0, help="Seconds between polls with --loop")
+        parser.add_argument('--stats', action='store_true', help="Print the backlog and lag as JSON and exit")
+        parser.add_argument('--purge-days', type=int, help="Delete payloads processed more than this many days ago")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(intake_metrics(), indent=2))
+            return
+
+        if options['purge_days'] is not None:
+            deleted = purge_processed(timedelta(days=options['purge_days']))
+            self.stdout.write(f"Purged {deleted} processed payload(s).")
+
+        while True:
+            for result in drain(options['batch_size']):
+                if result['failed']:
+                    self.stdout.write(self.style.ERROR(
+                        f"{result['failed']} of {result['rows']} payload(s) failed and will be retried: {result['error']}"
+                    ))
+                if result['failed'] == result['rows']:
+                    continue
+                self.stdout.write(self.style.SUCCESS(
+                    f"{result['rows']} payload(s): {result['created']} lead(s) created, {result['duplicates']} duplicate(s), "
+                    f"{result['invalid']} invalid in {result['seconds']:.2f}s (lag {result['lag_seconds']:.1f}s)"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        metrics = intake_metrics()
+        self.stdout.write(f"Staged: {metrics['pending']} pending, {metrics['failed']} failed, lag {metrics['lag_seconds']:.1f}s.")
@@ -0,0 +1,44 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from Travel.rate_import import SHEETS, RateSheetError, import_rate_sheet
+
+
+class Command(BaseCommand):
+    help = "Import a hotel or houseboat rate sheet (CSV or XLSX), upserting rates by supplier, room, meal and dates."
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV or XLSX file with a header row")
+        parser.add_argument('--kind', choices=sorted(SHEETS), default='hotel')
+        parser.add_argument('--dry-run', action='store_true', help="Validate and report without writing")
+        parser.add_argument('--partial', action='store_true', help="Write the clean rows even when others fail")
+        parser.add_argument('--chunk-size', type=int, default=1000)
+        parser.add_argument('--json', action='store_true', help="Print the full summary as JSON")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['path'], 'rb') as upload:
+                result = import_rate_sheet(
+                    options['kind'], upload, filename=options['path'], dry_run=options['dry_run'],
+                    partial=options['partial'], chunk_size=options['chunk_size']
+                )
+        except (OSError, RateSheetError) as e:
+            raise CommandError(str(e))
+
+        if options['json']:
+            self.stdout.write(json.dumps(result.summary(), indent=2))
+            return
+
+        for error in result.errors:
+            self.stdout.write(self.style.ERROR(f"Row {error['row']}: {'; '.join(error['errors'])}"))
+        for conflict in result.conflicts:
+            other = f"row {conflict['other_row']}" if conflict['other_row'] else 'a stored rate'
+            self.stdout.write(self.style.WARNING(
+                f"Row {conflict['row']}: {' to '.join(conflict['dates'])} overlaps {other} ({' to '.join(conflict['overlaps'])})"
+            ))
+
+        style = self.style.SUCCESS if result.written or (result.ok and options['dry_run']) else self.style.WARNING
+        self.stdout.write(style(
+            f"{result.rows} rows: {result.created} new, {result.updated} changed, {result.unchanged} unchanged, "
+            f"{len(result.errors)} invalid, {len(result.conflicts)} overlaps. "
+            f"{'Written.' if result.written else 'Nothing written.'}"
+        ))
@@ -0,0 +1,47 @@
+import json
+import time
+from datetime import timedelta
+from django.core.management.base import BaseCommand
+from Travel.rate_changes import BATCH_SIZE, drain, purge_processed, queue_metrics
+
+
+class Command(BaseCommand):
+    help = "Reprice the draft itineraries and package templates affected by queued rate changes."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help="Queued changes claimed per batch")
+        parser.add_argument('--chunk-size', type=int, default=100, help="Itineraries repriced per transaction")
+        parser.add_argument('--loop', action='store_true', help="Keep polling the queue instead of exiting when it is empty")
+        parser.add_argument('--interval', type=float, default=5.0, help="Seconds between polls with --loop")
+        parser.add_argument('--stats', action='store_true', help="Print the queue depth and lag as JSON and exit")
+        parser.add_argument('--purge-days', type=int, help="Delete changes processed more than this many days ago")
+
+    def handle(self, *args, **options):
+        if options['stats']:
+            self.stdout.write(json.dumps(queue_metrics(), indent=2))
+            return
+
+        if options['purge_days'] is not None:
+            deleted = purge_processed(timedelta(days=options['purge_days']))
+            self.stdout.write(f"Purged {deleted} processed change(s).")
+
+        while True:
+            for result in drain(options['batch_size'], options['chunk_size']):
+                if result['error']:
+                    self.stdout.write(self.style.ERROR(
+                        f"Batch of {result['changes']} change(s) failed and will be retried: {result['error']}"
+                    ))
+                    continue
+                self.stdout.write(self.style.SUCCESS(
+                    f"{result['changes']} change(s): repriced {result['itineraries']} itinerar"
+                    f"{'y' if result['itineraries'] == 1 else 'ies'} and {result['packages']} package(s), "
+                    f"{result['options']} option(s) in {result['seconds']:.2f}s (lag {result['lag_seconds']:.1f}s)"
+                ))
+            if not options['loop']:
+                break
+            time.sleep(options['interval'])
+
+        metrics = queue_metrics()
+        self.stdout.write(
+            f"Queue: {metrics['pending']} pending, {metrics['failed']} failed, lag {metrics['lag_seconds']:.1f}s."
+        )
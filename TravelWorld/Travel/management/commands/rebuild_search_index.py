@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from Travel.search_index import ENTITIES, fts_enabled, rebuild
+
+
+class Command(BaseCommand):
+    help = "Rebuild the query, itinerary and lead search documents (after bulk writes that skipped the signals)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity', choices=list(ENTITIES), help="Only this entity (default: all)")
+
+    def handle(self, *args, **options):
+        entities = [options['entity']] if options['entity'] else list(ENTITIES)
+        for entity, documents in rebuild(entities).items():
+            self.stdout.write(self.style.SUCCESS(f"{entity}: {documents} document(s) indexed."))
+        if not fts_enabled():
+            self.stdout.write("No FTS5 table on this database; searches use the document columns.")
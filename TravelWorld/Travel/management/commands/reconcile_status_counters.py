@@ -0,0 +1,28 @@
+import json
+from django.core.management.base import BaseCommand
+from Travel.status_counters import reconcile
+
+
+class Command(BaseCommand):
+    help = "Rebuild the dashboard status counters from the Query and Itinerary tables (run periodically, e.g. nightly)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--entity', choices=['query', 'itinerary'], help="Only this entity (default: both)")
+        parser.add_argument('--dry-run', action='store_true', help="Report drift without correcting it")
+        parser.add_argument('--json', action='store_true', help="Print the report as JSON")
+
+    def handle(self, *args, **options):
+        entities = [options['entity']] if options['entity'] else ['query', 'itinerary']
+        report = reconcile(entities, dry_run=options['dry_run'])
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+            return
+
+        for entity, result in report.items():
+            drift = result['drifted'] + result['missing'] + result['stale']
+            style = self.style.WARNING if drift else self.style.SUCCESS
+            self.stdout.write(style(
+                f"{entity}: {result['cells']} cell(s), {result['drifted']} off, {result['missing']} missing, "
+                f"{result['stale']} stale{' (not corrected, dry run)' if drift and options['dry_run'] else ''}"
+            ))
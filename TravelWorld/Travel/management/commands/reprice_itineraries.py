@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from Travel.models import Itinerary
+from Travel.pricing_utils import reprice_itineraries
+
+
+class Command(BaseCommand):
+    help = "Reprice itineraries against the current rate cards (draft itineraries by default)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('ids', nargs='*', type=int, help="Itinerary ids (default: every itinerary with --status)")
+        parser.add_argument('--status', default='draft', help="Status to reprice when no ids are given")
+        parser.add_argument('--chunk-size', type=int, default=100)
+        parser.add_argument('--dry-run', action='store_true', help="Show what would change without writing")
+
+    def handle(self, *args, **options):
+        ids = options['ids'] or list(
+            Itinerary.objects.filter(status=options['status']).values_list('id', flat=True)
+        )
+        if not ids:
+            self.stdout.write("No itineraries to reprice.")
+            return
+
+        result = reprice_itineraries(ids, chunk_size=options['chunk_size'], dry_run=options['dry_run'])
+
+        if options['dry_run']:
+            for diff in result['diffs']:
+                self.stdout.write(
+                    f"Itinerary #{diff['itinerary_id']} {diff['option_name']}: "
+                    f"{diff['old_final']} -> {diff['new_final']} ({diff['delta']:+})"
+                )
+            self.stdout.write(f"{len(result['diffs'])} option(s) would change.")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Repriced {result['itineraries']} itinerar{'y' if result['itineraries'] == 1 else 'ies'}, "
+            f"{result['options']} option(s) written in {result['seconds']:.2f}s "
+            f"({result['per_second']:.1f} itineraries/sec)"
+        ))
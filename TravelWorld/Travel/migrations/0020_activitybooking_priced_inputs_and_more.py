@@ -0,0 +1,133 @@
+# Generated by Django 5.2 on 2026-10-18 07:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0019_query_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='activitybooking',
+            name='priced_inputs',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='activitybooking',
+            name='priced_markup',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='activitybooking',
+            name='priced_net',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='activitybooking',
+            name='priced_rule_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='activitybooking',
+            name='priced_rule_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='activityprice',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped on every change to this rate row'),
+        ),
+        migrations.AddField(
+            model_name='hotelbooking',
+            name='priced_inputs',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='hotelbooking',
+            name='priced_markup',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='hotelbooking',
+            name='priced_net',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='hotelbooking',
+            name='priced_rule_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='hotelbooking',
+            name='priced_rule_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='hotelprice',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped on every change to this rate row'),
+        ),
+        migrations.AddField(
+            model_name='houseboatbooking',
+            name='priced_inputs',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='houseboatbooking',
+            name='priced_markup',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseboatbooking',
+            name='priced_net',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseboatbooking',
+            name='priced_rule_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseboatbooking',
+            name='priced_rule_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='houseboatprice',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped on every change to this rate row'),
+        ),
+        migrations.AddField(
+            model_name='vehiclebooking',
+            name='priced_inputs',
+            field=models.CharField(blank=True, default='', max_length=32),
+        ),
+        migrations.AddField(
+            model_name='vehiclebooking',
+            name='priced_markup',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclebooking',
+            name='priced_net',
+            field=models.DecimalField(blank=True, decimal_places=6, max_digits=16, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclebooking',
+            name='priced_rule_id',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclebooking',
+            name='priced_rule_version',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='vehiclepricing',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False, help_text='Bumped on every change to this rate row'),
+        ),
+    ]
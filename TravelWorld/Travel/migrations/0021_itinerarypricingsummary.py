@@ -0,0 +1,27 @@
+# Generated by Django 5.2 on 2026-10-18 07:20
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0020_activitybooking_priced_inputs_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ItineraryPricingSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('options', models.JSONField(default=dict)),
+                ('option_count', models.PositiveIntegerField(default=0)),
+                ('lowest_final', models.DecimalField(decimal_places=2, default=0, max_digits=12)),
+                ('vehicle_name', models.CharField(blank=True, default='', max_length=100)),
+                ('is_stale', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('itinerary', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='pricing_summary', to='Travel.itinerary')),
+            ],
+        ),
+    ]
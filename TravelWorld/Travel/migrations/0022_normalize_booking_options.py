@@ -0,0 +1,40 @@
+# Generated by Django 5.2 on 2026-10-18 07:26
+
+from django.db import migrations
+
+
+OPTION_ALIASES = {
+    1: ('option1', 'standard', 'standardpackage', 'opt1', '1'),
+    2: ('option2', 'deluxe', 'deluxepackage', 'opt2', '2'),
+    3: ('option3', 'premium', 'premiumpackage', 'opt3', '3'),
+    4: ('option4', 'luxury', 'luxurypackage', 'opt4', '4'),
+}
+
+
+def option_number(value):
+    key = str(value or '').lower().strip().replace(' ', '').replace('_', '')
+    for number, aliases in OPTION_ALIASES.items():
+        if key in aliases:
+            return number
+    return None
+
+
+def normalize_options(apps, schema_editor):
+    for model_name, template in (('HotelBooking', 'option_{}'), ('HouseboatBooking', 'option{}')):
+        model = apps.get_model('Travel', model_name)
+        values = model.objects.exclude(option__isnull=True).exclude(option='').values_list('option', flat=True).distinct()
+        for value in list(values):
+            number = option_number(value)
+            if number and value != template.format(number):
+                model.objects.filter(option=value).update(option=template.format(number))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0021_itinerarypricingsummary'),
+    ]
+
+    operations = [
+        migrations.RunPython(normalize_options, migrations.RunPython.noop),
+    ]
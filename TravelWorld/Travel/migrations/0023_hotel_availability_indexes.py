@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 07:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0022_normalize_booking_options'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='hotel',
+            index=models.Index(fields=['destination', 'status'], name='Travel_hote_destina_0b8e65_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotelprice',
+            index=models.Index(fields=['hotel', 'from_date', 'to_date'], name='Travel_hote_hotel_i_c559ba_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='hotelprice',
+            index=models.Index(fields=['from_date', 'to_date'], name='Travel_hote_from_da_43e1a4_idx'),
+        ),
+    ]
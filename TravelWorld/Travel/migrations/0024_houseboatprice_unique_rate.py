@@ -0,0 +1,43 @@
+# Generated by Django 5.2 on 2026-10-18 08:00
+
+from django.db import migrations, models
+from django.db.models import Count, Max
+
+
+RATE_KEY = ('houseboat', 'room_type', 'meal_plan', 'from_date', 'to_date')
+
+
+def collapse_duplicate_rates(apps, schema_editor):
+    """
+    Keep the newest HouseboatPrice per key so the constraint can be added;
+    bookings priced from a dropped row are repriced on their next read.
+    """
+    HouseboatPrice = apps.get_model('Travel', 'HouseboatPrice')
+    HouseboatBooking = apps.get_model('Travel', 'HouseboatBooking')
+    duplicated = (
+        HouseboatPrice.objects.values(*RATE_KEY)
+        .annotate(rows=Count('id'), keep=Max('id')).filter(rows__gt=1).order_by()
+    )
+    dropped = []
+    for key in duplicated:
+        keep = key.pop('keep')
+        key.pop('rows')
+        dropped.extend(HouseboatPrice.objects.filter(**key).exclude(id=keep).values_list('id', flat=True))
+    if dropped:
+        HouseboatPrice.objects.filter(id__in=dropped).delete()
+        HouseboatBooking.objects.filter(priced_rule_id__in=dropped).update(priced_net=None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0023_hotel_availability_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(collapse_duplicate_rates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='houseboatprice',
+            constraint=models.UniqueConstraint(fields=('houseboat', 'room_type', 'meal_plan', 'from_date', 'to_date'), name='unique_houseboat_room_meal_date_range'),
+        ),
+    ]
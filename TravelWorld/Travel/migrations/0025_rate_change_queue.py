@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 08:06
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0024_houseboatprice_unique_rate'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RateChange',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('hotel', 'Hotel'), ('houseboat', 'Houseboat'), ('vehicle', 'Vehicle'), ('activity', 'Activity')], max_length=10)),
+                ('supplier_id', models.PositiveIntegerField()),
+                ('from_date', models.DateField()),
+                ('to_date', models.DateField()),
+                ('enqueued_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=32, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['id'],
+                'indexes': [models.Index(fields=['processed_at', 'id'], name='Travel_rate_process_6699fa_idx'), models.Index(fields=['processed_at', 'enqueued_at'], name='Travel_rate_process_b574e8_idx')],
+            },
+        ),
+    ]
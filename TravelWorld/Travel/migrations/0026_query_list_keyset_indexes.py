@@ -0,0 +1,25 @@
+# Generated by Django 5.2 on 2026-10-18 08:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0025_rate_change_queue'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='query',
+            index=models.Index(fields=['created_at', 'id'], name='Travel_quer_created_9f3b77_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='query',
+            index=models.Index(fields=['created_by', 'created_at'], name='Travel_quer_created_4a7fe1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='query',
+            index=models.Index(fields=['assign', 'created_at'], name='Travel_quer_assign__6d065e_idx'),
+        ),
+    ]
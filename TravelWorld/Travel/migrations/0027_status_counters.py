@@ -0,0 +1,54 @@
+# Generated by Django 5.2 on 2026-10-18 08:14
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import TruncDate
+
+
+def count_existing(apps, schema_editor):
+    """Seed the counters (later drift is fixed by manage.py reconcile_status_counters)."""
+    StatusCounter = apps.get_model('Travel', 'StatusCounter')
+    sources = (
+        ('query', apps.get_model('Travel', 'Query'), ('status', 'priority', 'created_by_id', 'assign_id', 'created_by_id')),
+        ('itinerary', apps.get_model('Travel', 'Itinerary'), ('status', None, 'created_by_id', 'query__assign_id', 'query__created_by_id')),
+    )
+    rows = []
+    for entity, model, (status, priority, creator, assignee, query_creator) in sources:
+        fields = [name for name in (status, priority, creator, assignee, query_creator) if name]
+        grouped = model.objects.values(*set(fields), day=TruncDate('created_at')).annotate(n=Count('id')).order_by()
+        for row in grouped:
+            rows.append(StatusCounter(
+                entity=entity, status=row[status], priority=(row[priority] or '') if priority else '',
+                creator_id=row[creator] or 0, assignee_id=row[assignee] or 0, query_creator_id=row[query_creator] or 0,
+                day=row['day'], count=row['n'],
+            ))
+    StatusCounter.objects.bulk_create(rows, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0026_query_list_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StatusCounter',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('query', 'Query'), ('itinerary', 'Itinerary')], max_length=10)),
+                ('status', models.CharField(max_length=20)),
+                ('priority', models.CharField(blank=True, default='', max_length=10)),
+                ('creator_id', models.PositiveIntegerField(default=0)),
+                ('assignee_id', models.PositiveIntegerField(default=0, help_text="Team member the (itinerary's) query is assigned to")),
+                ('query_creator_id', models.PositiveIntegerField(default=0, help_text="Team member who created the (itinerary's) query")),
+                ('day', models.DateField()),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['entity', 'day'], name='Travel_stat_entity_8d5b79_idx')],
+                'constraints': [models.UniqueConstraint(fields=('entity', 'status', 'priority', 'creator_id', 'assignee_id', 'query_creator_id', 'day'), name='unique_status_counter_cell')],
+            },
+        ),
+        migrations.RunPython(count_existing, migrations.RunPython.noop),
+    ]
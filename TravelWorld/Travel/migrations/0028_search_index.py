@@ -0,0 +1,119 @@
+# Generated by Django 5.2 on 2026-10-18 08:18
+
+import re
+import unicodedata
+
+from django.db import OperationalError, migrations, models, transaction
+
+
+# Frozen copies of Travel.search_index as of this migration, so later
+# changes to the app module cannot alter what it creates or stores.
+SEARCH_FIELDS = ('name', 'phone', 'email', 'ref')
+SOURCE_FIELDS = {
+    'query': ('client_name', 'phone_number', 'email', 'query_id'),
+    'itinerary': ('name', 'query__client_name', 'query__phone_number', 'query__email', 'query__query_id'),
+    'lead': ('name', 'phone', 'email'),
+}
+FTS_TABLE = 'travel_search_fts'
+FTS_CREATE = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+    "entity UNINDEXED, object_id UNINDEXED, name, phone, email, ref, tokenize='trigram')"
+)
+FTS_DROP = f"DROP TABLE IF EXISTS {FTS_TABLE}"
+
+
+def normalise(text):
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def phone_digits(phone):
+    digits = re.sub(r'\D', '', str(phone or ''))
+    return f'{digits} {digits[-10:]}' if len(digits) > 10 else digits
+
+
+def document(entity, values):
+    if entity == 'itinerary':
+        name, client_name, phone, email, ref = values
+        name = f'{name or ""} {client_name or ""}'
+    elif entity == 'query':
+        name, phone, email, ref = values
+    else:
+        name, phone, email = values
+        ref = ''
+    return normalise(name), phone_digits(phone), normalise(email), normalise(ref)
+
+
+def create_search_structures(apps, schema_editor):
+    """
+    FTS5 trigram mirror on SQLite (skipped when the build lacks FTS5 /
+    trigram support), pg_trgm GIN indexes on PostgreSQL.
+    """
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        try:
+            with transaction.atomic(using=schema_editor.connection.alias):
+                schema_editor.execute(FTS_CREATE)
+        except OperationalError:
+            pass
+    elif vendor == 'postgresql':
+        schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        table = apps.get_model('Travel', 'SearchDocument')._meta.db_table
+        for field in SEARCH_FIELDS:
+            schema_editor.execute(
+                f'CREATE INDEX IF NOT EXISTS search_doc_{field}_trgm ON "{table}" USING gin ("{field}" gin_trgm_ops)'
+            )
+
+
+def drop_search_structures(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(FTS_DROP)
+    elif schema_editor.connection.vendor == 'postgresql':
+        for field in SEARCH_FIELDS:
+            schema_editor.execute(f'DROP INDEX IF EXISTS search_doc_{field}_trgm')
+
+
+def index_existing(apps, schema_editor):
+    """Seed the documents (manage.py rebuild_search_index redoes this from scratch)."""
+    SearchDocument = apps.get_model('Travel', 'SearchDocument')
+    sources = (('query', 'Query'), ('itinerary', 'Itinerary'), ('lead', 'Lead'))
+    for entity, model_name in sources:
+        rows = apps.get_model('Travel', model_name).objects.values_list('pk', *SOURCE_FIELDS[entity])
+        SearchDocument.objects.bulk_create([
+            SearchDocument(entity=entity, object_id=pk, **dict(zip(SEARCH_FIELDS, document(entity, values))))
+            for pk, *values in rows.iterator()
+        ], batch_size=500)
+    connection = schema_editor.connection
+    if connection.vendor == 'sqlite' and FTS_TABLE in connection.introspection.table_names():
+        schema_editor.execute(
+            f"INSERT INTO {FTS_TABLE} (rowid, entity, object_id, name, phone, email, ref) "
+            f"SELECT id, entity, object_id, name, phone, email, ref FROM {SearchDocument._meta.db_table}"
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0027_status_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('entity', models.CharField(choices=[('query', 'Query'), ('itinerary', 'Itinerary'), ('lead', 'Lead')], max_length=10)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('name', models.CharField(blank=True, default='', max_length=600)),
+                ('phone', models.CharField(blank=True, default='', max_length=60)),
+                ('email', models.CharField(blank=True, default='', max_length=254)),
+                ('ref', models.CharField(blank=True, default='', help_text='Query id (dh01...)', max_length=20)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('entity', 'object_id'), name='unique_search_document')],
+            },
+        ),
+        migrations.RunPython(create_search_structures, drop_search_structures),
+        migrations.RunPython(index_existing, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2 on 2026-10-18 08:20
+
+import re
+from django.db import migrations, models
+
+
+def seed_query_ids(apps, schema_editor):
+    """Start the query id sequence after the highest existing dhNN."""
+    Query = apps.get_model('Travel', 'Query')
+    IdSequence = apps.get_model('Travel', 'IdSequence')
+    numbers = (re.match(r'^dh(\d+)$', query_id or '') for query_id in Query.objects.values_list('query_id', flat=True))
+    IdSequence.objects.create(name='query_id', value=max((int(match.group(1)) for match in numbers if match), default=0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0028_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+        migrations.RunPython(seed_query_ids, migrations.RunPython.noop),
+    ]
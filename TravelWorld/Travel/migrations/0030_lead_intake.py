@@ -0,0 +1,46 @@
+# Generated by Django 5.2 on 2026-10-18 08:22
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0029_query_id_sequence'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeadIntake',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('payload', models.JSONField()),
+                ('source', models.CharField(blank=True, max_length=100)),
+                ('received_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('claimed_by', models.CharField(blank=True, max_length=32, null=True)),
+                ('claimed_at', models.DateTimeField(blank=True, null=True)),
+                ('processed_at', models.DateTimeField(blank=True, null=True)),
+                ('attempts', models.PositiveSmallIntegerField(default=0)),
+                ('outcome', models.CharField(blank=True, choices=[('created', 'Created'), ('duplicate', 'Duplicate'), ('invalid', 'Invalid')], max_length=10)),
+                ('error', models.TextField(blank=True, default='')),
+            ],
+            options={
+                'ordering': ['id'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['created_at'], name='Travel_lead_created_907a99_idx'),
+        ),
+        migrations.AddField(
+            model_name='leadintake',
+            name='lead',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='intakes', to='Travel.lead'),
+        ),
+        migrations.AddIndex(
+            model_name='leadintake',
+            index=models.Index(fields=['processed_at', 'id'], name='Travel_lead_process_dafd49_idx'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2 on 2026-10-18 08:38
+
+import re
+
+from django.db import migrations, models
+
+
+def fill_contact_keys(apps, schema_editor):
+    """Normalise the existing leads' phone / email the way Lead.apply_tracking does."""
+    Lead = apps.get_model('Travel', 'Lead')
+    leads = []
+    for lead in Lead.objects.only('id', 'phone', 'email').iterator(chunk_size=500):
+        digits = re.sub(r'\D', '', lead.phone or '')
+        lead.phone_key = digits[-10:] if len(digits) >= 7 else ''
+        lead.email_key = (lead.email or '').strip().lower()
+        leads.append(lead)
+    Lead.objects.bulk_update(leads, ['phone_key', 'email_key'], batch_size=500)
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Travel', '0031_cache_revisions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='lead',
+            name='email_key',
+            field=models.CharField(blank=True, editable=False, max_length=254),
+        ),
+        migrations.AddField(
+            model_name='lead',
+            name='phone_key',
+            field=models.CharField(blank=True, editable=False, max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['phone_key', 'created_at'], name='Travel_lead_phone_k_ee807f_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='lead',
+            index=models.Index(fields=['email_key', 'created_at'], name='Travel_lead_email_k_7e9515_idx'),
+        ),
+        migrations.RunPython(fill_contact_keys, migrations.RunPython.noop),
+    ]
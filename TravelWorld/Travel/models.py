@@ -1,7 +1,9 @@
-from django.db import models
+from django.db import models, transaction
 from django.utils.timezone import now
 from ckeditor.fields import RichTextField
 from django.utils import timezone
+from urllib.parse import urlparse
+import re
 
 
 def get_default_team_member():
@@ -213,6 +215,19 @@ class TeamMember(models.Model):
 
 ##############for connecting with php site#########################
 
+LEAD_PHONE_KEY_DIGITS = 10
+LEAD_MIN_PHONE_DIGITS = 7  # Shorter numbers are too partial to de-duplicate on
+
+
+def lead_phone_key(phone):
+    """Last ten digits of a phone number ('' when too short to compare)."""
+    digits = re.sub(r'\D', '', phone or '')
+    return digits[-LEAD_PHONE_KEY_DIGITS:] if len(digits) >= LEAD_MIN_PHONE_DIGITS else ''
+
+
+def lead_email_key(email):
+    return (email or '').strip().lower()
+
 
 class Lead(models.Model):
     # Basic info
@@ -247,7 +262,23 @@ class Lead(models.Model):
 
     source = models.CharField(max_length=100, blank=True)  # e.g. "dream-holidays-php"
 
-    def save(self, *args, **kwargs):
+    # Normalised contact details the batch intake de-duplicates on
+    phone_key = models.CharField(max_length=20, blank=True, editable=False)
+    email_key = models.CharField(max_length=254, blank=True, editable=False)
+
+    class Meta:
+        indexes = [
+            # Newest-first lists and the intake duplicate window
+            models.Index(fields=['created_at']),
+            models.Index(fields=['phone_key', 'created_at']),
+            models.Index(fields=['email_key', 'created_at']),
+        ]
+
+    def apply_tracking(self):
+        """Fill the derived fields: contact keys and tracking data (save does it; bulk inserts call it)."""
+        self.phone_key = lead_phone_key(self.phone)
+        self.email_key = lead_email_key(self.email)
+
         # Extract domain from URL
         if self.from_url:
             try:
@@ -262,6 +293,8 @@ class Lead(models.Model):
                 self.utm_medium.lower() in {"cpc", "ppc", "paid", "paid_search"})
         )
 
+    def save(self, *args, **kwargs):
+        self.apply_tracking()
         super().save(*args, **kwargs)
 
     @property
@@ -330,6 +363,11 @@ class  Hotel(models.Model):
     created_by = models.ForeignKey(TeamMember, on_delete=models.SET_NULL, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=['destination', 'status']),
+        ]
+
     def __str__(self):
         return self.name
 
@@ -366,6 +404,7 @@ class Hotelprice(models.Model):
     child_without_bed = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     child_with_bed = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
     extra_bed = models.DecimalField(max_digits=10, decimal_places=2, blank=True, null=True)
+    version = models.PositiveIntegerField(default=1, editable=False, help_text="Bumped on every change to this rate row")
 
     class Meta:
         constraints = [
@@ -374,10 +413,21 @@ class Hotelprice(models.Model):
                 name='unique_hotel_room_meal_date_range'
             )
         ]
+        indexes = [
+            # Availability search: hotels with a rate overlapping a date window
+            models.Index(fields=['hotel', 'from_date', 'to_date']),
+            models.Index(fields=['from_date', 'to_date']),
+        ]
 
     def __str__(self):
         return f"{self.hotel.name} - {self.room_type.name} ({self.from_date} to {self.to_date})"
 
+    def save(self, *args, **kwargs):
+        # Bump the version on edits so cached booking line prices know the rate moved
+        if self.pk:
+            self.version = (self.version or 0) + 1
+        super().save(*args, **kwargs)
+
 from django.db import models
 from decimal import Decimal
 import json
@@ -680,11 +730,25 @@ class HouseboatPrice(models.Model):
     nine_bed = models.DecimalField(max_digits=10, decimal_places=1)
     ten_bed = models.DecimalField(max_digits=10, decimal_places=1)
     extra_bed = models.DecimalField(max_digits=10, decimal_places=1)
+    version = models.PositiveIntegerField(default=1, editable=False, help_text="Bumped on every change to this rate row")
 
+    class Meta:
+        constraints = [
+            UniqueConstraint(
+                fields=['houseboat', 'room_type', 'meal_plan', 'from_date', 'to_date'],
+                name='unique_houseboat_room_meal_date_range'
+            )
+        ]
 
     def __str__(self):
         return f"{self.houseboat.name} ({self.from_date} - {self.to_date})"
 
+    def save(self, *args, **kwargs):
+        # Bump the version on edits so cached booking line prices know the rate moved
+        if self.pk:
+            self.version = (self.version or 0) + 1
+        super().save(*args, **kwargs)
+
 
 
 
@@ -865,10 +929,17 @@ class ActivityPrice(models.Model):
     from_date = models.DateField()
     to_date = models.DateField()
     per_person = models.DecimalField(max_digits=10, decimal_places=2)
+    version = models.PositiveIntegerField(default=1, editable=False, help_text="Bumped on every change to this rate row")
 
     def __str__(self):
         return f"{self.activity.name} ({self.from_date} - {self.to_date})"
 
+    def save(self, *args, **kwargs):
+        # Bump the version on edits so cached booking line prices know the rate moved
+        if self.pk:
+            self.version = (self.version or 0) + 1
+        super().save(*args, **kwargs)
+
     # This ensures data integrity even if saved outside a form
     def clean(self):
         if self.from_date and self.to_date and self.from_date > self.to_date:
@@ -1164,10 +1235,17 @@ class VehiclePricing(models.Model):
     total_fee_100km = models.DecimalField(max_digits=10, decimal_places=2)
     extra_fee_per_km = models.DecimalField(max_digits=10, decimal_places=2)
     is_active = models.BooleanField(default=True)
+    version = models.PositiveIntegerField(default=1, editable=False, help_text="Bumped on every change to this rate row")
 
     def __str__(self):
         return f"{self.vehicle.name} ({self.from_date} - {self.to_date})"
 
+    def save(self, *args, **kwargs):
+        # Bump the version on edits so cached booking line prices know the rate moved
+        if self.pk:
+            self.version = (self.version or 0) + 1
+        super().save(*args, **kwargs)
+
 
 
 
@@ -1549,20 +1627,26 @@ class Query(models.Model):
     )
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            # Keyset pages of the query list (newest first), overall and per creator / assignee
+            models.Index(fields=['created_at', 'id']),
+            models.Index(fields=['created_by', 'created_at']),
+            models.Index(fields=['assign', 'created_at']),
+        ]
+
     def save(self, *args, **kwargs):
         if not self.query_id:
-            # Get the last query to determine the next number
-            last_query = Query.objects.all().order_by('id').last()
-            if last_query and last_query.query_id:
-                # Extract number from last query_id (e.g., 'dh01' -> 1)
-                try:
-                    last_num = int(last_query.query_id[2:])
-                    new_num = last_num + 1
-                except (ValueError, IndexError):
-                    new_num = 1
-            else:
-                new_num = 1
-            self.query_id = f'dh{new_num:02d}'  # Format: dh01, dh02, dh03...
+            from .sequences import next_query_ids
+            try:
+                with transaction.atomic():
+                    # The number is rolled back with the insert if it fails, so ids stay gap-free
+                    self.query_id = next_query_ids()[0]
+                    super().save(*args, **kwargs)
+            except Exception:
+                self.query_id = ''  # Released with the rollback; allocate afresh on retry
+                raise
+            return
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -1834,6 +1918,24 @@ from django.db import models
 from django.contrib.auth.models import User
 
 
+# Spellings of the four hotel options seen in forms, imports and old data.
+# Booking saves store the canonical key so queries can match options exactly.
+OPTION_ALIASES = {
+    1: ('option1', 'standard', 'standardpackage', 'opt1', '1'),
+    2: ('option2', 'deluxe', 'deluxepackage', 'opt2', '2'),
+    3: ('option3', 'premium', 'premiumpackage', 'opt3', '3'),
+    4: ('option4', 'luxury', 'luxurypackage', 'opt4', '4'),
+}
+
+
+def option_number(value):
+    """1-4 for any known option spelling, None for blank or unknown values."""
+    key = str(value or '').lower().strip().replace(' ', '').replace('_', '')
+    for number, aliases in OPTION_ALIASES.items():
+        if key in aliases:
+            return number
+    return None
+
 
 class HotelBooking(models.Model):
     itinerary = models.ForeignKey(
@@ -1913,6 +2015,14 @@ class HotelBooking(models.Model):
     custom_child_with_bed_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     custom_child_without_bed_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    # Cached line price, reused by pricing.price_bookings(incremental=True)
+    # while the booking inputs and the rate row version are unchanged
+    priced_net = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_markup = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_rule_id = models.PositiveIntegerField(null=True, blank=True)
+    priced_rule_version = models.PositiveIntegerField(null=True, blank=True)
+    priced_inputs = models.CharField(max_length=32, blank=True, default='')
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -1954,9 +2064,16 @@ class HotelBooking(models.Model):
 
         return " | ".join(summaries)
 
+    def normalize_fields(self):
+        """Derived fields save() fills in; call before bulk_create, which skips save()."""
+        self.num_rooms = self.num_double_beds
+        number = option_number(self.option)
+        if number:
+            self.option = f'option_{number}'
+
     def save(self, *args, **kwargs):
         """Auto-calculate num_rooms from num_double_beds (1:1 mapping)"""
-        self.num_rooms = self.num_double_beds
+        self.normalize_fields()
         super().save(*args, **kwargs)
 
     def get_inclusions_json(self):
@@ -2224,6 +2341,14 @@ class ActivityBooking(models.Model):
     gross_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     custom_total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    # Cached line price, reused by pricing.price_bookings(incremental=True)
+    # while the booking inputs and the rate row version are unchanged
+    priced_net = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_markup = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_rule_id = models.PositiveIntegerField(null=True, blank=True)
+    priced_rule_version = models.PositiveIntegerField(null=True, blank=True)
+    priced_inputs = models.CharField(max_length=32, blank=True, default='')
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -2292,6 +2417,14 @@ class VehicleBooking(models.Model):
     gross_price = models.DecimalField(max_digits=10, decimal_places=2, default=0)
     custom_total_price = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    # Cached line price, reused by pricing.price_bookings(incremental=True)
+    # while the booking inputs and the rate row version are unchanged
+    priced_net = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_markup = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_rule_id = models.PositiveIntegerField(null=True, blank=True)
+    priced_rule_version = models.PositiveIntegerField(null=True, blank=True)
+    priced_inputs = models.CharField(max_length=32, blank=True, default='')
+
     class Meta:
         constraints = [
             models.CheckConstraint(
@@ -2390,6 +2523,14 @@ class HouseboatBooking(models.Model):
     custom_ten_bed_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
     custom_extra_bed_hb_total = models.DecimalField(max_digits=10, decimal_places=2, null=True, blank=True)
 
+    # Cached line price, reused by pricing.price_bookings(incremental=True)
+    # while the booking inputs and the rate row version are unchanged
+    priced_net = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_markup = models.DecimalField(max_digits=16, decimal_places=6, null=True, blank=True)
+    priced_rule_id = models.PositiveIntegerField(null=True, blank=True)
+    priced_rule_version = models.PositiveIntegerField(null=True, blank=True)
+    priced_inputs = models.CharField(max_length=32, blank=True, default='')
+
     created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
@@ -2454,6 +2595,16 @@ class HouseboatBooking(models.Model):
             })
         return json.dumps(inclusions_list)
 
+    def normalize_fields(self):
+        """Derived fields save() fills in; call before bulk_create, which skips save()."""
+        number = option_number(self.option)
+        if number:
+            self.option = f'option{number}'
+
+    def save(self, *args, **kwargs):
+        self.normalize_fields()
+        super().save(*args, **kwargs)
+
     # ✅ NEW: Calculate total rooms
     def get_total_rooms(self):
         """Calculate total number of rooms booked"""
@@ -2610,6 +2761,26 @@ class ItineraryPricingOption(models.Model):
         return f"{self.itinerary.name} - {self.option_name}: ₹{self.final_amount}"
 
 
+class ItineraryPricingSummary(models.Model):
+    """
+    Denormalised pricing snapshot of one itinerary for list, quotation and PDF pages.
+
+    ``options`` maps 'option_1'..'option_4' to that option's saved prices and
+    room/bed counts. Rebuilt by pricing_summary.refresh_pricing_summaries();
+    booking and pricing option writes flag it stale in the same transaction.
+    """
+    itinerary = models.OneToOneField(Itinerary, on_delete=models.CASCADE, related_name='pricing_summary')
+    options = models.JSONField(default=dict)
+    option_count = models.PositiveIntegerField(default=0)
+    lowest_final = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    vehicle_name = models.CharField(max_length=100, blank=True, default='')
+    is_stale = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.itinerary.name} - pricing summary"
+
+
 from decimal import Decimal
 from django.db import models
 from django.utils import timezone
@@ -2960,6 +3131,178 @@ class PackagePricingOption(models.Model):
         return f"{self.package_template.name} - {self.option_name}"
 
 
+class RateChange(models.Model):
+    """
+    One queued rate change: a supplier and the date range whose rates moved.
 
+    Written by the price model signals (and bulk rate imports) in the same
+    transaction as the rate itself; rate_changes.process_rate_changes claims
+    pending rows, reprices the draft itineraries and package templates they
+    affect and stamps ``processed_at``.
+    """
+    KIND_CHOICES = [
+        ('hotel', 'Hotel'),
+        ('houseboat', 'Houseboat'),
+        ('vehicle', 'Vehicle'),
+        ('activity', 'Activity'),
+    ]
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    supplier_id = models.PositiveIntegerField()
+    from_date = models.DateField()
+    to_date = models.DateField()
+    enqueued_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['processed_at', 'id']),
+            models.Index(fields=['processed_at', 'enqueued_at']),
+        ]
 
+    def __str__(self):
+        return f"{self.kind} #{self.supplier_id} ({self.from_date} - {self.to_date})"
+
+
+
+class StatusCounter(models.Model):
+    """
+    Number of queries or itineraries in one cell: status, priority, owners
+    and creation day.
 
+    Kept current by status_counters.py from the Query / Itinerary signals
+    and rebuilt by ``manage.py reconcile_status_counters``; the dashboard
+    tiles sum these rows instead of counting the source tables. Owner ids
+    are 0 when unset so every cell is unique.
+    """
+    ENTITY_CHOICES = [
+        ('query', 'Query'),
+        ('itinerary', 'Itinerary'),
+    ]
+    entity = models.CharField(max_length=10, choices=ENTITY_CHOICES)
+    status = models.CharField(max_length=20)
+    priority = models.CharField(max_length=10, blank=True, default='')
+    creator_id = models.PositiveIntegerField(default=0)
+    assignee_id = models.PositiveIntegerField(default=0, help_text="Team member the (itinerary's) query is assigned to")
+    query_creator_id = models.PositiveIntegerField(default=0, help_text="Team member who created the (itinerary's) query")
+    day = models.DateField()
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=['entity', 'status', 'priority', 'creator_id', 'assignee_id', 'query_creator_id', 'day'],
+                name='unique_status_counter_cell'
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['entity', 'day']),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} {self.status} {self.day}: {self.count}"
+
+
+
+class SearchDocument(models.Model):
+    """
+    Normalised searchable text of one query, itinerary or lead.
+
+    Written by search_index.py from the model signals (and mirrored into an
+    FTS5 table on SQLite); the list search boxes match these rows instead
+    of the source tables. ``phone`` holds digits only.
+    """
+    ENTITY_CHOICES = [
+        ('query', 'Query'),
+        ('itinerary', 'Itinerary'),
+        ('lead', 'Lead'),
+    ]
+    entity = models.CharField(max_length=10, choices=ENTITY_CHOICES)
+    object_id = models.PositiveBigIntegerField()
+    name = models.CharField(max_length=600, blank=True, default='')
+    phone = models.CharField(max_length=60, blank=True, default='')
+    email = models.CharField(max_length=254, blank=True, default='')
+    ref = models.CharField(max_length=20, blank=True, default='', help_text="Query id (dh01...)")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['entity', 'object_id'], name='unique_search_document'),
+        ]
+
+    def __str__(self):
+        return f"{self.entity} #{self.object_id}: {self.name}"
+
+
+
+class IdSequence(models.Model):
+    """
+    Last value handed out by one named counter (``query_id``: the number in
+    dh01, dh02...).
+
+    sequences.allocate bumps ``value`` with a single UPDATE inside the
+    caller's transaction, so concurrent workers queue on the row instead of
+    racing for the same number.
+    """
+    name = models.CharField(max_length=50, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
+
+
+
+class LeadIntake(models.Model):
+    """
+    One lead payload accepted by the batch intake API in staging mode.
+
+    Rows are appended as received and acknowledged at once;
+    lead_intake.process_staged claims pending rows, validates and
+    de-duplicates them and bulk-inserts the Leads, recording the outcome
+    here.
+    """
+    OUTCOME_CHOICES = [
+        ('created', 'Created'),
+        ('duplicate', 'Duplicate'),
+        ('invalid', 'Invalid'),
+    ]
+    payload = models.JSONField()
+    source = models.CharField(max_length=100, blank=True)
+    received_at = models.DateTimeField(default=timezone.now)
+    claimed_by = models.CharField(max_length=32, null=True, blank=True)
+    claimed_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    outcome = models.CharField(max_length=10, choices=OUTCOME_CHOICES, blank=True)
+    lead = models.ForeignKey(Lead, on_delete=models.SET_NULL, null=True, blank=True, related_name='intakes')
+    error = models.TextField(blank=True, default='')
+
+    class Meta:
+        ordering = ['id']
+        indexes = [
+            models.Index(fields=['processed_at', 'id']),
+        ]
+
+    def __str__(self):
+        return f"Intake #{self.id} ({self.outcome or 'pending'})"
+
+
+
+class CacheRevision(models.Model):
+    """
+    Revision counter of one cached thing (the rate index, a supplier's
+    booking options, an itinerary's diffs).
+
+    revisions.bump increments it in the writer's transaction; every worker
+    reads it from here, so an edit on one process retires the in-process
+    and cached copies on all of them.
+    """
+    name = models.CharField(max_length=100, unique=True)
+    value = models.PositiveBigIntegerField(default=0)
+    changed_at = models.DateTimeField(default=timezone.now)
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
@@ -0,0 +1,172 @@
+# option_builder.py
+"""
+Automatic hotel option tiers for an itinerary.
+
+Fills the four HotelBooking options (Standard, Deluxe, Premium, Luxury)
+from the itinerary's day plans in one go: consecutive nights in the same
+destination become one stay, each stay is priced at every hotel of the
+destination in one pass (hotel_search.cheapest_stays) and each tier takes
+the cheapest hotel of its preferred category. The bookings are written
+with one bulk_create and their line prices cached in the same
+transaction. Only draft itineraries are built, and their saved pricing
+options are left alone: the summary is flagged stale and the totals come
+from the line prices until the user saves the pricing again.
+"""
+from dataclasses import dataclass, field
+from datetime import time, timedelta
+from django.db import transaction
+from .models import HotelBooking
+from .hotel_search import get_hotel_index
+from .pricing import option_matrix, price_itinerary
+from .pricing_summary import mark_stale
+from . import version_diff
+
+
+# Option -> hotel categories it may use, most preferred first
+TIER_CATEGORIES = {
+    'option_1': ('3star', '2star', '1star', 'budget'),
+    'option_2': ('4star', '3star'),
+    'option_3': ('5star', '4star'),
+    'option_4': ('luxury', '5star', 'resort'),
+}
+
+CHECK_IN_TIME = time(14, 0)
+CHECK_OUT_TIME = time(11, 0)
+
+
+@dataclass
+class OptionPlan:
+    """Unsaved option bookings plus the stays no hotel could be found for."""
+    bookings: list = field(default_factory=list)
+    skipped: list = field(default_factory=list)
+
+    @property
+    def counts(self):
+        counts = {option: 0 for option in TIER_CATEGORIES}
+        for booking in self.bookings:
+            counts[booking.option] += 1
+        return counts
+
+
+def default_beds(itinerary):
+    """A double room per two adults, an extra bed for an odd adult, children without beds."""
+    adults = itinerary.adults or 2
+    return {
+        'num_double_beds': max(adults // 2, 1),
+        'extra_beds': adults % 2 if adults > 1 else 0,
+        'child_with_bed': 0,
+        'child_without_bed': itinerary.childrens or 0,
+    }
+
+
+def itinerary_nights(itinerary, day_plans):
+    """(day plan, date) for every day that is followed by a night, in day order."""
+    if not itinerary.travel_from:
+        return []
+    last_day = itinerary.travel_to or itinerary.travel_from + timedelta(days=(itinerary.total_days or 1) - 1)
+    nights = []
+    for day_plan in day_plans:
+        day = itinerary.travel_from + timedelta(days=day_plan.day_number - 1)
+        if day < last_day:
+            nights.append((day_plan, day))
+    return nights
+
+
+def stay_blocks(nights, booked_day_plans):
+    """
+    Group consecutive nights in the same destination into stays, leaving out
+    day plans that already have a booking for the option.
+    Returns [(first day plan, destination id, check in, check out)].
+    """
+    blocks = []
+    for day_plan, day in nights:
+        if day_plan.id in booked_day_plans or not day_plan.destination_id:
+            continue
+        last = blocks[-1] if blocks else None
+        if last and last[1] == day_plan.destination_id and last[3] == day:
+            blocks[-1] = (last[0], last[1], last[2], day + timedelta(days=1))
+        else:
+            blocks.append((day_plan, day_plan.destination_id, day, day + timedelta(days=1)))
+    return blocks
+
+
+def plan_options(itinerary, beds, options=None, room_type_id=None, meal_plan_id=None, index=None):
+    """
+    Option bookings for every night of ``itinerary`` not yet covered for that
+    option. Within a stay the tiers pick different hotels where they can.
+    """
+    options = [option for option in (options or TIER_CATEGORIES) if option in TIER_CATEGORIES]
+    index = index or get_hotel_index()
+    day_plans = list(itinerary.day_plans.order_by('day_number', 'id'))
+    nights = itinerary_nights(itinerary, day_plans)
+
+    booked = {option: set() for option in options}
+    for day_plan_id, option in HotelBooking.objects.filter(itinerary=itinerary).values_list('day_plan_id', 'option'):
+        if option in booked:
+            booked[option].add(day_plan_id)
+
+    plan = OptionPlan()
+    for day_plan, day in nights:
+        if not day_plan.destination_id:
+            plan.skipped.append({'day': day_plan.day_number, 'option': None, 'reason': 'No destination for this day'})
+
+    quotes = {}
+    used = {}
+    for option in options:
+        for day_plan, destination_id, check_in, check_out in stay_blocks(nights, booked[option]):
+            key = (destination_id, check_in, check_out)
+            if key not in quotes:
+                quotes[key] = index.cheapest_stays(
+                    destination_id, check_in, check_out, beds, room_type_id, meal_plan_id, limit=len(TIER_CATEGORIES)
+                )
+            taken = used.setdefault(key, set())
+            stay = next((
+                stay for category in TIER_CATEGORIES[option] for stay in quotes[key].get(category, [])
+                if stay['id'] not in taken
+            ), None)
+            if stay is None:
+                plan.skipped.append({
+                    'day': day_plan.day_number, 'option': option,
+                    'reason': f"No priced {'/'.join(TIER_CATEGORIES[option])} hotel from {check_in} to {check_out}"
+                })
+                continue
+            taken.add(stay['id'])
+
+            booking = HotelBooking(
+                itinerary=itinerary,
+                day_plan=day_plan,
+                destination_id=destination_id,
+                hotel_id=stay['id'],
+                category=stay['category'],
+                room_type_id=stay['room_type_id'],
+                meal_plan_id=stay['meal_plan_id'],
+                option=option,
+                check_in_date=check_in,
+                check_in_time=CHECK_IN_TIME,
+                check_out_date=check_out,
+                check_out_time=CHECK_OUT_TIME,
+                **beds,
+            )
+            booking.normalize_fields()
+            plan.bookings.append(booking)
+    return plan
+
+
+def build_option_sets(itinerary, beds=None, options=None, room_type_id=None, meal_plan_id=None):
+    """
+    Plan and write the option tiers of a draft itinerary in one transaction.
+    Returns (plan, option x category matrix of the line prices). Raises
+    ValueError for an itinerary that is not a draft.
+    """
+    if itinerary.status != 'draft':
+        raise ValueError(f'Only draft itineraries can be auto-built (this one is {itinerary.get_status_display()})')
+    index = get_hotel_index()
+    plan = plan_options(itinerary, beds or default_beds(itinerary), options, room_type_id, meal_plan_id, index)
+    with transaction.atomic():
+        HotelBooking.objects.bulk_create(plan.bookings)
+        # bulk_create skips the signals: flag the summary, retire cached diffs
+        # and cache the new lines' prices (saved pricing options are not touched)
+        mark_stale(itinerary.id)
+        version_diff.touch(itinerary.id)
+        price_itinerary(itinerary, rates=index.rates, incremental=True)
+    return plan, option_matrix(itinerary, refresh=False)
@@ -0,0 +1,153 @@
+# package_availability.py
+"""
+Set-based rate availability for package templates.
+
+Loads every booking of a package in one query per booking type, shifts its
+dates by the offset between the package dates and the requested start date
+and resolves coverage against the in-memory RateIndex, instead of one
+``.exists()`` query per booking and per day plan.
+"""
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import timedelta
+from .models import HotelBooking, VehicleBooking, ActivityBooking, HouseboatBooking
+from .rate_index import get_rate_index
+
+
+@dataclass
+class PackageItems:
+    """A package's bookings grouped by day plan, loaded once."""
+    day_plans: list
+    hotels: dict = field(default_factory=dict)
+    activities: dict = field(default_factory=dict)
+    houseboats: dict = field(default_factory=dict)
+    vehicles: list = field(default_factory=list)
+
+
+def _by_day_plan(queryset):
+    grouped = defaultdict(list)
+    for booking in queryset:
+        grouped[booking.package_day_plan_id].append(booking)
+    return grouped
+
+
+def load_package_items(package, with_inclusions=False):
+    """
+    Day plans plus every hotel, activity, houseboat and vehicle booking (five
+    queries, two more for the hotel inclusions when ``with_inclusions``).
+    """
+    hotels = (
+        HotelBooking.objects.filter(package_day_plan__package_template=package)
+        .select_related('hotel', 'room_type', 'meal_plan').order_by('id')
+    )
+    if with_inclusions:
+        hotels = hotels.prefetch_related('inclusion_items__special_inclusion')
+    return PackageItems(
+        day_plans=list(package.day_plans.all()),
+        hotels=_by_day_plan(hotels),
+        activities=_by_day_plan(
+            ActivityBooking.objects.filter(package_template=package, package_day_plan__isnull=False)
+            .select_related('activity').order_by('id')
+        ),
+        houseboats=_by_day_plan(
+            HouseboatBooking.objects.filter(package_template=package, package_day_plan__isnull=False)
+            .select_related('houseboat', 'room_type').order_by('id')
+        ),
+        vehicles=list(VehicleBooking.objects.filter(package_template=package).select_related('vehicle').order_by('id')),
+    )
+
+
+def date_offset(package, start_date):
+    """Days between the package's own start date and ``start_date``."""
+    return (start_date - package.from_date).days if package.from_date else 0
+
+
+def missing_pricing(package, start_date, end_date=None, items=None, rates=None):
+    """
+    Every package item without a rate covering its shifted date, in the
+    order and shape validate_pricing_availability has always returned:
+    hotels, then activities, then houseboats (each by day), then vehicles.
+    """
+    items = items or load_package_items(package)
+    rates = rates or get_rate_index()
+    offset = timedelta(days=date_offset(package, start_date))
+    missing = []
+
+    for day_plan in items.day_plans:
+        for booking in items.hotels.get(day_plan.id, []):
+            check_in = booking.check_in_date + offset
+            if not rates.hotel_rule(booking.hotel_id, booking.room_type_id, booking.meal_plan_id, check_in):
+                missing.append({
+                    'type': 'Hotel',
+                    'name': booking.hotel.name,
+                    'room_type': booking.room_type.name if booking.room_type else 'N/A',
+                    'meal_plan': booking.meal_plan.name if booking.meal_plan else 'N/A',
+                    'day': day_plan.day_number,
+                    'check_in': check_in,
+                    'check_out': booking.check_out_date + offset
+                })
+
+    for day_plan in items.day_plans:
+        default_day = start_date + timedelta(days=day_plan.day_number - 1)
+        for booking in items.activities.get(day_plan.id, []):
+            booking_date = booking.booking_date + offset if booking.booking_date else default_day
+            if not rates.activity_rule(booking.activity_id, booking_date, fallback=False):
+                missing.append({
+                    'type': 'Activity',
+                    'name': booking.activity.name,
+                    'day': day_plan.day_number,
+                    'date': booking_date.strftime('%d %b %Y')
+                })
+
+    for day_plan in items.day_plans:
+        default_day = start_date + timedelta(days=day_plan.day_number - 1)
+        for booking in items.houseboats.get(day_plan.id, []):
+            check_in = booking.check_in_date + offset if booking.check_in_date else default_day
+            if not rates.houseboat_rule(booking.houseboat_id, booking.room_type_id, booking.meal_plan_id, check_in):
+                missing.append({
+                    'type': 'Houseboat',
+                    'name': booking.houseboat.name,
+                    'day': day_plan.day_number,
+                    'check_in': check_in.strftime('%d %b %Y')
+                })
+
+    for booking in items.vehicles:
+        pickup_date = booking.pickup_date + offset if booking.pickup_date else start_date
+        if not rates.vehicle_rule(booking.vehicle_id, pickup_date):
+            missing.append({
+                'type': 'Vehicle',
+                'name': booking.vehicle.name,
+                'vehicle_type': booking.vehicle_type if booking.vehicle_type else 'N/A',
+                'pickup_date': pickup_date.strftime('%d %b %Y')
+            })
+
+    return missing
+
+
+def hotel_day_coverage(package, start_date, items=None, rates=None):
+    """
+    Hotel coverage on each day plan's calendar date (``start_date`` plus the
+    day number), as the package availability API reports it. Returns
+    (unavailable_items, available_count, total_items).
+    """
+    items = items or load_package_items(package)
+    rates = rates or get_rate_index()
+    unavailable = []
+    available_count = 0
+    total = 0
+
+    for day_plan in items.day_plans:
+        current_date = start_date + timedelta(days=day_plan.day_number - 1)
+        for booking in items.hotels.get(day_plan.id, []):
+            total += 1
+            if rates.hotel_rule(booking.hotel_id, booking.room_type_id, booking.meal_plan_id, current_date):
+                available_count += 1
+            else:
+                unavailable.append({
+                    'type': 'Hotel',
+                    'name': booking.hotel.name,
+                    'day': day_plan.day_number,
+                    'date': current_date.strftime('%d %b %Y')
+                })
+
+    return unavailable, available_count, total
@@ -0,0 +1,242 @@
+# package_insert.py
+"""
+Package template -> itinerary materialiser.
+
+Plans the whole itinerary in memory first (day plans, bookings shifted to
+the query dates, inclusions and the items skipped for lack of a rate), then
+writes it with one bulk_create per model and prices it once with the shared
+engine. Rate coverage comes from the in-memory RateIndex, so the cost no
+longer grows with one query per booking.
+"""
+import logging
+from dataclasses import dataclass, field
+from datetime import time, timedelta
+from django.db import transaction
+from django.utils.timezone import now
+from .models import (
+    Itinerary, ItineraryDayPlan, ItineraryPricingOption,
+    HotelBooking, HotelBookingInclusion, VehicleBooking, ActivityBooking, HouseboatBooking
+)
+from .package_availability import load_package_items, date_offset
+from .pricing_summary import refresh_pricing_summaries
+from .pricing_utils import build_option_rows
+from .rate_index import get_rate_index
+from . import pricing, version_diff
+
+
+logger = logging.getLogger(__name__)
+
+HOUSEBOAT_ROOM_FIELDS = [qty for qty, _ in pricing.HOUSEBOAT_BED_FIELDS]
+
+
+@dataclass
+class ItineraryPlan:
+    """Unsaved rows for one itinerary, in insertion order."""
+    day_plans: list = field(default_factory=list)
+    hotels: list = field(default_factory=list)
+    inclusions: list = field(default_factory=list)
+    activities: list = field(default_factory=list)
+    houseboats: list = field(default_factory=list)
+    vehicles: list = field(default_factory=list)
+    skipped_items: list = field(default_factory=list)
+
+
+def _span(start, end):
+    return f"{start.strftime('%d %b')} → {end.strftime('%d %b')}"
+
+
+def plan_itinerary(package, itinerary, start_date, items=None, rates=None):
+    """
+    Build every row of ``itinerary`` from ``package`` without touching the
+    database (beyond loading the package once). Hotels and houseboats need a
+    rate overlapping their stay, activities and vehicles one covering their
+    date; anything else is listed in ``skipped_items``.
+    """
+    items = items or load_package_items(package, with_inclusions=True)
+    rates = rates or get_rate_index()
+    offset = timedelta(days=date_offset(package, start_date))
+    plan = ItineraryPlan()
+
+    for template_day in items.day_plans:
+        current_date = start_date + timedelta(days=template_day.day_number - 1)
+        day = ItineraryDayPlan(
+            itinerary=itinerary,
+            day_number=template_day.day_number,
+            destination_id=template_day.destination_id,
+            title=template_day.title,
+            description=template_day.description,
+            image=template_day.image if template_day.image else None,
+        )
+        plan.day_plans.append(day)
+
+        for source in items.hotels.get(template_day.id, []):
+            check_in = source.check_in_date + offset
+            check_out = source.check_out_date + offset
+            room_type_name = source.room_type.name if source.room_type else 'N/A'
+            meal_plan_name = source.meal_plan.name if source.meal_plan else 'N/A'
+            hotel_name = f"{source.hotel.name} ({room_type_name}, {meal_plan_name})"
+
+            if not rates.hotel_rate_overlaps(source.hotel_id, source.room_type_id, source.meal_plan_id, check_in, check_out):
+                plan.skipped_items.append({
+                    'day': template_day.day_number, 'type': 'Hotel', 'name': hotel_name, 'date': _span(check_in, check_out)
+                })
+                continue
+
+            booking = HotelBooking(
+                itinerary=itinerary,
+                day_plan=day,
+                hotel_id=source.hotel_id,
+                destination_id=source.destination_id,
+                category=source.category,
+                room_type_id=source.room_type_id,
+                meal_plan_id=source.meal_plan_id,
+                option=source.option,
+                num_double_beds=source.num_double_beds,
+                child_with_bed=source.child_with_bed,
+                child_without_bed=source.child_without_bed,
+                extra_beds=source.extra_beds,
+                check_in_date=check_in,
+                check_in_time=source.check_in_time or time(14, 0),
+                check_out_date=check_out,
+                check_out_time=source.check_out_time or time(11, 0),
+            )
+            booking.normalize_fields()
+            plan.hotels.append(booking)
+
+            for source_item in source.inclusion_items.all():
+                inclusion = HotelBookingInclusion(
+                    hotel_booking=booking,
+                    special_inclusion=source_item.special_inclusion,
+                    num_adults=source_item.num_adults,
+                    num_children=source_item.num_children,
+                )
+                inclusion.price = inclusion.calculate_price()
+                plan.inclusions.append(inclusion)
+
+        for source in items.activities.get(template_day.id, []):
+            booking_date = source.booking_date + offset if source.booking_date else current_date
+            if not rates.activity_rule(source.activity_id, booking_date, fallback=False):
+                plan.skipped_items.append({
+                    'day': template_day.day_number, 'type': 'Activity', 'name': source.activity.name,
+                    'date': booking_date.strftime('%d %b %Y')
+                })
+                continue
+            plan.activities.append(ActivityBooking(
+                itinerary=itinerary,
+                day_plan=day,
+                activity_id=source.activity_id,
+                booking_date=booking_date,
+                booking_time=source.booking_time,
+                num_adults=source.num_adults,
+                num_children=source.num_children,
+                notes=source.notes,
+            ))
+
+        for source in items.houseboats.get(template_day.id, []):
+            check_in = source.check_in_date + offset if source.check_in_date else current_date
+            check_out = source.check_out_date + offset if source.check_out_date else current_date + timedelta(days=1)
+            room_type_name = source.room_type.name if source.room_type else 'Standard'
+            houseboat_name = f"{source.houseboat.name} ({room_type_name})"
+
+            if not rates.houseboat_rate_overlaps(source.houseboat_id, source.room_type_id, source.meal_plan_id, check_in, check_out):
+                plan.skipped_items.append({
+                    'day': template_day.day_number, 'type': 'Houseboat', 'name': houseboat_name, 'date': _span(check_in, check_out)
+                })
+                continue
+
+            booking = HouseboatBooking(
+                itinerary=itinerary,
+                day_plan=day,
+                houseboat_id=source.houseboat_id,
+                meal_plan_id=source.meal_plan_id,
+                room_type_id=source.room_type_id,
+                check_in_date=check_in,
+                check_out_date=check_out,
+                **{qty: getattr(source, qty) for qty in HOUSEBOAT_ROOM_FIELDS},
+            )
+            booking.normalize_fields()
+            plan.houseboats.append(booking)
+
+    for source in items.vehicles:
+        pickup = source.pickup_date + offset if source.pickup_date else start_date
+        vehicle_name = f"{source.vehicle.name} ({source.vehicle_type})"
+        if not rates.vehicle_rule(source.vehicle_id, pickup):
+            plan.skipped_items.append({
+                'day': '-', 'type': 'Vehicle', 'name': vehicle_name, 'date': pickup.strftime('%d %b %Y')
+            })
+            continue
+        plan.vehicles.append(VehicleBooking(
+            itinerary=itinerary,
+            vehicle_id=source.vehicle_id,
+            destination_id=source.destination_id,
+            pickup_date=pickup,
+            pickup_time=source.pickup_time or time(9, 0),
+            num_passengers=source.num_passengers,
+            vehicle_type=source.vehicle_type,
+            option=source.option,
+            total_km=source.total_km,
+        ))
+
+    return plan
+
+
+def write_plan(plan):
+    """One bulk_create per model; parents first so the FKs pick up their ids."""
+    ItineraryDayPlan.objects.bulk_create(plan.day_plans)
+    HotelBooking.objects.bulk_create(plan.hotels)
+    HotelBookingInclusion.objects.bulk_create(plan.inclusions)
+    ActivityBooking.objects.bulk_create(plan.activities)
+    HouseboatBooking.objects.bulk_create(plan.houseboats)
+    VehicleBooking.objects.bulk_create(plan.vehicles)
+
+
+def save_itinerary_pricing(itinerary, rates):
+    """Price the new itinerary once and store its options (the engine the pricing page uses)."""
+    items = pricing.price_bookings(pricing.load_itinerary_bookings(itinerary), rates)
+    options = pricing.summarise_options(
+        items, itinerary.cgst_percentage, itinerary.sgst_percentage, itinerary.discount,
+        fallback_name='Standard Package'
+    )
+    ItineraryPricingOption.objects.bulk_create(
+        ItineraryPricingOption(itinerary=itinerary, **row) for row in build_option_rows(itinerary, options)
+    )
+    itinerary.is_finalized = True
+    itinerary.finalized_at = now()
+    itinerary.save(update_fields=['is_finalized', 'finalized_at'])
+    refresh_pricing_summaries([itinerary.id])
+    return options
+
+
+def materialise_package(package, query, start_date, end_date=None, created_by=None, rates=None):
+    """
+    Create an itinerary for ``query`` from ``package`` in one transaction.
+    Items without pricing for the shifted dates are skipped.
+    Returns (itinerary, skipped_items).
+    """
+    rates = rates or get_rate_index()
+    items = load_package_items(package, with_inclusions=True)
+
+    with transaction.atomic():
+        itinerary = Itinerary.objects.create(
+            query=query,
+            name=f"{package.name} - {query.client_name}",
+            discount=getattr(package, 'discount', 0),
+            cgst_percentage=getattr(package, 'cgst_percentage', 0),
+            sgst_percentage=getattr(package, 'sgst_percentage', 0),
+            status='draft',
+            created_by=created_by
+        )
+        itinerary.destinations.set(package.destinations.all())
+
+        plan = plan_itinerary(package, itinerary, start_date, items, rates)
+        write_plan(plan)
+        version_diff.touch(itinerary.id)
+
+        try:
+            # A pricing failure must not lose the inserted itinerary
+            with transaction.atomic():
+                save_itinerary_pricing(itinerary, rates)
+        except Exception:
+            logger.exception("Auto-saving pricing failed for itinerary #%s", itinerary.id)
+
+    return itinerary, plan.skipped_items
@@ -0,0 +1,642 @@
+# pricing.py
+"""
+Pricing engine shared by every pricing screen.
+
+One place for the hotel per-night, vehicle 100km + extra-km, activity
+per-person and ten-slot houseboat formulas. Callers hand in a batch of
+bookings (plus an optional preloaded RateIndex) and get back the same
+bookings annotated with ``calculated_price`` and friends, then roll them
+up into per-option totals with ``summarise_options``.
+"""
+import hashlib
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+from itertools import chain
+from django.db.models import F, Q, Sum, Count, Case, When, Value, CharField, DecimalField
+from .models import (
+    HotelBooking, VehicleBooking, ActivityBooking, HouseboatBooking,
+    StandaloneInclusionBooking
+)
+from .rate_index import RateIndex, get_rate_index
+
+
+ZERO = Decimal('0.00')
+
+ACCOMMODATION = 'Accommodation'
+HOUSEBOAT = 'Houseboat'
+TRANSPORTATION = 'Transportation'
+ACTIVITY = 'Activity'
+STANDALONE = 'Standalone Activity'
+
+# Item types that vary per hotel option; everything else is shared by all options
+OPTION_ITEM_TYPES = (ACCOMMODATION, HOUSEBOAT)
+
+# Group key of the shared lines in precomputed option sums
+SHARED = 'shared'
+
+HOTEL_BED_FIELDS = [
+    ('num_double_beds', 'double_bed'),
+    ('child_with_bed', 'child_with_bed'),
+    ('child_without_bed', 'child_without_bed'),
+    ('extra_beds', 'extra_bed'),
+]
+
+HOUSEBOAT_BED_FIELDS = [
+    ('num_one_bed_rooms', 'one_bed'),
+    ('num_two_bed_rooms', 'two_bed'),
+    ('num_three_bed_rooms', 'three_bed'),
+    ('num_four_bed_rooms', 'four_bed'),
+    ('num_five_bed_rooms', 'five_bed'),
+    ('num_six_bed_rooms', 'six_bed'),
+    ('num_seven_bed_rooms', 'seven_bed'),
+    ('num_eight_bed_rooms', 'eight_bed'),
+    ('num_nine_bed_rooms', 'nine_bed'),
+    ('num_ten_bed_rooms', 'ten_bed'),
+    ('num_extra_beds', 'extra_bed'),
+]
+
+
+# ==========================================
+# FORMULAS
+# ==========================================
+def stay_nights(check_in_date, check_out_date):
+    """Same-day stays count as one night."""
+    return (check_out_date - check_in_date).days or 1
+
+
+def hotel_per_night(booking, rule):
+    return sum(
+        (Decimal(getattr(booking, qty) or 0) * (getattr(rule, rate) or 0) for qty, rate in HOTEL_BED_FIELDS),
+        ZERO
+    )
+
+
+def houseboat_per_night(booking, rule):
+    return sum(
+        (Decimal(getattr(booking, qty) or 0) * (getattr(rule, rate) or 0) for qty, rate in HOUSEBOAT_BED_FIELDS),
+        ZERO
+    )
+
+
+def vehicle_price(booking, rule):
+    """Flat fee for the first 100km plus a per-km charge beyond that."""
+    if not rule or booking.total_km is None:
+        return Decimal('0')
+    base = rule.total_fee_100km or Decimal('0')
+    if booking.total_km <= 100:
+        return base
+    extra_km = booking.total_km - 100
+    return base + Decimal(str(extra_km)) * (rule.extra_fee_per_km or Decimal('0'))
+
+
+def activity_price(booking, rule):
+    if not rule:
+        return Decimal('0')
+    people = (booking.num_adults or 0) + (booking.num_children or 0)
+    return Decimal(str(people)) * (rule.per_person or Decimal('0'))
+
+
+def markup_amount(net, markup_type, markup_value):
+    """Fixed amount, or a percentage of ``net``."""
+    if not markup_value:
+        return ZERO
+    try:
+        value = Decimal(str(markup_value))
+    except (ValueError, TypeError, InvalidOperation):
+        return ZERO
+    if value <= 0:
+        return ZERO
+    return net * (value / 100) if markup_type == 'percentage' else value
+
+
+def _positive(value):
+    return value is not None and value > 0
+
+
+# ==========================================
+# LINE PRICING
+# ==========================================
+# Booking fields that feed each line price. A line cached on the booking
+# (priced_* fields) stays valid while these, the inclusion prices and the
+# covering rate row (id + version) are unchanged.
+LINE_INPUT_FIELDS = {
+    HotelBooking: (
+        'hotel_id', 'room_type_id', 'meal_plan_id', 'check_in_date', 'check_out_date',
+        *(qty for qty, _ in HOTEL_BED_FIELDS), 'net_price', 'markup_type', 'markup_value',
+    ),
+    HouseboatBooking: (
+        'houseboat_id', 'room_type_id', 'meal_plan_id', 'check_in_date', 'check_out_date',
+        *(qty for qty, _ in HOUSEBOAT_BED_FIELDS), 'net_price', 'markup_type', 'markup_value',
+    ),
+    VehicleBooking: (
+        'vehicle_id', 'pickup_date', 'total_km', 'custom_total_price', 'net_price',
+        'markup_type', 'markup_value',
+    ),
+    ActivityBooking: (
+        'activity_id', 'booking_date', 'num_adults', 'num_children', 'custom_total_price',
+        'net_price', 'markup_type', 'markup_value',
+    ),
+}
+
+CACHE_FIELDS = ['priced_net', 'priced_markup', 'priced_rule_id', 'priced_rule_version', 'priced_inputs']
+
+CACHE_PLACES = Decimal('0.000001')
+
+
+def _token(value):
+    if isinstance(value, Decimal):
+        return format(value.normalize(), 'f')
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return str(value)
+
+
+def inputs_signature(booking, inclusions_list=(), night_rules=()):
+    """
+    Hash of everything on the booking side that the line price depends on,
+    plus the rate rows (id and version) used for each night of a stay.
+    """
+    parts = [_token(getattr(booking, field)) for field in LINE_INPUT_FIELDS[type(booking)]]
+    parts.extend(f"{item.pk}:{_token(item.price)}" for item in inclusions_list)
+    parts.extend(f"{r.pk}:{r.version}" if r else '-' for r in night_rules)
+    return hashlib.md5('|'.join(parts).encode()).hexdigest()
+
+
+def stay_rates(rule, night_rules):
+    """
+    Rule for each night of a stay. Nights the rate calendar does not cover
+    fall back to the check-in rule, as before the calendar existed; nights
+    with neither are not charged.
+    """
+    return [night or rule for night in night_rules]
+
+
+def _line_net(booking, rule, night_rules, inclusion_price):
+    """
+    Net price of one line. Manual overrides win over the rate card:
+    ``custom_total_price`` (vehicles, activities), then a saved ``net_price``,
+    then the rate rules. Stays are summed night by night over the rate
+    calendar, so a stay crossing a season boundary pays each season's rate.
+    """
+    if isinstance(booking, HotelBooking):
+        if _positive(booking.net_price):
+            net_price = booking.net_price
+        elif booking.hotel_id:
+            net_price = sum((hotel_per_night(booking, r) for r in stay_rates(rule, night_rules) if r), ZERO)
+        else:
+            # Demo hotels (custom_hotel_name) have no rate card
+            net_price = ZERO
+        return net_price + inclusion_price
+
+    if isinstance(booking, HouseboatBooking):
+        if _positive(booking.net_price):
+            net_price = booking.net_price
+        else:
+            net_price = sum((houseboat_per_night(booking, r) for r in stay_rates(rule, night_rules) if r), ZERO)
+        return net_price + inclusion_price
+
+    if isinstance(booking, VehicleBooking):
+        if _positive(booking.custom_total_price):
+            return booking.custom_total_price
+        if _positive(booking.net_price):
+            return booking.net_price
+        return vehicle_price(booking, rule)
+
+    if isinstance(booking, ActivityBooking):
+        if _positive(booking.custom_total_price):
+            return booking.custom_total_price
+        if _positive(booking.net_price):
+            return booking.net_price
+        return activity_price(booking, rule)
+
+    return booking.total_price
+
+
+def line_context(booking, rates):
+    """
+    Everything about a line except its price: the covering rule, nights and
+    per-night rules, inclusions, item type and sort date.
+    """
+    nights = 1
+    inclusion_price = ZERO
+    inclusions_list = []
+    night_rules = []
+    rule = rates.rule_for(booking)
+
+    if isinstance(booking, (HotelBooking, HouseboatBooking)):
+        nights = stay_nights(booking.check_in_date, booking.check_out_date)
+        night_rules = rates.nightly_rules(booking, nights)
+        inclusions_list = list(booking.inclusion_items.all())
+        inclusion_price = sum((item.price for item in inclusions_list), ZERO)
+        item_type = ACCOMMODATION if isinstance(booking, HotelBooking) else HOUSEBOAT
+        sort_date = booking.check_in_date
+    elif isinstance(booking, VehicleBooking):
+        item_type = TRANSPORTATION
+        sort_date = booking.pickup_date
+    elif isinstance(booking, ActivityBooking):
+        item_type = ACTIVITY
+        sort_date = booking.booking_date
+    elif isinstance(booking, StandaloneInclusionBooking):
+        item_type = STANDALONE
+        sort_date = booking.booking_date
+    else:
+        raise TypeError(f"Cannot price {type(booking).__name__}")
+
+    return rule, nights, night_rules, inclusions_list, inclusion_price, item_type, sort_date
+
+
+def annotate_line(booking, context, net_price, individual_markup):
+    """Attach the priced line to the booking the way every template expects it."""
+    rule, nights, night_rules, inclusions_list, inclusion_price, item_type, sort_date = context
+    booking.price_record = rule
+    booking.sort_date = sort_date
+    booking.item_type = item_type
+    booking.inclusion_price = inclusion_price
+    booking.inclusions_list = inclusions_list
+    booking.calculated_price = {
+        'net': net_price,
+        'markup': individual_markup,
+        'gross': net_price + individual_markup,
+        'inclusion_price': inclusion_price,
+        'nights': nights
+    }
+    return booking
+
+
+def by_date(bookings):
+    """Priced bookings in date order, undated ones last."""
+    return sorted(bookings, key=lambda b: (b.sort_date is None, b.sort_date or 0))
+
+
+def _fresh_line(booking, rule, night_rules, inclusion_price):
+    """
+    (net, markup) of a line priced from its rates, rounded to CACHE_PLACES
+    whether or not it is cached, so both paths give the same totals.
+    """
+    net_price = _line_net(booking, rule, night_rules, inclusion_price).quantize(CACHE_PLACES)
+    return net_price, markup_amount(net_price, booking.markup_type, booking.markup_value).quantize(CACHE_PLACES)
+
+
+def price_booking(booking, rates, use_cache=False):
+    """
+    Price a single booking against ``rates`` and annotate it in place.
+
+    With ``use_cache`` the line price saved on the booking is reused when its
+    inputs and rate row are unchanged; otherwise it is recomputed and the
+    priced_* fields are refreshed in memory (``price_bookings`` persists them).
+    ``booking.line_cache_hit`` tells which happened.
+    """
+    context = line_context(booking, rates)
+    rule, nights, night_rules, inclusions_list, inclusion_price, item_type, sort_date = context
+
+    cacheable = use_cache and type(booking) in LINE_INPUT_FIELDS
+    booking.line_cache_hit = False
+
+    if cacheable:
+        signature = inputs_signature(booking, inclusions_list, night_rules)
+        rule_id = rule.pk if rule else None
+        rule_version = rule.version if rule else None
+        if (booking.priced_net is not None and booking.priced_inputs == signature
+                and booking.priced_rule_id == rule_id and booking.priced_rule_version == rule_version):
+            net_price = booking.priced_net
+            individual_markup = booking.priced_markup or ZERO
+            booking.line_cache_hit = True
+        else:
+            net_price, individual_markup = _fresh_line(booking, rule, night_rules, inclusion_price)
+            booking.priced_net = net_price
+            booking.priced_markup = individual_markup
+            booking.priced_rule_id = rule_id
+            booking.priced_rule_version = rule_version
+            booking.priced_inputs = signature
+    else:
+        net_price, individual_markup = _fresh_line(booking, rule, night_rules, inclusion_price)
+
+    return annotate_line(booking, context, net_price, individual_markup)
+
+
+def price_bookings(bookings, rates=None, incremental=False):
+    """
+    Price a whole batch of bookings in one pass.
+
+    The rate index is loaded once for every supplier in the batch (at most
+    four queries) unless one is passed in. Returns the bookings sorted by date.
+
+    With ``incremental`` the shared rate index is used, cached line prices are
+    reused where still valid and only the repriced lines are written back
+    (one bulk_update per booking model).
+
+    That write happens on read: the pricing screen's GET persists the lines
+    it had to reprice. It only touches the priced_* cache columns, writes
+    the same values for the same inputs (two readers racing store identical
+    rows) and nothing at all once the lines are current, so a page view
+    never changes what the itinerary costs.
+    """
+    bookings = list(bookings)
+    if rates is None:
+        rates = get_rate_index() if incremental else RateIndex.for_bookings(bookings)
+    priced = [price_booking(booking, rates, use_cache=incremental) for booking in bookings]
+
+    if incremental:
+        stale = defaultdict(list)
+        for booking in priced:
+            if type(booking) in LINE_INPUT_FIELDS and not booking.line_cache_hit:
+                stale[type(booking)].append(booking)
+        for model, rows in stale.items():
+            model.objects.bulk_update(rows, CACHE_FIELDS)
+
+    return by_date(priced)
+
+
+# ==========================================
+# LOADING
+# ==========================================
+# Relations the pricing screens render for each line
+HOTEL_RELATED = ('hotel', 'room_type', 'meal_plan')
+HOUSEBOAT_RELATED = ('houseboat', 'room_type', 'meal_plan')
+
+
+def load_itinerary_bookings(itinerary):
+    """Every priceable booking of an itinerary with the relations pricing needs."""
+    return list(chain(
+        HotelBooking.objects.filter(day_plan__itinerary=itinerary).select_related(*HOTEL_RELATED).prefetch_related('inclusion_items__special_inclusion'),
+        VehicleBooking.objects.filter(itinerary=itinerary).select_related('vehicle'),
+        ActivityBooking.objects.filter(day_plan__itinerary=itinerary).select_related('activity'),
+        HouseboatBooking.objects.filter(day_plan__itinerary=itinerary).select_related(*HOUSEBOAT_RELATED).prefetch_related('inclusion_items__special_inclusion'),
+        StandaloneInclusionBooking.objects.filter(itinerary=itinerary).select_related('special_inclusion')
+    ))
+
+
+def load_package_bookings(package):
+    """Every priceable booking of a package template."""
+    return list(chain(
+        HotelBooking.objects.filter(package_day_plan__package_template=package).select_related(*HOTEL_RELATED).prefetch_related('inclusion_items__special_inclusion'),
+        VehicleBooking.objects.filter(package_template=package).select_related('vehicle'),
+        ActivityBooking.objects.filter(package_template=package).select_related('activity'),
+        HouseboatBooking.objects.filter(package_template=package).select_related(*HOUSEBOAT_RELATED).prefetch_related('inclusion_items__special_inclusion')
+    ))
+
+
+def load_bookings_for_itineraries(itinerary_ids):
+    """
+    Bookings for many itineraries at once (five queries for the whole batch),
+    grouped by itinerary id.
+    """
+    owner = F('day_plan__itinerary_id')
+    grouped = defaultdict(list)
+    for booking in chain(
+        HotelBooking.objects.filter(day_plan__itinerary_id__in=itinerary_ids).annotate(owner_id=owner).select_related(*HOTEL_RELATED).prefetch_related('inclusion_items__special_inclusion'),
+        VehicleBooking.objects.filter(itinerary_id__in=itinerary_ids).annotate(owner_id=F('itinerary_id')).select_related('vehicle'),
+        ActivityBooking.objects.filter(day_plan__itinerary_id__in=itinerary_ids).annotate(owner_id=owner).select_related('activity'),
+        HouseboatBooking.objects.filter(day_plan__itinerary_id__in=itinerary_ids).annotate(owner_id=owner).select_related(*HOUSEBOAT_RELATED).prefetch_related('inclusion_items__special_inclusion'),
+        StandaloneInclusionBooking.objects.filter(itinerary_id__in=itinerary_ids).annotate(owner_id=F('itinerary_id')).select_related('special_inclusion')
+    ):
+        grouped[booking.owner_id].append(booking)
+    return grouped
+
+
+def load_bookings_for_packages(package_ids):
+    """Bookings for many package templates at once (four queries), grouped by package id."""
+    owner = F('package_template_id')
+    grouped = defaultdict(list)
+    for booking in chain(
+        HotelBooking.objects.filter(package_day_plan__package_template_id__in=package_ids).annotate(owner_id=F('package_day_plan__package_template_id')).select_related(*HOTEL_RELATED).prefetch_related('inclusion_items__special_inclusion'),
+        VehicleBooking.objects.filter(package_template_id__in=package_ids).annotate(owner_id=owner).select_related('vehicle'),
+        ActivityBooking.objects.filter(package_template_id__in=package_ids).annotate(owner_id=owner).select_related('activity'),
+        HouseboatBooking.objects.filter(package_template_id__in=package_ids).annotate(owner_id=owner).select_related(*HOUSEBOAT_RELATED).prefetch_related('inclusion_items__special_inclusion')
+    ):
+        grouped[booking.owner_id].append(booking)
+    return grouped
+
+
+def price_itinerary(itinerary, rates=None, incremental=False):
+    return price_bookings(load_itinerary_bookings(itinerary), rates, incremental)
+
+
+def price_package(package, rates=None):
+    return price_bookings(load_package_bookings(package), rates)
+
+
+# ==========================================
+# OPTION ROLL-UP
+# ==========================================
+def option_key(raw_option):
+    """Normalise 'option_1', 'Option 1' and 'option1' to the same key."""
+    key = str(raw_option or '').lower().replace(' ', '').replace('_', '')
+    return key or 'option1'
+
+
+def option_label(key):
+    if key.startswith('option') and key[6:].isdigit():
+        return f'Option {key[6:]}'
+    return key.title()
+
+
+def item_display_name(item):
+    if getattr(item, 'houseboat', None):
+        return item.houseboat.name
+    if getattr(item, 'hotel', None):
+        return item.hotel.name
+    if getattr(item, 'custom_hotel_name', None):
+        return f"{item.custom_hotel_name} (Demo)"
+    return "Unknown Hotel"
+
+
+def option_totals(option_net, option_markup, shared_net, shared_markup,
+                  cgst_percentage, sgst_percentage, discount,
+                  global_markup_type='fixed', global_markup_value=Decimal('0')):
+    """
+    Package arithmetic for one option: individual markups, then the global
+    markup on top, then CGST/SGST on the marked-up amount, minus discount.
+    """
+    net = option_net + shared_net
+    markup = option_markup + shared_markup
+    base = net + markup
+    global_markup_value = Decimal(global_markup_value or 0)
+    global_markup = base * (global_markup_value / 100) if global_markup_type == 'percentage' else global_markup_value
+    gross = base + global_markup
+    cgst = gross * (cgst_percentage / 100)
+    sgst = gross * (sgst_percentage / 100)
+    return {
+        'net_price': net,
+        'markup': markup,
+        'global_markup': global_markup,
+        'gross_before_tax': gross,
+        'cgst_amount': cgst,
+        'sgst_amount': sgst,
+        'discount': discount,
+        'gross_price': gross + cgst + sgst - discount,
+    }
+
+
+def summarise_options(items, cgst_percentage, sgst_percentage, discount,
+                      markup_for=None, option_types=OPTION_ITEM_TYPES,
+                      group_key=None, label_for=None, fallback_name=None, sums=None):
+    """
+    Roll priced items up into one totals dict per hotel option.
+
+    ``markup_for(index)`` returns the (type, value) global markup for the
+    1-based option index. Items whose type is not in ``option_types`` are
+    shared and added to every option. When nothing is grouped and
+    ``fallback_name`` is given, a single option with only shared items is
+    returned. ``sums`` maps group keys (and SHARED) to (net, markup) totals
+    already summed elsewhere, e.g. by pricing_batch.
+    """
+    group_key = group_key or (lambda item: option_key(getattr(item, 'option', None)))
+    label_for = label_for or (lambda key, members: option_label(key))
+    markup_for = markup_for or (lambda index: ('fixed', Decimal('0')))
+
+    def totals_of(key, members):
+        if sums is not None:
+            return sums.get(key, (Decimal('0'), Decimal('0')))
+        return (
+            sum((m.calculated_price['net'] for m in members), Decimal('0')),
+            sum((m.calculated_price['markup'] for m in members), Decimal('0')),
+        )
+
+    shared_net, shared_markup = totals_of(SHARED, [i for i in items if i.item_type not in option_types])
+
+    grouped = defaultdict(list)
+    for item in items:
+        if item.item_type in option_types:
+            grouped[group_key(item)].append(item)
+
+    if not grouped and fallback_name is not None:
+        grouped[None] = []
+
+    options = []
+    for index, (key, members) in enumerate(grouped.items(), 1):
+        markup_type, markup_value = markup_for(index)
+        option_net, option_markup = totals_of(key, members)
+        totals = option_totals(
+            option_net, option_markup, shared_net, shared_markup,
+            cgst_percentage, sgst_percentage, discount, markup_type, markup_value
+        )
+        options.append({
+            'key': key,
+            'option_number': index,
+            'option_name': fallback_name if key is None else label_for(key, members),
+            'hotel_count': len(members),
+            'hotels': [
+                {'name': item_display_name(m), 'net_price': m.calculated_price['net'], 'type': m.item_type}
+                for m in members
+            ],
+            'option_net_total': option_net,
+            **totals,
+        })
+    return options
+
+
+# ==========================================
+# OPTION MATRIX
+# ==========================================
+MATRIX_CATEGORIES = (ACCOMMODATION, HOUSEBOAT, TRANSPORTATION, ACTIVITY, STANDALONE)
+
+
+def _matrix_rows(itinerary_id):
+    """
+    Per (category, option) sums of the line prices cached on the bookings,
+    for all five booking tables in one UNION ALL query.
+    """
+    def grouped(queryset, category, option, net, markup, priced):
+        return (
+            queryset.annotate(
+                line_category=Value(category, output_field=CharField()),
+                option_key=option,
+            )
+            .values('line_category', 'option_key')
+            .annotate(
+                net=Sum(net, output_field=DecimalField(max_digits=16, decimal_places=6)),
+                markup=Sum(markup, output_field=DecimalField(max_digits=16, decimal_places=6)),
+                lines=Count('id'),
+                unpriced=Count('id', filter=~priced),
+            )
+            .order_by()
+        )
+
+    shared = Value('', output_field=CharField())
+    cached = Q(priced_net__isnull=False)
+    standalone_markup = Case(
+        When(markup_type='percentage', then=F('total_price') * F('markup_value') / 100),
+        default=F('markup_value'),
+    )
+    hotels = grouped(
+        HotelBooking.objects.filter(day_plan__itinerary_id=itinerary_id),
+        ACCOMMODATION, F('option'), 'priced_net', 'priced_markup', cached
+    )
+    return list(hotels.union(
+        grouped(HouseboatBooking.objects.filter(day_plan__itinerary_id=itinerary_id),
+                HOUSEBOAT, F('option'), 'priced_net', 'priced_markup', cached),
+        grouped(VehicleBooking.objects.filter(itinerary_id=itinerary_id),
+                TRANSPORTATION, shared, 'priced_net', 'priced_markup', cached),
+        grouped(ActivityBooking.objects.filter(day_plan__itinerary_id=itinerary_id),
+                ACTIVITY, shared, 'priced_net', 'priced_markup', cached),
+        grouped(StandaloneInclusionBooking.objects.filter(itinerary_id=itinerary_id),
+                STANDALONE, shared, 'total_price', standalone_markup, Q(pk__isnull=False)),
+        all=True
+    ))
+
+
+def _cell(net=Decimal('0'), markup=Decimal('0'), lines=0):
+    return {'net': net, 'markup': markup, 'gross': net + markup, 'lines': lines}
+
+
+def build_option_matrix(rows, option_types=OPTION_ITEM_TYPES):
+    """
+    Arrange (category, option) sums into an option × category matrix.
+
+    Categories in ``option_types`` are split per option; the rest are shared
+    and appear unchanged in every option row, as in ``summarise_options``.
+    """
+    per_option = defaultdict(dict)
+    shared = {}
+    for row in rows:
+        net, markup = row['net'] or Decimal('0'), row['markup'] or Decimal('0')
+        category = row['line_category']
+        if category in option_types:
+            cells = per_option[option_key(row['option_key'])]
+        else:
+            cells = shared
+        current = cells.get(category, _cell())
+        cells[category] = _cell(current['net'] + net, current['markup'] + markup, current['lines'] + row['lines'])
+
+    def order(key):
+        return (0, int(key[6:])) if key[6:].isdigit() else (1, key)
+
+    matrix_rows = []
+    for key in sorted(per_option, key=order):
+        cells = [per_option[key].get(c) or shared.get(c) or _cell() for c in MATRIX_CATEGORIES]
+        matrix_rows.append({
+            'key': key,
+            'label': option_label(key),
+            'cells': cells,
+            'net': sum((c['net'] for c in cells), Decimal('0')),
+            'markup': sum((c['markup'] for c in cells), Decimal('0')),
+            'gross': sum((c['gross'] for c in cells), Decimal('0')),
+        })
+    return {
+        'categories': list(MATRIX_CATEGORIES),
+        'rows': matrix_rows,
+        'shared': shared,
+        'unpriced': sum(row['unpriced'] for row in rows),
+    }
+
+
+def option_matrix(itinerary, refresh=True):
+    """
+    Option × category totals for every hotel option of an itinerary at once.
+
+    One grouped aggregation over the line prices cached on the bookings
+    (see ``price_bookings(incremental=True)``). When some lines have never
+    been priced, or were edited since, they are priced first and the
+    aggregation is run again.
+    """
+    rows = _matrix_rows(itinerary.pk)
+    if refresh and any(row['unpriced'] for row in rows):
+        price_itinerary(itinerary, incremental=True)
+        rows = _matrix_rows(itinerary.pk)
+    return build_option_matrix(rows)
+
+
+def invalidate_line_prices(model, **lookup):
+    """Drop the cached line price of the matching bookings so they are repriced."""
+    model.objects.filter(priced_net__isnull=False, **lookup).update(priced_net=None)
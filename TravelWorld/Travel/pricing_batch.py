@@ -0,0 +1,200 @@
+# pricing_batch.py
+"""
+Vectorised line pricing for bulk repricing.
+
+The rate rules are still resolved per line through the RateIndex, but the
+money arithmetic runs over integer arrays: every quantity x rate term is
+held in paise, per-line nets are summed with NumPy, markups are worked out
+in micro-rupees (a percentage of a paise amount is always a whole number of
+micro-rupees) and option totals are summed per group in one pass.
+
+Results are exactly equal to the Decimal path in pricing.py. A line whose
+inputs are not whole paise (or whose totals would not fit in int64) is
+priced through pricing.price_booking instead, so nothing is ever rounded.
+"""
+from decimal import Decimal, InvalidOperation
+import numpy as np
+from .models import HotelBooking, VehicleBooking, ActivityBooking, HouseboatBooking
+from .rate_index import RateIndex
+from . import pricing
+
+
+# Keeps every product, and the Decimal arithmetic it mirrors, well inside
+# int64 and the 28-digit Decimal context
+LIMIT = 2 ** 62
+
+
+class Inexact(Exception):
+    """A value cannot be represented in whole paise."""
+
+
+def to_paise(value):
+    scaled = (value if isinstance(value, Decimal) else Decimal(str(value))).scaleb(2)
+    if not scaled.is_finite() or scaled != scaled.to_integral_value() or abs(scaled) >= LIMIT:
+        raise Inexact(value)
+    return int(scaled)
+
+
+def to_units(value):
+    if value is None:
+        return 0
+    if value != int(value) or abs(value) >= LIMIT:
+        raise Inexact(value)
+    return int(value)
+
+
+def markup_centi(markup_value):
+    """markup_value in hundredths, 0 wherever pricing.markup_amount charges nothing."""
+    if not markup_value:
+        return 0
+    try:
+        value = Decimal(str(markup_value))
+    except (ValueError, TypeError, InvalidOperation):
+        return 0
+    if value <= 0:
+        return 0
+    centi = to_paise(value)
+    if centi >= LIMIT // 10 ** 4:
+        raise Inexact(value)
+    return centi
+
+
+def line_terms(booking, rule, night_rules, inclusions_list):
+    """(quantity, rate in paise) pairs summing to the line net, as pricing._line_net."""
+    if isinstance(booking, (HotelBooking, HouseboatBooking)):
+        terms = [(1, to_paise(item.price)) for item in inclusions_list]
+        if pricing._positive(booking.net_price):
+            terms.append((1, to_paise(booking.net_price)))
+        elif isinstance(booking, HouseboatBooking) or booking.hotel_id:
+            fields = pricing.HOTEL_BED_FIELDS if isinstance(booking, HotelBooking) else pricing.HOUSEBOAT_BED_FIELDS
+            for r in pricing.stay_rates(rule, night_rules):
+                if r:
+                    terms.extend(
+                        (to_units(getattr(booking, qty) or 0), to_paise(getattr(r, rate) or 0)) for qty, rate in fields
+                    )
+        return terms
+
+    if isinstance(booking, (VehicleBooking, ActivityBooking)):
+        if pricing._positive(booking.custom_total_price):
+            return [(1, to_paise(booking.custom_total_price))]
+        if pricing._positive(booking.net_price):
+            return [(1, to_paise(booking.net_price))]
+        if isinstance(booking, VehicleBooking):
+            if not rule or booking.total_km is None:
+                return []
+            terms = [(1, to_paise(rule.total_fee_100km or 0))]
+            if booking.total_km > 100:
+                terms.append((to_units(booking.total_km - 100), to_paise(rule.extra_fee_per_km or 0)))
+            return terms
+        if not rule:
+            return []
+        people = (booking.num_adults or 0) + (booking.num_children or 0)
+        return [(to_units(people), to_paise(rule.per_person or 0))]
+
+    if booking.total_price is None:
+        raise Inexact(None)
+    return [(1, to_paise(booking.total_price))]
+
+
+def group_sum(values, groups, size):
+    """Sum ``values`` into ``size`` buckets, widening to Python ints if int64 could overflow."""
+    if len(values) and float(np.abs(values).astype(float).sum()) >= LIMIT:
+        values = values.astype(object)
+    totals = np.zeros(size, dtype=values.dtype)
+    np.add.at(totals, groups, values)
+    return totals
+
+
+class BatchPrices:
+    """
+    Integer line prices for one batch, aligned with ``bookings``.
+
+    ``net`` is in paise and ``markup`` in micro-rupees; ``exact`` is False for
+    the lines that went through the Decimal path instead.
+    """
+
+    def __init__(self, bookings, net, markup, exact):
+        self.bookings = bookings
+        self.net = net
+        self.markup = markup
+        self.exact = exact
+
+    def group_totals(self, keys):
+        """{key: (net, markup)} as Decimals, ``keys`` giving each line's group."""
+        index = {}
+        groups = np.fromiter((index.setdefault(key, len(index)) for key in keys), dtype=np.int64, count=len(self.bookings))
+        exact = self.exact
+        net = group_sum(self.net[exact], groups[exact], len(index))
+        markup = group_sum(self.markup[exact], groups[exact], len(index))
+
+        totals = {key: [Decimal(int(net[i])).scaleb(-2), Decimal(int(markup[i])).scaleb(-6)] for key, i in index.items()}
+        for line in np.flatnonzero(~exact):
+            total = totals[keys[line]]
+            price = self.bookings[line].calculated_price
+            total[0] += price['net']
+            total[1] += price['markup']
+        return {key: tuple(total) for key, total in totals.items()}
+
+
+def evaluate(bookings, rates=None):
+    """
+    Price ``bookings`` in one vectorised pass and annotate them in place
+    exactly as pricing.price_bookings does (without the line cache).
+    """
+    bookings = list(bookings)
+    rates = rates or RateIndex.for_bookings(bookings)
+    count = len(bookings)
+
+    contexts = []
+    term_line, term_qty, term_rate = [], [], []
+    centi = np.zeros(count, dtype=np.int64)
+    percentage = np.zeros(count, dtype=bool)
+    exact = np.ones(count, dtype=bool)
+
+    for line, booking in enumerate(bookings):
+        context = pricing.line_context(booking, rates)
+        contexts.append(context)
+        rule, nights, night_rules, inclusions_list = context[:4]
+        try:
+            terms = line_terms(booking, rule, night_rules, inclusions_list)
+            centi[line] = markup_centi(booking.markup_value)
+        except Inexact:
+            exact[line] = False
+            continue
+        percentage[line] = booking.markup_type == 'percentage'
+        for qty, rate in terms:
+            term_line.append(line)
+            term_qty.append(qty)
+            term_rate.append(rate)
+
+    term_line = np.asarray(term_line, dtype=np.int64)
+    qty = np.asarray(term_qty, dtype=np.int64)
+    rate = np.asarray(term_rate, dtype=np.int64)
+
+    # Lines whose terms or percentage markup could leave int64 go the Decimal way
+    bound = np.zeros(count)
+    np.add.at(bound, term_line, np.abs(qty.astype(float)) * np.abs(rate.astype(float)))
+    exact &= bound < LIMIT
+    exact &= ~percentage | (bound * np.abs(centi) < LIMIT)
+    keep = exact[term_line]
+
+    net = np.zeros(count, dtype=np.int64)
+    np.add.at(net, term_line[keep], qty[keep] * rate[keep])
+    net[~exact] = 0
+    # Fixed markups are centi-rupees (10**4 micro); percentages are net paise x centi-percent
+    markup = np.where(percentage, net * centi, centi * 10 ** 4)
+
+    for line, (booking, context) in enumerate(zip(bookings, contexts)):
+        if exact[line]:
+            pricing.annotate_line(
+                booking, context, Decimal(int(net[line])).scaleb(-2), Decimal(int(markup[line])).scaleb(-6)
+            )
+        else:
+            pricing.price_booking(booking, rates)
+
+    return BatchPrices(bookings, net, markup, exact)
+
+
+def price_bookings(bookings, rates=None):
+    """Drop-in for pricing.price_bookings(bookings, rates) using the vectorised path."""
+    return pricing.by_date(evaluate(bookings, rates).bookings)
@@ -0,0 +1,199 @@
+# pricing_summary.py
+"""
+Materialised per-itinerary pricing summary.
+
+List pages, the quotation view and the quotation PDF read one
+ItineraryPricingSummary row instead of re-aggregating ItineraryPricingOption
+and HotelBooking on every request.
+
+The summary is not recomputed by the write itself: a save or delete of any
+booking type or pricing option only flags it stale, inside the writer's
+transaction (see signals.py), and the next reader rebuilds it (three
+queries; list pages rebuild every stale row of the page in one batch).
+Editing an itinerary saves dozens of bookings in a row, so a full rebuild
+per write would repeat the same aggregation dozens of times; the flag is a
+single-row UPDATE that commits or rolls back with the change, so no reader
+is ever served a summary older than the committed bookings.
+
+Room and bed counts are the largest per night in an option, not sums over
+the stay: two rooms for three nights is two rooms.
+"""
+from collections import defaultdict
+from decimal import Decimal
+from django.db import transaction
+from django.db.models import Count, Max
+from .models import HotelBooking, VehicleBooking, ItineraryPricingOption, ItineraryPricingSummary, option_number
+
+
+OPTION_KEYS = ['option_1', 'option_2', 'option_3', 'option_4']
+
+# Labels ItineraryPricingOption.option_name has been saved under for each option
+OPTION_NAMES = {
+    'option_1': ["Option 1", "Option1", "option1", "Standard", "Standard Package", "option_1"],
+    'option_2': ["Option 2", "Option2", "option2", "Deluxe", "Deluxe Package", "option_2"],
+    'option_3': ["Option 3", "Option3", "option3", "Premium", "Premium Package", "option_3"],
+    'option_4': ["Option 4", "Option4", "option4", "Luxury", "Luxury Package", "option_4"],
+}
+
+PRICE_FIELDS = ['net_price', 'markup_amount', 'gross_price', 'cgst_amount', 'sgst_amount',
+                'tax_amount', 'discount_amount', 'final_amount']
+
+COUNT_FIELDS = ['number_of_rooms', 'extra_beds', 'child_with_bed', 'child_without_bed']
+
+SUMMARY_FIELDS = ['options', 'option_count', 'lowest_final', 'vehicle_name', 'is_stale', 'updated_at']
+
+
+def normalize_option(value):
+    """Map 'Option 2', 'deluxe', 'option2', ... to the HotelBooking option key."""
+    return f'option_{option_number(value) or 1}'
+
+
+def _pick_pricing_row(rows, key, number):
+    """Saved row for an option: matched by name first, then by option number."""
+    names = OPTION_NAMES[key]
+    for row in rows:
+        if row.option_name in names:
+            return row
+    for row in rows:
+        if row.option_number == number:
+            return row
+    return None
+
+
+def _option_entry(row, counts):
+    entry = {'hotel_count': counts['hotel_count']}
+    if row:
+        entry.update({
+            'option_number': row.option_number,
+            'option_name': row.option_name,
+            'net_price': str(row.net_price),
+            'markup_amount': str(row.markup_amount),
+            'gross_price': str(row.gross_price),
+            'cgst_amount': str(row.cgst_amount),
+            'sgst_amount': str(row.sgst_amount),
+            'tax_amount': str(row.cgst_amount + row.sgst_amount),
+            'discount_amount': str(row.discount_amount),
+            'final_amount': str(row.final_amount),
+            'vehicle_type': row.vehicle_type,
+        })
+    # Booking counts win; the saved pricing row fills in when bookings have none
+    for field in COUNT_FIELDS:
+        entry[field] = counts[field] or (getattr(row, field) if row else 0) or 0
+    return entry
+
+
+def _hotel_counts(itinerary_ids):
+    """
+    Max room and bed counts per itinerary and option key in one grouped query.
+    Bookings without an option belong to every option.
+    """
+    per_option = defaultdict(lambda: defaultdict(lambda: dict.fromkeys(COUNT_FIELDS + ['hotel_count'], 0)))
+    shared = defaultdict(lambda: dict.fromkeys(COUNT_FIELDS + ['hotel_count'], 0))
+
+    rows = (
+        HotelBooking.objects.filter(itinerary_id__in=itinerary_ids)
+        .values('itinerary_id', 'option')
+        .annotate(
+            number_of_rooms=Max('num_double_beds'),
+            extra_beds=Max('extra_beds'),
+            child_with_bed=Max('child_with_bed'),
+            child_without_bed=Max('child_without_bed'),
+            hotel_count=Count('id'),
+        )
+        .order_by()
+    )
+    for row in rows:
+        target = shared[row['itinerary_id']] if not row['option'] else per_option[row['itinerary_id']][normalize_option(row['option'])]
+        for field in COUNT_FIELDS:
+            target[field] = max(target[field], row[field] or 0)
+        target['hotel_count'] += row['hotel_count']
+
+    counts = {}
+    for itinerary_id in itinerary_ids:
+        common = shared[itinerary_id]
+        counts[itinerary_id] = {}
+        for key in OPTION_KEYS:
+            own = per_option[itinerary_id][key]
+            merged = {field: max(own[field], common[field]) for field in COUNT_FIELDS}
+            merged['hotel_count'] = own['hotel_count'] + common['hotel_count']
+            counts[itinerary_id][key] = merged
+    return counts
+
+
+def build_summaries(itinerary_ids):
+    """Unsaved ItineraryPricingSummary per itinerary id (three queries per batch)."""
+    itinerary_ids = list(itinerary_ids)
+
+    pricing_rows = defaultdict(list)
+    for row in ItineraryPricingOption.objects.filter(itinerary_id__in=itinerary_ids).order_by('option_number'):
+        pricing_rows[row.itinerary_id].append(row)
+
+    vehicle_names = {}
+    for booking in VehicleBooking.objects.filter(itinerary_id__in=itinerary_ids).select_related('vehicle').order_by('id'):
+        if booking.itinerary_id not in vehicle_names:
+            vehicle_names[booking.itinerary_id] = booking.vehicle.name if booking.vehicle else (booking.vehicle_type or '')
+
+    counts = _hotel_counts(itinerary_ids)
+
+    summaries = []
+    for itinerary_id in itinerary_ids:
+        rows = pricing_rows[itinerary_id]
+        options = {
+            key: _option_entry(_pick_pricing_row(rows, key, number), counts[itinerary_id][key])
+            for number, key in enumerate(OPTION_KEYS, 1)
+        }
+        finals = [row.final_amount for row in rows if row.final_amount]
+        summaries.append(ItineraryPricingSummary(
+            itinerary_id=itinerary_id,
+            options=options,
+            option_count=len(rows),
+            lowest_final=min(finals) if finals else Decimal('0'),
+            vehicle_name=(vehicle_names.get(itinerary_id) or '')[:100],
+            is_stale=False,
+        ))
+    return summaries
+
+
+def refresh_pricing_summaries(itinerary_ids):
+    """Rebuild and upsert the summaries for ``itinerary_ids``."""
+    itinerary_ids = sorted({i for i in itinerary_ids if i})
+    if not itinerary_ids:
+        return []
+    summaries = build_summaries(itinerary_ids)
+    with transaction.atomic():
+        ItineraryPricingSummary.objects.bulk_create(
+            summaries,
+            update_conflicts=True,
+            unique_fields=['itinerary'],
+            update_fields=SUMMARY_FIELDS,
+        )
+    return summaries
+
+
+def get_pricing_summary(itinerary):
+    """Current summary for ``itinerary``, rebuilt first when missing or stale."""
+    try:
+        summary = itinerary.pricing_summary
+    except ItineraryPricingSummary.DoesNotExist:
+        summary = None
+    if summary is None or summary.is_stale:
+        summary = refresh_pricing_summaries([itinerary.pk])[0]
+        itinerary.pricing_summary = summary
+    return summary
+
+
+def option_prices(summary, key):
+    """Entry for ``key`` with its money fields as Decimals (zero when unpriced)."""
+    entry = dict(summary.options.get(key) or {})
+    for field in PRICE_FIELDS:
+        entry[field] = Decimal(entry.get(field) or '0')
+    for field in COUNT_FIELDS:
+        entry.setdefault(field, 0)
+    entry['is_priced'] = 'option_number' in entry
+    return entry
+
+
+def mark_stale(itinerary_id):
+    """Flag a summary for rebuild; runs inside the caller's transaction."""
+    if itinerary_id:
+        ItineraryPricingSummary.objects.filter(itinerary_id=itinerary_id, is_stale=False).update(is_stale=True)
@@ -1,258 +1,269 @@
 # pricing_utils.py
-from decimal import Decimal, InvalidOperation
+import time
 from collections import defaultdict
-from itertools import chain
-from operator import attrgetter
+from decimal import Decimal
+from django.db import transaction
 from django.utils.timezone import now
-from .models import (
-    Itinerary, HotelBooking, VehicleBooking, ActivityBooking, HouseboatBooking,
-    ItineraryPricingOption, Hotelprice, VehiclePricing, ActivityPrice, HouseboatPrice
+from .models import Itinerary, ItineraryPricingOption, PackageTemplate, PackagePricingOption
+from .rate_index import RateIndex
+from . import pricing, pricing_batch, version_diff
+from .pricing_summary import refresh_pricing_summaries
+
+
+def build_option_rows(itinerary, options):
+    """Turn summarise_options() output into ItineraryPricingOption field dicts."""
+    return [
+        {
+            'option_name': option['option_name'],
+            'option_number': option['option_number'],
+            'net_price': option['net_price'],
+            'markup_amount': option['global_markup'],
+            'gross_price': option['gross_before_tax'],
+            'cgst_amount': option['cgst_amount'],
+            'sgst_amount': option['sgst_amount'],
+            'discount_amount': itinerary.discount,
+            'final_amount': option['gross_price'],
+            'hotels_included': [
+                {'name': h['name'], 'net_price': float(h['net_price']), 'type': h['type']}
+                for h in option['hotels']
+            ]
+        }
+        for option in options
+    ]
+
+
+# Houseboats are shared across options for package templates
+PACKAGE_OPTION_TYPES = (pricing.ACCOMMODATION,)
+
+# Booking details kept on a package option when it is repriced
+PACKAGE_OPTION_DETAILS = (
+    'vehicle_type', 'number_of_rooms', 'extra_beds', 'child_without_bed', 'child_with_bed', 'child_ages',
 )
 
 
+def package_option_label(key, hotels):
+    return hotels[0].option
+
+
+def build_package_option_rows(discount, options):
+    """Turn summarise_options() output into PackagePricingOption field dicts."""
+    return [
+        {
+            'option_name': option['option_name'],
+            'option_number': option['option_number'],
+            'net_price': option['net_price'],
+            'markup_amount': option['global_markup'],
+            'gross_price': option['gross_before_tax'],  # Price WITH markups (before tax)
+            'cgst_amount': option['cgst_amount'],
+            'sgst_amount': option['sgst_amount'],
+            'discount_amount': discount,
+            'final_amount': option['gross_price'],  # Final with everything
+            'hotels_included': [{'name': h['name'], 'net_price': float(h['net_price'])} for h in option['hotels']]
+        }
+        for option in options
+    ]
+
+
 def calculate_itinerary_pricing(itinerary, save=True):
     """
     Calculate and optionally save pricing for an itinerary based on current booking dates.
-    This reuses the same logic from itinerary_pricing view.
-    
+    This reuses the same engine as the itinerary_pricing view (see pricing.py).
+
     Args:
         itinerary: Itinerary instance
         save: Boolean - whether to save pricing options to database
-    
+
     Returns:
         List of pricing option dictionaries
     """
     print(f"\n💰 Calculating prices for Itinerary #{itinerary.id}")
     print(f"   Using NEW booking dates for price lookup...")
-    
-    def calculate_booking_price(booking):
-        """Calculate net price for a single booking based on its date"""
-        net_price = Decimal('0.00')
-        
-        # --- Hotel Booking ---
-        if isinstance(booking, HotelBooking):
-            if hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                net_price = booking.net_price
-            else:
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-                rule = Hotelprice.objects.filter(
-                    hotel=booking.hotel,
-                    room_type=booking.room_type,
-                    meal_plan=booking.meal_plan,
-                    from_date__lte=booking.check_in_date,
-                    to_date__gte=booking.check_in_date
-                ).first()
-                
-                if rule:
-                    per_night = (
-                        Decimal(booking.num_double_beds or 0) * (rule.double_bed or 0) +
-                        Decimal(booking.child_with_bed or 0) * (rule.child_with_bed or 0) +
-                        Decimal(booking.child_without_bed or 0) * (rule.child_without_bed or 0) +
-                        Decimal(booking.extra_beds or 0) * (rule.extra_bed or 0)
-                    )
-                    net_price = per_night * nights
-                    print(f"   🏨 {booking.hotel.name}: ₹{per_night}/night × {nights} = ₹{net_price}")
-                else:
-                    print(f"   ⚠️ No price rule for {booking.hotel.name} on {booking.check_in_date}")
-            
-            booking.price_record = rule if 'rule' in locals() else None
-            booking.sort_date = booking.check_in_date
-            booking.item_type = 'Accommodation'
-        
-        # --- Vehicle Booking ---
-        elif isinstance(booking, VehicleBooking):
-            rule = VehiclePricing.objects.filter(
-                vehicle=booking.vehicle,
-                from_date__lte=booking.pickup_date,
-                to_date__gte=booking.pickup_date,
-                is_active=True
-            ).first()
-            
-            expected_calculated_price = Decimal('0')
-            if rule and hasattr(booking, 'total_km') and booking.total_km is not None:
-                if booking.total_km <= 100:
-                    expected_calculated_price = rule.total_fee_100km or Decimal('0')
-                else:
-                    extra_km = booking.total_km - 100
-                    extra_cost = Decimal(str(extra_km)) * (rule.extra_fee_per_km or Decimal('0'))
-                    expected_calculated_price = (rule.total_fee_100km or Decimal('0')) + extra_cost
-            
-            if hasattr(booking, 'custom_total_price') and booking.custom_total_price and booking.custom_total_price > 0:
-                net_price = booking.custom_total_price
-            elif hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                net_price = booking.net_price
-            else:
-                net_price = expected_calculated_price
-            
-            print(f"   🚗 {booking.vehicle.name}: {booking.total_km}km = ₹{net_price}")
-            booking.price_record = rule
-            booking.sort_date = booking.pickup_date
-            booking.item_type = 'Transportation'
-        
-        # --- Activity Booking ---
-        elif isinstance(booking, ActivityBooking):
-            rule = ActivityPrice.objects.filter(
-                activity=booking.activity,
-                from_date__lte=booking.booking_date,
-                to_date__gte=booking.booking_date
-            ).first() or ActivityPrice.objects.filter(activity=booking.activity).first()
-            
-            expected_calculated_price = Decimal('0')
-            if rule:
-                total_people = (booking.num_adults or 0) + (booking.num_children or 0)
-                expected_calculated_price = Decimal(str(total_people)) * (rule.per_person or Decimal('0'))
-            
-            if hasattr(booking, 'custom_total_price') and booking.custom_total_price and booking.custom_total_price > 0:
-                net_price = booking.custom_total_price
-            elif hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                net_price = booking.net_price
-            else:
-                net_price = expected_calculated_price
-            
-            print(f"   🎯 {booking.activity.name}: {total_people if 'total_people' in locals() else 0} people = ₹{net_price}")
-            booking.price_record = rule
-            booking.sort_date = booking.booking_date
-            booking.item_type = 'Activity'
-        
-        # --- Houseboat Booking ---
-        elif isinstance(booking, HouseboatBooking):
-            if hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                net_price = booking.net_price
-            else:
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-                rule = HouseboatPrice.objects.filter(
-                    houseboat=booking.houseboat,
-                    meal_plan=booking.meal_plan,
-                    room_type=booking.room_type,
-                    from_date__lte=booking.check_in_date,
-                    to_date__gte=booking.check_in_date
-                ).first()
-                
-                if rule:
-                    per_night = (
-                        Decimal(booking.num_one_bed_rooms or 0) * (rule.one_bed or 0) +
-                        Decimal(booking.num_two_bed_rooms or 0) * (rule.two_bed or 0) +
-                        Decimal(booking.num_three_bed_rooms or 0) * (rule.three_bed or 0) +
-                        Decimal(booking.num_four_bed_rooms or 0) * (rule.four_bed or 0) +
-                        Decimal(booking.num_five_bed_rooms or 0) * (rule.five_bed or 0) +
-                        Decimal(booking.num_six_bed_rooms or 0) * (rule.six_bed or 0) +
-                        Decimal(booking.num_seven_bed_rooms or 0) * (rule.seven_bed or 0) +
-                        Decimal(booking.num_eight_bed_rooms or 0) * (rule.eight_bed or 0) +
-                        Decimal(booking.num_nine_bed_rooms or 0) * (rule.nine_bed or 0) +
-                        Decimal(booking.num_ten_bed_rooms or 0) * (rule.ten_bed or 0) +
-                        Decimal(booking.num_extra_beds or 0) * (rule.extra_bed or 0)
-                    )
-                    net_price = per_night * nights
-            
-            booking.price_record = rule if 'rule' in locals() else None
-            booking.sort_date = booking.check_in_date
-            booking.item_type = 'Houseboat'
-            print(f"   🚤 {booking.houseboat.name}: ₹{net_price}")
-        
-        # Calculate individual markup
-        individual_markup = Decimal('0.00')
-        if hasattr(booking, 'markup_value') and booking.markup_value:
-            try:
-                markup_val = Decimal(str(booking.markup_value))
-                if markup_val > 0:
-                    if booking.markup_type != 'percentage':
-                        individual_markup = markup_val
-                    else:
-                        individual_markup = net_price * (markup_val / 100)
-            except (ValueError, TypeError, InvalidOperation):
-                pass
-        
-        booking.calculated_price = {
-            'net': net_price,
-            'markup': individual_markup,
-            'gross': net_price + individual_markup
-        }
-        return booking
-    
-    # Get all bookings
-    combined_bookings = list(chain(
-        HotelBooking.objects.filter(day_plan__itinerary=itinerary),
-        VehicleBooking.objects.filter(itinerary=itinerary),
-        ActivityBooking.objects.filter(day_plan__itinerary=itinerary),
-        HouseboatBooking.objects.filter(day_plan__itinerary=itinerary)
-    ))
-    
-    # Calculate prices for all bookings
-    all_items = [calculate_booking_price(booking) for booking in combined_bookings]
-    all_items = sorted(all_items, key=attrgetter('sort_date'))
-    
-    # Calculate non-accommodation totals
-    non_accommodation_net = sum(
-        item.calculated_price['net'] for item in all_items 
-        if item.item_type != 'Accommodation'
+
+    all_items = pricing.price_itinerary(itinerary)
+    options = pricing.summarise_options(
+        all_items,
+        itinerary.cgst_percentage,
+        itinerary.sgst_percentage,
+        itinerary.discount,
+        fallback_name='Standard Package'
     )
-    
-    # Group hotels by option
-    grouped_hotels = defaultdict(list)
-    for item in all_items:
-        if item.item_type == 'Accommodation':
-            hotel_option = getattr(item, 'option', 'Option 1')
-            grouped_hotels[hotel_option].append(item)
-    
-    # If no hotels, create default option
-    if not grouped_hotels:
-        grouped_hotels['Standard Package'] = []
-    
-    pricing_options = []
-    
-    # Create pricing option for each hotel group
-    for index, (option_name, hotels) in enumerate(grouped_hotels.items(), 1):
-        option_hotels_net = sum(h.calculated_price['net'] for h in hotels)
-        package_net = option_hotels_net + non_accommodation_net
-        
-        # Calculate taxes and final amount
-        cgst_amount = package_net * (itinerary.cgst_percentage / Decimal('100'))
-        sgst_amount = package_net * (itinerary.sgst_percentage / Decimal('100'))
-        final_amount = package_net + cgst_amount + sgst_amount - itinerary.discount
-        
-        # Prepare hotel list
-        hotels_list = [
-            {'name': h.hotel.name, 'net_price': float(h.calculated_price['net'])}
-            for h in hotels
-        ]
-        
-        option_data = {
-            'option_name': option_name,
-            'option_number': index,
-            'net_price': package_net,
-            'gross_price': package_net,
-            'cgst_amount': cgst_amount,
-            'sgst_amount': sgst_amount,
-            'discount_amount': itinerary.discount,
-            'final_amount': final_amount,
-            'hotels_included': hotels_list
-        }
-        
-        pricing_options.append(option_data)
-        
-        print(f"\n   ✅ {option_name}:")
-        print(f"      Net: ₹{package_net}")
-        print(f"      CGST: ₹{cgst_amount}")
-        print(f"      SGST: ₹{sgst_amount}")
-        print(f"      Final: ₹{final_amount}")
-    
+    pricing_options = build_option_rows(itinerary, options)
+
     # Save to database if requested
     if save:
         # Clear existing options
         ItineraryPricingOption.objects.filter(itinerary=itinerary).delete()
-        
+
         # Create new options
         for option_data in pricing_options:
             ItineraryPricingOption.objects.create(
                 itinerary=itinerary,
                 **option_data
             )
-        
+
         # Mark itinerary as finalized
         itinerary.is_finalized = True
         itinerary.finalized_at = now()
         itinerary.save()
-        
+
         print(f"\n   💾 Saved {len(pricing_options)} pricing option(s) to database")
-    
+
     return pricing_options
+
+
+# ==========================================
+# BATCH REPRICING
+# ==========================================
+def _chunks(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def reprice_itineraries(itinerary_ids, chunk_size=100, dry_run=False, rates=None):
+    """
+    Reprice many itineraries in one pass.
+
+    Every rule is resolved from a single rate snapshot loaded up front. Each
+    chunk loads its bookings in a handful of queries, prices every line and
+    option total in one vectorised pass (pricing_batch) and replaces the
+    ItineraryPricingOption rows with one bulk_create inside one transaction,
+    rebuilding the pricing summaries in the same transaction. The global
+    markup already saved on each option is carried over, since the
+    per-option markup the pricing screen keeps in the session is not
+    available here.
+
+    With ``dry_run`` nothing is written and ``diffs`` lists every option whose
+    final amount would change.
+
+    Returns a dict with counts, elapsed seconds, throughput and diffs.
+    """
+    started = time.perf_counter()
+    itinerary_ids = sorted(set(itinerary_ids))
+    rates = rates or RateIndex.load()
+
+    repriced = 0
+    options_written = 0
+    diffs = []
+
+    for chunk in _chunks(itinerary_ids, chunk_size):
+        itineraries = Itinerary.objects.in_bulk(chunk)
+        bookings = pricing.load_bookings_for_itineraries(list(itineraries))
+
+        existing = {}
+        for option in ItineraryPricingOption.objects.filter(itinerary_id__in=list(itineraries)):
+            existing.setdefault(option.itinerary_id, {})[option.option_number] = option
+
+        lines = [booking for itinerary_id in itineraries for booking in bookings.get(itinerary_id, [])]
+        batch = pricing_batch.evaluate(lines, rates)
+        sums = defaultdict(dict)
+        for (itinerary_id, key), totals in batch.group_totals([
+            (b.owner_id, pricing.option_key(getattr(b, 'option', None)) if b.item_type in pricing.OPTION_ITEM_TYPES else pricing.SHARED)
+            for b in lines
+        ]).items():
+            sums[itinerary_id][key] = totals
+
+        new_rows = []
+        for itinerary_id, itinerary in itineraries.items():
+            saved = existing.get(itinerary_id, {})
+
+            def saved_markup(index, saved=saved):
+                option = saved.get(index)
+                return ('fixed', option.markup_amount if option else Decimal('0'))
+
+            items = pricing.by_date(bookings.get(itinerary_id, []))
+            options = pricing.summarise_options(
+                items, itinerary.cgst_percentage, itinerary.sgst_percentage, itinerary.discount,
+                markup_for=saved_markup, sums=sums[itinerary_id]
+            )
+            rows = build_option_rows(itinerary, options)
+
+            for row in rows:
+                old = saved.get(row['option_number'])
+                old_final = old.final_amount if old else None
+                new_final = Decimal(row['final_amount']).quantize(Decimal('0.01'))
+                if old_final != new_final:
+                    diffs.append({
+                        'itinerary_id': itinerary_id,
+                        'option_number': row['option_number'],
+                        'option_name': row['option_name'],
+                        'old_final': old_final,
+                        'new_final': new_final,
+                        'delta': new_final - (old_final or Decimal('0')),
+                    })
+            for number, old in saved.items():
+                if number > len(rows):
+                    diffs.append({
+                        'itinerary_id': itinerary_id,
+                        'option_number': number,
+                        'option_name': old.option_name,
+                        'old_final': old.final_amount,
+                        'new_final': None,
+                        'delta': -old.final_amount,
+                    })
+
+            new_rows.extend(ItineraryPricingOption(itinerary_id=itinerary_id, **row) for row in rows)
+            repriced += 1
+
+        if not dry_run:
+            with transaction.atomic():
+                ItineraryPricingOption.objects.filter(itinerary_id__in=list(itineraries)).delete()
+                ItineraryPricingOption.objects.bulk_create(new_rows)
+                refresh_pricing_summaries(list(itineraries))
+                version_diff.touch(*itineraries)
+            options_written += len(new_rows)
+
+    elapsed = time.perf_counter() - started
+    return {
+        'itineraries': repriced,
+        'options': options_written,
+        'seconds': elapsed,
+        'per_second': repriced / elapsed if elapsed else 0.0,
+        'dry_run': dry_run,
+        'diffs': diffs,
+    }
+
+
+def reprice_packages(package_ids, rates=None):
+    """
+    Reprice the saved options of many package templates, the way
+    package_template_pricing does. Each option keeps the global markup and
+    booking details it was saved with; tax and discount come from the
+    package. Bookings load in four queries and the options are replaced in
+    one transaction.
+    """
+    started = time.perf_counter()
+    rates = rates or RateIndex.load()
+    packages = PackageTemplate.objects.in_bulk(sorted(set(package_ids)))
+    bookings = pricing.load_bookings_for_packages(list(packages))
+
+    existing = defaultdict(dict)
+    for option in PackagePricingOption.objects.filter(package_template_id__in=list(packages)):
+        existing[option.package_template_id][option.option_number] = option
+
+    new_rows = []
+    for package_id, package in packages.items():
+        saved = existing[package_id]
+
+        def saved_markup(index, saved=saved):
+            option = saved.get(index)
+            return ('fixed', option.markup_amount if option else Decimal('0'))
+
+        items = pricing.price_bookings(bookings.get(package_id, []), rates)
+        options = pricing.summarise_options(
+            items, package.cgst_percentage, package.sgst_percentage, package.discount,
+            markup_for=saved_markup, option_types=PACKAGE_OPTION_TYPES, label_for=package_option_label
+        )
+        for row in build_package_option_rows(package.discount, options):
+            old = saved.get(row['option_number'])
+            details = {name: getattr(old, name) for name in PACKAGE_OPTION_DETAILS} if old else {}
+            new_rows.append(PackagePricingOption(package_template_id=package_id, **details, **row))
+
+    with transaction.atomic():
+        PackagePricingOption.objects.filter(package_template_id__in=list(packages)).delete()
+        PackagePricingOption.objects.bulk_create(new_rows)
+
+    return {
+        'packages': len(packages),
+        'options': len(new_rows),
+        'seconds': time.perf_counter() - started,
+    }
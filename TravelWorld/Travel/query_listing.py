@@ -0,0 +1,172 @@
+# query_listing.py
+"""
+Keyset pagination and cached status counts for the query list.
+
+The list is ordered newest first on (created_at, id) and paged with a
+cursor holding the last row's pair, so every page is an index range scan
+of PAGE_SIZE rows however many queries exist (OFFSET would scan and drop
+all the earlier rows). The status counts shown above the list are one
+grouped aggregate, cached per user scope and filter set and retired by
+signals.py whenever a query is saved or deleted; the unfiltered list
+reads them from the status counters (status_counters.py).
+"""
+import base64
+import hashlib
+import json
+import uuid
+from datetime import datetime
+from django.core.cache import cache
+from django.db.models import Q, Count
+from django.utils import timezone
+from .models import Query, TeamMember
+from . import status_counters
+from .search_index import search_filter
+
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+FILTER_FIELDS = ('name', 'phone', 'from_date', 'assign', 'id')
+
+QUERY_LIST_REVISION_KEY = 'query_list:revision'
+COUNTS_KEY = 'query_list:counts:{}:{}'
+COUNTS_TIMEOUT = 60 * 5
+
+LIST_RELATED = ('assign', 'lead_source', 'created_by')
+
+
+class BadCursor(ValueError):
+    """The cursor parameter was not produced by ``encode_cursor``."""
+
+
+# ==========================================
+# SCOPE & FILTERS
+# ==========================================
+def scoped_queries(user_type, user_id):
+    """(queryset of the queries this user may see, user role)."""
+    if user_type == 'superuser':
+        return Query.objects.all(), 'superuser'
+    if user_type == 'team_member':
+        user = TeamMember.objects.get(id=user_id)
+        if user.role == 'admin':
+            return Query.objects.all(), user.role
+        if user.role == 'manager':
+            return Query.objects.filter(Q(created_by=user) | Q(assign=user)), user.role
+        return Query.objects.filter(created_by=user), user.role
+    return Query.objects.none(), None
+
+
+def read_filters(params):
+    return {name: params.get(name, '').strip() for name in FILTER_FIELDS}
+
+
+def apply_filters(queries, filters):
+    """The search boxes of query_list.html (name, phone and id go through the search index)."""
+    if filters['name']:
+        queries = search_filter(queries, 'query', filters['name'], fields=('name',))
+    if filters['phone']:
+        queries = search_filter(queries, 'query', filters['phone'], fields=('phone',))
+    if filters['from_date']:
+        queries = queries.filter(from_date__icontains=filters['from_date'])
+    if filters['assign']:
+        queries = queries.filter(
+            Q(assign__first_name__icontains=filters['assign']) |
+            Q(assign__last_name__icontains=filters['assign'])
+        )
+    if filters['id']:
+        queries = search_filter(queries, 'query', filters['id'], fields=('ref',))
+    return queries
+
+
+# ==========================================
+# KEYSET PAGES
+# ==========================================
+def encode_cursor(query):
+    raw = f'{query.created_at.isoformat()}|{query.id}'
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """(created_at, id) from ``encode_cursor``; raises BadCursor."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = raw.rsplit('|', 1)
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise BadCursor(cursor) from e
+
+
+def page(queries, cursor=None, size=PAGE_SIZE):
+    """
+    (rows, next cursor or None): up to ``size`` queries after ``cursor``,
+    newest first, with the relations the list renders.
+    """
+    size = max(1, min(size, MAX_PAGE_SIZE))
+    queries = queries.select_related(*LIST_RELATED).order_by('-created_at', '-id')
+    if cursor:
+        created_at, pk = decode_cursor(cursor)
+        queries = queries.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    # One extra row tells whether there is a next page without a COUNT
+    rows = list(queries[:size + 1])
+    if len(rows) > size:
+        return rows[:size], encode_cursor(rows[size - 1])
+    return rows, None
+
+
+# ==========================================
+# COUNTS
+# ==========================================
+def touch():
+    """A query was added, edited or removed: retire every cached count (bulk writers call it themselves)."""
+    cache.set(QUERY_LIST_REVISION_KEY, uuid.uuid4().hex, None)
+
+
+def _revision():
+    revision = cache.get(QUERY_LIST_REVISION_KEY)
+    if revision is None:
+        cache.add(QUERY_LIST_REVISION_KEY, uuid.uuid4().hex, None)
+        revision = cache.get(QUERY_LIST_REVISION_KEY)
+    return revision
+
+
+def status_counts(queries, scope, filters, role=None, user_id=None):
+    """
+    Total and per-status counts of the filtered queries. Unfiltered, they
+    come from the status counters; otherwise from one aggregate, cached per
+    (scope, filters, day) until a query changes.
+    """
+    if not any(filters.values()):
+        tiles = status_counters.tiles('query', role, user_id)
+        return {
+            'total': tiles['total'],
+            'new': tiles['today'],  # Today's queries only
+            'hot_lead': tiles['hot'],
+            **{status: tiles[status] for status in (
+                'active', 'no_connect', 'follow_up', 'proposal_sent', 'confirmed', 'cancelled', 'invalid'
+            )},
+        }
+
+    today = timezone.localdate()
+    fingerprint = hashlib.md5(
+        json.dumps([scope, filters, today.isoformat()], sort_keys=True, default=str).encode(),
+        usedforsecurity=False
+    ).hexdigest()
+    key = COUNTS_KEY.format(_revision(), fingerprint)
+    counts = cache.get(key)
+    if counts is None:
+        today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        today_end = timezone.now().replace(hour=23, minute=59, second=59, microsecond=999999)
+        counts = queries.order_by().aggregate(
+            total=Count('id'),
+            new=Count('id', filter=Q(created_at__gte=today_start, created_at__lte=today_end)),  # Today's queries only
+            active=Count('id', filter=Q(status='active')),
+            no_connect=Count('id', filter=Q(status='no_connect')),
+            hot_lead=Count('id', filter=Q(priority='hot')),
+            follow_up=Count('id', filter=Q(status='follow_up')),
+            proposal_sent=Count('id', filter=Q(status='proposal_sent')),
+            confirmed=Count('id', filter=Q(status='confirmed')),
+            cancelled=Count('id', filter=Q(status='cancelled')),
+            invalid=Count('id', filter=Q(status='invalid')),
+        )
+        cache.set(key, counts, COUNTS_TIMEOUT)
+    return counts
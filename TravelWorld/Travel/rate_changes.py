@@ -0,0 +1,272 @@
+# rate_changes.py
+"""
+Rate change propagation queue.
+
+When a rate row changes, the draft itineraries and package templates that
+price against it keep their saved totals until someone reopens the pricing
+screen. The price model signals (and bulk rate imports) therefore enqueue
+a RateChange row per (supplier, date range) in the same transaction as the
+rate itself, and a worker (``manage.py process_rate_changes``) drains the
+queue:
+
+1. claim a batch of pending rows with one UPDATE, so two workers never
+   take the same rows;
+2. merge the claimed ranges per supplier;
+3. find the draft itineraries and priced package templates with a booking
+   on one of those suppliers inside a merged range (one query per booking
+   type and owner, filtered in memory);
+4. reprice them in batches against one rate snapshot and stamp the rows
+   processed.
+
+A failed batch is released for retry; after MAX_ATTEMPTS its rows stay
+unprocessed with the error and count as failed in ``queue_metrics``.
+"""
+import time
+import uuid
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import timedelta
+from django.db.models import Q, F, Avg, Max, Min, Count, DurationField, ExpressionWrapper
+from django.utils import timezone
+from .models import (
+    RateChange, Hotelprice, HouseboatPrice, VehiclePricing, ActivityPrice,
+    HotelBooking, HouseboatBooking, VehicleBooking, ActivityBooking, PackagePricingOption
+)
+from .rate_index import RateIndex
+from .pricing_utils import reprice_itineraries, reprice_packages
+
+
+BATCH_SIZE = 500
+MAX_ATTEMPTS = 5
+CLAIM_TIMEOUT = timedelta(minutes=15)
+
+# Itinerary statuses whose saved prices follow the rate cards
+REPRICE_STATUSES = ('draft',)
+
+# Price model -> (queue kind, supplier attribute)
+RATE_SOURCES = {
+    Hotelprice: ('hotel', 'hotel_id'),
+    HouseboatPrice: ('houseboat', 'houseboat_id'),
+    VehiclePricing: ('vehicle', 'vehicle_id'),
+    ActivityPrice: ('activity', 'activity_id'),
+}
+
+# kind -> (booking model, supplier field, (first date, last date) fields,
+#          itinerary id path, package template id path)
+AFFECTED_BOOKINGS = {
+    'hotel': (HotelBooking, 'hotel_id', ('check_in_date', 'check_out_date'),
+              'day_plan__itinerary', 'package_day_plan__package_template'),
+    'houseboat': (HouseboatBooking, 'houseboat_id', ('check_in_date', 'check_out_date'),
+                  'day_plan__itinerary', 'package_template'),
+    'vehicle': (VehicleBooking, 'vehicle_id', ('pickup_date', 'pickup_date'), 'itinerary', 'package_template'),
+    'activity': (ActivityBooking, 'activity_id', ('booking_date', 'booking_date'),
+                 'day_plan__itinerary', 'package_template'),
+}
+
+
+# ==========================================
+# ENQUEUE
+# ==========================================
+def rate_range(instance):
+    """(kind, supplier id, from, to) of a rate row."""
+    kind, field = RATE_SOURCES[type(instance)]
+    return kind, getattr(instance, field), instance.from_date, instance.to_date
+
+
+def enqueue(changes):
+    """Queue (kind, supplier id, from, to) tuples; incomplete or repeated ones are dropped."""
+    rows = {
+        (kind, supplier_id, min(start, end), max(start, end))
+        for kind, supplier_id, start, end in changes
+        if supplier_id and start and end
+    }
+    RateChange.objects.bulk_create([
+        RateChange(kind=kind, supplier_id=supplier_id, from_date=start, to_date=end)
+        for kind, supplier_id, start, end in sorted(rows)
+    ])
+    return len(rows)
+
+
+# ==========================================
+# RESOLVE
+# ==========================================
+def merge_ranges(changes):
+    """{(kind, supplier id): ([starts], [ends])} of the disjoint, sorted unions of the ranges."""
+    grouped = defaultdict(list)
+    for change in changes:
+        grouped[(change.kind, change.supplier_id)].append((change.from_date, change.to_date))
+
+    merged = {}
+    for key, ranges in grouped.items():
+        starts, ends = [], []
+        for start, end in sorted(ranges):
+            if ends and start <= ends[-1] + timedelta(days=1):
+                ends[-1] = max(ends[-1], end)
+            else:
+                starts.append(start)
+                ends.append(end)
+        merged[key] = (starts, ends)
+    return merged
+
+
+def _hits(ranges, first, last):
+    """Does first..last overlap one of the merged ranges? Undated bookings always do."""
+    if first is None or last is None:
+        return True
+    starts, ends = ranges
+    i = bisect_right(starts, max(first, last)) - 1
+    return i >= 0 and ends[i] >= min(first, last)
+
+
+def affected_owners(changes):
+    """
+    (itinerary ids, package template ids) with a booking priced by one of
+    the changed (supplier, range) keys: draft itineraries and active
+    package templates that have saved pricing options.
+    """
+    merged = merge_ranges(changes)
+    suppliers = defaultdict(list)
+    for kind, supplier_id in merged:
+        suppliers[kind].append(supplier_id)
+
+    itinerary_ids, package_ids = set(), set()
+    for kind, supplier_ids in suppliers.items():
+        model, field, (first, last), itinerary, package = AFFECTED_BOOKINGS[kind]
+        lowest = min(merged[(kind, i)][0][0] for i in supplier_ids)
+        highest = max(merged[(kind, i)][1][-1] for i in supplier_ids)
+        in_window = (Q(**{f'{first}__lte': highest}) | Q(**{f'{first}__isnull': True})) & (
+            Q(**{f'{last}__gte': lowest}) | Q(**{f'{last}__isnull': True})
+        )
+        owners = (
+            (itinerary, itinerary_ids, Q(**{f'{itinerary}__status__in': REPRICE_STATUSES})),
+            (package, package_ids, Q(**{f'{package}__is_active': True}, **{
+                f'{package}_id__in': PackagePricingOption.objects.values('package_template_id')
+            })),
+        )
+        for path, found, owned in owners:
+            rows = (
+                model.objects.filter(owned, in_window, **{f'{field}__in': supplier_ids})
+                .values_list(field, first, last, f'{path}_id')
+            )
+            for supplier_id, start, end, owner_id in rows:
+                if _hits(merged[(kind, supplier_id)], start, end):
+                    found.add(owner_id)
+    return itinerary_ids, package_ids
+
+
+# ==========================================
+# WORKER
+# ==========================================
+def pending():
+    return RateChange.objects.filter(processed_at__isnull=True, attempts__lt=MAX_ATTEMPTS)
+
+
+def claim(batch_size=BATCH_SIZE):
+    """Take up to ``batch_size`` pending rows (oldest first) for this worker; stale claims are retaken."""
+    token = uuid.uuid4().hex
+    moment = timezone.now()
+    free = Q(claimed_by__isnull=True) | Q(claimed_at__lt=moment - CLAIM_TIMEOUT)
+    ids = list(pending().filter(free).order_by('id').values_list('id', flat=True)[:batch_size])
+    if not ids:
+        return token, []
+    RateChange.objects.filter(free, id__in=ids).update(claimed_by=token, claimed_at=moment)
+    return token, list(RateChange.objects.filter(claimed_by=token))
+
+
+def process_rate_changes(batch_size=BATCH_SIZE, chunk_size=100):
+    """
+    Drain one batch of the queue. Returns counts, elapsed seconds and the
+    lag (age of the oldest change) the batch cleared.
+    """
+    started = time.perf_counter()
+    token, changes = claim(batch_size)
+    result = {
+        'changes': len(changes),
+        'itineraries': 0,
+        'packages': 0,
+        'options': 0,
+        'lag_seconds': 0.0,
+        'seconds': 0.0,
+        'error': None,
+    }
+    if not changes:
+        return result
+
+    claimed = RateChange.objects.filter(claimed_by=token)
+    try:
+        itinerary_ids, package_ids = affected_owners(changes)
+        rates = RateIndex.load()
+        if itinerary_ids:
+            repriced = reprice_itineraries(itinerary_ids, chunk_size=chunk_size, rates=rates)
+            result['itineraries'] = repriced['itineraries']
+            result['options'] += repriced['options']
+        if package_ids:
+            repriced = reprice_packages(package_ids, rates=rates)
+            result['packages'] = repriced['packages']
+            result['options'] += repriced['options']
+    except Exception as e:
+        # Release the rows for another attempt
+        claimed.update(claimed_by=None, claimed_at=None, attempts=F('attempts') + 1, error=str(e)[:1000])
+        result['error'] = str(e)
+    else:
+        claimed.update(processed_at=timezone.now(), attempts=F('attempts') + 1, error='')
+
+    result['lag_seconds'] = (timezone.now() - min(change.enqueued_at for change in changes)).total_seconds()
+    result['seconds'] = time.perf_counter() - started
+    return result
+
+
+def drain(batch_size=BATCH_SIZE, chunk_size=100, max_batches=None):
+    """Process batches until the queue is empty (or a batch fails); yields each batch result."""
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        result = process_rate_changes(batch_size, chunk_size)
+        if not result['changes']:
+            return
+        batches += 1
+        yield result
+        if result['error']:
+            return
+
+
+def purge_processed(older_than=timedelta(days=7)):
+    """Delete processed rows older than ``older_than``; returns how many went."""
+    deleted, _ = RateChange.objects.filter(processed_at__lt=timezone.now() - older_than).delete()
+    return deleted
+
+
+# ==========================================
+# METRICS
+# ==========================================
+def queue_metrics(window=timedelta(hours=1)):
+    """
+    Queue depth and lag: pending and failed rows, the age of the oldest
+    pending change, and for rows processed within ``window`` the count and
+    the mean / worst enqueue-to-processed latency.
+    """
+    moment = timezone.now()
+    waiting = pending().aggregate(
+        count=Count('id'),
+        oldest=Min('enqueued_at'),
+        claimed=Count('id', filter=Q(claimed_by__isnull=False)),
+    )
+    latency = ExpressionWrapper(F('processed_at') - F('enqueued_at'), output_field=DurationField())
+    recent = RateChange.objects.filter(processed_at__gte=moment - window).aggregate(
+        count=Count('id'), mean=Avg(latency), worst=Max(latency), last=Max('processed_at'),
+    )
+    last_processed = recent['last'] or RateChange.objects.aggregate(last=Max('processed_at'))['last']
+
+    def seconds(value):
+        return round(value.total_seconds(), 3) if value is not None else 0.0
+
+    return {
+        'pending': waiting['count'],
+        'in_progress': waiting['claimed'],
+        'failed': RateChange.objects.filter(processed_at__isnull=True, attempts__gte=MAX_ATTEMPTS).count(),
+        'lag_seconds': seconds(moment - waiting['oldest'] if waiting['oldest'] else None),
+        'window_seconds': int(window.total_seconds()),
+        'processed_in_window': recent['count'],
+        'mean_latency_seconds': seconds(recent['mean']),
+        'max_latency_seconds': seconds(recent['worst']),
+        'last_processed_at': last_processed.isoformat() if last_processed else None,
+    }
@@ -0,0 +1,377 @@
+# rate_import.py
+"""
+Bulk rate-sheet import for Hotelprice and HouseboatPrice.
+
+A sheet (CSV, or XLSX when openpyxl is installed) is read row by row into
+plain tuples, every row is validated in memory and overlaps are found for
+the whole sheet at once: the sheet's rows and the rows already stored are
+sorted per (supplier, room type, meal plan) key and swept once, instead of
+one overlap query per row as HotelPriceForm / HouseboatPriceForm do. A row
+with the same key and dates as a stored rate updates it; only new or
+changed rates are written, with chunked ``bulk_create(update_conflicts=True)``.
+
+Bulk writes skip the price model signals, so ``import_rate_sheet`` does
+their work once for the whole sheet: it retires the rate index, the cached
+line prices and the booking modal options of every supplier it touched,
+and queues the changed ranges for the repricing worker (rate_changes.py).
+"""
+import csv
+import io
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime
+from decimal import Decimal, InvalidOperation
+from django.db import transaction
+from .models import Hotel, Hotelprice, Houseboat, HouseboatPrice, HotelBooking, HouseboatBooking, RoomType, MealPlan
+from .pricing import invalidate_line_prices
+from .rate_index import invalidate_rate_index
+from . import catalog_options, rate_changes
+
+
+CHUNK_SIZE = 1000
+
+DATE_FORMATS = ('%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y')
+
+
+@dataclass(frozen=True)
+class SheetSpec:
+    supplier_model: type
+    price_model: type
+    supplier_field: str
+    booking_model: type
+    required_rates: tuple
+    optional_rates: tuple = ()
+
+    @property
+    def rate_fields(self):
+        return self.required_rates + self.optional_rates
+
+    @property
+    def unique_fields(self):
+        return [self.supplier_field, 'room_type', 'meal_plan', 'from_date', 'to_date']
+
+
+SHEETS = {
+    'hotel': SheetSpec(
+        Hotel, Hotelprice, 'hotel', HotelBooking,
+        required_rates=('double_bed',),
+        optional_rates=('child_without_bed', 'child_with_bed', 'extra_bed'),
+    ),
+    'houseboat': SheetSpec(
+        Houseboat, HouseboatPrice, 'houseboat', HouseboatBooking,
+        required_rates=(
+            'one_bed', 'two_bed', 'three_bed', 'four_bed', 'five_bed',
+            'six_bed', 'seven_bed', 'eight_bed', 'nine_bed', 'ten_bed', 'extra_bed',
+        ),
+    ),
+}
+
+
+class RateSheetError(Exception):
+    """The sheet cannot be read at all (format, missing columns)."""
+
+
+@dataclass
+class ImportResult:
+    kind: str
+    rows: int = 0
+    created: int = 0
+    updated: int = 0
+    unchanged: int = 0
+    errors: list = field(default_factory=list)
+    conflicts: list = field(default_factory=list)
+    changed: list = field(default_factory=list)
+    written: bool = False
+
+    @property
+    def ok(self):
+        return not self.errors and not self.conflicts
+
+    def summary(self):
+        """JSON-safe report; ``changed`` lists every new or changed rate for cache invalidation."""
+        return {
+            'kind': self.kind,
+            'rows': self.rows,
+            'created': self.created,
+            'updated': self.updated,
+            'unchanged': self.unchanged,
+            'written': self.written,
+            'errors': self.errors,
+            'conflicts': self.conflicts,
+            'changed': self.changed,
+            'suppliers': sorted({entry['supplier_id'] for entry in self.changed}),
+        }
+
+
+# ==========================================
+# READING
+# ==========================================
+def _header(name):
+    return str(name or '').strip().lower().replace(' ', '_').replace('-', '_')
+
+
+def read_rows(upload, filename=''):
+    """
+    Yield (row number, {column: value}) from a CSV or XLSX file object,
+    without loading the whole sheet first.
+    """
+    name = (filename or getattr(upload, 'name', '') or '').lower()
+    if name.endswith(('.xlsx', '.xlsm')):
+        try:
+            import openpyxl
+        except ImportError:
+            raise RateSheetError('XLSX sheets need openpyxl installed; upload a CSV instead')
+        workbook = openpyxl.load_workbook(upload, read_only=True, data_only=True)
+        try:
+            rows = workbook.active.iter_rows(values_only=True)
+            header = [_header(cell) for cell in next(rows, ())]
+            for number, values in enumerate(rows, start=2):
+                if any(value not in (None, '') for value in values):
+                    yield number, dict(zip(header, values))
+        finally:
+            workbook.close()
+        return
+
+    text = io.TextIOWrapper(upload, encoding='utf-8-sig', newline='') if not isinstance(upload, io.TextIOBase) else upload
+    reader = csv.reader(text)
+    header = [_header(cell) for cell in next(reader, [])]
+    for number, values in enumerate(reader, start=2):
+        if any(value.strip() for value in values):
+            yield number, dict(zip(header, values))
+
+
+def _date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value or '').strip()
+    try:
+        # Fast path for the usual ISO dates; strptime is the slowest part of parsing a large sheet
+        return date.fromisoformat(text)
+    except ValueError:
+        pass
+    for fmt in DATE_FORMATS[1:]:
+        try:
+            return datetime.strptime(text, fmt).date()
+        except ValueError:
+            continue
+    raise ValueError(f"'{text}' is not a date")
+
+
+def _amount(value, required, model_field):
+    """The cell as a Decimal that ``model_field`` stores exactly (more decimals are an error, not rounded)."""
+    text = str(value if value is not None else '').strip().replace(',', '')
+    if not text:
+        if required:
+            raise ValueError('is required')
+        return None
+    try:
+        amount = Decimal(text)
+    except InvalidOperation:
+        raise ValueError(f"'{text}' is not a number")
+    if not amount.is_finite():
+        raise ValueError(f"'{text}' is not a number")
+    if amount < 0:
+        raise ValueError('cannot be negative')
+    places = model_field.decimal_places
+    if amount and amount.adjusted() >= model_field.max_digits - places:
+        raise ValueError('is too large')
+    exact = amount.quantize(Decimal(1).scaleb(-places))
+    if exact != amount:
+        raise ValueError(f'has more than {places} decimal place(s)')
+    return exact
+
+
+class _Lookup:
+    """Case-insensitive name (or id) -> id, loaded once per model."""
+
+    def __init__(self, queryset):
+        self.by_id = {}
+        self.by_name = {}
+        for pk, name in queryset.values_list('id', 'name'):
+            self.by_id[pk] = pk
+            self.by_name.setdefault(str(name).strip().lower(), pk)
+
+    def __call__(self, value):
+        text = str(value if value is not None else '').strip()
+        if text.isdigit() and int(text) in self.by_id:
+            return int(text)
+        return self.by_name.get(text.lower())
+
+
+def parse_sheet(kind, rows, result):
+    """
+    Validate every row; returns {key: [(from, to, rates, row number)]} with
+    key (supplier id, room type id, meal plan id). Bad rows go to ``result.errors``.
+    """
+    spec = SHEETS[kind]
+    suppliers = _Lookup(spec.supplier_model.objects.all())
+    room_types = _Lookup(RoomType.objects.all())
+    meal_plans = _Lookup(MealPlan.objects.all())
+    parsed = defaultdict(list)
+
+    required = {spec.supplier_field, 'room_type', 'meal_plan', 'from_date', 'to_date', *spec.required_rates}
+    for number, row in rows:
+        if not result.rows and required - row.keys():
+            raise RateSheetError(f"Missing columns: {', '.join(sorted(required - row.keys()))}")
+        result.rows += 1
+        problems = []
+        key = []
+        for column, lookup in ((spec.supplier_field, suppliers), ('room_type', room_types), ('meal_plan', meal_plans)):
+            found = lookup(row.get(column))
+            if found is None:
+                problems.append(f"unknown {column.replace('_', ' ')} '{row.get(column) or ''}'")
+            key.append(found)
+
+        dates = []
+        for column in ('from_date', 'to_date'):
+            try:
+                dates.append(_date(row.get(column)))
+            except ValueError as e:
+                problems.append(f'{column}: {e}')
+        if len(dates) == 2 and dates[1] < dates[0]:
+            problems.append('to_date is earlier than from_date')
+
+        rates = {}
+        for column in spec.rate_fields:
+            try:
+                rates[column] = _amount(
+                    row.get(column), column in spec.required_rates, spec.price_model._meta.get_field(column)
+                )
+            except ValueError as e:
+                problems.append(f'{column} {e}')
+
+        if problems:
+            result.errors.append({'row': number, 'errors': problems})
+            continue
+        parsed[tuple(key)].append((dates[0], dates[1], rates, number))
+    return parsed
+
+
+# ==========================================
+# OVERLAPS
+# ==========================================
+def find_conflicts(parsed, existing):
+    """
+    Sort + sweep per key over the sheet rows and the stored rows that the
+    sheet does not replace (same dates = update). Returns the conflicts and
+    the set of row numbers involved.
+    """
+    conflicts = []
+    bad_rows = set()
+    for key, rows in parsed.items():
+        sheet_dates = {(start, end) for start, end, _, _ in rows}
+        intervals = [(start, end, number) for start, end, _, number in rows]
+        intervals.extend(
+            (start, end, None) for (start, end) in existing.get(key, {}) if (start, end) not in sheet_dates
+        )
+        intervals.sort(key=lambda interval: (interval[0], interval[1]))
+
+        reach = None
+        for start, end, number in intervals:
+            if reach is not None and start <= reach[1] and (number or reach[2]):
+                # Reported from the sheet row's side; stored rows have no row number
+                row, other = ((start, end, number), reach) if number else (reach, (start, end, number))
+                conflicts.append({
+                    'row': row[2],
+                    'other_row': other[2],
+                    'key': list(key),
+                    'dates': [row[0].isoformat(), row[1].isoformat()],
+                    'overlaps': [other[0].isoformat(), other[1].isoformat()],
+                })
+                bad_rows.update(n for n in (number, reach[2]) if n is not None)
+            if reach is None or end > reach[1]:
+                reach = (start, end, number)
+    conflicts.sort(key=lambda conflict: (conflict['row'], conflict['other_row'] or 0, conflict['overlaps']))
+    return conflicts, bad_rows
+
+
+def load_existing(kind, supplier_ids):
+    """{key: {(from, to): (version, rates)}} for the suppliers on the sheet (one query)."""
+    spec = SHEETS[kind]
+    existing = defaultdict(dict)
+    columns = (f'{spec.supplier_field}_id', 'room_type_id', 'meal_plan_id', 'from_date', 'to_date', 'version')
+    for values in (
+        spec.price_model.objects.filter(**{f'{spec.supplier_field}_id__in': supplier_ids})
+        .values_list(*columns, *spec.rate_fields).iterator(chunk_size=CHUNK_SIZE)
+    ):
+        key, (start, end, version), rates = values[:3], values[3:6], values[6:]
+        existing[key][(start, end)] = (version, dict(zip(spec.rate_fields, rates)))
+    return existing
+
+
+# ==========================================
+# IMPORT
+# ==========================================
+def _same(old, new):
+    return all((old.get(name) is None and new[name] is None) or (
+        old.get(name) is not None and new[name] is not None and Decimal(old[name]) == new[name]
+    ) for name in new)
+
+
+def import_rate_sheet(kind, upload, filename='', dry_run=False, partial=False, chunk_size=CHUNK_SIZE):
+    """
+    Validate and upsert one rate sheet. Nothing is written when any row is
+    invalid or overlaps, unless ``partial`` (then only the clean rows are).
+    """
+    spec = SHEETS[kind]
+    result = ImportResult(kind)
+    parsed = parse_sheet(kind, read_rows(upload, filename), result)
+    existing = load_existing(kind, {key[0] for key in parsed})
+    result.conflicts, bad_rows = find_conflicts(parsed, existing)
+    error_rows = {error['row'] for error in result.errors}
+
+    to_write = []
+    for key, rows in parsed.items():
+        supplier_id, room_type_id, meal_plan_id = key
+        for start, end, rates, number in rows:
+            if number in bad_rows:
+                continue
+            stored = existing.get(key, {}).get((start, end))
+            if stored and _same(stored[1], rates):
+                result.unchanged += 1
+                continue
+            if stored:
+                result.updated += 1
+            else:
+                result.created += 1
+            result.changed.append({
+                'row': number, 'supplier_id': supplier_id, 'room_type_id': room_type_id, 'meal_plan_id': meal_plan_id,
+                'from_date': start.isoformat(), 'to_date': end.isoformat(),
+                'action': 'updated' if stored else 'created',
+            })
+            to_write.append(spec.price_model(**{
+                f'{spec.supplier_field}_id': supplier_id,
+                'room_type_id': room_type_id,
+                'meal_plan_id': meal_plan_id,
+                'from_date': start,
+                'to_date': end,
+                'version': stored[0] + 1 if stored else 1,
+                **rates,
+            }))
+
+    if dry_run or not to_write or ((error_rows or bad_rows) and not partial):
+        return result
+
+    with transaction.atomic():
+        spec.price_model.objects.bulk_create(
+            to_write, batch_size=chunk_size, update_conflicts=True,
+            unique_fields=spec.unique_fields, update_fields=[*spec.rate_fields, 'version'],
+        )
+        rates_changed(kind, result.changed)
+    result.written = True
+    return result
+
+
+def rates_changed(kind, changed):
+    """What the price model signals do per row, once for a bulk write of the ``changed`` entries."""
+    spec = SHEETS[kind]
+    supplier_ids = {entry['supplier_id'] for entry in changed}
+    invalidate_rate_index()
+    invalidate_line_prices(spec.booking_model, **{f'{spec.supplier_field}_id__in': supplier_ids})
+    catalog_options.touch(kind, *supplier_ids)
+    rate_changes.enqueue(
+        (kind, entry['supplier_id'], date.fromisoformat(entry['from_date']), date.fromisoformat(entry['to_date']))
+        for entry in changed
+    )
@@ -0,0 +1,317 @@
+# rate_index.py
+"""
+In-memory seasonal rate index.
+
+Loads Hotelprice / HouseboatPrice / VehiclePricing / ActivityPrice rows once
+and keeps them as sorted date intervals per supplier key, so "which rule
+covers date D" is answered with a bisect instead of one SQL query per booking.
+
+Each key also materialises a nightly rate calendar (contiguous date segments
+with the rule in force), so a stay is priced night by night across season
+boundaries. When a rate row changes only its key is rebuilt.
+"""
+from bisect import bisect_right
+from datetime import timedelta
+from django.db import connection
+from .models import (
+    HotelBooking, VehicleBooking, ActivityBooking, HouseboatBooking,
+    Hotelprice, VehiclePricing, ActivityPrice, HouseboatPrice
+)
+from . import revisions
+
+
+RATE_INDEX_REVISION = 'rate_index'
+
+ONE_DAY = timedelta(days=1)
+
+
+class IntervalList:
+    """
+    Rate rules for a single key, sorted by from_date.
+
+    ``reach[i]`` is the furthest to_date among rules[0..i], which lets
+    ``covering`` stop scanning as soon as no earlier rule can reach the date.
+    """
+    __slots__ = ('starts', 'rules', 'reach', '_calendar')
+
+    def __init__(self, rules):
+        self._calendar = None
+        self.rules = sorted(rules, key=lambda r: (r.from_date, r.pk))
+        self.starts = [r.from_date for r in self.rules]
+        self.reach = []
+        furthest = None
+        for rule in self.rules:
+            if furthest is None or rule.to_date > furthest:
+                furthest = rule.to_date
+            self.reach.append(furthest)
+
+    def covering(self, day, predicate=None):
+        """Return the rule covering ``day`` (lowest pk wins, like ``.first()``)."""
+        if day is None:
+            return None
+        match = None
+        i = bisect_right(self.starts, day)
+        while i > 0:
+            i -= 1
+            if self.reach[i] < day:
+                break
+            rule = self.rules[i]
+            if rule.to_date < day or (predicate and not predicate(rule)):
+                continue
+            if match is None or rule.pk < match.pk:
+                match = rule
+        return match
+
+    def overlaps(self, start, end):
+        """True when any rule overlaps the inclusive range ``start``..``end``."""
+        i = bisect_right(self.starts, end)
+        return i > 0 and self.reach[i - 1] >= start
+
+    def overlapping(self, start, end):
+        """Every rule overlapping the inclusive range ``start``..``end``."""
+        matches = []
+        i = bisect_right(self.starts, end)
+        while i > 0:
+            i -= 1
+            if self.reach[i] < start:
+                break
+            if self.rules[i].to_date >= start:
+                matches.append(self.rules[i])
+        return matches
+
+    def first(self):
+        """Lowest pk rule for this key regardless of dates."""
+        return min(self.rules, key=lambda r: r.pk) if self.rules else None
+
+    def calendar(self):
+        """
+        Nightly rate calendar as parallel lists: ``starts[i]`` is the first
+        date of a segment and ``segment_rules[i]`` the rule in force from
+        then until the next start (None where nothing covers).
+        """
+        if self._calendar is None:
+            starts = sorted({r.from_date for r in self.rules} | {r.to_date + ONE_DAY for r in self.rules})
+            self._calendar = (starts, [self.covering(day) for day in starts])
+        return self._calendar
+
+    def nightly(self, check_in, nights):
+        """Rule for each of ``nights`` nights starting ``check_in``."""
+        starts, segment_rules = self.calendar()
+        i = bisect_right(starts, check_in) - 1
+        day = check_in
+        rules = []
+        for _ in range(nights):
+            while i + 1 < len(starts) and starts[i + 1] <= day:
+                i += 1
+            rules.append(segment_rules[i] if i >= 0 else None)
+            day += ONE_DAY
+        return rules
+
+    def __len__(self):
+        return len(self.rules)
+
+
+def _group(rules, key_func):
+    grouped = {}
+    for rule in rules:
+        grouped.setdefault(key_func(rule), []).append(rule)
+    return {key: IntervalList(items) for key, items in grouped.items()}
+
+
+def _scoped(queryset, field, ids):
+    """None means the whole table, an empty collection means nothing to load."""
+    if ids is None:
+        return queryset
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return queryset.none()
+    return queryset.filter(**{f'{field}__in': ids})
+
+
+# Rate model -> (RateIndex table attribute, key of a rule in that table)
+RULE_KEYS = {
+    Hotelprice: ('hotels', lambda r: (r.hotel_id, r.room_type_id, r.meal_plan_id)),
+    HouseboatPrice: ('houseboats', lambda r: (r.houseboat_id, r.room_type_id, r.meal_plan_id)),
+    VehiclePricing: ('vehicles', lambda r: r.vehicle_id),
+    ActivityPrice: ('activities', lambda r: r.activity_id),
+}
+
+
+class RateIndex:
+    """
+    Date-interval index over all four rate tables.
+
+    Build one with ``RateIndex.load(...)`` (at most one query per rate table)
+    or ``RateIndex.for_bookings(bookings)`` and then resolve every booking's
+    rule in memory.
+    """
+
+    def __init__(self, hotels=None, houseboats=None, vehicles=None, activities=None):
+        self.hotels = hotels or {}
+        self.houseboats = houseboats or {}
+        self.vehicles = vehicles or {}
+        self.activities = activities or {}
+
+    @classmethod
+    def load(cls, hotel_ids=None, houseboat_ids=None, vehicle_ids=None, activity_ids=None):
+        hotel_rules = _scoped(Hotelprice.objects.all(), 'hotel_id', hotel_ids)
+        houseboat_rules = _scoped(HouseboatPrice.objects.all(), 'houseboat_id', houseboat_ids)
+        vehicle_rules = _scoped(VehiclePricing.objects.all(), 'vehicle_id', vehicle_ids)
+        activity_rules = _scoped(ActivityPrice.objects.all(), 'activity_id', activity_ids)
+
+        return cls(
+            hotels=_group(hotel_rules, RULE_KEYS[Hotelprice][1]),
+            houseboats=_group(houseboat_rules, RULE_KEYS[HouseboatPrice][1]),
+            vehicles=_group(vehicle_rules, RULE_KEYS[VehiclePricing][1]),
+            activities=_group(activity_rules, RULE_KEYS[ActivityPrice][1]),
+        )
+
+    @classmethod
+    def for_bookings(cls, bookings):
+        """Load only the rate rows for suppliers referenced by ``bookings``."""
+        hotel_ids, houseboat_ids, vehicle_ids, activity_ids = set(), set(), set(), set()
+        for booking in bookings:
+            if isinstance(booking, HotelBooking):
+                hotel_ids.add(booking.hotel_id)
+            elif isinstance(booking, HouseboatBooking):
+                houseboat_ids.add(booking.houseboat_id)
+            elif isinstance(booking, VehicleBooking):
+                vehicle_ids.add(booking.vehicle_id)
+            elif isinstance(booking, ActivityBooking):
+                activity_ids.add(booking.activity_id)
+        return cls.load(hotel_ids, houseboat_ids, vehicle_ids, activity_ids)
+
+    # ------------------------------------------------------------------
+    # Lookups
+    # ------------------------------------------------------------------
+    def hotel_rule(self, hotel_id, room_type_id, meal_plan_id, day):
+        intervals = self.hotels.get((hotel_id, room_type_id, meal_plan_id))
+        return intervals.covering(day) if intervals else None
+
+    def houseboat_rule(self, houseboat_id, room_type_id, meal_plan_id, day):
+        intervals = self.houseboats.get((houseboat_id, room_type_id, meal_plan_id))
+        return intervals.covering(day) if intervals else None
+
+    def vehicle_rule(self, vehicle_id, day, active_only=False):
+        intervals = self.vehicles.get(vehicle_id)
+        if not intervals:
+            return None
+        return intervals.covering(day, predicate=(lambda r: r.is_active) if active_only else None)
+
+    def activity_rule(self, activity_id, day, fallback=True):
+        """Rule covering ``day``; falls back to any rule for the activity when ``fallback``."""
+        intervals = self.activities.get(activity_id)
+        if not intervals:
+            return None
+        return intervals.covering(day) or (intervals.first() if fallback else None)
+
+    def hotel_rate_overlaps(self, hotel_id, room_type_id, meal_plan_id, start, end):
+        intervals = self.hotels.get((hotel_id, room_type_id, meal_plan_id))
+        return bool(intervals) and intervals.overlaps(start, end)
+
+    def houseboat_rate_overlaps(self, houseboat_id, room_type_id, meal_plan_id, start, end):
+        intervals = self.houseboats.get((houseboat_id, room_type_id, meal_plan_id))
+        return bool(intervals) and intervals.overlaps(start, end)
+
+    def hotel_nights(self, hotel_id, room_type_id, meal_plan_id, check_in, nights):
+        intervals = self.hotels.get((hotel_id, room_type_id, meal_plan_id))
+        return intervals.nightly(check_in, nights) if intervals else [None] * nights
+
+    def houseboat_nights(self, houseboat_id, room_type_id, meal_plan_id, check_in, nights):
+        intervals = self.houseboats.get((houseboat_id, room_type_id, meal_plan_id))
+        return intervals.nightly(check_in, nights) if intervals else [None] * nights
+
+    def nightly_rules(self, booking, nights):
+        """Rule in force for each night of a hotel or houseboat stay."""
+        if isinstance(booking, HotelBooking):
+            return self.hotel_nights(booking.hotel_id, booking.room_type_id, booking.meal_plan_id, booking.check_in_date, nights)
+        return self.houseboat_nights(booking.houseboat_id, booking.room_type_id, booking.meal_plan_id, booking.check_in_date, nights)
+
+    def rule_for(self, booking):
+        """Resolve the covering rule for any booking type."""
+        if isinstance(booking, HotelBooking):
+            return self.hotel_rule(booking.hotel_id, booking.room_type_id, booking.meal_plan_id, booking.check_in_date)
+        if isinstance(booking, HouseboatBooking):
+            return self.houseboat_rule(booking.houseboat_id, booking.room_type_id, booking.meal_plan_id, booking.check_in_date)
+        if isinstance(booking, VehicleBooking):
+            # Deactivated vehicle rates are kept for reference but never priced
+            return self.vehicle_rule(booking.vehicle_id, booking.pickup_date, active_only=True)
+        if isinstance(booking, ActivityBooking):
+            return self.activity_rule(booking.activity_id, booking.booking_date)
+        return None
+
+
+    # ------------------------------------------------------------------
+    # Incremental maintenance
+    # ------------------------------------------------------------------
+    def apply_change(self, rule, deleted=False):
+        """
+        Replace (or drop) one rate row and rebuild only the keys it touches:
+        its current key plus the one it was filed under before an edit.
+        """
+        attr, key_func = RULE_KEYS[type(rule)]
+        table = getattr(self, attr)
+        new_key = None if deleted else key_func(rule)
+
+        touched = {key for key, intervals in table.items() if any(r.pk == rule.pk for r in intervals.rules)}
+        if new_key is not None:
+            touched.add(new_key)
+
+        for key in touched:
+            current = table.get(key)
+            rules = [r for r in current.rules if r.pk != rule.pk] if current else []
+            if key == new_key:
+                rules.append(rule)
+            if rules:
+                table[key] = IntervalList(rules)
+            else:
+                table.pop(key, None)
+
+
+# ----------------------------------------------------------------------
+# Process-wide shared index (invalidated by price model signals)
+# ----------------------------------------------------------------------
+_shared = {'version': None, 'index': None}
+
+
+def current_rate_version():
+    return revisions.value(RATE_INDEX_REVISION)
+
+
+def get_rate_index():
+    """
+    Whole-catalog index shared across requests in this process.
+
+    Rebuilt lazily whenever the rate revision (a database counter bumped
+    when a price row is saved or deleted, see signals.py) moves, so an edit
+    on any worker reaches every process.
+    """
+    version = current_rate_version()
+    if _shared['index'] is None or _shared['version'] != version:
+        _shared['index'] = RateIndex.load()
+        _shared['version'] = version
+    return _shared['index']
+
+
+def invalidate_rate_index():
+    revisions.bump(RATE_INDEX_REVISION)
+    _shared['index'] = None
+
+
+def rate_rule_changed(rule, deleted=False):
+    """
+    Bring the shared index up to date after one rate row changed.
+
+    Outside a transaction this process patches just the affected key in
+    place when its index was current up to this change; inside one (where
+    the change may still roll back) the index is dropped and rebuilt on
+    next use. Other workers see the new revision and rebuild either way.
+    """
+    version = revisions.bump(RATE_INDEX_REVISION)[RATE_INDEX_REVISION]
+
+    index = _shared['index']
+    if index is None or _shared['version'] != version - 1 or connection.in_atomic_block:
+        _shared['index'] = None
+        return
+    index.apply_change(rule, deleted)
+    _shared['version'] = version
@@ -0,0 +1,52 @@
+# revisions.py
+"""
+Database-backed revision counters for the process-local caches.
+
+The rate index, hotel search index, booking option lists and version
+diffs are kept per process (and in the per-process LocMemCache), keyed on
+a revision. The revisions used to live in that cache too, so an edit only
+retired the copies of the worker that made it. They are CacheRevision
+rows instead: ``bump`` increments them inside the writer's transaction
+(a rolled-back edit rolls its bump back) and ``current`` reads them in
+one query, so every worker sees a committed change on its next lookup.
+"""
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from .models import CacheRevision
+
+
+def current(*names):
+    """{name: (value, changed_at)}; a name never bumped is (0, None)."""
+    found = {
+        name: (value, changed_at)
+        for name, value, changed_at in CacheRevision.objects.filter(name__in=names).values_list('name', 'value', 'changed_at')
+    }
+    return {name: found.get(name, (0, None)) for name in names}
+
+
+def value(name):
+    return current(name)[name][0]
+
+
+def bump(*names):
+    """Increment each named revision; returns {name: new value}."""
+    names = sorted({name for name in names if name})
+    if not names:
+        return {}
+    moment = timezone.now()
+    with transaction.atomic():
+        CacheRevision.objects.filter(name__in=names).update(value=F('value') + 1, changed_at=moment)
+        values = dict(CacheRevision.objects.filter(name__in=names).values_list('name', 'value'))
+        for name in names:
+            if name in values:
+                continue
+            try:
+                with transaction.atomic():
+                    CacheRevision.objects.create(name=name, value=1, changed_at=moment)
+                values[name] = 1
+            except IntegrityError:
+                # Another writer created it first
+                CacheRevision.objects.filter(name=name).update(value=F('value') + 1, changed_at=moment)
+                values[name] = CacheRevision.objects.filter(name=name).values_list('value', flat=True).get()
+    return values
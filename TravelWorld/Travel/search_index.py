@@ -0,0 +1,257 @@
+# search_index.py
+"""
+Search index for the query, itinerary and lead lists.
+
+Every Query, Itinerary and Lead has one SearchDocument holding its
+normalised searchable text: name (an itinerary's own name plus its
+client's), phone digits, email and query id. The search boxes match
+against these documents instead of running icontains over the source
+tables and their joins:
+
+* SQLite: the documents are mirrored into an FTS5 table with the trigram
+  tokenizer (rowid = SearchDocument id), so substring matches of three or
+  more characters are index lookups. Shorter tokens fall back to LIKE on
+  the same table.
+* PostgreSQL: the document columns carry pg_trgm GIN indexes, which serve
+  the icontains lookups.
+* Anything else (or SQLite built without FTS5): icontains on the document
+  columns, still one narrow table with no joins.
+
+Phone numbers are stored and searched as digits only, with the last ten
+digits kept too, so "+91 98470-12345", "098470 12345" and "9847012345"
+all find the same client.
+
+signals.py keeps the documents current on save / delete (a query edit
+re-indexes its itineraries, which carry its name and phone). Bulk writes
+skip the signals and call ``reindex`` themselves;
+``manage.py rebuild_search_index`` rebuilds everything.
+"""
+import re
+import unicodedata
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from .models import SearchDocument, Query, Itinerary, Lead
+
+
+ENTITIES = ('query', 'itinerary', 'lead')
+SEARCH_FIELDS = ('name', 'phone', 'email', 'ref')
+
+FTS_TABLE = 'travel_search_fts'  # Created by migration 0028 where SQLite has FTS5
+TRIGRAM_MIN = 3  # FTS5 trigram MATCH needs at least three characters
+
+# Source fields read per entity, in the order ``document`` expects
+SOURCE_FIELDS = {
+    'query': ('client_name', 'phone_number', 'email', 'query_id'),
+    'itinerary': ('name', 'query__client_name', 'query__phone_number', 'query__email', 'query__query_id'),
+    'lead': ('name', 'phone', 'email'),
+}
+SOURCE_MODELS = {'query': Query, 'itinerary': Itinerary, 'lead': Lead}
+
+CHUNK_SIZE = 500
+
+PHONE_TERM = re.compile(r'[\d\s()+.\-]+')
+
+
+# ==========================================
+# NORMALISATION
+# ==========================================
+def normalise(text):
+    """Lower case, accents stripped, whitespace collapsed."""
+    text = unicodedata.normalize('NFKD', str(text or ''))
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    return ' '.join(text.lower().split())
+
+
+def phone_digits(phone):
+    """Digits of a phone number, plus its last ten when it has a country / trunk prefix."""
+    digits = re.sub(r'\D', '', str(phone or ''))
+    return f'{digits} {digits[-10:]}' if len(digits) > 10 else digits
+
+
+def document(entity, values):
+    """(name, phone, email, ref) of one row read as ``SOURCE_FIELDS[entity]``."""
+    if entity == 'itinerary':
+        name, client_name, phone, email, ref = values
+        name = f'{name or ""} {client_name or ""}'
+    elif entity == 'query':
+        name, phone, email, ref = values
+    else:
+        name, phone, email = values
+        ref = ''
+    return normalise(name), phone_digits(phone), normalise(email), normalise(ref)
+
+
+def search_tokens(term):
+    """
+    Tokens every match must contain. A phone-shaped term is one token of
+    its digits (the last ten when longer), whatever the spacing or prefix.
+    """
+    term = (term or '').strip()
+    if PHONE_TERM.fullmatch(term):
+        digits = re.sub(r'\D', '', term)
+        if len(digits) >= TRIGRAM_MIN:
+            return [digits[-10:]]
+    return normalise(term).split()
+
+
+# ==========================================
+# BACKEND
+# ==========================================
+_fts_tables = {}
+
+
+def fts_enabled():
+    """True when the FTS5 mirror exists on the default database."""
+    if connection.vendor != 'sqlite':
+        return False
+    key = connection.settings_dict['NAME']
+    if key not in _fts_tables:
+        _fts_tables[key] = FTS_TABLE in connection.introspection.table_names()
+    return _fts_tables[key]
+
+
+def _fts_write(cursor, rows):
+    """Replace the FTS rows of ``rows`` [(doc id, entity, object id, name, phone, email, ref)]."""
+    ids = [row[0] for row in rows]
+    for start in range(0, len(ids), CHUNK_SIZE):
+        chunk = ids[start:start + CHUNK_SIZE]
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+    cursor.executemany(
+        f"INSERT INTO {FTS_TABLE} (rowid, entity, object_id, name, phone, email, ref) VALUES (%s, %s, %s, %s, %s, %s, %s)",
+        rows
+    )
+
+
+def _fts_delete(cursor, doc_ids):
+    doc_ids = list(doc_ids)
+    for start in range(0, len(doc_ids), CHUNK_SIZE):
+        chunk = doc_ids[start:start + CHUNK_SIZE]
+        cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE rowid IN ({', '.join(['%s'] * len(chunk))})", chunk)
+
+
+# ==========================================
+# SEARCH
+# ==========================================
+def _fts_matches(entity, tokens, fields):
+    """RawSQL selecting the object ids whose document contains every token in one of ``fields``."""
+    columns = ' '.join(fields)
+    match = []
+    where = ['entity = %s']
+    params = [entity]
+    for token in tokens:
+        if len(token) >= TRIGRAM_MIN:
+            match.append(f'{{{columns}}} : "{token.replace(chr(34), chr(34) * 2)}"')
+        else:
+            pattern = '%' + token.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            where.append('(' + ' OR '.join(f"{field} LIKE %s ESCAPE '\\'" for field in fields) + ')')
+            params.extend([pattern] * len(fields))
+    if match:
+        where.append(f'{FTS_TABLE} MATCH %s')
+        params.append(' AND '.join(match))
+    return RawSQL(f"SELECT object_id FROM {FTS_TABLE} WHERE {' AND '.join(where)}", params)
+
+
+def _document_matches(entity, tokens, fields):
+    documents = SearchDocument.objects.filter(entity=entity)
+    for token in tokens:
+        any_field = Q()
+        for field in fields:
+            any_field |= Q(**{f'{field}__icontains': token})
+        documents = documents.filter(any_field)
+    return documents.values('object_id')
+
+
+def search_filter(queryset, entity, term, fields=SEARCH_FIELDS):
+    """
+    ``queryset`` narrowed to the rows whose search document matches
+    ``term`` in any of ``fields``: every token of the term must appear
+    somewhere in those fields. An empty term leaves it unchanged.
+    """
+    tokens = search_tokens(term)
+    if not tokens:
+        return queryset
+    if fts_enabled():
+        return queryset.filter(pk__in=_fts_matches(entity, tokens, fields))
+    return queryset.filter(pk__in=_document_matches(entity, tokens, fields))
+
+
+# ==========================================
+# INDEXING
+# ==========================================
+def reindex(entity, ids):
+    """
+    Bring the documents of ``ids`` in line with their source rows: changed
+    ones are rewritten, vanished rows' documents removed. Returns the
+    number of documents written or removed.
+    """
+    ids = set(ids)
+    if not ids:
+        return 0
+    current = {}
+    for pk, *values in SOURCE_MODELS[entity].objects.filter(pk__in=ids).values_list('pk', *SOURCE_FIELDS[entity]):
+        current[pk] = document(entity, values)
+    stored = {doc.object_id: doc for doc in SearchDocument.objects.filter(entity=entity, object_id__in=ids)}
+
+    new, changed = [], []
+    for pk, fields in current.items():
+        doc = stored.get(pk)
+        if doc is None:
+            new.append(SearchDocument(entity=entity, object_id=pk, **dict(zip(SEARCH_FIELDS, fields))))
+        elif tuple(getattr(doc, name) for name in SEARCH_FIELDS) != fields:
+            for name, value in zip(SEARCH_FIELDS, fields):
+                setattr(doc, name, value)
+            changed.append(doc)
+    gone = [doc.id for pk, doc in stored.items() if pk not in current]
+    if not (new or changed or gone):
+        return 0
+
+    with transaction.atomic():
+        SearchDocument.objects.bulk_create(new, batch_size=CHUNK_SIZE)
+        SearchDocument.objects.bulk_update(changed, list(SEARCH_FIELDS), batch_size=CHUNK_SIZE)
+        SearchDocument.objects.filter(id__in=gone).delete()
+        if fts_enabled():
+            if new and new[0].id is None:
+                # Backend did not return the new ids
+                new = list(SearchDocument.objects.filter(entity=entity, object_id__in=[doc.object_id for doc in new]))
+            with connection.cursor() as cursor:
+                _fts_delete(cursor, gone)
+                _fts_write(cursor, [
+                    (doc.id, entity, doc.object_id, *(getattr(doc, name) for name in SEARCH_FIELDS))
+                    for doc in new + changed
+                ])
+    return len(new) + len(changed) + len(gone)
+
+
+def remove(entity, ids):
+    """Drop the documents of deleted rows."""
+    documents = SearchDocument.objects.filter(entity=entity, object_id__in=list(ids))
+    with transaction.atomic():
+        if fts_enabled():
+            with connection.cursor() as cursor:
+                _fts_delete(cursor, documents.values_list('id', flat=True))
+        documents.delete()
+
+
+def query_itinerary_ids(query_id):
+    return list(Itinerary.objects.filter(query_id=query_id).values_list('id', flat=True))
+
+
+def rebuild(entities=ENTITIES):
+    """
+    Re-index every row of ``entities`` from scratch, chunk by chunk.
+    Returns {entity: documents}.
+    """
+    report = {}
+    for entity in entities:
+        documents = SearchDocument.objects.filter(entity=entity)
+        with transaction.atomic():
+            if fts_enabled():
+                with connection.cursor() as cursor:
+                    cursor.execute(f"DELETE FROM {FTS_TABLE} WHERE entity = %s", [entity])
+            documents.delete()
+        ids = list(SOURCE_MODELS[entity].objects.order_by('pk').values_list('pk', flat=True))
+        for start in range(0, len(ids), CHUNK_SIZE):
+            reindex(entity, ids[start:start + CHUNK_SIZE])
+        report[entity] = documents.count()
+    return report
@@ -0,0 +1,69 @@
+# sequences.py
+"""
+Counter-table sequences for human-facing ids.
+
+Query ids (dh01, dh02...) used to be derived from the last query row,
+which raced under concurrent intake: two requests read the same last id
+and one of them failed on the unique ``query_id``. ``allocate`` instead
+bumps an IdSequence row with one ``UPDATE ... SET value = value + n`` and
+reads the new value back in the same transaction. The UPDATE takes the
+row lock (the database write lock on SQLite), so other workers wait for
+the transaction to finish rather than reading a stale value, and each
+allocation is O(1) however many queries exist.
+
+Allocation runs inside the caller's transaction: if the insert that uses
+the number rolls back, so does the counter, and the numbers stay gap-free
+(a deleted query's number is not reused). Bulk intake allocates a block
+of ``n`` ids with one UPDATE.
+"""
+import re
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from .models import IdSequence
+
+
+QUERY_ID_SEQUENCE = 'query_id'
+QUERY_ID_PREFIX = 'dh'
+
+_QUERY_NUMBER = re.compile(rf'^{QUERY_ID_PREFIX}(\d+)$')
+
+
+def allocate(name, count=1, seed=None):
+    """
+    Reserve ``count`` consecutive values of sequence ``name``; returns the
+    range of them. A missing sequence is created starting after ``seed()``
+    (0 without one). Must be used inside the transaction that consumes the
+    values to stay gap-free.
+    """
+    if count < 1:
+        return range(0)
+    with transaction.atomic():
+        for _ in range(2):
+            if IdSequence.objects.filter(name=name).update(value=F('value') + count):
+                last = IdSequence.objects.filter(name=name).values_list('value', flat=True).get()
+                return range(last - count + 1, last + 1)
+            try:
+                with transaction.atomic():
+                    start = seed() if seed else 0
+                    IdSequence.objects.create(name=name, value=start + count)
+                    return range(start + 1, start + count + 1)
+            except IntegrityError:
+                # Another worker created it first; bump it like any other time
+                continue
+    raise IntegrityError(f"Could not allocate from sequence {name!r}")
+
+
+def format_query_id(number):
+    return f'{QUERY_ID_PREFIX}{number:02d}'  # Format: dh01, dh02, dh03...
+
+
+def highest_query_number():
+    """Largest number among the existing query ids (seeds the sequence once)."""
+    from .models import Query
+    numbers = (_QUERY_NUMBER.match(query_id or '') for query_id in Query.objects.values_list('query_id', flat=True).iterator())
+    return max((int(match.group(1)) for match in numbers if match), default=0)
+
+
+def next_query_ids(count=1):
+    """``count`` fresh query ids, in order."""
+    return [format_query_id(number) for number in allocate(QUERY_ID_SEQUENCE, count, seed=highest_query_number)]
@@ -22,11 +22,12 @@ class LeadSerializer(serializers.ModelSerializer):
         read_only_fields = ["id","created_at"]
 
 class LeadInSerializer(serializers.Serializer):
-    name = serializers.CharField()
-    email = serializers.EmailField(required=False, allow_null=True, allow_blank=True)
-    phone = serializers.CharField(required=False, allow_blank=True)
+    # Lengths match the Lead columns so one oversized field fails its own item, not the insert
+    name = serializers.CharField(max_length=100)
+    email = serializers.EmailField(required=False, allow_null=True, allow_blank=True, max_length=254)
+    phone = serializers.CharField(required=False, allow_blank=True, max_length=20)
     message = serializers.CharField(required=False, allow_blank=True)
-    from_url = serializers.CharField(required=False, allow_blank=True, allow_null=True)
+    from_url = serializers.CharField(required=False, allow_blank=True, allow_null=True, max_length=200)
 
 
 class PhpWebhookAuth(permissions.BasePermission):
@@ -0,0 +1,276 @@
+# signals.py
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import (
+    Hotel, Houseboat, RoomType, MealPlan, Hotelprice, HouseboatPrice, VehiclePricing, ActivityPrice,
+    Query, Itinerary, ItineraryDayPlan, HotelBooking, VehicleBooking, ActivityBooking, HouseboatBooking, StandaloneInclusionBooking,
+    HotelBookingInclusion, HouseboatBookingInclusion, ItineraryPricingOption, Lead
+)
+from .rate_index import rate_rule_changed
+from .hotel_search import invalidate_hotel_index
+from . import catalog_options, rate_changes
+from .pricing import CACHE_FIELDS, invalidate_line_prices
+from .pricing_summary import mark_stale
+from . import version_diff
+from . import query_listing, status_counters, search_index
+
+
+# Bookings whose cached line price may depend on a rate row
+RATE_BOOKINGS = {
+    Hotelprice: (HotelBooking, ('hotel_id', 'room_type_id', 'meal_plan_id')),
+    HouseboatPrice: (HouseboatBooking, ('houseboat_id', 'room_type_id', 'meal_plan_id')),
+    VehiclePricing: (VehicleBooking, ('vehicle_id',)),
+    ActivityPrice: (ActivityBooking, ('activity_id',)),
+}
+
+
+# ==========================================
+# RATE INDEX MAINTENANCE
+# ==========================================
+@receiver(post_save, sender=Hotelprice)
+@receiver(post_save, sender=HouseboatPrice)
+@receiver(post_save, sender=VehiclePricing)
+@receiver(post_save, sender=ActivityPrice)
+@receiver(post_delete, sender=Hotelprice)
+@receiver(post_delete, sender=HouseboatPrice)
+@receiver(post_delete, sender=VehiclePricing)
+@receiver(post_delete, sender=ActivityPrice)
+def price_rule_changed(sender, instance, signal, **kwargs):
+    """
+    Any change to a rate row updates the shared rate index and drops the
+    cached line prices of bookings on that rate card.
+    """
+    rate_rule_changed(instance, deleted=signal is post_delete)
+    model, lookup = RATE_BOOKINGS[sender]
+    invalidate_line_prices(model, **{field: getattr(instance, field) for field in lookup})
+
+
+# ==========================================
+# RATE CHANGE QUEUE
+# ==========================================
+@receiver(pre_save, sender=Hotelprice)
+@receiver(pre_save, sender=HouseboatPrice)
+@receiver(pre_save, sender=VehiclePricing)
+@receiver(pre_save, sender=ActivityPrice)
+def rate_row_saving(sender, instance, **kwargs):
+    """Remember the supplier and dates an edited rate row had, in case they move."""
+    if instance.pk:
+        field = rate_changes.RATE_SOURCES[sender][1]
+        previous = sender.objects.filter(pk=instance.pk).values_list(field, 'from_date', 'to_date').first()
+        instance._previous_rate = (rate_changes.RATE_SOURCES[sender][0], *previous) if previous else None
+
+
+@receiver(post_save, sender=Hotelprice)
+@receiver(post_save, sender=HouseboatPrice)
+@receiver(post_save, sender=VehiclePricing)
+@receiver(post_save, sender=ActivityPrice)
+@receiver(post_delete, sender=Hotelprice)
+@receiver(post_delete, sender=HouseboatPrice)
+@receiver(post_delete, sender=VehiclePricing)
+@receiver(post_delete, sender=ActivityPrice)
+def rate_row_changed(sender, instance, **kwargs):
+    """Queue the old and new (supplier, dates) of the row for the repricing worker."""
+    changes = [rate_changes.rate_range(instance)]
+    if getattr(instance, '_previous_rate', None):
+        changes.append(instance._previous_rate)
+    rate_changes.enqueue(changes)
+
+
+# ==========================================
+# HOTEL SEARCH INDEX MAINTENANCE
+# ==========================================
+@receiver(post_save, sender=Hotel)
+@receiver(post_save, sender=RoomType)
+@receiver(post_save, sender=MealPlan)
+@receiver(post_delete, sender=Hotel)
+@receiver(post_delete, sender=RoomType)
+@receiver(post_delete, sender=MealPlan)
+def hotel_catalog_changed(sender, instance, **kwargs):
+    """Status, destination and names feed the hotel search index (rates follow the rate index)."""
+    invalidate_hotel_index()
+
+
+# ==========================================
+# BOOKING MODAL OPTION CACHE INVALIDATION
+# ==========================================
+@receiver(post_save, sender=Hotel)
+@receiver(post_save, sender=Houseboat)
+@receiver(post_save, sender=Hotelprice)
+@receiver(post_save, sender=HouseboatPrice)
+@receiver(post_delete, sender=Hotel)
+@receiver(post_delete, sender=Houseboat)
+@receiver(post_delete, sender=Hotelprice)
+@receiver(post_delete, sender=HouseboatPrice)
+def supplier_options_changed(sender, instance, **kwargs):
+    kind, field = catalog_options.SUPPLIER_OF[sender]
+    previous = getattr(instance, '_previous_rate', None)
+    catalog_options.touch(kind, getattr(instance, field), previous[1] if previous else None)
+
+
+@receiver(post_save, sender=RoomType)
+@receiver(post_save, sender=MealPlan)
+@receiver(post_delete, sender=RoomType)
+@receiver(post_delete, sender=MealPlan)
+def option_names_changed(sender, instance, **kwargs):
+    catalog_options.touch_names()
+
+
+# ==========================================
+# LINE PRICE CACHE INVALIDATION
+# ==========================================
+@receiver(pre_save, sender=HotelBooking)
+@receiver(pre_save, sender=HouseboatBooking)
+@receiver(pre_save, sender=VehicleBooking)
+@receiver(pre_save, sender=ActivityBooking)
+def booking_saving(sender, instance, update_fields=None, **kwargs):
+    """A full save may change any pricing input, so drop the cached line price."""
+    if update_fields is None:
+        instance.priced_net = None
+
+
+@receiver(post_save, sender=HotelBooking)
+@receiver(post_save, sender=HouseboatBooking)
+@receiver(post_save, sender=VehicleBooking)
+@receiver(post_save, sender=ActivityBooking)
+def booking_partially_saved(sender, instance, update_fields=None, **kwargs):
+    if update_fields and not set(update_fields) <= set(CACHE_FIELDS):
+        invalidate_line_prices(sender, pk=instance.pk)
+
+
+@receiver(post_save, sender=HotelBookingInclusion)
+@receiver(post_delete, sender=HotelBookingInclusion)
+def hotel_inclusion_changed(sender, instance, **kwargs):
+    invalidate_line_prices(HotelBooking, pk=instance.hotel_booking_id)
+
+
+@receiver(post_save, sender=HouseboatBookingInclusion)
+@receiver(post_delete, sender=HouseboatBookingInclusion)
+def houseboat_inclusion_changed(sender, instance, **kwargs):
+    invalidate_line_prices(HouseboatBooking, pk=instance.houseboat_booking_id)
+
+
+# ==========================================
+# PRICING SUMMARY INVALIDATION
+# ==========================================
+@receiver(post_save, sender=HotelBooking)
+@receiver(post_save, sender=HouseboatBooking)
+@receiver(post_save, sender=VehicleBooking)
+@receiver(post_save, sender=ActivityBooking)
+@receiver(post_save, sender=StandaloneInclusionBooking)
+@receiver(post_save, sender=ItineraryPricingOption)
+@receiver(post_delete, sender=HotelBooking)
+@receiver(post_delete, sender=HouseboatBooking)
+@receiver(post_delete, sender=VehicleBooking)
+@receiver(post_delete, sender=ActivityBooking)
+@receiver(post_delete, sender=StandaloneInclusionBooking)
+@receiver(post_delete, sender=ItineraryPricingOption)
+def itinerary_pricing_changed(sender, instance, **kwargs):
+    """Flag the itinerary's pricing summary for rebuild in the same transaction."""
+    mark_stale(instance.itinerary_id)
+
+
+# ==========================================
+# VERSION DIFF INVALIDATION
+# ==========================================
+@receiver(post_save, sender=ItineraryDayPlan)
+@receiver(post_save, sender=HotelBooking)
+@receiver(post_save, sender=HouseboatBooking)
+@receiver(post_save, sender=VehicleBooking)
+@receiver(post_save, sender=ActivityBooking)
+@receiver(post_save, sender=StandaloneInclusionBooking)
+@receiver(post_save, sender=ItineraryPricingOption)
+@receiver(post_delete, sender=ItineraryDayPlan)
+@receiver(post_delete, sender=HotelBooking)
+@receiver(post_delete, sender=HouseboatBooking)
+@receiver(post_delete, sender=VehicleBooking)
+@receiver(post_delete, sender=ActivityBooking)
+@receiver(post_delete, sender=StandaloneInclusionBooking)
+@receiver(post_delete, sender=ItineraryPricingOption)
+def itinerary_content_changed(sender, instance, update_fields=None, **kwargs):
+    """Saving only the cached line price does not change what a diff shows."""
+    if update_fields and set(update_fields) <= set(CACHE_FIELDS):
+        return
+    version_diff.touch(instance.itinerary_id)
+
+
+@receiver(post_save, sender=Itinerary)
+@receiver(post_delete, sender=Itinerary)
+def itinerary_changed(sender, instance, **kwargs):
+    version_diff.touch(instance.id)
+
+
+@receiver(post_save, sender=HotelBookingInclusion)
+@receiver(post_delete, sender=HotelBookingInclusion)
+@receiver(post_save, sender=HouseboatBookingInclusion)
+@receiver(post_delete, sender=HouseboatBookingInclusion)
+def booking_inclusion_changed(sender, instance, **kwargs):
+    owner = HotelBooking if sender is HotelBookingInclusion else HouseboatBooking
+    booking_id = instance.hotel_booking_id if sender is HotelBookingInclusion else instance.houseboat_booking_id
+    version_diff.touch(owner.objects.filter(pk=booking_id).values_list('itinerary_id', flat=True).first())
+
+
+# ==========================================
+# QUERY LIST COUNT CACHE
+# ==========================================
+@receiver(post_save, sender=Query)
+@receiver(post_delete, sender=Query)
+def query_changed(sender, instance, **kwargs):
+    query_listing.touch()
+
+
+# ==========================================
+# DASHBOARD STATUS COUNTERS
+# ==========================================
+@receiver(pre_save, sender=Query)
+@receiver(pre_save, sender=Itinerary)
+@receiver(pre_delete, sender=Query)
+@receiver(pre_delete, sender=Itinerary)
+def counted_row_changing(sender, instance, **kwargs):
+    """Remember the counter cell the row is in before it is saved or deleted."""
+    instance._counter_state = status_counters.stored_state(sender, instance.pk) if instance.pk else (None, None)
+
+
+@receiver(post_save, sender=Query)
+@receiver(post_save, sender=Itinerary)
+def counted_row_saved(sender, instance, **kwargs):
+    old, old_query_id = getattr(instance, '_counter_state', (None, None))
+    if sender is Itinerary and old and old_query_id == instance.query_id:
+        # Same query: its owners are already in the stored cell
+        new = status_counters.cell_of(instance, query_owners=old[4:6])
+    else:
+        new = status_counters.cell_of(instance)
+    deltas = status_counters.move(old, new)
+    if sender is Query and old and old[4:6] != new[4:6]:
+        # The query's itineraries are counted under the query's owners too
+        deltas.update(status_counters.owners_moved(instance.pk, old[4:6], new[4:6]))
+    status_counters.apply(deltas)
+
+
+@receiver(post_delete, sender=Query)
+@receiver(post_delete, sender=Itinerary)
+def counted_row_deleted(sender, instance, **kwargs):
+    old, _ = getattr(instance, '_counter_state', (None, None))
+    status_counters.apply(status_counters.move(old, None))
+
+
+# ==========================================
+# SEARCH INDEX
+# ==========================================
+SEARCH_ENTITIES = {Query: 'query', Itinerary: 'itinerary', Lead: 'lead'}
+
+
+@receiver(post_save, sender=Query)
+@receiver(post_save, sender=Itinerary)
+@receiver(post_save, sender=Lead)
+def searchable_row_saved(sender, instance, **kwargs):
+    search_index.reindex(SEARCH_ENTITIES[sender], [instance.pk])
+    if sender is Query:
+        # Itinerary documents carry the client's name, phone and query id
+        search_index.reindex('itinerary', search_index.query_itinerary_ids(instance.pk))
+
+
+@receiver(post_delete, sender=Query)
+@receiver(post_delete, sender=Itinerary)
+@receiver(post_delete, sender=Lead)
+def searchable_row_deleted(sender, instance, **kwargs):
+    search_index.remove(SEARCH_ENTITIES[sender], [instance.pk])
@@ -0,0 +1,233 @@
+# status_counters.py
+"""
+Incrementally maintained status counts for the dashboard tiles.
+
+query_list and list_itineraries show counts per status over everything
+the user may see. Instead of aggregating Query / Itinerary on every page
+view, StatusCounter keeps one row per cell (entity, status, priority,
+creator, assignee, query creator, creation day). signals.py moves an
+object between cells when it is created, saved with a new status or
+owner, or deleted, so a tile is a sum over a few hundred counter rows.
+The cells partition the source rows, so even the OR-shaped manager
+scopes are exact sums.
+
+Bulk writes and raw updates skip the signals; ``reconcile`` rebuilds the
+cells from the source tables (``manage.py reconcile_status_counters``,
+run periodically) and reports any drift it corrects.
+"""
+import uuid
+from collections import Counter
+from datetime import datetime
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Q, F, Sum, Count
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+from .models import StatusCounter, Query, Itinerary
+
+
+REVISION_KEY = 'status_counters:rev:{}'
+TILES_KEY = 'status_counters:tiles:{}:{}:{}:{}'
+TILES_TIMEOUT = 60 * 5
+
+CELL_FIELDS = ('entity', 'status', 'priority', 'creator_id', 'assignee_id', 'query_creator_id', 'day')
+
+STATUSES = {
+    'query': [value for value, _ in Query.STATUS_CHOICES],
+    'itinerary': [value for value, _ in Itinerary.STATUS_CHOICES],
+}
+
+
+# ==========================================
+# CELLS
+# ==========================================
+def _day(moment):
+    if not isinstance(moment, datetime):
+        return moment  # already a date (TruncDate)
+    return timezone.localdate(moment) if timezone.is_aware(moment) else moment.date()
+
+
+def query_cell(status, priority, created_by_id, assign_id, created_at):
+    return ('query', status, priority or '', created_by_id or 0, assign_id or 0, created_by_id or 0, _day(created_at))
+
+
+def itinerary_cell(status, created_by_id, query_assign_id, query_created_by_id, created_at):
+    return ('itinerary', status, '', created_by_id or 0, query_assign_id or 0, query_created_by_id or 0, _day(created_at))
+
+
+def cell_of(instance, query_owners=None):
+    """
+    Counter cell of a Query or Itinerary as it is in memory. An itinerary
+    also needs its query's (assign id, created_by id); they are read when
+    not given.
+    """
+    if isinstance(instance, Query):
+        return query_cell(instance.status, instance.priority, instance.created_by_id, instance.assign_id, instance.created_at)
+    if query_owners is None:
+        query_owners = Query.objects.filter(id=instance.query_id).values_list('assign_id', 'created_by_id').first() or (None, None)
+    return itinerary_cell(instance.status, instance.created_by_id, *query_owners, instance.created_at)
+
+
+def stored_state(model, pk):
+    """
+    (cell, query id) of the row as it is in the database, or (None, None).
+    The query id is the itinerary's own (the query's id for a query).
+    """
+    if model is Query:
+        row = Query.objects.filter(id=pk).values_list('status', 'priority', 'created_by_id', 'assign_id', 'created_at').first()
+        return (query_cell(*row), pk) if row else (None, None)
+    row = Itinerary.objects.filter(id=pk).values_list(
+        'status', 'created_by_id', 'query__assign_id', 'query__created_by_id', 'created_at', 'query_id'
+    ).first()
+    return (itinerary_cell(*row[:5]), row[5]) if row else (None, None)
+
+
+def owners_moved(query_id, old_owners, new_owners):
+    """Deltas moving a query's itineraries from its old (assign, created_by) to the new one."""
+    deltas = Counter()
+    for status, created_by_id, created_at in (
+        Itinerary.objects.filter(query_id=query_id).values_list('status', 'created_by_id', 'created_at')
+    ):
+        deltas.update(move(
+            itinerary_cell(status, created_by_id, *old_owners, created_at),
+            itinerary_cell(status, created_by_id, *new_owners, created_at),
+        ))
+    return deltas
+
+
+# ==========================================
+# UPDATES
+# ==========================================
+def apply(deltas):
+    """Add ``deltas`` ({cell: +n/-n}) to the counters, creating missing cells."""
+    deltas = {cell: n for cell, n in Counter(deltas).items() if n}
+    if not deltas:
+        return
+    with transaction.atomic():
+        for cell, n in sorted(deltas.items()):
+            lookup = dict(zip(CELL_FIELDS, cell))
+            if StatusCounter.objects.filter(**lookup).update(count=F('count') + n):
+                continue
+            try:
+                with transaction.atomic():
+                    StatusCounter.objects.create(count=n, **lookup)
+            except IntegrityError:
+                # Another request created the cell first
+                StatusCounter.objects.filter(**lookup).update(count=F('count') + n)
+    touch(*{cell[0] for cell in deltas})
+
+
+def move(old, new):
+    """Deltas for one object leaving cell ``old`` and entering ``new`` (either may be None)."""
+    deltas = Counter()
+    if old == new:
+        return deltas
+    if old:
+        deltas[old] -= 1
+    if new:
+        deltas[new] += 1
+    return deltas
+
+
+def touch(*entities):
+    cache.set_many({REVISION_KEY.format(entity): uuid.uuid4().hex for entity in entities}, None)
+
+
+def _revision(entity):
+    key = REVISION_KEY.format(entity)
+    revision = cache.get(key)
+    if revision is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        revision = cache.get(key)
+    return revision
+
+
+# ==========================================
+# TILES
+# ==========================================
+def scope_filter(entity, role, user_id):
+    """Counter rows visible to a user, mirroring the list views' role scopes."""
+    if role in ('superuser', 'admin'):
+        return Q()
+    if role == 'manager':
+        mine = Q(creator_id=user_id) | Q(assignee_id=user_id)
+        return mine | Q(query_creator_id=user_id) if entity == 'itinerary' else mine
+    return Q(creator_id=user_id)
+
+
+def tiles(entity, role, user_id):
+    """
+    {'total', 'today', 'hot', <status>: n, ...} for what ``role`` / ``user_id``
+    may see, summed from the counters and cached until a counter moves.
+    """
+    today = timezone.localdate()
+    scope = 'all' if role in ('superuser', 'admin') else f'{role}:{user_id}'
+    key = TILES_KEY.format(entity, _revision(entity), scope, today.isoformat())
+    counts = cache.get(key)
+    if counts is None:
+        sums = {'total': Sum('count'), 'today': Sum('count', filter=Q(day=today)), 'hot': Sum('count', filter=Q(priority='hot'))}
+        sums.update({status: Sum('count', filter=Q(status=status)) for status in STATUSES[entity]})
+        counts = {
+            name: value or 0
+            for name, value in
+            StatusCounter.objects.filter(scope_filter(entity, role, user_id), entity=entity).aggregate(**sums).items()
+        }
+        cache.set(key, counts, TILES_TIMEOUT)
+    return counts
+
+
+# ==========================================
+# RECONCILIATION
+# ==========================================
+def actual_cells(entity):
+    """{cell: count} straight from the source table (one grouped query)."""
+    if entity == 'query':
+        rows = Query.objects.values_list('status', 'priority', 'created_by_id', 'assign_id', TruncDate('created_at'))
+        build = query_cell
+    else:
+        rows = Itinerary.objects.values_list(
+            'status', 'created_by_id', 'query__assign_id', 'query__created_by_id', TruncDate('created_at')
+        )
+        build = itinerary_cell
+    counts = Counter()
+    for *dims, day, n in rows.annotate(n=Count('id')).order_by():
+        counts[build(*dims, day)] += n
+    return counts
+
+
+def reconcile(entities=('query', 'itinerary'), dry_run=False):
+    """
+    Rebuild the counters of ``entities`` from the source tables. Returns
+    {entity: {'cells', 'drifted', 'missing', 'stale'}}: cells in use, cells
+    whose count was off, cells that had no row and non-zero rows for cells
+    that are now empty. Empty rows left behind by moves are deleted too.
+    """
+    report = {}
+    for entity in entities:
+        actual = actual_cells(entity)
+        stored = {}
+        for row in StatusCounter.objects.filter(entity=entity):
+            stored[tuple(getattr(row, name) for name in CELL_FIELDS)] = row
+
+        changed = [row for cell, row in stored.items() if cell in actual and row.count != actual[cell]]
+        missing = [cell for cell in actual if cell not in stored]
+        stale = [row for cell, row in stored.items() if cell not in actual]
+        report[entity] = {
+            'cells': len(actual),
+            'drifted': len(changed),
+            'missing': len(missing),
+            'stale': sum(1 for row in stale if row.count),
+        }
+        if dry_run:
+            continue
+
+        for row in changed:
+            row.count = actual[tuple(getattr(row, name) for name in CELL_FIELDS)]
+        with transaction.atomic():
+            StatusCounter.objects.bulk_update(changed, ['count'], batch_size=500)
+            StatusCounter.objects.bulk_create(
+                [StatusCounter(count=actual[cell], **dict(zip(CELL_FIELDS, cell))) for cell in missing], batch_size=500
+            )
+            StatusCounter.objects.filter(id__in=[row.id for row in stale]).delete()
+        touch(entity)
+    return report
@@ -1,3 +1,1423 @@
-from django.test import TestCase
+import contextlib
+import io
+import json
+import random
+from datetime import date, time, timedelta
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.db import IntegrityError, connection
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from .models import (
+    TeamMember, Destinations, RoomType, MealPlan, Hotel, Hotelprice, Vehicle, VehiclePricing,
+    Activity, ActivityPrice, SpecialInclusion, Query, Itinerary, ItineraryDayPlan,
+    HotelBooking, HotelBookingInclusion, VehicleBooking, ActivityBooking,
+    Houseboat, HouseboatPrice, HouseboatBooking, StandaloneInclusionBooking,
+    ItineraryPricingOption, ItineraryPricingSummary, PackageTemplate, PackageTemplateDayPlan,
+    IdSequence, Lead, LeadIntake, SearchDocument, StatusCounter
+)
+from .rate_index import RateIndex
+from .serializers import WEBHOOK_SECRET
+from . import (
+    itinerary_versioning, lead_intake, package_insert, pricing, pricing_batch, pricing_utils, rate_import,
+    rate_index, search_index, sequences, status_counters, version_diff, views
+)
 
-# Create your tests here.
+
+# Each gunicorn worker has its own LocMemCache; a test swaps to this one
+# to act as another worker.
+OTHER_WORKER_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'other-worker'}}
+
+
+def make_member(email, role='admin'):
+    return TeamMember.objects.create(first_name='Test', last_name='User', email=email, phone_number='9000000000', role=role)
+
+
+def make_query(member, start, days=2, **fields):
+    values = dict(
+        type='client', gender='mr', client_name='Client', phone_number='9000000001', email='c@example.com',
+        sector='kerala', total_days=days, from_date=start, adult=2, childrens=0,
+        priority='general', assign=member, services='full_package'
+    )
+    values.update(fields)
+    return Query.objects.create(**values)
+
+
+def make_itinerary(query, name='Trip', **fields):
+    values = dict(
+        name=name, query=query, travel_from=query.from_date,
+        travel_to=query.from_date + timedelta(days=query.total_days - 1), adults=2, childrens=0
+    )
+    values.update(fields)
+    return Itinerary.objects.create(**values)
+
+
+class ItineraryPricingQueryBudgetTests(TestCase):
+    """itinerary_pricing must load in a fixed number of queries, whatever the itinerary length."""
+
+    # One of them reads the rate revision so a rate edit on another worker is seen
+    QUERY_BUDGET = 13
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = TeamMember.objects.create(
+            first_name='Test', last_name='User', email='test@example.com', phone_number='9000000000', role='admin'
+        )
+        cls.destination = Destinations.objects.create(name='Munnar')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='CP', created_by=cls.member)
+        cls.hotels = [
+            Hotel.objects.create(
+                name=f'Hotel {n}', category='3star', destination=cls.destination, details='-',
+                contact_person='-', phone_number='9000000000', email='hotel@example.com'
+            )
+            for n in (1, 2)
+        ]
+        for hotel in cls.hotels:
+            Hotelprice.objects.create(
+                hotel=hotel, room_type=cls.room_type, meal_plan=cls.meal_plan,
+                from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+                double_bed=Decimal('1000'), extra_bed=Decimal('300'), child_with_bed=Decimal('200')
+            )
+        cls.vehicle = Vehicle.objects.create(name='Ertiga', destination=cls.destination, details='-')
+        VehiclePricing.objects.create(
+            vehicle=cls.vehicle, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+            total_fee_100km=Decimal('2500'), extra_fee_per_km=Decimal('15')
+        )
+        cls.activity = Activity.objects.create(name='Trek', destination=cls.destination, details='-')
+        ActivityPrice.objects.create(
+            activity=cls.activity, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), per_person=Decimal('500')
+        )
+        cls.inclusion = SpecialInclusion.objects.create(
+            name='Candle Light Dinner', inclusion_type='hotel', hotel=cls.hotels[0],
+            pricing_type='per_booking', adult_price=Decimal('1500')
+        )
+
+    def make_itinerary(self, days):
+        start = date(2026, 6, 1)
+        query = Query.objects.create(
+            type='client', gender='mr', client_name='Client', phone_number='9000000001', email='c@example.com',
+            sector='kerala', total_days=days, from_date=start, adult=2, childrens=1,
+            priority='general', assign=self.member, services='full_package'
+        )
+        itinerary = Itinerary.objects.create(
+            name=f'{days} day trip', query=query, travel_from=start, travel_to=start + timedelta(days=days - 1),
+            adults=2, childrens=1
+        )
+        for n in range(days):
+            day = start + timedelta(days=n)
+            day_plan = ItineraryDayPlan.objects.create(
+                itinerary=itinerary, day_number=n + 1, title=f'Day {n + 1}', description='-', destination=self.destination
+            )
+            for option, hotel in zip(('option_1', 'option_2'), self.hotels):
+                booking = HotelBooking.objects.create(
+                    itinerary=itinerary, day_plan=day_plan, destination=self.destination, hotel=hotel,
+                    category=hotel.category, room_type=self.room_type, meal_plan=self.meal_plan, option=option,
+                    num_double_beds=1, extra_beds=1, child_with_bed=1,
+                    check_in_date=day, check_in_time=time(12), check_out_date=day + timedelta(days=1), check_out_time=time(11)
+                )
+                if hotel == self.hotels[0]:
+                    HotelBookingInclusion.objects.create(hotel_booking=booking, special_inclusion=self.inclusion)
+            VehicleBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, destination=self.destination, vehicle=self.vehicle,
+                pickup_date=day, total_km=150, num_passengers=3
+            )
+            ActivityBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, activity=self.activity, booking_date=day, num_adults=2, num_children=1
+            )
+        return itinerary
+
+    def pricing_page_queries(self, itinerary):
+        url = reverse('itinerary_pricing', args=[itinerary.id])
+        # First load warms the shared rate index and the per-line price cache
+        self.assertEqual(self.client.get(url).status_code, 200)
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(captured.captured_queries)
+
+    def test_query_count_is_fixed(self):
+        session = self.client.session
+        session['user_id'] = self.member.id
+        session['user_type'] = 'team_member'
+        session.save()
+
+        short_trip = self.pricing_page_queries(self.make_itinerary(2))
+        long_trip = self.pricing_page_queries(self.make_itinerary(12))
+
+        self.assertLessEqual(short_trip, self.QUERY_BUDGET)
+        self.assertEqual(short_trip, long_trip)
+
+
+class BatchPricingPropertyTests(TestCase):
+    """pricing_batch must agree exactly with the Decimal engine on random bookings."""
+
+    SEEDS = range(8)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = TeamMember.objects.create(
+            first_name='Test', last_name='User', email='batch@example.com', phone_number='9000000000', role='admin'
+        )
+        cls.destination = Destinations.objects.create(name='Alleppey')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='MAP', created_by=cls.member)
+
+    def money(self, rng, places=2, high=20000):
+        return Decimal(rng.randint(0, high * 10 ** places)).scaleb(-places)
+
+    def markup(self, rng):
+        return rng.choice(['fixed', 'percentage']), rng.choice([Decimal('0'), self.money(rng, high=40)])
+
+    def make_catalog(self, rng):
+        """Rate rows split into two seasons so stays can cross a boundary."""
+        seasons = [(date(2026, 1, 1), date(2026, 6, 14)), (date(2026, 6, 15), date(2026, 12, 31))]
+        hotels, houseboats, vehicles, activities, inclusions = [], [], [], [], []
+        for n in range(3):
+            hotel = Hotel.objects.create(
+                name=f'Hotel {n}', category='4star', destination=self.destination, details='-',
+                contact_person='-', phone_number='9000000000', email='hotel@example.com'
+            )
+            houseboat = Houseboat.objects.create(
+                name=f'Boat {n}', destination=self.destination, details='-',
+                contact_person='-', phone_number='9000000000', email='boat@example.com'
+            )
+            vehicle = Vehicle.objects.create(name=f'Car {n}', destination=self.destination, details='-')
+            activity = Activity.objects.create(name=f'Ride {n}', destination=self.destination, details='-')
+            for from_date, to_date in seasons:
+                Hotelprice.objects.create(
+                    hotel=hotel, room_type=self.room_type, meal_plan=self.meal_plan, from_date=from_date, to_date=to_date,
+                    double_bed=self.money(rng), extra_bed=self.money(rng),
+                    child_with_bed=self.money(rng), child_without_bed=self.money(rng)
+                )
+                HouseboatPrice.objects.create(
+                    houseboat=houseboat, room_type=self.room_type, meal_plan=self.meal_plan,
+                    from_date=from_date, to_date=to_date,
+                    **{rate: self.money(rng, places=1) for _, rate in pricing.HOUSEBOAT_BED_FIELDS}
+                )
+                VehiclePricing.objects.create(
+                    vehicle=vehicle, from_date=from_date, to_date=to_date,
+                    total_fee_100km=self.money(rng), extra_fee_per_km=self.money(rng, high=50)
+                )
+                ActivityPrice.objects.create(activity=activity, from_date=from_date, to_date=to_date, per_person=self.money(rng))
+            inclusions.append(SpecialInclusion.objects.create(
+                name=f'Extra {n}', inclusion_type='hotel', hotel=hotel, pricing_type='per_booking', adult_price=self.money(rng)
+            ))
+            general = SpecialInclusion.objects.create(
+                name=f'Show {n}', inclusion_type='general', pricing_type='per_person', adult_price=self.money(rng)
+            )
+            hotels.append(hotel)
+            houseboats.append(houseboat)
+            vehicles.append(vehicle)
+            activities.append(activity)
+            inclusions.append(general)
+        return hotels, houseboats, vehicles, activities, inclusions
+
+    def make_itinerary(self, rng, catalog):
+        hotels, houseboats, vehicles, activities, inclusions = catalog
+        start = date(2026, 6, rng.randint(1, 14))
+        days = rng.randint(2, 6)
+        query = Query.objects.create(
+            type='client', gender='mr', client_name='Client', phone_number='9000000001', email='c@example.com',
+            sector='kerala', total_days=days, from_date=start, adult=2, childrens=1,
+            priority='general', assign=self.member, services='full_package'
+        )
+        itinerary = Itinerary.objects.create(
+            name='Random trip', query=query, travel_from=start, travel_to=start + timedelta(days=days - 1),
+            adults=2, childrens=1, cgst_percentage=Decimal('2.50'), sgst_percentage=Decimal('2.50'),
+            discount=self.money(rng, high=500)
+        )
+        for n in range(days):
+            day = start + timedelta(days=n)
+            day_plan = ItineraryDayPlan.objects.create(
+                itinerary=itinerary, day_number=n + 1, title=f'Day {n + 1}', description='-', destination=self.destination
+            )
+            stay = day + timedelta(days=rng.randint(1, 3))
+            for option in ('option_1', 'option_2', 'option_3')[:rng.randint(1, 3)]:
+                hotel = rng.choice(hotels)
+                markup_type, markup_value = self.markup(rng)
+                booking = HotelBooking.objects.create(
+                    itinerary=itinerary, day_plan=day_plan, destination=self.destination, hotel=hotel,
+                    category=hotel.category, room_type=self.room_type, meal_plan=self.meal_plan, option=option,
+                    num_double_beds=rng.randint(1, 4), extra_beds=rng.randint(0, 2), child_with_bed=rng.randint(0, 2),
+                    child_without_bed=rng.randint(0, 2), check_in_date=day, check_in_time=time(12),
+                    check_out_date=stay, check_out_time=time(11), markup_type=markup_type, markup_value=markup_value,
+                    net_price=rng.choice([Decimal('0')] * 4 + [self.money(rng)])
+                )
+                if rng.random() < 0.5:
+                    HotelBookingInclusion.objects.create(hotel_booking=booking, special_inclusion=inclusions[hotels.index(hotel) * 2])
+            if rng.random() < 0.5:
+                markup_type, markup_value = self.markup(rng)
+                HouseboatBooking.objects.create(
+                    itinerary=itinerary, day_plan=day_plan, houseboat=rng.choice(houseboats), room_type=self.room_type,
+                    meal_plan=self.meal_plan, check_in_date=day, check_out_date=stay, option=rng.choice(['option1', 'option2']),
+                    markup_type=markup_type, markup_value=markup_value,
+                    **{qty: rng.randint(0, 2) for qty, _ in pricing.HOUSEBOAT_BED_FIELDS}
+                )
+            markup_type, markup_value = self.markup(rng)
+            VehicleBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, destination=self.destination, vehicle=rng.choice(vehicles),
+                pickup_date=day, total_km=rng.randint(0, 400), num_passengers=3,
+                markup_type=markup_type, markup_value=markup_value,
+                custom_total_price=rng.choice([None, None, None, self.money(rng)])
+            )
+            markup_type, markup_value = self.markup(rng)
+            ActivityBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, activity=rng.choice(activities), booking_date=day,
+                num_adults=rng.randint(0, 4), num_children=rng.randint(0, 3),
+                markup_type=markup_type, markup_value=markup_value
+            )
+            if rng.random() < 0.3:
+                StandaloneInclusionBooking.objects.create(
+                    itinerary=itinerary, day_plan=day_plan, special_inclusion=inclusions[1], booking_date=day,
+                    num_adults=rng.randint(1, 3)
+                )
+        return itinerary
+
+    def assertSame(self, expected, actual):
+        # Equal values with the same canonical digits, not merely close
+        self.assertEqual(expected, actual)
+        self.assertEqual(str(expected.normalize()), str(actual.normalize()))
+
+    def test_matches_decimal_engine(self):
+        for seed in self.SEEDS:
+            with self.subTest(seed=seed):
+                rng = random.Random(seed)
+                catalog = self.make_catalog(rng)
+                itineraries = [self.make_itinerary(rng, catalog) for _ in range(3)]
+                ids = [itinerary.id for itinerary in itineraries]
+                rates = RateIndex.load()
+
+                decimal_lines = pricing.load_bookings_for_itineraries(ids)
+                batch_lines = pricing.load_bookings_for_itineraries(ids)
+                # A markup with more than two places cannot be held in paise and must take the Decimal path
+                for lines in (decimal_lines, batch_lines):
+                    lines[ids[0]][0].markup_type = 'percentage'
+                    lines[ids[0]][0].markup_value = Decimal('7.125')
+
+                flat = [b for i in ids for b in batch_lines[i]]
+                batch = pricing_batch.evaluate(flat, rates)
+                self.assertFalse(batch.exact[0])
+                self.assertTrue(batch.exact[1:].any())
+                sums = batch.group_totals([
+                    (b.owner_id, pricing.option_key(getattr(b, 'option', None)) if b.item_type in pricing.OPTION_ITEM_TYPES else pricing.SHARED)
+                    for b in flat
+                ])
+
+                for itinerary in itineraries:
+                    expected_items = pricing.price_bookings(decimal_lines[itinerary.id], rates)
+                    actual_items = pricing.by_date(batch_lines[itinerary.id])
+                    for expected, actual in zip(expected_items, actual_items):
+                        self.assertEqual((type(expected), expected.pk), (type(actual), actual.pk))
+                        for field in ('net', 'markup', 'gross', 'inclusion_price'):
+                            self.assertSame(expected.calculated_price[field], actual.calculated_price[field])
+
+                    own_sums = {key: totals for (owner, key), totals in sums.items() if owner == itinerary.id}
+                    expected_options = pricing.summarise_options(
+                        expected_items, itinerary.cgst_percentage, itinerary.sgst_percentage, itinerary.discount
+                    )
+                    actual_options = pricing.summarise_options(
+                        actual_items, itinerary.cgst_percentage, itinerary.sgst_percentage, itinerary.discount, sums=own_sums
+                    )
+                    self.assertEqual(len(expected_options), len(actual_options))
+                    for expected, actual in zip(expected_options, actual_options):
+                        for field in ('option_net_total', 'net_price', 'markup', 'gross_before_tax',
+                                      'cgst_amount', 'sgst_amount', 'gross_price'):
+                            self.assertSame(expected[field], actual[field])
+
+
+class RateIndexRevisionTests(TestCase):
+    """A rate edit on one worker must make every other worker's shared rate index reload."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = TeamMember.objects.create(
+            first_name='Test', last_name='User', email='rates@example.com', phone_number='9000000000', role='admin'
+        )
+        cls.destination = Destinations.objects.create(name='Thekkady')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='CP', created_by=cls.member)
+        cls.hotel = Hotel.objects.create(
+            name='Hotel', category='3star', destination=cls.destination, details='-',
+            contact_person='-', phone_number='9000000000', email='hotel@example.com'
+        )
+        cls.rate = Hotelprice.objects.create(
+            hotel=cls.hotel, room_type=cls.room_type, meal_plan=cls.meal_plan,
+            from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), double_bed=Decimal('1000')
+        )
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+
+    def double_bed(self):
+        rule = rate_index.get_rate_index().hotel_rule(self.hotel.id, self.room_type.id, self.meal_plan.id, date(2026, 6, 1))
+        return rule.double_bed
+
+    def test_other_worker_reloads_after_rate_edit(self):
+        self.assertEqual(self.double_bed(), Decimal('1000'))
+        this_worker = dict(rate_index._shared)
+
+        # Another process, with its own index and its own cache, edits the rate
+        rate_index._shared.update(version=None, index=None)
+        with override_settings(CACHES=OTHER_WORKER_CACHE):
+            self.assertEqual(self.double_bed(), Decimal('1000'))
+            self.rate.double_bed = Decimal('1500')
+            self.rate.save()
+            self.assertEqual(self.double_bed(), Decimal('1500'))
+
+        rate_index._shared.update(this_worker)
+        self.assertEqual(self.double_bed(), Decimal('1500'))
+        self.assertIsNot(rate_index._shared['index'], this_worker['index'])
+
+    def test_unchanged_rates_keep_the_index(self):
+        first = rate_index.get_rate_index()
+        self.assertIs(rate_index.get_rate_index(), first)
+
+
+class CatalogOptionsRevalidationTests(TestCase):
+    """Booking modal options revalidate as 304 until a rate edit, on any worker, changes them."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = TeamMember.objects.create(
+            first_name='Test', last_name='User', email='options@example.com', phone_number='9000000000', role='admin'
+        )
+        cls.destination = Destinations.objects.create(name='Kumarakom')
+        cls.room_types = [RoomType.objects.create(name=name) for name in ('Deluxe', 'Suite')]
+        cls.meal_plan = MealPlan.objects.create(name='MAP', created_by=cls.member)
+        cls.hotel = Hotel.objects.create(
+            name='Lake Resort', category='4star', destination=cls.destination, details='-',
+            contact_person='-', phone_number='9000000000', email='hotel@example.com'
+        )
+        cls.rate = Hotelprice.objects.create(
+            hotel=cls.hotel, room_type=cls.room_types[0], meal_plan=cls.meal_plan,
+            from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), double_bed=Decimal('4000')
+        )
+
+    def get_options(self, **headers):
+        url = reverse('get_valid_hotel_options', args=[self.hotel.id])
+        return self.client.get(url, {'checkin': '2026-06-01', 'checkout': '2026-06-03'}, headers=headers)
+
+    def room_type_names(self, response):
+        return [room_type['name'] for room_type in response.json()['roomtypes']]
+
+    def test_not_modified_until_a_rate_changes(self):
+        first = self.get_options()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(self.room_type_names(first), ['Deluxe'])
+
+        self.assertEqual(self.get_options(if_none_match=first['ETag']).status_code, 304)
+
+        # The rate is edited on another worker, with its own cache
+        with override_settings(CACHES=OTHER_WORKER_CACHE):
+            self.rate.room_type = self.room_types[1]
+            self.rate.save()
+
+        changed = self.get_options(if_none_match=first['ETag'])
+        self.assertEqual(changed.status_code, 200)
+        self.assertEqual(self.room_type_names(changed), ['Suite'])
+        self.assertNotEqual(changed['ETag'], first['ETag'])
+        self.assertIn('Last-Modified', changed)
+        self.assertEqual(self.get_options(if_none_match=changed['ETag']).status_code, 304)
+
+
+class LinePriceCacheTests(TestCase):
+    """Cached line prices are reused until an inclusion or a rate of the line changes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = TeamMember.objects.create(
+            first_name='Test', last_name='User', email='lines@example.com', phone_number='9000000000', role='admin'
+        )
+        cls.destination = Destinations.objects.create(name='Alleppey')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='CP', created_by=cls.member)
+        cls.hotel = Hotel.objects.create(
+            name='Backwater Inn', category='3star', destination=cls.destination, details='-',
+            contact_person='-', phone_number='9000000000', email='hotel@example.com'
+        )
+        cls.rate = Hotelprice.objects.create(
+            hotel=cls.hotel, room_type=cls.room_type, meal_plan=cls.meal_plan,
+            from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), double_bed=Decimal('1000')
+        )
+        cls.inclusion = SpecialInclusion.objects.create(
+            name='Houseboat Lunch', inclusion_type='hotel', hotel=cls.hotel,
+            pricing_type='per_booking', adult_price=Decimal('1500')
+        )
+        start = date(2026, 6, 1)
+        query = Query.objects.create(
+            type='client', gender='mr', client_name='Client', phone_number='9000000001', email='c@example.com',
+            sector='kerala', total_days=2, from_date=start, adult=2, childrens=0,
+            priority='general', assign=cls.member, services='full_package'
+        )
+        cls.itinerary = Itinerary.objects.create(
+            name='Backwaters', query=query, travel_from=start, travel_to=start + timedelta(days=2), adults=2, childrens=0
+        )
+        day_plan = ItineraryDayPlan.objects.create(
+            itinerary=cls.itinerary, day_number=1, title='Day 1', description='-', destination=cls.destination
+        )
+        cls.bookings = [
+            HotelBooking.objects.create(
+                itinerary=cls.itinerary, day_plan=day_plan, destination=cls.destination, hotel=cls.hotel,
+                category=cls.hotel.category, room_type=cls.room_type, meal_plan=cls.meal_plan, option=option,
+                num_double_beds=1, markup_type='percentage', markup_value=Decimal('7.5'),
+                check_in_date=start, check_in_time=time(12), check_out_date=start + timedelta(days=2), check_out_time=time(11)
+            )
+            for option in ('option_1', 'option_2')
+        ]
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+
+    def price(self):
+        """{booking id: (net, cache hit)} of an incremental pricing pass."""
+        return {
+            item.id: (item.calculated_price['net'], item.line_cache_hit)
+            for item in pricing.price_itinerary(self.itinerary, incremental=True)
+        }
+
+    def test_reused_until_inclusion_or_rate_changes(self):
+        first, second = self.bookings
+        self.assertEqual(self.price(), {first.id: (Decimal('2000'), False), second.id: (Decimal('2000'), False)})
+
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.price(), {first.id: (Decimal('2000'), True), second.id: (Decimal('2000'), True)})
+        self.assertFalse([query for query in captured.captured_queries if query['sql'].startswith('UPDATE')])
+
+        # Both paths round the same way
+        uncached = pricing.price_itinerary(self.itinerary)
+        self.assertEqual(
+            {item.id: (item.calculated_price['net'], item.calculated_price['gross']) for item in uncached},
+            {item.id: (item.calculated_price['net'], item.calculated_price['gross'])
+             for item in pricing.price_itinerary(self.itinerary, incremental=True)}
+        )
+
+        HotelBookingInclusion.objects.create(hotel_booking=first, special_inclusion=self.inclusion)
+        self.assertEqual(self.price(), {first.id: (Decimal('3500'), False), second.id: (Decimal('2000'), True)})
+
+        self.rate.double_bed = Decimal('1200')
+        self.rate.save()
+        self.assertEqual(self.price(), {first.id: (Decimal('3900'), False), second.id: (Decimal('2400'), False)})
+        self.assertEqual(self.price(), {first.id: (Decimal('3900'), True), second.id: (Decimal('2400'), True)})
+
+
+class VehicleRuleActiveTests(TestCase):
+    """Vehicle lines are priced from active VehiclePricing rows only."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.destination = Destinations.objects.create(name='Vagamon')
+        cls.vehicle = Vehicle.objects.create(name='Innova', destination=cls.destination, details='-')
+        cls.inactive = VehiclePricing.objects.create(
+            vehicle=cls.vehicle, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+            total_fee_100km=Decimal('9000'), extra_fee_per_km=Decimal('50'), is_active=False
+        )
+        cls.active = VehiclePricing.objects.create(
+            vehicle=cls.vehicle, from_date=date(2026, 6, 1), to_date=date(2026, 6, 30),
+            total_fee_100km=Decimal('2500'), extra_fee_per_km=Decimal('15')
+        )
+        query = make_query(make_member('vehicles@example.com'), date(2026, 6, 10))
+        cls.itinerary = make_itinerary(query)
+        cls.booking = VehicleBooking.objects.create(
+            itinerary=cls.itinerary, destination=cls.destination, vehicle=cls.vehicle,
+            pickup_date=date(2026, 6, 10), total_km=100, num_passengers=2
+        )
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+
+    def priced(self, incremental):
+        [line] = pricing.price_itinerary(self.itinerary, incremental=incremental)
+        return line.price_record, line.calculated_price['net']
+
+    def test_inactive_rule_is_skipped(self):
+        for incremental in (False, True):
+            self.assertEqual(self.priced(incremental), (self.active, Decimal('2500')))
+
+        self.active.is_active = False
+        self.active.save()
+        for incremental in (False, True):
+            self.assertEqual(self.priced(incremental), (None, Decimal('0')))
+
+
+class PricingSummaryTests(TestCase):
+    """Booking and pricing option writes flag the summary stale; the next page view shows the new numbers."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = make_member('summary@example.com')
+        cls.destination = Destinations.objects.create(name='Kovalam')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='CP', created_by=cls.member)
+        supplier = dict(destination=cls.destination, details='-', contact_person='-', phone_number='9000000000', email='s@example.com')
+        cls.hotel = Hotel.objects.create(name='Beach Hotel', category='3star', **supplier)
+        Hotelprice.objects.create(
+            hotel=cls.hotel, room_type=cls.room_type, meal_plan=cls.meal_plan,
+            from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), double_bed=Decimal('2000')
+        )
+        cls.houseboat = Houseboat.objects.create(name='Kettuvallam', **supplier)
+        HouseboatPrice.objects.create(
+            houseboat=cls.houseboat, room_type=cls.room_type, meal_plan=cls.meal_plan,
+            from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+            **{rate: Decimal('1000') * n for n, (_, rate) in enumerate(pricing.HOUSEBOAT_BED_FIELDS, 1)}
+        )
+        cls.vehicle = Vehicle.objects.create(name='Tempo Traveller', destination=cls.destination, details='-')
+        VehiclePricing.objects.create(
+            vehicle=cls.vehicle, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+            total_fee_100km=Decimal('3000'), extra_fee_per_km=Decimal('20')
+        )
+        cls.activity = Activity.objects.create(name='Kathakali', destination=cls.destination, details='-')
+        ActivityPrice.objects.create(
+            activity=cls.activity, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), per_person=Decimal('400')
+        )
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+        session = self.client.session
+        session['user_id'] = self.member.id
+        session['user_type'] = 'team_member'
+        session.save()
+
+        start = date(2026, 6, 1)
+        self.itinerary = make_itinerary(make_query(self.member, start, days=3))
+        day_plans = [
+            ItineraryDayPlan.objects.create(
+                itinerary=self.itinerary, day_number=n + 1, title=f'Day {n + 1}', description='-', destination=self.destination
+            )
+            for n in range(3)
+        ]
+        # Two rooms, then three, then one: the option needs three rooms, not six
+        self.hotels = [
+            HotelBooking.objects.create(
+                itinerary=self.itinerary, day_plan=day_plan, destination=self.destination, hotel=self.hotel,
+                category=self.hotel.category, room_type=self.room_type, meal_plan=self.meal_plan, option='option_1',
+                num_double_beds=rooms, check_in_date=start + timedelta(days=n), check_in_time=time(12),
+                check_out_date=start + timedelta(days=n + 1), check_out_time=time(11)
+            )
+            for n, (day_plan, rooms) in enumerate(zip(day_plans, (2, 3, 1)))
+        ]
+        self.houseboat_booking = HouseboatBooking.objects.create(
+            itinerary=self.itinerary, day_plan=day_plans[1], houseboat=self.houseboat, room_type=self.room_type,
+            meal_plan=self.meal_plan, check_in_date=start + timedelta(days=1), check_out_date=start + timedelta(days=2),
+            num_one_bed_rooms=1
+        )
+        self.vehicle_booking = VehicleBooking.objects.create(
+            itinerary=self.itinerary, day_plan=day_plans[0], destination=self.destination, vehicle=self.vehicle,
+            pickup_date=start, total_km=100, num_passengers=2
+        )
+        self.activity_booking = ActivityBooking.objects.create(
+            itinerary=self.itinerary, day_plan=day_plans[2], activity=self.activity,
+            booking_date=start + timedelta(days=2), num_adults=2, num_children=0
+        )
+
+    def quotation(self):
+        response = self.client.get(reverse('view_quotation', args=[self.itinerary.id]))
+        self.assertEqual(response.status_code, 200)
+        return response.context['option1_price']
+
+    def assertFlagged(self):
+        self.assertTrue(ItineraryPricingSummary.objects.get(itinerary=self.itinerary).is_stale)
+
+    def test_booking_edits_reach_the_quotation(self):
+        price = self.quotation()
+        self.assertFalse(ItineraryPricingSummary.objects.get(itinerary=self.itinerary).is_stale)
+
+        edits = (
+            (self.hotels[0], 'num_double_beds', 4),
+            (self.houseboat_booking, 'num_one_bed_rooms', 2),
+            (self.vehicle_booking, 'total_km', 250),
+            (self.activity_booking, 'num_adults', 4),
+        )
+        for booking, field, value in edits:
+            with self.subTest(booking=type(booking).__name__):
+                setattr(booking, field, value)
+                booking.save()
+                self.assertFlagged()
+                new_price = self.quotation()
+                self.assertGreater(new_price, price)
+                price = new_price
+
+        for booking in (self.houseboat_booking, self.activity_booking):
+            with self.subTest(deleted=type(booking).__name__):
+                booking.delete()
+                self.assertFlagged()
+                new_price = self.quotation()
+                self.assertLess(new_price, price)
+                price = new_price
+
+    def listed_summary(self):
+        response = self.client.get(reverse('list_itineraries'))
+        self.assertEqual(response.status_code, 200)
+        return {itinerary.id: itinerary for itinerary in response.context['itineraries']}[self.itinerary.id].pricing_summary
+
+    def test_saved_option_reaches_the_list(self):
+        self.assertEqual(self.listed_summary().option_count, 0)
+        ItineraryPricingOption.objects.create(
+            itinerary=self.itinerary, option_name='Option 1', option_number=1, net_price=Decimal('10000'),
+            markup_amount=Decimal('0'), gross_price=Decimal('10000'), final_amount=Decimal('10500'), hotels_included=[]
+        )
+        self.assertFlagged()
+        self.assertEqual(self.listed_summary().lowest_final, Decimal('10500'))
+
+        option = ItineraryPricingOption.objects.get(itinerary=self.itinerary)
+        option.final_amount = Decimal('9800')
+        option.save()
+        self.assertFlagged()
+        self.assertEqual(self.listed_summary().lowest_final, Decimal('9800'))
+
+    def test_room_counts_are_the_largest_night(self):
+        for booking in (self.hotels[0], self.hotels[2]):
+            booking.extra_beds = 1
+            booking.save()
+        request = RequestFactory().get('/')
+        request.session = {'user_id': self.member.id}
+        with mock.patch('Travel.views.render_to_string', return_value='<p>-</p>') as render:
+            views.download_quotation_pdf(request, self.itinerary.id)
+        selected = render.call_args.args[1]['selected_option']
+        self.assertEqual((selected['number_of_rooms'], selected['extra_beds']), (3, 1))
+        quotation = self.client.get(reverse('view_quotation', args=[self.itinerary.id]))
+        self.assertEqual(quotation.context['selected_option']['number_of_rooms'], 3)
+
+
+class RateImportTests(TestCase):
+    """Rate sheets create, update or skip rows by key and dates; bad rows block the sheet unless partial."""
+
+    HOUSEBOAT_RATES = [rate for _, rate in pricing.HOUSEBOAT_BED_FIELDS] + ['extra_bed']
+
+    @classmethod
+    def setUpTestData(cls):
+        member = make_member('rates-import@example.com')
+        cls.destination = Destinations.objects.create(name='Kumily')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='MAP', created_by=member)
+        supplier = dict(destination=cls.destination, details='-', contact_person='-', phone_number='9000000000', email='s@example.com')
+        cls.hotel = Hotel.objects.create(name='Spice Village', category='4star', **supplier)
+        cls.houseboat = Houseboat.objects.create(name='Lake Queen', **supplier)
+
+    def sheet(self, header, rows):
+        return io.StringIO('\n'.join([','.join(header)] + [','.join(map(str, row)) for row in rows]) + '\n')
+
+    def hotel_sheet(self, *rows):
+        header = ['hotel', 'room_type', 'meal_plan', 'from_date', 'to_date', 'double_bed', 'extra_bed']
+        return self.sheet(header, [('Spice Village', 'Deluxe', 'MAP', *row) for row in rows])
+
+    def houseboat_sheet(self, *rows):
+        header = ['houseboat', 'room_type', 'meal_plan', 'from_date', 'to_date', *self.HOUSEBOAT_RATES]
+        return self.sheet(header, [('Lake Queen', 'Deluxe', 'MAP', start, end, *[amount] * len(self.HOUSEBOAT_RATES))
+                                   for start, end, amount in rows])
+
+    def counts(self, result):
+        return result.created, result.updated, result.unchanged, result.written
+
+    def test_create_update_unchanged(self):
+        june, july = ('2026-06-01', '2026-06-30'), ('2026-07-01', '2026-07-31')
+        result = rate_import.import_rate_sheet('hotel', self.hotel_sheet((*june, 3000, 500), (*july, 3200, '')))
+        self.assertEqual(self.counts(result), (2, 0, 0, True))
+
+        again = rate_import.import_rate_sheet('hotel', self.hotel_sheet((*june, '"3,000.00"', 500), (*july, 3200, '')))
+        self.assertEqual(self.counts(again), (0, 0, 2, False))
+
+        changed = rate_import.import_rate_sheet('hotel', self.hotel_sheet((*june, 3000, 500), (*july, 3400, '')))
+        self.assertEqual(self.counts(changed), (0, 1, 1, True))
+        rate = Hotelprice.objects.get(hotel=self.hotel, from_date=date(2026, 7, 1))
+        self.assertEqual((rate.double_bed, rate.extra_bed, rate.version), (Decimal('3400'), None, 2))
+        self.assertEqual(Hotelprice.objects.filter(hotel=self.hotel).count(), 2)
+
+    def test_bad_rows_block_the_sheet_unless_partial(self):
+        rows = (
+            ('2026-06-01', '2026-06-30', 3000, ''),
+            ('2026-07-01', '2026-06-30', 3000, ''),      # ends before it starts
+            ('2026-08-01', 'someday', 3000, ''),         # not a date
+            ('2026-09-01', '2026-09-30', -5, ''),        # negative
+            ('2026-10-01', '2026-10-31', 3000.555, ''),  # more decimals than the column
+            ('2026-06-15', '2026-07-15', 3100, ''),      # overlaps the first row
+        )
+        result = rate_import.import_rate_sheet('hotel', self.hotel_sheet(*rows))
+        self.assertFalse(result.written)
+        self.assertEqual([error['row'] for error in result.errors], [3, 4, 5, 6])
+        self.assertEqual([(conflict['row'], conflict['other_row']) for conflict in result.conflicts], [(7, 2)])
+        self.assertFalse(Hotelprice.objects.exists())
+
+        unknown = self.sheet(
+            ['hotel', 'room_type', 'meal_plan', 'from_date', 'to_date', 'double_bed'],
+            [('Nowhere Inn', 'Deluxe', 'MAP', '2026-06-01', '2026-06-30', 3000)]
+        )
+        self.assertIn("unknown hotel 'Nowhere Inn'", rate_import.import_rate_sheet('hotel', unknown).errors[0]['errors'])
+
+        clean = (('2026-11-01', '2026-11-30', 2800, ''),) + rows[1:5]
+        partial = rate_import.import_rate_sheet('hotel', self.hotel_sheet(*clean), partial=True)
+        self.assertEqual(self.counts(partial), (1, 0, 0, True))
+        self.assertEqual(list(Hotelprice.objects.values_list('from_date', flat=True)), [date(2026, 11, 1)])
+
+    def test_houseboat_rates_keep_one_row_per_key(self):
+        result = rate_import.import_rate_sheet('houseboat', self.houseboat_sheet(('2026-06-01', '2026-06-30', '1234.5')))
+        self.assertEqual(self.counts(result), (1, 0, 0, True))
+
+        # The column holds one decimal place: 1234.50 is the same rate, 1234.56 cannot be stored
+        same = rate_import.import_rate_sheet('houseboat', self.houseboat_sheet(('2026-06-01', '2026-06-30', '1234.50')))
+        self.assertEqual(self.counts(same), (0, 0, 1, False))
+        precise = rate_import.import_rate_sheet('houseboat', self.houseboat_sheet(('2026-06-01', '2026-06-30', '1234.56')))
+        self.assertIn('one_bed has more than 1 decimal place(s)', precise.errors[0]['errors'])
+
+        updated = rate_import.import_rate_sheet('houseboat', self.houseboat_sheet(('2026-06-01', '2026-06-30', '1300')))
+        self.assertEqual(self.counts(updated), (0, 1, 0, True))
+        rate = HouseboatPrice.objects.get(houseboat=self.houseboat)
+        self.assertEqual((rate.one_bed, rate.ten_bed, rate.version), (Decimal('1300'), Decimal('1300'), 2))
+
+
+class QueryIdSequenceTests(TestCase):
+    """Query ids come from the IdSequence counter: gap-free, and seeded from the existing dhNN ids."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = make_member('sequence@example.com')
+
+    def new_query(self, **fields):
+        return make_query(self.member, date(2026, 6, 1), **fields)
+
+    def test_failed_insert_releases_its_number(self):
+        self.assertEqual(self.new_query().query_id, 'dh01')
+
+        query = Query(
+            type='client', gender='mr', client_name=None, phone_number='9000000001', sector='kerala',
+            total_days=2, from_date=date(2026, 6, 1), adult=2, priority='general', services='full_package'
+        )
+        with self.assertRaises(IntegrityError):
+            query.save()
+        self.assertEqual(query.query_id, '')
+
+        self.assertEqual(self.new_query().query_id, 'dh02')
+        self.assertEqual(sequences.next_query_ids(3), ['dh03', 'dh04', 'dh05'])
+        self.assertEqual(self.new_query().query_id, 'dh06')
+
+    def test_seeded_from_existing_ids(self):
+        # Queries saved before the sequence existed
+        IdSequence.objects.filter(name=sequences.QUERY_ID_SEQUENCE).delete()
+        for query_id in ('dh07', 'dh41', 'legacy-99', 'dh3x'):
+            self.new_query(query_id=query_id)
+        self.assertEqual(sequences.highest_query_number(), 41)
+
+        self.assertEqual(self.new_query().query_id, 'dh42')
+        self.assertEqual(IdSequence.objects.get(name=sequences.QUERY_ID_SEQUENCE).value, 42)
+        self.assertEqual(self.new_query().query_id, 'dh43')
+
+
+class LeadIntakeTests(TestCase):
+    """Batch lead intake: validation per item, de-duplication on the contact keys, isolated failures."""
+
+    def statuses(self, result):
+        return [(row['status'], row.get('id')) for row in result['results']]
+
+    def test_duplicates_in_batch_and_window(self):
+        recent = Lead.objects.create(name='Recent', phone='+91 98470 12345', email='Anu@Example.com')
+        old = Lead.objects.create(name='Old', phone='90000 11111', email='old@example.com')
+        Lead.objects.filter(pk=old.pk).update(created_at=old.created_at - timedelta(days=2))
+        self.assertEqual((recent.phone_key, recent.email_key), ('9847012345', 'anu@example.com'))
+
+        result = lead_intake.ingest([
+            {'name': 'Same phone', 'phone': '098470-12345'},
+            {'name': 'Same email', 'email': 'ANU@example.com'},
+            {'name': 'Old lead again', 'phone': '9000011111'},
+            {'name': 'Repeat in batch', 'phone': '+91 9000011111', 'email': 'new@example.com'},
+            {'name': ''},
+            'not a lead',
+            {'name': 'x' * 101, 'phone': '1' * 21},
+            {'name': 'Short phone', 'phone': '12345'},
+            {'name': 'Short phone too', 'phone': '12345'},
+        ], source='php')
+        created = Lead.objects.filter(source='php').order_by('id')
+        first, short, short_too = created
+        self.assertEqual(self.statuses(result), [
+            ('duplicate', recent.id), ('duplicate', recent.id), ('created', first.id), ('duplicate', first.id),
+            ('invalid', None), ('invalid', None), ('invalid', None), ('created', short.id), ('created', short_too.id),
+        ])
+        self.assertEqual((result['created'], result['duplicates'], result['invalid']), (3, 3, 3))
+        self.assertEqual(set(result['results'][6]['errors']), {'name', 'phone'})
+        self.assertEqual((first.phone_key, short.phone_key), ('9000011111', ''))
+
+    def test_failing_payload_is_retried_alone(self):
+        lead_intake.stage([{'name': 'Asha', 'phone': '9847000001'}, {'name': 'Boom'}, {'name': 'Ravi', 'phone': '9847000002'}])
+        real_ingest = lead_intake.ingest
+
+        def flaky_ingest(items, **kwargs):
+            if any(item.get('name') == 'Boom' for item in items):
+                raise IntegrityError('database said no')
+            return real_ingest(items, **kwargs)
+
+        with mock.patch.object(lead_intake, 'ingest', flaky_ingest):
+            batches = list(lead_intake.drain())
+        # The good rows land in the first batch; the retried bad row alone stops the drain
+        self.assertEqual([(batch['rows'], batch['created'], batch['failed']) for batch in batches], [(3, 2, 1), (1, 0, 1)])
+        self.assertEqual(sorted(Lead.objects.values_list('name', flat=True)), ['Asha', 'Ravi'])
+        failed = LeadIntake.objects.get(processed_at__isnull=True)
+        self.assertEqual((failed.attempts, failed.claimed_by, failed.error), (2, None, 'database said no'))
+        self.assertEqual(set(LeadIntake.objects.filter(processed_at__isnull=False).values_list('attempts', 'outcome')), {(1, 'created')})
+
+        [batch] = lead_intake.drain()
+        self.assertEqual((batch['created'], batch['failed']), (1, 0))
+        self.assertEqual(lead_intake.intake_metrics()['pending'], 0)
+
+    def test_batch_api(self):
+        url = reverse('api-lead-batch')
+
+        def post(body, secret=WEBHOOK_SECRET):
+            return self.client.post(url, json.dumps(body), content_type='application/json', headers={'X-Webhook-Secret': secret})
+
+        self.assertEqual(post([{'name': 'Asha'}], secret='wrong').status_code, 403)
+        self.assertEqual(post([]).status_code, 400)
+        too_many = post([{'name': f'Lead {n}'} for n in range(lead_intake.MAX_BATCH + 1)])
+        self.assertEqual(too_many.status_code, 400)
+        self.assertFalse(Lead.objects.exists())
+
+        created = post({'leads': [{'name': 'Asha', 'phone': '9847000001'}, {'name': 'Asha', 'phone': '9847000001'}], 'source': 'php'})
+        self.assertEqual(created.status_code, 201)
+        self.assertEqual((created.json()['created'], created.json()['duplicates']), (1, 1))
+
+        staged = post({'leads': [{'name': 'Ravi'}], 'mode': 'stage'})
+        self.assertEqual((staged.status_code, staged.json()['staged']), (202, 1))
+        self.assertEqual(lead_intake.intake_metrics()['pending'], 1)
+
+
+class StatusCounterTests(TestCase):
+    """The signal-maintained counters never drift from the source tables."""
+
+    def assertNoDrift(self):
+        report = status_counters.reconcile(dry_run=True)
+        for entity in ('query', 'itinerary'):
+            self.assertEqual({key: report[entity][key] for key in ('drifted', 'missing', 'stale')},
+                             {'drifted': 0, 'missing': 0, 'stale': 0}, entity)
+        return report
+
+    def stored(self, entity):
+        return sum(StatusCounter.objects.filter(entity=entity).values_list('count', flat=True))
+
+    def test_counters_follow_every_change(self):
+        owner, other = make_member('owner@example.com'), make_member('other@example.com')
+        query = make_query(owner, date(2026, 1, 10), created_by=owner)
+        first, second = make_itinerary(query, 'First', created_by=owner), make_itinerary(query, 'Second')
+        report = self.assertNoDrift()
+        self.assertEqual((report['query']['cells'], report['itinerary']['cells']), (1, 2))
+        self.assertEqual((self.stored('query'), self.stored('itinerary')), (1, 2))
+
+        query.status = 'follow_up'
+        query.save()
+        first.status = 'quoted'
+        first.save()
+        self.assertNoDrift()
+
+        # Reassigning the query moves its itineraries to the new owner's cells
+        query.assign = other
+        query.save()
+        self.assertNoDrift()
+        tiles = status_counters.tiles('itinerary', 'manager', other.id)
+        self.assertEqual((tiles['total'], tiles['draft'], tiles['quoted']), (2, 1, 1))
+
+        second.delete()
+        self.assertNoDrift()
+        query.delete()
+        self.assertNoDrift()
+        self.assertEqual((self.stored('query'), self.stored('itinerary')), (0, 0))
+
+
+class SearchIndexTests(TestCase):
+    """Search documents and their FTS mirror follow the source rows."""
+
+    def setUp(self):
+        self.member = make_member('search@example.com')
+
+    def documents(self, entity):
+        return dict(SearchDocument.objects.filter(entity=entity).values_list('object_id', 'name'))
+
+    def fts_rows(self, entity):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT object_id, name FROM {search_index.FTS_TABLE} WHERE entity = %s', [entity])
+            return dict(cursor.fetchall())
+
+    def assertIndexed(self, entity, expected):
+        self.assertEqual(self.documents(entity), expected)
+        self.assertEqual(self.fts_rows(entity), expected)
+
+    def found(self, model, entity, term):
+        return set(search_index.search_filter(model.objects.all(), entity, term).values_list('pk', flat=True))
+
+    def test_save_and_delete_keep_the_index_in_sync(self):
+        self.assertTrue(search_index.fts_enabled())
+        query = make_query(self.member, date(2026, 2, 1), client_name='Meera Nair')
+        itinerary = make_itinerary(query, 'Munnar Escape')
+        lead = Lead.objects.create(name='Anu', phone='9000000002', email='anu@example.com')
+        self.assertIndexed('query', {query.pk: 'meera nair'})
+        self.assertIndexed('itinerary', {itinerary.pk: 'munnar escape meera nair'})
+        self.assertIndexed('lead', {lead.pk: 'anu'})
+
+        # A query edit re-indexes its itineraries, which carry the client name
+        query.client_name = 'Meera Menon'
+        query.save()
+        lead.name = 'Anu Thomas'
+        lead.save()
+        self.assertIndexed('query', {query.pk: 'meera menon'})
+        self.assertIndexed('itinerary', {itinerary.pk: 'munnar escape meera menon'})
+        self.assertIndexed('lead', {lead.pk: 'anu thomas'})
+        self.assertEqual(self.found(Itinerary, 'itinerary', 'menon'), {itinerary.pk})
+        self.assertEqual(self.found(Itinerary, 'itinerary', 'nair'), set())
+
+        lead.delete()
+        query.delete()
+        for entity in search_index.ENTITIES:
+            self.assertIndexed(entity, {})
+
+    def test_phone_matches_whatever_the_formatting(self):
+        plain = make_query(self.member, date(2026, 2, 1), phone_number='9847012345')
+        formatted = make_query(self.member, date(2026, 2, 1), phone_number='+91 98470-12345')
+        other = make_query(self.member, date(2026, 2, 1), phone_number='9000000003')
+        both = {plain.pk, formatted.pk}
+        self.assertEqual(self.found(Query, 'query', '+91 98470-12345'), both)
+        self.assertEqual(self.found(Query, 'query', '9847012345'), both)
+        self.assertEqual(self.found(Query, 'query', '098470 12345'), both)
+        self.assertNotIn(other.pk, self.found(Query, 'query', '98470'))
+
+    def test_short_tokens_fall_back_to_like(self):
+        kv = Lead.objects.create(name='K V Raman', phone='9000000004', email='kv@example.com')
+        Lead.objects.create(name='Suresh', phone='9000000005', email='suresh@example.com')
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.found(Lead, 'lead', 'kv'), {kv.pk})
+        self.assertIn('LIKE', queries[-1]['sql'])
+        self.assertNotIn('MATCH', queries[-1]['sql'])
+        # Long and short tokens combine: MATCH for one, LIKE for the other
+        self.assertEqual(self.found(Lead, 'lead', 'raman v'), {kv.pk})
+        self.assertEqual(self.found(Lead, 'lead', 'suresh v'), set())
+        # LIKE wildcards in the term are literal
+        self.assertEqual(self.found(Lead, 'lead', '%'), set())
+
+
+class ItineraryVersioningTests(TestCase):
+    """A new version is a full copy of the old one, written in a fixed number of queries."""
+
+    # Keys that point at the version's own rows or are stamped on insert
+    OWN_FIELDS = {'id', 'itinerary_id', 'day_plan_id', 'hotel_booking_id', 'houseboat_booking_id'}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = make_member('versions@example.com')
+        cls.destination = Destinations.objects.create(name='Thekkady')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='MAP', created_by=cls.member)
+        cls.hotel = Hotel.objects.create(
+            name='Spice Village', category='4star', destination=cls.destination, details='-',
+            contact_person='-', phone_number='9000000000', email='hotel@example.com'
+        )
+        Hotelprice.objects.create(
+            hotel=cls.hotel, room_type=cls.room_type, meal_plan=cls.meal_plan,
+            from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), double_bed=Decimal('3000'), extra_bed=Decimal('800')
+        )
+        cls.vehicle = Vehicle.objects.create(name='Innova', destination=cls.destination, details='-')
+        VehiclePricing.objects.create(
+            vehicle=cls.vehicle, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+            total_fee_100km=Decimal('2800'), extra_fee_per_km=Decimal('18')
+        )
+        cls.activity = Activity.objects.create(name='Bamboo Rafting', destination=cls.destination, details='-')
+        ActivityPrice.objects.create(
+            activity=cls.activity, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), per_person=Decimal('700')
+        )
+        cls.hotel_inclusion = SpecialInclusion.objects.create(
+            name='Plantation Walk', inclusion_type='hotel', hotel=cls.hotel,
+            pricing_type='per_booking', adult_price=Decimal('900')
+        )
+        cls.general_inclusion = SpecialInclusion.objects.create(
+            name='Spice Tour', inclusion_type='general', pricing_type='per_person', adult_price=Decimal('250')
+        )
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+
+    def make_itinerary(self, days):
+        query = make_query(self.member, date(2026, 8, 3), days=days)
+        itinerary = make_itinerary(query, f'{days} day trip')
+        for n in range(days):
+            day = query.from_date + timedelta(days=n)
+            day_plan = ItineraryDayPlan.objects.create(
+                itinerary=itinerary, day_number=n + 1, title=f'Day {n + 1}', description='-', destination=self.destination
+            )
+            day_plan.hotels.add(self.hotel)
+            day_plan.activities.add(self.activity)
+            booking = HotelBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, destination=self.destination, hotel=self.hotel,
+                category=self.hotel.category, room_type=self.room_type, meal_plan=self.meal_plan, option='option_1',
+                num_double_beds=n + 1, extra_beds=n % 2, check_in_date=day, check_in_time=time(13),
+                check_out_date=day + timedelta(days=1), check_out_time=time(10)
+            )
+            HotelBookingInclusion.objects.create(hotel_booking=booking, special_inclusion=self.hotel_inclusion)
+            VehicleBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, destination=self.destination, vehicle=self.vehicle,
+                pickup_date=day, total_km=120 + n, num_passengers=2
+            )
+            ActivityBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, activity=self.activity, booking_date=day, num_adults=2, num_children=n
+            )
+            StandaloneInclusionBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, special_inclusion=self.general_inclusion, booking_date=day, num_adults=2
+            )
+        ItineraryPricingOption.objects.create(
+            itinerary=itinerary, option_name='Option 1', option_number=1, net_price=Decimal('20000'),
+            markup_amount=Decimal('2000'), gross_price=Decimal('22000'), final_amount=Decimal('23100'), hotels_included=[]
+        )
+        return itinerary
+
+    def new_version(self, source):
+        return Itinerary.objects.create(
+            name=source.name, query=source.query, travel_from=source.travel_from, travel_to=source.travel_to,
+            adults=source.adults, childrens=source.childrens
+        )
+
+    def rows(self, itinerary):
+        """Every row hanging off ``itinerary``, as comparable field values, per model."""
+        def values(queryset):
+            model = queryset.model
+            names = [
+                f.attname for f in model._meta.concrete_fields
+                if f.attname not in self.OWN_FIELDS and not getattr(f, 'auto_now', False) and not getattr(f, 'auto_now_add', False)
+            ]
+            return [tuple(getattr(row, name) for name in names) for row in queryset.order_by('id')]
+
+        day_plans = itinerary.day_plans.order_by('day_number')
+        return {
+            'day_plans': values(day_plans),
+            'links': [
+                (sorted(day.hotels.values_list('id', flat=True)), sorted(day.activities.values_list('id', flat=True)))
+                for day in day_plans
+            ],
+            'day_numbers': [
+                [booking.day_plan.day_number for booking in model.objects.filter(itinerary=itinerary).order_by('id')]
+                for model in (HotelBooking, VehicleBooking, ActivityBooking, StandaloneInclusionBooking)
+            ],
+            'hotels': values(HotelBooking.objects.filter(itinerary=itinerary)),
+            'hotel_inclusions': values(HotelBookingInclusion.objects.filter(hotel_booking__itinerary=itinerary)),
+            'vehicles': values(VehicleBooking.objects.filter(itinerary=itinerary)),
+            'activities': values(ActivityBooking.objects.filter(itinerary=itinerary)),
+            'standalone': values(StandaloneInclusionBooking.objects.filter(itinerary=itinerary)),
+            'pricing_options': values(ItineraryPricingOption.objects.filter(itinerary=itinerary)),
+        }
+
+    def test_clone_copies_every_row(self):
+        source = self.make_itinerary(4)
+        target = self.new_version(source)
+        counts = itinerary_versioning.clone_itinerary(source, target)
+
+        self.assertEqual(counts, {
+            'days': 4, 'hotels': 4, 'vehicles': 4, 'activities': 4, 'houseboats': 0,
+            'standalone_inclusions': 4, 'pricing_options': 1,
+        })
+        self.assertEqual(self.rows(target), self.rows(source))
+        # The source version is left as it was
+        self.assertEqual(HotelBooking.objects.filter(itinerary=source).count(), 4)
+
+    def test_clone_query_count_is_fixed(self):
+        def clone_queries(days):
+            source = self.make_itinerary(days)
+            target = self.new_version(source)
+            with CaptureQueriesContext(connection) as captured:
+                itinerary_versioning.clone_itinerary(source, target)
+            return len(captured.captured_queries)
+
+        self.assertEqual(clone_queries(2), clone_queries(8))
+
+    def test_clone_for_new_dates_shifts_the_bookings(self):
+        source = self.make_itinerary(3)
+        target = self.new_version(source)
+        target.travel_from += timedelta(days=7)
+        target.travel_to += timedelta(days=7)
+        target.total_days = 3
+        target.save()
+
+        counts, skipped = itinerary_versioning.clone_for_new_dates(source, target)
+
+        self.assertEqual((counts['hotels'], counts['vehicles'], counts['activities']), (3, 3, 3))
+        self.assertFalse(any(skipped.values()))
+        week = timedelta(days=7)
+        self.assertEqual(
+            list(HotelBooking.objects.filter(itinerary=target).order_by('id').values_list('check_in_date', 'num_double_beds')),
+            [(check_in + week, rooms) for check_in, rooms in
+             HotelBooking.objects.filter(itinerary=source).order_by('id').values_list('check_in_date', 'num_double_beds')]
+        )
+        self.assertEqual(
+            list(VehicleBooking.objects.filter(itinerary=target).order_by('id').values_list('pickup_date', flat=True)),
+            [day + week for day in VehicleBooking.objects.filter(itinerary=source).order_by('id').values_list('pickup_date', flat=True)]
+        )
+
+
+class RepriceItinerariesTests(TestCase):
+    """Batch repricing writes what the single-itinerary pricing would, chunk by chunk."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = make_member('reprice@example.com')
+        cls.destination = Destinations.objects.create(name='Alleppey')
+        cls.room_type = RoomType.objects.create(name='Deluxe')
+        cls.meal_plan = MealPlan.objects.create(name='CP', created_by=cls.member)
+        cls.hotels = [
+            Hotel.objects.create(
+                name=f'Lake Hotel {n}', category='3star', destination=cls.destination, details='-',
+                contact_person='-', phone_number='9000000000', email='hotel@example.com'
+            )
+            for n in (1, 2)
+        ]
+        cls.rates = [
+            Hotelprice.objects.create(
+                hotel=hotel, room_type=cls.room_type, meal_plan=cls.meal_plan,
+                from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), double_bed=Decimal(double_bed)
+            )
+            for hotel, double_bed in zip(cls.hotels, ('2000', '2600'))
+        ]
+        cls.vehicle = Vehicle.objects.create(name='Etios', destination=cls.destination, details='-')
+        VehiclePricing.objects.create(
+            vehicle=cls.vehicle, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+            total_fee_100km=Decimal('2200'), extra_fee_per_km=Decimal('14')
+        )
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+
+    def make_itinerary(self, rooms, **fields):
+        start = date(2026, 9, 7)
+        itinerary = make_itinerary(make_query(self.member, start, days=3), f'{rooms} room trip', **fields)
+        for n in range(2):
+            day = start + timedelta(days=n)
+            day_plan = ItineraryDayPlan.objects.create(
+                itinerary=itinerary, day_number=n + 1, title=f'Day {n + 1}', description='-', destination=self.destination
+            )
+            for option, hotel in zip(('option_1', 'option_2'), self.hotels):
+                HotelBooking.objects.create(
+                    itinerary=itinerary, day_plan=day_plan, destination=self.destination, hotel=hotel,
+                    category=hotel.category, room_type=self.room_type, meal_plan=self.meal_plan, option=option,
+                    num_double_beds=rooms, check_in_date=day, check_in_time=time(12),
+                    check_out_date=day + timedelta(days=1), check_out_time=time(11)
+                )
+            VehicleBooking.objects.create(
+                itinerary=itinerary, day_plan=day_plan, destination=self.destination, vehicle=self.vehicle,
+                pickup_date=day, total_km=130, num_passengers=2
+            )
+        return itinerary
+
+    def single_pricing(self, itinerary):
+        with contextlib.redirect_stdout(io.StringIO()):
+            rows = pricing_utils.calculate_itinerary_pricing(Itinerary.objects.get(pk=itinerary.pk), save=False)
+        return {row['option_number']: Decimal(row['final_amount']).quantize(Decimal('0.01')) for row in rows}
+
+    def saved(self, itinerary):
+        return dict(
+            ItineraryPricingOption.objects.filter(itinerary=itinerary).values_list('option_number', 'final_amount')
+        )
+
+    def test_batch_matches_single_pricing(self):
+        itineraries = [
+            self.make_itinerary(1),
+            self.make_itinerary(2, cgst_percentage=Decimal('2.5'), sgst_percentage=Decimal('2.5')),
+            self.make_itinerary(3, discount=Decimal('750')),
+        ]
+        expected = {itinerary.id: self.single_pricing(itinerary) for itinerary in itineraries}
+        self.assertEqual(len(expected[itineraries[0].id]), 2)
+
+        result = pricing_utils.reprice_itineraries([itinerary.id for itinerary in itineraries], chunk_size=2)
+
+        self.assertEqual((result['itineraries'], result['options'], result['dry_run']), (3, 6, False))
+        self.assertEqual({itinerary.id: self.saved(itinerary) for itinerary in itineraries}, expected)
+
+    def test_dry_run_reports_the_rate_change_and_writes_nothing(self):
+        itinerary = self.make_itinerary(2)
+        ItineraryPricingOption.objects.create(
+            itinerary=itinerary, option_name='Option 1', option_number=1, net_price=Decimal('0'),
+            markup_amount=Decimal('500'), gross_price=Decimal('0'), final_amount=Decimal('0'), hotels_included=[]
+        )
+        pricing_utils.reprice_itineraries([itinerary.id])
+        before = self.saved(itinerary)
+        # The saved markup is carried over rather than reset
+        self.assertEqual(before[1], self.single_pricing(itinerary)[1] + Decimal('500'))
+
+        self.rates[0].double_bed = Decimal('2300')
+        self.rates[0].save()
+        result = pricing_utils.reprice_itineraries([itinerary.id], dry_run=True)
+
+        # Two nights, two rooms, 300 more a room: only option 1 uses the repriced hotel
+        self.assertEqual(
+            [(diff['option_number'], diff['old_final'], diff['new_final'], diff['delta']) for diff in result['diffs']],
+            [(1, before[1], before[1] + Decimal('1200'), Decimal('1200'))]
+        )
+        self.assertEqual((result['options'], result['dry_run']), (0, True))
+        self.assertEqual(self.saved(itinerary), before)
+
+        pricing_utils.reprice_itineraries([itinerary.id])
+        self.assertEqual(self.saved(itinerary), {1: before[1] + Decimal('1200'), 2: before[2]})
+        self.assertEqual(ItineraryPricingOption.objects.get(itinerary=itinerary, option_number=1).markup_amount, Decimal('500'))
+
+
+class PackageInsertTests(TestCase):
+    """A package becomes an itinerary in one transaction: all of it or none of it."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = make_member('packages@example.com')
+        cls.destination = Destinations.objects.create(name='Wayanad')
+        cls.room_type = RoomType.objects.create(name='Cottage')
+        cls.meal_plan = MealPlan.objects.create(name='AP', created_by=cls.member)
+        supplier = dict(destination=cls.destination, details='-', contact_person='-', phone_number='9000000000', email='s@example.com')
+        cls.hotel = Hotel.objects.create(name='Forest Resort', category='4star', **supplier)
+        cls.unpriced_hotel = Hotel.objects.create(name='New Resort', category='3star', **supplier)
+        Hotelprice.objects.create(
+            hotel=cls.hotel, room_type=cls.room_type, meal_plan=cls.meal_plan,
+            from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), double_bed=Decimal('4000')
+        )
+        cls.vehicle = Vehicle.objects.create(name='Xylo', destination=cls.destination, details='-')
+        VehiclePricing.objects.create(
+            vehicle=cls.vehicle, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31),
+            total_fee_100km=Decimal('2600'), extra_fee_per_km=Decimal('16')
+        )
+        cls.activity = Activity.objects.create(name='Edakkal Caves', destination=cls.destination, details='-')
+        ActivityPrice.objects.create(
+            activity=cls.activity, from_date=date(2026, 1, 1), to_date=date(2026, 12, 31), per_person=Decimal('100')
+        )
+
+        start = date(2026, 3, 2)
+        cls.package = PackageTemplate.objects.create(
+            name='Wayanad Weekend', from_date=start, to_date=start + timedelta(days=1), total_days=2, created_by=cls.member
+        )
+        cls.package.destinations.add(cls.destination)
+        for n in range(2):
+            day = start + timedelta(days=n)
+            owner = {'package_template': cls.package}
+            day_plan = PackageTemplateDayPlan.objects.create(
+                day_number=n + 1, title=f'Day {n + 1}', description='-', destination=cls.destination, **owner
+            )
+            for option, hotel in zip(('option_1', 'option_2'), (cls.hotel, cls.unpriced_hotel)):
+                HotelBooking.objects.create(
+                    package_day_plan=day_plan, destination=cls.destination, hotel=hotel, category=hotel.category,
+                    room_type=cls.room_type, meal_plan=cls.meal_plan, option=option, num_double_beds=1,
+                    check_in_date=day, check_in_time=time(12), check_out_date=day + timedelta(days=1), check_out_time=time(11),
+                    **owner
+                )
+            ActivityBooking.objects.create(
+                package_day_plan=day_plan, activity=cls.activity, booking_date=day, num_adults=2, num_children=0, **owner
+            )
+            VehicleBooking.objects.create(
+                package_day_plan=day_plan, destination=cls.destination, vehicle=cls.vehicle, pickup_date=day,
+                total_km=100, num_passengers=2, **owner
+            )
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+        self.query = make_query(self.member, date(2026, 5, 4))
+
+    def itinerary_rows(self):
+        return {
+            'itineraries': Itinerary.objects.count(),
+            'day_plans': ItineraryDayPlan.objects.count(),
+            'hotels': HotelBooking.objects.filter(itinerary__isnull=False).count(),
+            'activities': ActivityBooking.objects.filter(itinerary__isnull=False).count(),
+            'vehicles': VehicleBooking.objects.filter(itinerary__isnull=False).count(),
+            'pricing_options': ItineraryPricingOption.objects.count(),
+        }
+
+    def test_materialise_shifts_the_package_to_the_query_dates(self):
+        itinerary, skipped = package_insert.materialise_package(self.package, self.query, self.query.from_date, created_by=self.member)
+
+        self.assertEqual(self.itinerary_rows(), {
+            'itineraries': 1, 'day_plans': 2, 'hotels': 2, 'activities': 2, 'vehicles': 2, 'pricing_options': 1,
+        })
+        self.assertEqual([(item['type'], item['day']) for item in skipped], [('Hotel', 1), ('Hotel', 2)])
+        self.assertEqual(
+            list(HotelBooking.objects.filter(itinerary=itinerary).order_by('check_in_date').values_list('check_in_date', flat=True)),
+            [date(2026, 5, 4), date(2026, 5, 5)]
+        )
+        self.assertTrue(Itinerary.objects.get(pk=itinerary.pk).is_finalized)
+
+    def test_failed_write_leaves_nothing_behind(self):
+        with mock.patch.object(VehicleBooking.objects, 'bulk_create', side_effect=IntegrityError('disk full')):
+            with self.assertRaises(IntegrityError):
+                package_insert.materialise_package(self.package, self.query, self.query.from_date)
+
+        # The itinerary, its day plans and the bookings written before the vehicles are all rolled back
+        self.assertEqual(set(self.itinerary_rows().values()), {0})
+
+    def test_pricing_failure_keeps_the_itinerary(self):
+        with mock.patch.object(package_insert, 'save_itinerary_pricing', side_effect=ValueError('no tax rate')), \
+                self.assertLogs('Travel.package_insert', 'ERROR'):
+            itinerary, _ = package_insert.materialise_package(self.package, self.query, self.query.from_date)
+
+        rows = self.itinerary_rows()
+        self.assertEqual((rows['itineraries'], rows['hotels'], rows['pricing_options']), (1, 2, 0))
+        self.assertFalse(Itinerary.objects.get(pk=itinerary.pk).is_finalized)
+
+
+class VersionDiffCacheTests(TestCase):
+    """A cached version diff is retired by the itinerary's revision bump, on every worker."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.member = make_member('diffs@example.com')
+        cls.destination = Destinations.objects.create(name='Varkala')
+        cls.room_type = RoomType.objects.create(name='Sea View')
+        cls.meal_plan = MealPlan.objects.create(name='CP', created_by=cls.member)
+        cls.hotel = Hotel.objects.create(
+            name='Cliff Hotel', category='3star', destination=cls.destination, details='-',
+            contact_person='-', phone_number='9000000000', email='hotel@example.com'
+        )
+        cls.vehicle = Vehicle.objects.create(name='Dzire', destination=cls.destination, details='-')
+
+    def setUp(self):
+        rate_index._shared.update(version=None, index=None)
+        # Ids and revisions restart with each test's rollback; the cache does not
+        cache.clear()
+        start = date(2026, 11, 2)
+        self.old = make_itinerary(make_query(self.member, start, days=3), 'Beach Break')
+        for n in range(2):
+            day = start + timedelta(days=n)
+            day_plan = ItineraryDayPlan.objects.create(
+                itinerary=self.old, day_number=n + 1, title=f'Day {n + 1}', description='-', destination=self.destination
+            )
+            HotelBooking.objects.create(
+                itinerary=self.old, day_plan=day_plan, destination=self.destination, hotel=self.hotel,
+                category=self.hotel.category, room_type=self.room_type, meal_plan=self.meal_plan, option='option_1',
+                num_double_beds=1, check_in_date=day, check_in_time=time(12),
+                check_out_date=day + timedelta(days=1), check_out_time=time(11)
+            )
+        VehicleBooking.objects.create(
+            itinerary=self.old, destination=self.destination, vehicle=self.vehicle, pickup_date=start,
+            total_km=80, num_passengers=2
+        )
+        self.new = make_itinerary(self.old.query, 'Beach Break', parent_itinerary=self.old, version_number=2)
+        itinerary_versioning.clone_itinerary(self.old, self.new)
+        self.booking = HotelBooking.objects.filter(itinerary=self.new).order_by('check_in_date').first()
+
+    def diff(self):
+        return version_diff.diff_versions(self.old, self.new)
+
+    def test_edit_retires_the_cached_diff(self):
+        self.assertEqual(self.diff()['summary']['unchanged'], 3)
+        with CaptureQueriesContext(connection) as captured:
+            self.assertEqual(self.diff()['summary']['changed'], 0)
+        # Served from the cache: only the revisions are read
+        self.assertEqual(len(captured.captured_queries), 1)
+
+        # Storing a line price changes nothing the diff shows and keeps it cached
+        self.booking.priced_net = Decimal('1234.00')
+        self.booking.save(update_fields=['priced_net'])
+        with CaptureQueriesContext(connection) as captured:
+            self.diff()
+        self.assertEqual(len(captured.captured_queries), 1)
+
+        self.booking.num_double_beds = 2
+        self.booking.save()
+        diff = self.diff()
+        self.assertEqual(diff['summary']['changed'], 1)
+        self.assertEqual(diff['bookings']['hotels']['changed'][0]['changes']['num_double_beds'], [1, 2])
+
+    def test_edit_on_another_worker_retires_this_workers_diff(self):
+        self.assertEqual(self.diff()['summary']['changed'], 0)
+
+        # Another process, with its own cache, removes a booking
+        with override_settings(CACHES=OTHER_WORKER_CACHE):
+            VehicleBooking.objects.get(itinerary=self.new).delete()
+
+        diff = self.diff()
+        self.assertEqual((diff['summary']['removed'], diff['summary']['unchanged']), (1, 2))
+        self.assertEqual(diff['bookings']['vehicles']['removed'][0]['name'], 'Dzire')
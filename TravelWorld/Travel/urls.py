@@ -52,6 +52,8 @@ urlpatterns = [
      path('hotels/<int:hotel_id>/prices/add/', views.Hotel_add_price, name='add_price'),
      path('hotel/<int:hotel_id>/price/edit/<int:price_id>/', views.Hotel_edit_price, name='edit_price'),
      path('hotel/<int:hotel_id>/price/delete/<int:price_id>/', views.Hotel_delete_price, name='delete_price'),
+     path('prices/import-sheet/', views.import_rate_sheet, name='import_rate_sheet'),
+     path('prices/rate-changes/metrics/', views.rate_change_metrics, name='rate_change_metrics'),
 
 
      path('houseboats/', views.houseboat_list, name='houseboat_list'),
@@ -165,6 +167,7 @@ urlpatterns = [
      path('roles/<int:pk>/delete/', views.delete_role, name='delete_role'),
 
      path('queries/', views.query_list, name='query_list'),
+     path('queries/rows/', views.query_list_rows, name='query_list_rows'),
      path('query/add/', views.add_query, name='add_query'),
      path('query/<int:pk>/edit/', views.edit_query, name='edit_query'),
 
@@ -187,6 +190,7 @@ urlpatterns = [
      path('get-hotel-inclusions/<int:hotel_id>/', views.get_hotel_inclusions, name='get_hotel_inclusions'),
      path('get-houseboat-inclusions/<int:houseboat_id>/', views.get_houseboat_inclusions, name='get_houseboat_inclusions'),
      path('itinerary/<int:itinerary_id>/create-hotel-booking/', views.create_hotel_booking, name='create_hotel_booking'),
+     path('itinerary/<int:itinerary_id>/auto-build-hotel-options/', views.auto_build_hotel_options, name='auto_build_hotel_options'),
      path('hotel-booking/<int:booking_id>/update/', views.update_hotel_booking, name='update_hotel_booking'),
      path('hotel-booking/<int:booking_id>/update/', views.update_hotel_booking, name='update_hotel_booking'),
      path('hotel-booking/<int:booking_id>/delete/', views.delete_hotel_booking, name='delete_hotel_booking'),
@@ -325,6 +329,7 @@ urlpatterns = [
      path("leads/", LeadListView.as_view(), name="lead-list"),
      path("api/leads/", ApiLeadListCreateView.as_view(), name="api-lead-list-create"),
      path("api/leads/<int:pk>/", ApiLeadDetailView.as_view(), name="api-lead-detail"),
+     path("api/leads/batch/", ApiLeadBatchView.as_view(), name="api-lead-batch"),
 
 
 
@@ -393,6 +398,7 @@ urlpatterns = [
 
     path('api/hotels/by-destination/', views.get_hotels_by_destination, name='hotels_by_destination'),
     path('hotel/get-priced-hotels/', views.get_priced_hotels, name='get_priced_hotels'),
+    path('hotel/cheapest-hotels/', views.find_cheapest_hotels, name='find_cheapest_hotels'),
 
 
         # Driver PDF Views
@@ -411,6 +417,9 @@ urlpatterns = [
      path('query/<int:query_id>/version-history/',
          views.itinerary_version_history,
          name='itinerary_version_history'),
+     path('itinerary/<int:itinerary_id>/diff/',
+         views.itinerary_version_diff,
+         name='itinerary_version_diff'),
      path('itinerary/<int:itinerary_id>/delete-version/',
          views.delete_itinerary_version,
          name='delete_itinerary_version'),
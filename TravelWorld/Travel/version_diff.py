@@ -0,0 +1,298 @@
+# version_diff.py
+"""
+Booking- and price-level differences between two itinerary versions.
+
+Both versions (or every version on a history page) are loaded with one
+``values()`` query per table, matched in memory on a per-type identity key
+(day, option and supplier, not row id, since every version has its own
+rows) and the result cached per version pair. Each itinerary has a
+revision (a database counter, see revisions.py) that signals.py bumps
+whenever one of its rows is saved or deleted, so no worker serves a
+cached diff for content that has changed.
+"""
+from collections import defaultdict
+from datetime import date, time
+from decimal import Decimal
+from django.core.cache import cache
+from .models import (
+    Itinerary, ItineraryDayPlan, HotelBooking, HotelBookingInclusion, HouseboatBooking, HouseboatBookingInclusion,
+    VehicleBooking, ActivityBooking, StandaloneInclusionBooking, ItineraryPricingOption
+)
+from .pricing import HOUSEBOAT_BED_FIELDS, option_key, option_label
+from . import revisions
+
+
+REVISION_NAME = 'itinerary:{}'
+DIFF_KEY = 'itinerary_diff:{}:{}:{}:{}'
+DIFF_TIMEOUT = 60 * 60 * 24
+
+ITINERARY_FIELDS = (
+    'name', 'travel_from', 'travel_to', 'total_days', 'adults', 'childrens', 'infants',
+    'cgst_percentage', 'sgst_percentage', 'discount', 'markup_type', 'markup_value',
+)
+DAY_PLAN_FIELDS = ('title', 'destination__name')
+MARKUP_FIELDS = ('markup_type', 'markup_value')
+
+# key: fields naming the same booking across versions; label: display name
+# fields (first non-empty wins); fields: what is compared.
+BOOKING_TYPES = {
+    'hotels': {
+        'model': HotelBooking,
+        'key': ('option', 'hotel_id', 'custom_hotel_name'),
+        'label': ('hotel__name', 'custom_hotel_name'),
+        'fields': (
+            'room_type__name', 'custom_room_type', 'meal_plan__name', 'check_in_date', 'check_out_date',
+            'num_double_beds', 'extra_beds', 'child_with_bed', 'child_without_bed', *MARKUP_FIELDS,
+            'custom_double_bed_total', 'custom_extra_bed_total', 'custom_child_with_bed_total',
+            'custom_child_without_bed_total',
+        ),
+    },
+    'houseboats': {
+        'model': HouseboatBooking,
+        'key': ('option', 'houseboat_id'),
+        'label': ('houseboat__name',),
+        'fields': (
+            'room_type__name', 'meal_plan__name', 'check_in_date', 'check_out_date',
+            *(qty for qty, _ in HOUSEBOAT_BED_FIELDS), *MARKUP_FIELDS,
+        ),
+    },
+    'vehicles': {
+        'model': VehicleBooking,
+        'key': ('option', 'vehicle_id'),
+        'label': ('vehicle__name',),
+        'fields': ('pickup_date', 'vehicle_type', 'total_km', 'num_passengers', 'custom_total_price', *MARKUP_FIELDS),
+    },
+    'activities': {
+        'model': ActivityBooking,
+        'key': ('activity_id',),
+        'label': ('activity__name',),
+        'fields': ('booking_date', 'booking_time', 'num_adults', 'num_children', 'custom_total_price', *MARKUP_FIELDS),
+    },
+    'standalone_inclusions': {
+        'model': StandaloneInclusionBooking,
+        'key': ('special_inclusion_id',),
+        'label': ('special_inclusion__name',),
+        'fields': ('booking_date', 'booking_time', 'num_adults', 'num_children', 'total_price', *MARKUP_FIELDS),
+    },
+}
+
+INCLUSION_MODELS = {
+    'hotels': (HotelBookingInclusion, 'hotel_booking'),
+    'houseboats': (HouseboatBookingInclusion, 'houseboat_booking'),
+}
+
+PRICE_FIELDS = (
+    'net_price', 'markup_amount', 'gross_price', 'cgst_amount', 'sgst_amount', 'discount_amount', 'final_amount',
+)
+
+
+def _plain(value):
+    """JSON-safe form of a field value."""
+    if isinstance(value, Decimal):
+        return str(value)
+    if isinstance(value, (date, time)):
+        return value.isoformat()
+    return value
+
+
+# ==========================================
+# REVISIONS
+# ==========================================
+def touch(*itinerary_ids):
+    """
+    Retire every cached diff involving these itineraries. Signals call it on
+    each save; bulk writers (which skip signals) must call it themselves.
+    """
+    revisions.bump(*(REVISION_NAME.format(i) for i in itinerary_ids if i))
+
+
+def itinerary_revisions(itinerary_ids):
+    """{itinerary id: revision}, read in one query."""
+    names = {REVISION_NAME.format(i): i for i in itinerary_ids}
+    return {names[name]: value for name, (value, _) in revisions.current(*names).items()}
+
+
+# ==========================================
+# SNAPSHOTS
+# ==========================================
+def load_snapshots(itinerary_ids):
+    """
+    Everything the diff compares for ``itinerary_ids``: header fields, day
+    plans, bookings (with their inclusions) and pricing options, one query
+    per table regardless of how many versions are loaded.
+    """
+    itinerary_ids = list(itinerary_ids)
+    snapshots = {
+        row['id']: {'itinerary': row, 'days': {}, 'bookings': defaultdict(list), 'pricing': {}}
+        for row in Itinerary.objects.filter(id__in=itinerary_ids).values('id', 'version_number', 'status', *ITINERARY_FIELDS)
+    }
+
+    for row in (ItineraryDayPlan.objects.filter(itinerary_id__in=itinerary_ids)
+                .values('itinerary_id', 'day_number', *DAY_PLAN_FIELDS).order_by('day_number', 'id')):
+        snapshots[row['itinerary_id']]['days'].setdefault(row['day_number'], row)
+
+    inclusions = {}
+    for name, (model, owner) in INCLUSION_MODELS.items():
+        grouped = defaultdict(list)
+        for booking_id, inclusion, adults, children in (
+            model.objects.filter(**{f'{owner}__itinerary_id__in': itinerary_ids}).order_by('id')
+            .values_list(f'{owner}_id', 'special_inclusion__name', 'num_adults', 'num_children')
+        ):
+            grouped[booking_id].append(f'{inclusion} ({adults}A+{children}C)')
+        inclusions[name] = grouped
+
+    for name, spec in BOOKING_TYPES.items():
+        rows = (
+            spec['model'].objects.filter(itinerary_id__in=itinerary_ids)
+            .values('id', 'itinerary_id', 'day_plan__day_number', *spec['key'], *spec['label'], *spec['fields'])
+            .order_by('id')
+        )
+        for row in rows:
+            if name in inclusions:
+                row['inclusions'] = sorted(inclusions[name].get(row['id'], []))
+            snapshots[row['itinerary_id']]['bookings'][name].append(row)
+
+    for row in (ItineraryPricingOption.objects.filter(itinerary_id__in=itinerary_ids)
+                .values('itinerary_id', 'option_number', 'option_name', *PRICE_FIELDS).order_by('option_number', 'id')):
+        snapshots[row['itinerary_id']]['pricing'].setdefault(row['option_number'], row)
+
+    return snapshots
+
+
+# ==========================================
+# DIFF
+# ==========================================
+def _booking_key(row, spec):
+    values = [row['day_plan__day_number']]
+    for field in spec['key']:
+        values.append(option_key(row[field]) if field == 'option' else row[field])
+    return tuple(values)
+
+
+def _describe(row, spec):
+    entry = {
+        'day': row['day_plan__day_number'],
+        'name': next((row[field] for field in spec['label'] if row[field]), '-'),
+    }
+    if 'option' in spec['key']:
+        entry['option'] = option_label(option_key(row['option']))
+    return entry
+
+
+def _changes(old, new, fields):
+    return {field: [_plain(old[field]), _plain(new[field])] for field in fields if old[field] != new[field]}
+
+
+def diff_bookings(old_rows, new_rows, spec, fields):
+    """Match rows on their identity key (in id order for repeats) and compare ``fields``."""
+    old_by_key = defaultdict(list)
+    for row in old_rows:
+        old_by_key[_booking_key(row, spec)].append(row)
+
+    result = {'added': [], 'removed': [], 'changed': [], 'unchanged': 0}
+    for row in new_rows:
+        matches = old_by_key.get(_booking_key(row, spec))
+        if not matches:
+            result['added'].append(_describe(row, spec))
+            continue
+        changes = _changes(matches.pop(0), row, fields)
+        if changes:
+            result['changed'].append({**_describe(row, spec), 'changes': changes})
+        else:
+            result['unchanged'] += 1
+    for rows in old_by_key.values():
+        result['removed'].extend(_describe(row, spec) for row in rows)
+    return result
+
+
+def diff_pricing(old_options, new_options):
+    """Per option number: both sides and the change in every amount."""
+    options = []
+    for number in sorted(set(old_options) | set(new_options)):
+        old, new = old_options.get(number), new_options.get(number)
+        entry = {
+            'option_number': number,
+            'option_name': (new or old)['option_name'],
+            'before': {field: _plain(old[field]) for field in PRICE_FIELDS} if old else None,
+            'after': {field: _plain(new[field]) for field in PRICE_FIELDS} if new else None,
+        }
+        if old and new:
+            entry['delta'] = {field: _plain(new[field] - old[field]) for field in PRICE_FIELDS}
+        entry['changed'] = not (old and new) or any(old[field] != new[field] for field in PRICE_FIELDS)
+        options.append(entry)
+    return options
+
+
+def diff_snapshots(old, new):
+    days = {}
+    for number in sorted(set(old['days']) | set(new['days'])):
+        before, after = old['days'].get(number), new['days'].get(number)
+        if not before:
+            days[number] = {'status': 'added', 'title': after['title']}
+        elif not after:
+            days[number] = {'status': 'removed', 'title': before['title']}
+        else:
+            changes = _changes(before, after, DAY_PLAN_FIELDS)
+            if changes:
+                days[number] = {'status': 'changed', 'changes': changes}
+
+    bookings = {
+        name: diff_bookings(
+            old['bookings'].get(name, []), new['bookings'].get(name, []), spec,
+            spec['fields'] + (('inclusions',) if name in INCLUSION_MODELS else ())
+        )
+        for name, spec in BOOKING_TYPES.items()
+    }
+    pricing = diff_pricing(old['pricing'], new['pricing'])
+    return {
+        'from': {field: _plain(old['itinerary'][field]) for field in ('id', 'version_number', 'status')},
+        'to': {field: _plain(new['itinerary'][field]) for field in ('id', 'version_number', 'status')},
+        'itinerary': _changes(old['itinerary'], new['itinerary'], ITINERARY_FIELDS),
+        'days': days,
+        'bookings': bookings,
+        'pricing': pricing,
+        'summary': {
+            'added': sum(len(b['added']) for b in bookings.values()),
+            'removed': sum(len(b['removed']) for b in bookings.values()),
+            'changed': sum(len(b['changed']) for b in bookings.values()),
+            'unchanged': sum(b['unchanged'] for b in bookings.values()),
+            'price_changes': sum(1 for option in pricing if option['changed']),
+        },
+    }
+
+
+def base_version(itinerary):
+    """The version ``itinerary`` was made from, else the previous version number of the same query."""
+    if itinerary.parent_itinerary_id:
+        return itinerary.parent_itinerary
+    return (
+        Itinerary.objects.filter(query_id=itinerary.query_id, version_number__lt=itinerary.version_number)
+        .order_by('-version_number', '-id').first()
+    )
+
+
+def diff_pairs(pairs):
+    """
+    Diffs for many (old_id, new_id) pairs. Cached pairs are served from the
+    cache; the rest share one snapshot load.
+    """
+    pairs = list(dict.fromkeys(pairs))
+    tokens = itinerary_revisions({i for pair in pairs for i in pair})
+    keys = {DIFF_KEY.format(a, b, tokens[a], tokens[b]): (a, b) for a, b in pairs}
+    cached = cache.get_many(keys)
+    result = {keys[key]: value for key, value in cached.items()}
+
+    missing = {key: pair for key, pair in keys.items() if key not in cached}
+    if missing:
+        snapshots = load_snapshots({i for pair in missing.values() for i in pair})
+        fresh = {}
+        for key, (a, b) in missing.items():
+            if a in snapshots and b in snapshots:
+                result[(a, b)] = fresh[key] = diff_snapshots(snapshots[a], snapshots[b])
+        cache.set_many(fresh, DIFF_TIMEOUT)
+    return result
+
+
+def diff_versions(old, new):
+    """Diff between two itineraries (cached per pair and content revision)."""
+    return diff_pairs([(old.id, new.id)]).get((old.id, new.id))
@@ -936,6 +936,44 @@ def Hotel_delete_price(request, hotel_id, price_id):
     price.delete()
     return redirect('price_list', hotel_id=hotel_id)
 
+
+@require_POST
+@custom_login_required
+def import_rate_sheet(request):
+    """
+    Upload a hotel or houseboat rate sheet (CSV/XLSX). Returns the import
+    summary; with dry_run nothing is written, with partial only the clean
+    rows are written when others fail.
+    """
+    from .rate_import import SHEETS, RateSheetError, import_rate_sheet as run_import
+
+    kind = request.POST.get('kind', 'hotel')
+    sheet = request.FILES.get('sheet')
+    if kind not in SHEETS or not sheet:
+        return JsonResponse({'success': False, 'error': 'A sheet file and kind (hotel/houseboat) are required'}, status=400)
+
+    try:
+        result = run_import(
+            kind, sheet, filename=sheet.name,
+            dry_run=request.POST.get('dry_run') in ('1', 'true', 'on'),
+            partial=request.POST.get('partial') in ('1', 'true', 'on'),
+        )
+    except RateSheetError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+
+    summary = result.summary()
+    print(f"📥 Rate sheet {sheet.name} ({kind}): {summary['rows']} rows, {summary['created']} new, "
+          f"{summary['updated']} changed, {len(summary['errors'])} invalid, {len(summary['conflicts'])} overlaps")
+    return JsonResponse({'success': result.ok or result.written, **summary})
+
+
+@custom_login_required
+def rate_change_metrics(request):
+    """Depth and lag of the rate change queue that reprices draft itineraries (rate_changes.py)."""
+    from .rate_changes import queue_metrics
+
+    return JsonResponse({'success': True, **queue_metrics()})
+
 ###############################################################################################################
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
@@ -2513,98 +2551,87 @@ import json
 from django.utils import timezone
 from datetime import datetime
 
+def _query_list_scope(request):
+    """(scoped queryset, user role, counts cache scope, filters) shared by the list page and its rows endpoint."""
+    from .query_listing import scoped_queries, read_filters, apply_filters
+
+    user_id = request.session.get('user_id')
+    user_type = request.session.get('user_type')
+    queries, user_role = scoped_queries(user_type, user_id)
+    filters = read_filters(request.GET)
+    # Admins see every query, so they share one set of cached counts
+    scope = 'all' if user_role in ('superuser', 'admin') else f'{user_role}:{user_id}'
+    return apply_filters(queries, filters), user_role, scope, filters
+
+
 @custom_login_required
 def query_list(request):
+    """
+    First page of the query list (keyset paginated, see query_listing.py);
+    further pages come from query_list_rows as the user scrolls.
+    """
+    from .query_listing import BadCursor, page, status_counts as count_statuses
+
     user_id = request.session.get('user_id')
-    user_type = request.session.get('user_type')
 
     if not user_id:
         messages.warning(request, '⚠️ Please login first')
         return redirect('team_member:login')
 
-    # Get individual search terms from GET
-    name = request.GET.get('name', '').strip()
-    phone = request.GET.get('phone', '').strip()
-    from_date = request.GET.get('from_date', '').strip()
-    assign = request.GET.get('assign', '').strip()
-    query_id = request.GET.get('id', '').strip()
-
-    # Get user role and base queryset
-    user_role = None
-    if user_type == 'superuser':
-        user_role = 'superuser'
-        queries = Query.objects.all()
-    elif user_type == 'team_member':
-        user = TeamMember.objects.get(id=user_id)
-        user_role = user.role
-        if user.role == 'admin':
-            queries = Query.objects.all()
-        elif user.role == 'manager':
-            queries = Query.objects.filter(
-                Q(created_by=user) | Q(assign=user)
-            )
-        else:
-            queries = Query.objects.filter(created_by=user)
-    else:
-        queries = Query.objects.none()
+    queries, user_role, scope, filters = _query_list_scope(request)
+    try:
+        rows, next_cursor = page(queries, request.GET.get('cursor'))
+    except BadCursor:
+        rows, next_cursor = page(queries)
 
-    # Apply filters for each search box field
-    if name:
-        queries = queries.filter(client_name__icontains=name)
-    if phone:
-        queries = queries.filter(phone_number__icontains=phone)
-    if from_date:
-        queries = queries.filter(from_date__icontains=from_date)
-    if assign:
-        queries = queries.filter(
-            Q(assign__first_name__icontains=assign) |
-            Q(assign__last_name__icontains=assign)
-        )
-    if query_id:
-        queries = queries.filter(query_id__icontains=query_id)
-
-    queries = queries.order_by('-created_at')
-
-    # Calculate status counts based on the same filtered queryset
-    total_queries = queries.count()
-
-    # ✅ Get today's date range (start and end of today)
-    today_start = timezone.now().replace(hour=0, minute=0, second=0, microsecond=0)
-    today_end = timezone.now().replace(hour=23, minute=59, second=59, microsecond=999999)
-
-    status_counts = queries.aggregate(
-        new=Count('id', filter=Q(created_at__gte=today_start, created_at__lte=today_end)),  # ✅ Today's queries only
-        active=Count('id', filter=Q(status='active')),
-        no_connect=Count('id', filter=Q(status='no_connect')),
-        hot_lead=Count('id', filter=Q(priority='hot')),
-        follow_up=Count('id', filter=Q(status='follow_up')),
-        proposal_sent=Count('id', filter=Q(status='proposal_sent')),
-        confirmed=Count('id', filter=Q(status='confirmed')),
-        cancelled=Count('id', filter=Q(status='cancelled')),
-        invalid=Count('id', filter=Q(status='invalid')),
-    )
+    # Counts are computed separately from the rows and cached
+    status_counts = count_statuses(queries, scope, filters, user_role, request.session.get('user_id'))
 
     lead_sources = LeadSource.objects.filter(is_active=True).order_by('source_name')
     team_members = TeamMember.objects.filter(is_active=True).order_by('first_name')
 
     context = {
-        'queries': queries,
+        'queries': rows,
+        'next_cursor': next_cursor,
         'query_form': QueryForm(user=None, user_role=user_role),
         'title': 'Query Management',
-        'total_queries': total_queries,
+        'total_queries': status_counts['total'],
         'user_role': user_role,
         'lead_sources': lead_sources,
         'team_members': team_members,
-        'name': name,
-        'phone': phone,
-        'from_date': from_date,
-        'assign': assign,
-        'id': query_id,
+        'name': filters['name'],
+        'phone': filters['phone'],
+        'from_date': filters['from_date'],
+        'assign': filters['assign'],
+        'id': filters['id'],
         'status_counts': status_counts,
     }
     return render(request, 'query_list.html', context)
 
 
+@require_http_methods(["GET"])
+@custom_login_required
+def query_list_rows(request):
+    """Next page of query cards after ``cursor`` (same filters as query_list) as HTML."""
+    from .query_listing import PAGE_SIZE, BadCursor, page
+
+    queries, user_role, scope, filters = _query_list_scope(request)
+    try:
+        size = int(request.GET.get('size', PAGE_SIZE))
+        rows, next_cursor = page(queries, request.GET.get('cursor'), size)
+    except (ValueError, BadCursor):
+        return JsonResponse({'success': False, 'error': 'Invalid cursor or page size'}, status=400)
+
+    html = render_to_string('partials/query_rows.html', {'queries': rows}, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'count': len(rows),
+        'next_cursor': next_cursor,
+        'has_more': next_cursor is not None,
+    })
+
+
 
 
 
@@ -3017,6 +3044,8 @@ from django.db.models import Q, Count, Prefetch
 from django.http import JsonResponse
 from django.views.decorators.http import require_POST
 from .models import Itinerary, Query, TeamMember
+from .pricing_summary import refresh_pricing_summaries, get_pricing_summary, option_prices, normalize_option
+from . import status_counters, search_index
 
 
 @custom_login_required
@@ -3062,11 +3091,8 @@ def list_itineraries(request):
     # ✅ Search filter (by itinerary name or client name)
     search = request.GET.get('search', '').strip()
     if search:
-        itineraries = itineraries.filter(
-            Q(name__icontains=search) |
-            Q(query__client_name__icontains=search) |
-            Q(query__phone_number__icontains=search)
-        )
+        # Itinerary name, client name, phone, email or query id
+        itineraries = search_index.search_filter(itineraries, 'itinerary', search)
 
     # ✅ Status filter
     status = request.GET.get('status', '').strip()
@@ -3109,13 +3135,18 @@ def list_itineraries(request):
         'query',
         'created_by',
         'query__assign',
-        'query__created_by'
+        'query__created_by',
+        'pricing_summary'
     ).prefetch_related(
-        'pricing_options',
         'destinations',
         'day_plans'
     ).order_by('-created_at')
 
+    # ✅ Rebuild missing/stale pricing summaries in one batch before listing
+    refresh_pricing_summaries(
+        itineraries.filter(Q(pricing_summary__isnull=True) | Q(pricing_summary__is_stale=True)).values_list('id', flat=True)
+    )
+
     # ✅ Get team members for admin filter dropdown
     team_members = None
     if user_type == 'superuser' or (current_user and current_user.role == 'admin'):
@@ -3126,11 +3157,21 @@ def list_itineraries(request):
     # ✅ Get status choices for filter
     status_choices = Itinerary.STATUS_CHOICES
 
-    # ✅ Count statistics
-    total_count = itineraries.count()
-    draft_count = itineraries.filter(status='draft').count()
-    confirmed_count = itineraries.filter(status='confirmed').count()
-    cancelled_count = itineraries.filter(status='cancelled').count()
+    # ✅ Count statistics: from the status counters when unfiltered, else one aggregate
+    if not any((search, status, days, from_date, to_date, filter_user_id)):
+        role = 'superuser' if user_type == 'superuser' else current_user.role if current_user else None
+        tiles = status_counters.tiles('itinerary', role, user_id)
+    else:
+        tiles = itineraries.order_by().aggregate(
+            total=Count('id', distinct=True),
+            draft=Count('id', distinct=True, filter=Q(status='draft')),
+            confirmed=Count('id', distinct=True, filter=Q(status='confirmed')),
+            cancelled=Count('id', distinct=True, filter=Q(status='cancelled')),
+        )
+    total_count = tiles['total']
+    draft_count = tiles['draft']
+    confirmed_count = tiles['confirmed']
+    cancelled_count = tiles['cancelled']
 
     context = {
         'itineraries': itineraries,
@@ -4076,30 +4117,18 @@ def get_priced_hotels(request):
 
     try:
         from datetime import datetime
+        from .hotel_search import search_hotels
 
         checkin_date = datetime.strptime(checkin, '%Y-%m-%d').date()
         checkout_date = datetime.strptime(checkout, '%Y-%m-%d').date()
 
-        # ✅ Get hotels that have pricing covering the entire date range
-        priced_hotels_qs = Hotelprice.objects.filter(
-            hotel__destination_id=destination_id,
-            hotel__status=True,
-            from_date__lte=checkin_date,   # Price starts before/on checkin
-            to_date__gte=checkout_date      # Price ends after/on checkout
-        ).select_related('hotel').values(
-            'hotel__id',
-            'hotel__name',
-            'hotel__category'
-        ).distinct()
-
-        # Format response
-        hotels = []
-        for ph in priced_hotels_qs:
-            hotels.append({
-                'id': ph['hotel__id'],
-                'name': ph['hotel__name'],
-                'category': ph['hotel__category']
-            })
+        # ✅ Hotels with one rate covering the entire date range (cheapest rate included)
+        hotels = [{
+            'id': hotel['id'],
+            'name': hotel['name'],
+            'category': hotel['category'],
+            'cheapest_rate': hotel['cheapest_rate'],
+        } for hotel in search_hotels(int(destination_id), checkin_date, checkout_date, full_cover=True)]
 
         return JsonResponse({
             'success': True,
@@ -4120,6 +4149,131 @@ def get_priced_hotels(request):
 
 
 
+# ============================================================
+# 💰 QUICK QUOTE: CHEAPEST PRICED HOTELS PER CATEGORY
+# ============================================================
+@require_http_methods(["GET"])
+@custom_login_required
+def find_cheapest_hotels(request):
+    """
+    Quick quote API: the N cheapest hotels per category in a destination for
+    a stay, room configuration and (optionally) room type / meal plan, with
+    night-by-night stay totals from the rate calendar.
+    """
+    from datetime import datetime
+    from .hotel_search import cheapest_stays, CATEGORY_LABELS
+    from .pricing import HOTEL_BED_FIELDS
+
+    destination_id = request.GET.get('destination')
+    checkin = request.GET.get('checkin')
+    checkout = request.GET.get('checkout')
+
+    if not all([destination_id, checkin, checkout]):
+        return JsonResponse({
+            'success': False,
+            'error': 'destination, checkin, and checkout are required'
+        }, status=400)
+
+    try:
+        checkin_date = datetime.strptime(checkin, '%Y-%m-%d').date()
+        checkout_date = datetime.strptime(checkout, '%Y-%m-%d').date()
+        destination_id = int(destination_id)
+        room_type_id = int(request.GET.get('room_type') or 0) or None
+        meal_plan_id = int(request.GET.get('meal_plan') or 0) or None
+        beds = {qty: max(int(request.GET.get(qty) or 0), 0) for qty, _ in HOTEL_BED_FIELDS}
+        limit = min(max(int(request.GET.get('limit') or 3), 1), 10)
+    except ValueError as ve:
+        return JsonResponse({
+            'success': False,
+            'error': f'Invalid parameter: {str(ve)}'
+        }, status=400)
+
+    if checkout_date < checkin_date:
+        return JsonResponse({
+            'success': False,
+            'error': 'checkout must not be before checkin'
+        }, status=400)
+
+    if not any(beds.values()):
+        beds['num_double_beds'] = 1
+
+    stays = cheapest_stays(destination_id, checkin_date, checkout_date, beds, room_type_id, meal_plan_id, limit)
+
+    # Categories in the order Hotel.CATEGORY_CHOICES lists them
+    categories = [
+        {'category': category, 'category_display': label, 'hotels': stays[category]}
+        for category, label in CATEGORY_LABELS.items() if category in stays
+    ]
+
+    return JsonResponse({
+        'success': True,
+        'beds': beds,
+        'categories': categories,
+        'hotel_count': sum(len(entry['hotels']) for entry in categories)
+    })
+
+
+
+# ============================================================
+# 🏨 AUTO-BUILD HOTEL OPTIONS (STANDARD / DELUXE / PREMIUM / LUXURY)
+# ============================================================
+@require_http_methods(["POST"])
+@custom_login_required
+def auto_build_hotel_options(request, itinerary_id):
+    """
+    Fill the four hotel options of a draft itinerary in one request: the
+    cheapest priced hotel of each tier's category for every stay, written in
+    one bulk transaction. Nights that already have a hotel for an option are
+    left alone, and so are the saved pricing options.
+    """
+    from .option_builder import TIER_CATEGORIES, build_option_sets, default_beds
+    from .pricing import HOTEL_BED_FIELDS
+
+    itinerary = get_object_or_404(Itinerary, id=itinerary_id)
+    if not itinerary.travel_from:
+        return JsonResponse({'success': False, 'error': 'Set the travel dates first'}, status=400)
+
+    options = request.POST.getlist('options') or list(TIER_CATEGORIES)
+    unknown = [option for option in options if option not in TIER_CATEGORIES]
+    if unknown:
+        return JsonResponse({'success': False, 'error': f"Unknown options: {', '.join(unknown)}"}, status=400)
+
+    try:
+        room_type_id = int(request.POST.get('room_type') or 0) or None
+        meal_plan_id = int(request.POST.get('meal_plan') or 0) or None
+        beds = default_beds(itinerary)
+        for qty, _ in HOTEL_BED_FIELDS:
+            if request.POST.get(qty):
+                beds[qty] = max(int(request.POST[qty]), 0)
+    except ValueError as ve:
+        return JsonResponse({'success': False, 'error': f'Invalid parameter: {str(ve)}'}, status=400)
+
+    try:
+        plan, matrix = build_option_sets(itinerary, beds, options, room_type_id, meal_plan_id)
+    except ValueError as ve:
+        return JsonResponse({'success': False, 'error': str(ve)}, status=400)
+    except Exception as e:
+        print(f"❌ Error auto-building hotel options for itinerary #{itinerary_id}: {e}")
+        return JsonResponse({'success': False, 'error': str(e)}, status=500)
+
+    counts = plan.counts
+    print(f"🏨 Auto-built {len(plan.bookings)} hotel bookings for itinerary #{itinerary_id} "
+          f"({', '.join(f'{option}: {count}' for option, count in counts.items())}), {len(plan.skipped)} skipped")
+
+    return JsonResponse({
+        'success': True,
+        'created': counts,
+        'skipped': plan.skipped,
+        'beds': beds,
+        # Line-price totals; the saved pricing options are unchanged until the user saves again
+        'option_totals': [
+            {'option': row['key'], 'label': row['label'], **{name: round(row[name], 2) for name in ('net', 'markup', 'gross')}}
+            for row in matrix['rows']
+        ],
+    })
+
+
+
 from django.http import JsonResponse
 from django.template.loader import render_to_string
 
@@ -4188,25 +4342,13 @@ def get_section_data_ajax(request, itinerary_id):
         } for item in items]
 
     elif selected_section == 'hotels':
-        from .models import Hotelprice
-        valid_hotel_ids = Hotelprice.objects.filter(
-            hotel__destination=destination,
-            hotel__status=True
-        ).filter(
-            Q(from_date__lte=itinerary.travel_to) & Q(to_date__gte=itinerary.travel_from)
-        ).values_list('hotel_id', flat=True).distinct()
-
-        items = Hotel.objects.filter(
-            id__in=valid_hotel_ids,
-            destination=destination,
-            status=True
-        ).select_related('destination').order_by('name')
-
+        from .hotel_search import search_hotels
         section_data = [{
-            'id': item.id,
-            'name': item.name,
-            'destination': item.destination.name if item.destination else '',
-        } for item in items]
+            'id': hotel['id'],
+            'name': hotel['name'],
+            'destination': destination.name,
+            'cheapest_rate': hotel['cheapest_rate'],
+        } for hotel in search_hotels(destination.id, itinerary.travel_from, itinerary.travel_to)]
 
     elif selected_section == 'houseboats':
         from .models import HouseboatPrice
@@ -4288,101 +4430,38 @@ from django.views.decorators.http import require_GET
 from django.http import JsonResponse
 from django.shortcuts import get_object_or_404
 
-@require_GET
-def get_valid_houseboat_options(request, houseboat_id):
+def valid_options_response(request, kind, supplier_id):
     """
-    Returns ONLY room types and meal plans that exist in HouseboatPrice table
-    Based on check-in and check-out dates
+    Cached room type / meal plan options for the booking modals, with
+    ETag and Last-Modified so an unchanged window revalidates as a 304.
     """
-    try:
-        # Get parameters
-        checkin = request.GET.get('checkin')
-        checkout = request.GET.get('checkout')
-
-        print(f"\n{'='*60}")
-        print(f"🚢 get_valid_houseboat_options called")
-        print(f"   Houseboat ID: {houseboat_id}")
-        print(f"   Check-in: {checkin}")
-        print(f"   Check-out: {checkout}")
-
-        # Validate parameters
-        if not checkin or not checkout:
-            return JsonResponse({
-                'success': False,
-                'error': 'Check-in and check-out dates are required'
-            }, status=400)
-
-        # Get houseboat
-        houseboat = get_object_or_404(Houseboat, id=houseboat_id, status=True)
-
-        # Query prices that overlap with the date range
-        valid_prices = HouseboatPrice.objects.filter(
-            houseboat=houseboat,
-            from_date__lte=checkout,  # Price period starts before/on checkout
-            to_date__gte=checkin      # Price period ends after/on checkin
-        ).select_related('room_type', 'meal_plan')
+    from datetime import datetime
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from django.utils.http import http_date, quote_etag
+    from . import catalog_options
 
-        print(f"   Found {valid_prices.count()} valid price entries")
-
-        if not valid_prices.exists():
-            print(f"   ❌ No pricing available")
-            return JsonResponse({
-                'success': False,
-                'error': f'No pricing available for {houseboat.name} from {checkin} to {checkout}',
-                'roomtypes': [],
-                'mealplans': []
-            })
-
-        # Extract unique room types and meal plans
-        room_types = []
-        meal_plans = []
-        room_type_ids = set()
-        meal_plan_ids = set()
-
-        for price in valid_prices:
-            # Add room type if not already added
-            if price.room_type_id not in room_type_ids:
-                room_types.append({
-                    'id': price.room_type.id,
-                    'name': price.room_type.name
-                })
-                room_type_ids.add(price.room_type_id)
-
-            # Add meal plan if not already added
-            if price.meal_plan_id not in meal_plan_ids:
-                meal_plans.append({
-                    'id': price.meal_plan.id,
-                    'name': price.meal_plan.name
-                })
-                meal_plan_ids.add(price.meal_plan_id)
-
-        print(f"   ✅ Room Types: {len(room_types)}")
-        for rt in room_types:
-            print(f"      - {rt['name']} (ID: {rt['id']})")
-
-        print(f"   ✅ Meal Plans: {len(meal_plans)}")
-        for mp in meal_plans:
-            print(f"      - {mp['name']} (ID: {mp['id']})")
-
-        print(f"{'='*60}\n")
+    checkin = request.GET.get('checkin')
+    checkout = request.GET.get('checkout')
 
+    if not checkin or not checkout:
         return JsonResponse({
-            'success': True,
-            'houseboat_name': houseboat.name,
-            'roomtypes': room_types,
-            'mealplans': meal_plans,
-            'room_type_count': len(room_types),
-            'meal_plan_count': len(meal_plans)
-        })
+            'success': False,
+            'error': 'Check-in and check-out dates are required'
+        }, status=400)
 
-    except Houseboat.DoesNotExist:
+    try:
+        checkin_date = datetime.strptime(checkin, '%Y-%m-%d').date()
+        checkout_date = datetime.strptime(checkout, '%Y-%m-%d').date()
+    except ValueError as ve:
         return JsonResponse({
             'success': False,
-            'error': 'Houseboat not found'
-        }, status=404)
+            'error': f'Invalid date format: {str(ve)}'
+        }, status=400)
 
+    try:
+        entry = catalog_options.get_options(kind, supplier_id, checkin_date, checkout_date)
     except Exception as e:
-        print(f"❌ Error in get_valid_houseboat_options: {str(e)}")
+        print(f"❌ Error in get_valid_{kind}_options: {str(e)}")
         import traceback
         traceback.print_exc()
         return JsonResponse({
@@ -4390,108 +4469,36 @@ def get_valid_houseboat_options(request, houseboat_id):
             'error': f'Server error: {str(e)}'
         }, status=500)
 
+    if entry['status'] != 200:
+        return JsonResponse(entry['body'], status=entry['status'])
+
+    etag = quote_etag(entry['etag'])
+    response = get_conditional_response(request, etag=etag, last_modified=entry['last_modified'])
+    if response is None:
+        response = JsonResponse(entry['body'])
+    response.headers['ETag'] = etag
+    if entry['last_modified']:
+        response.headers['Last-Modified'] = http_date(entry['last_modified'])
+    # Let the browser keep the answer but revalidate it on every date change
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
 
 
 @require_GET
-def get_valid_hotel_options(request, hotel_id):
+def get_valid_houseboat_options(request, houseboat_id):
     """
-    Returns room types and meal plans based on hotel and dates ONLY (no category)
+    Returns ONLY room types and meal plans that exist in HouseboatPrice table
+    Based on check-in and check-out dates
     """
-    try:
-        # Get parameters - NO CATEGORY
-        checkin = request.GET.get('checkin')
-        checkout = request.GET.get('checkout')
-
-        print(f"\n{'='*60}")
-        print(f"🏨 get_valid_hotel_options called")
-        print(f"   Hotel ID: {hotel_id}")
-        print(f"   Check-in: {checkin}")
-        print(f"   Check-out: {checkout}")
-
-        # Validate parameters
-        if not checkin or not checkout:
-            return JsonResponse({
-                'success': False,
-                'error': 'Check-in and check-out dates are required'
-            }, status=400)
-
-        # Get hotel
-        hotel = get_object_or_404(Hotel, id=hotel_id, status=True)
-
-        # ✅ Query prices WITHOUT category filter
-        valid_prices = Hotelprice.objects.filter(
-            hotel=hotel,
-            from_date__lte=checkout,
-            to_date__gte=checkin
-        ).select_related('room_type', 'meal_plan')
-
-        print(f"   Found {valid_prices.count()} valid price entries")
-
-        if not valid_prices.exists():
-            print(f"   ❌ No pricing available")
-            return JsonResponse({
-                'success': False,
-                'error': f'No pricing available for {hotel.name} from {checkin} to {checkout}',
-                'roomtypes': [],
-                'mealplans': []
-            })
-
-        # Extract unique room types and meal plans
-        room_types = []
-        meal_plans = []
-        room_type_ids = set()
-        meal_plan_ids = set()
-
-        for price in valid_prices:
-            # Add room type if not already added
-            if price.room_type_id not in room_type_ids:
-                room_types.append({
-                    'id': price.room_type.id,
-                    'name': price.room_type.name
-                })
-                room_type_ids.add(price.room_type_id)
-
-            # Add meal plan if not already added
-            if price.meal_plan_id not in meal_plan_ids:
-                meal_plans.append({
-                    'id': price.meal_plan.id,
-                    'name': price.meal_plan.name
-                })
-                meal_plan_ids.add(price.meal_plan_id)
+    return valid_options_response(request, 'houseboat', houseboat_id)
 
-        print(f"   ✅ Room Types: {len(room_types)}")
-        for rt in room_types:
-            print(f"      - {rt['name']} (ID: {rt['id']})")
 
-        print(f"   ✅ Meal Plans: {len(meal_plans)}")
-        for mp in meal_plans:
-            print(f"      - {mp['name']} (ID: {mp['id']})")
-
-        print(f"{'='*60}\n")
-
-        return JsonResponse({
-            'success': True,
-            'hotel_name': hotel.name,
-            'roomtypes': room_types,
-            'mealplans': meal_plans,
-            'room_type_count': len(room_types),
-            'meal_plan_count': len(meal_plans)
-        })
-
-    except Hotel.DoesNotExist:
-        return JsonResponse({
-            'success': False,
-            'error': 'Hotel not found'
-        }, status=404)
-
-    except Exception as e:
-        print(f"❌ Error in get_valid_hotel_options: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return JsonResponse({
-            'success': False,
-            'error': f'Server error: {str(e)}'
-        }, status=500)
+@require_GET
+def get_valid_hotel_options(request, hotel_id):
+    """
+    Returns room types and meal plans based on hotel and dates ONLY (no category)
+    """
+    return valid_options_response(request, 'hotel', hotel_id)
 
 
 
@@ -4832,6 +4839,7 @@ from .models import (
     StandaloneInclusionBooking,  # ✅ ADD THIS
     Hotelprice, VehiclePricing, ActivityPrice, HouseboatPrice
 )
+from . import pricing as pricing_engine
 
 
 
@@ -4855,199 +4863,21 @@ def itinerary_pricing(request, itinerary_id):
     elif user_type == 'team_member':
         current_user = TeamMember.objects.get(id=user_id)
 
-    # Get itinerary
-    itinerary = get_object_or_404(Itinerary, id=itinerary_id)
-
     # ==========================================
-    # 2. PRICE CALCULATION LOGIC
+    # 2. DATA LOADING
     # ==========================================
-    def calculate_all_prices():
-        combined_bookings = list(chain(
-            HotelBooking.objects.filter(day_plan__itinerary=itinerary).prefetch_related('inclusion_items__special_inclusion'),
-            VehicleBooking.objects.filter(itinerary=itinerary),
-            ActivityBooking.objects.filter(day_plan__itinerary=itinerary),
-            HouseboatBooking.objects.filter(day_plan__itinerary=itinerary).prefetch_related('inclusion_items__special_inclusion'),
-            StandaloneInclusionBooking.objects.filter(itinerary=itinerary).select_related('special_inclusion')
-        ))
-
-        all_bookings = []
-
-        for booking in combined_bookings:
-            net_price = Decimal('0.00')
-            nights = 1
-
-            # --- Hotel Booking ---
-            if isinstance(booking, HotelBooking):
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-
-                # If manual net price exists, use it
-                if hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-
-                # 🔥 FIX: Only lookup DB price if it's a REAL hotel
-                elif booking.hotel:
-                    rule = Hotelprice.objects.filter(
-                        hotel=booking.hotel, room_type=booking.room_type, meal_plan=booking.meal_plan,
-                        from_date__lte=booking.check_in_date, to_date__gte=booking.check_in_date
-                    ).first()
-                    if rule:
-                        per_night = (
-                            Decimal(booking.num_double_beds or 0) * (rule.double_bed or 0) +
-                            Decimal(booking.child_with_bed or 0) * (rule.child_with_bed or 0) +
-                            Decimal(booking.child_without_bed or 0) * (rule.child_without_bed or 0) +
-                            Decimal(booking.extra_beds or 0) * (rule.extra_bed or 0)
-                        )
-                        net_price = per_night * nights
-                else:
-                    # Demo Hotel default price is 0
-                    net_price = Decimal('0.00')
-
-                inclusion_price = booking.get_total_inclusion_price()
-                net_price += inclusion_price
-
-                # Store rule for debugging (only if real hotel)
-                booking.price_record = None
-                if booking.hotel:
-                    booking.price_record = Hotelprice.objects.filter(
-                        hotel=booking.hotel, room_type=booking.room_type, meal_plan=booking.meal_plan,
-                        from_date__lte=booking.check_in_date, to_date__gte=booking.check_in_date
-                    ).first()
-
-                booking.sort_date = booking.check_in_date
-                booking.item_type = 'Accommodation'
-                booking.inclusion_price = inclusion_price
-                booking.inclusions_list = list(booking.inclusion_items.select_related('special_inclusion').all())
-
-            # --- Vehicle Booking ---
-            elif isinstance(booking, VehicleBooking):
-                rule = VehiclePricing.objects.filter(
-                    vehicle=booking.vehicle,
-                    from_date__lte=booking.pickup_date,
-                    to_date__gte=booking.pickup_date
-                ).first()
-
-                expected_price = Decimal('0')
-                if rule and hasattr(booking, 'total_km') and booking.total_km is not None:
-                    if booking.total_km <= 100:
-                        expected_price = rule.total_fee_100km or Decimal('0')
-                    else:
-                        extra_km = booking.total_km - 100
-                        extra_cost = Decimal(str(extra_km)) * (rule.extra_fee_per_km or Decimal('0'))
-                        expected_price = (rule.total_fee_100km or Decimal('0')) + extra_cost
-
-                if hasattr(booking, 'custom_total_price') and booking.custom_total_price and booking.custom_total_price > 0:
-                    net_price = booking.custom_total_price
-                elif hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-                else:
-                    net_price = expected_price
-
-                booking.price_record = rule
-                booking.sort_date = booking.pickup_date
-                booking.item_type = 'Transportation'
-                booking.inclusion_price = Decimal('0.00')
-                booking.inclusions_list = []
-
-            # --- Activity Booking ---
-            elif isinstance(booking, ActivityBooking):
-                rule = ActivityPrice.objects.filter(
-                    activity=booking.activity,
-                    from_date__lte=booking.booking_date,
-                    to_date__gte=booking.booking_date
-                ).first() or ActivityPrice.objects.filter(activity=booking.activity).first()
-
-                expected_price = Decimal('0')
-                if rule:
-                    people = (booking.num_adults or 0) + (booking.num_children or 0)
-                    expected_price = Decimal(str(people)) * (rule.per_person or Decimal('0'))
-
-                if hasattr(booking, 'custom_total_price') and booking.custom_total_price and booking.custom_total_price > 0:
-                    net_price = booking.custom_total_price
-                elif hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-                else:
-                    net_price = expected_price
-
-                booking.price_record = rule
-                booking.sort_date = booking.booking_date
-                booking.item_type = 'Activity'
-                booking.inclusion_price = Decimal('0.00')
-                booking.inclusions_list = []
-
-            # --- Houseboat Booking ---
-            elif isinstance(booking, HouseboatBooking):
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-
-                if hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-                else:
-                    rule = HouseboatPrice.objects.filter(
-                        houseboat=booking.houseboat,
-                        meal_plan=booking.meal_plan,
-                        room_type=booking.room_type,
-                        from_date__lte=booking.check_in_date,
-                        to_date__gte=booking.check_in_date
-                    ).first()
-                    if rule:
-                        per_night = (
-                            Decimal(booking.num_one_bed_rooms or 0) * (rule.one_bed or 0) +
-                            Decimal(booking.num_two_bed_rooms or 0) * (rule.two_bed or 0) +
-                            Decimal(booking.num_three_bed_rooms or 0) * (rule.three_bed or 0) +
-                            Decimal(booking.num_four_bed_rooms or 0) * (rule.four_bed or 0) +
-                            Decimal(booking.num_five_bed_rooms or 0) * (rule.five_bed or 0) +
-                            Decimal(booking.num_six_bed_rooms or 0) * (rule.six_bed or 0) +
-                            Decimal(booking.num_seven_bed_rooms or 0) * (rule.seven_bed or 0) +
-                            Decimal(booking.num_eight_bed_rooms or 0) * (rule.eight_bed or 0) +
-                            Decimal(booking.num_nine_bed_rooms or 0) * (rule.nine_bed or 0) +
-                            Decimal(booking.num_ten_bed_rooms or 0) * (rule.ten_bed or 0) +
-                            Decimal(booking.num_extra_beds or 0) * (rule.extra_bed or 0)
-                        )
-                        net_price = per_night * nights
-
-                inclusion_price = booking.get_total_inclusion_price()
-                net_price += inclusion_price
-
-                booking.price_record = HouseboatPrice.objects.filter(
-                    houseboat=booking.houseboat,
-                    meal_plan=booking.meal_plan,
-                    room_type=booking.room_type,
-                    from_date__lte=booking.check_in_date,
-                    to_date__gte=booking.check_in_date
-                ).first()
-                booking.sort_date = booking.check_in_date
-                booking.item_type = 'Houseboat'
-                booking.inclusion_price = inclusion_price
-                booking.inclusions_list = list(booking.inclusion_items.select_related('special_inclusion').all())
-
-            # --- Standalone Inclusion ---
-            elif isinstance(booking, StandaloneInclusionBooking):
-                net_price = booking.total_price
-                booking.price_record = None
-                booking.sort_date = booking.booking_date
-                booking.item_type = 'Standalone Activity'
-                booking.inclusion_price = Decimal('0.00')
-                booking.inclusions_list = []
-
-            # --- Final Price Struct ---
-            individual_markup = Decimal('0.00')
-            if hasattr(booking, 'markup_value') and booking.markup_value:
-                try:
-                    markup_val = Decimal(str(booking.markup_value))
-                    if markup_val > 0:
-                        individual_markup = markup_val if booking.markup_type != 'percentage' else net_price * (markup_val / 100)
-                except:
-                    pass
-
-            booking.calculated_price = {
-                'net': net_price,
-                'markup': individual_markup,
-                'gross': net_price + individual_markup,
-                'inclusion_price': getattr(booking, 'inclusion_price', Decimal('0.00')),
-                'nights': nights
-            }
-            all_bookings.append(booking)
-
-        return all_bookings
+    # The itinerary comes with its query (used by the page header) and every
+    # booking line comes from pricing_engine.price_itinerary, which loads
+    # bookings, inclusions and display relations in a fixed number of queries.
+    # Nothing below may hit the database per booking; the query budget is
+    # enforced in tests.py.
+    itinerary = get_object_or_404(Itinerary.objects.select_related('query'), id=itinerary_id)
+
+    def stored_markup(index):
+        return (
+            request.session.get(f'itinerary_{itinerary.id}_option_{index}_markup_type', 'fixed'),
+            Decimal(request.session.get(f'itinerary_{itinerary.id}_option_{index}_markup_value', '0'))
+        )
 
     # ==========================================
     # 3. POST LOGIC (SAVE & FINALIZE)
@@ -5066,80 +4896,33 @@ def itinerary_pricing(request, itinerary_id):
             # Delete old options
             ItineraryPricingOption.objects.filter(itinerary=itinerary).delete()
 
-            all_items = sorted(calculate_all_prices(), key=attrgetter('sort_date'))
-
-            non_accommodation_net = sum(i.calculated_price['net'] for i in all_items if i.item_type not in ['Accommodation', 'Houseboat'])
-            non_accommodation_markup = sum(i.calculated_price['markup'] for i in all_items if i.item_type not in ['Accommodation', 'Houseboat'])
-
-            grouped_hotels = defaultdict(list)
-            for item in all_items:
-                if item.item_type in ['Accommodation', 'Houseboat']:
-                    raw_option = getattr(item, 'option', 'option1')
-                    key = str(raw_option).lower().replace(' ', '').replace('_', '')
-                    if not key: key = 'option1'
-                    grouped_hotels[key].append(item)
+            all_items = pricing_engine.price_itinerary(itinerary, incremental=True)
+            options = pricing_engine.summarise_options(all_items, cgst_perc, sgst_perc, discount, markup_for=stored_markup)
 
             # Create Pricing Options
-            for index, (option_key, hotels) in enumerate(grouped_hotels.items(), 1):
-                package_index_str = str(index)
-                stored_markup_type = request.session.get(f'itinerary_{itinerary.id}_option_{package_index_str}_markup_type', 'fixed')
-                stored_markup_value = Decimal(request.session.get(f'itinerary_{itinerary.id}_option_{package_index_str}_markup_value', '0'))
-
-                option_hotels_net = sum(h.calculated_price['net'] for h in hotels)
-                option_hotels_markup = sum(h.calculated_price['markup'] for h in hotels)
-
-                package_net = option_hotels_net + non_accommodation_net
-                package_markup = option_hotels_markup + non_accommodation_markup
-                package_base = package_net + package_markup
-
-                global_markup = package_base * (stored_markup_value / 100) if stored_markup_type == 'percentage' else stored_markup_value
-
-                gross = package_base + global_markup
-                cgst = gross * (cgst_perc / 100)
-                sgst = gross * (sgst_perc / 100)
-                final = gross + cgst + sgst - discount
-
-                if option_key == 'option1': option_display_name = 'Option 1'
-                elif option_key == 'option2': option_display_name = 'Option 2'
-                elif option_key == 'option3': option_display_name = 'Option 3'
-                else: option_display_name = str(option_key).title()
-
-                # 🔥 SAFE NAME EXTRACTION FOR POST
-                hotels_list = []
-                for h in hotels:
-                    hotel_name = "Unknown Hotel"
-                    if hasattr(h, 'houseboat') and h.houseboat:
-                        hotel_name = h.houseboat.name
-                    elif hasattr(h, 'hotel') and h.hotel:
-                        hotel_name = h.hotel.name
-                    elif hasattr(h, 'custom_hotel_name') and h.custom_hotel_name:
-                        hotel_name = f"{h.custom_hotel_name} (Demo)"
-
-                    hotels_list.append({
-                        'name': hotel_name,
-                        'net_price': float(h.calculated_price['net']),
-                        'type': h.item_type
-                    })
-
+            for option in options:
                 ItineraryPricingOption.objects.create(
                     itinerary=itinerary,
-                    option_name=option_display_name,
-                    option_number=index,
-                    net_price=package_net,
-                    markup_amount=global_markup,
-                    gross_price=gross,
-                    cgst_amount=cgst,
-                    sgst_amount=sgst,
+                    option_name=option['option_name'],
+                    option_number=option['option_number'],
+                    net_price=option['net_price'],
+                    markup_amount=option['global_markup'],
+                    gross_price=option['gross_before_tax'],
+                    cgst_amount=option['cgst_amount'],
+                    sgst_amount=option['sgst_amount'],
                     discount_amount=discount,
-                    final_amount=final,
-                    hotels_included=hotels_list
+                    final_amount=option['gross_price'],
+                    hotels_included=[
+                        {'name': h['name'], 'net_price': float(h['net_price']), 'type': h['type']}
+                        for h in option['hotels']
+                    ]
                 )
 
             itinerary.is_finalized = True
             itinerary.finalized_at = now()
             itinerary.save()
 
-            messages.success(request, f"✅ Successfully saved {len(grouped_hotels)} pricing option(s)!")
+            messages.success(request, f"✅ Successfully saved {len(options)} pricing option(s)!")
             return redirect('query_proposals', query_id=itinerary.query.id)
 
         except Exception as e:
@@ -5162,93 +4945,23 @@ def itinerary_pricing(request, itinerary_id):
     discount = Decimal(request.GET.get('discount', str(itinerary.discount)))
     selected_option = request.GET.get('selected_option') or request.session.get(f'itinerary_{itinerary.id}_selected_option')
 
-    all_items = sorted(calculate_all_prices(), key=attrgetter('sort_date'))
-
-    non_accommodation_net = sum(i.calculated_price['net'] for i in all_items if i.item_type not in ['Accommodation', 'Houseboat'])
-    non_accommodation_markup = sum(i.calculated_price['markup'] for i in all_items if i.item_type not in ['Accommodation', 'Houseboat'])
-
-    grouped_hotels = defaultdict(list)
-    for item in all_items:
-        if item.item_type in ['Accommodation', 'Houseboat']:
-            raw_option = getattr(item, 'option', 'option1')
-            key = str(raw_option).lower().replace(' ', '').replace('_', '')
-            if not key: key = 'option1'
-            grouped_hotels[key].append(item)
-
-    hotel_option_groups = []
-
-    # Handle Case: No Hotels (Optional: You can add logic here if you want a "Standard Package" row)
-    if not grouped_hotels and all_items:
-         pass # Add standard package logic here if needed
-
-    # Build Option Groups
-    for index, (option_key, hotels) in enumerate(grouped_hotels.items(), 1):
-        package_index_str = str(index)
-        stored_markup_type = request.session.get(f'itinerary_{itinerary.id}_option_{package_index_str}_markup_type', 'fixed')
-        stored_markup_value = Decimal(request.session.get(f'itinerary_{itinerary.id}_option_{package_index_str}_markup_value', '0'))
-
-        option_hotels_net = sum(h.calculated_price['net'] for h in hotels)
-        option_hotels_markup = sum(h.calculated_price['markup'] for h in hotels)
-
-        package_net = option_hotels_net + non_accommodation_net
-        package_markup = option_hotels_markup + non_accommodation_markup
-        package_base = package_net + package_markup
-
-        global_markup = package_base * (stored_markup_value / 100) if stored_markup_type == 'percentage' else stored_markup_value
-
-        gross = package_base + global_markup
-        cgst = gross * (cgst_perc / 100)
-        sgst = gross * (sgst_perc / 100)
-        final = gross + cgst + sgst - discount
-
-        # Name Mapping
-        option_display_name = str(option_key).title()
-        if option_key == 'option1': option_display_name = 'Option 1'
-        elif option_key == 'option2': option_display_name = 'Option 2'
-        elif option_key == 'option3': option_display_name = 'Option 3'
-
-        # 🔥 SAFE NAME EXTRACTION FOR TEMPLATE DISPLAY
-        safe_hotels_list = []
-        for h in hotels:
-            hotel_name = "Unknown Hotel"
-            if hasattr(h, 'houseboat') and h.houseboat:
-                hotel_name = h.houseboat.name
-            elif hasattr(h, 'hotel') and h.hotel:
-                hotel_name = h.hotel.name
-            elif hasattr(h, 'custom_hotel_name') and h.custom_hotel_name:
-                hotel_name = f"{h.custom_hotel_name} (Demo)"
-
-            safe_hotels_list.append({
-                'name': hotel_name,
-                'net_price': h.calculated_price['net']
-            })
-
-        hotel_option_groups.append({
-            'option_name': option_display_name,
-            'hotel_count': len(hotels),
-            'hotels': safe_hotels_list,  # ✅ Pass this safe list to template
-            'option_net_total': option_hotels_net,
-            'net_price': package_net,
-            'markup': package_markup,
-            'global_markup': global_markup,
-            'gross_before_tax': gross,
-            'cgst_amount': cgst,
-            'sgst_amount': sgst,
-            'discount': discount,
-            'gross_price': final
-        })
+    # Also saves the line prices that had to be recomputed (see pricing.price_bookings)
+    all_items = pricing_engine.price_itinerary(itinerary, incremental=True)
+    hotel_option_groups = pricing_engine.summarise_options(all_items, cgst_perc, sgst_perc, discount, markup_for=stored_markup)
+    # Line caches were just refreshed above, so one aggregation is enough
+    option_matrix = pricing_engine.option_matrix(itinerary, refresh=False)
 
     # Prepare Context
     current_markup_type = 'fixed'
     current_markup_value = Decimal('0')
     if selected_option:
-        current_markup_type = request.session.get(f'itinerary_{itinerary.id}_option_{selected_option}_markup_type', 'fixed')
-        current_markup_value = Decimal(request.session.get(f'itinerary_{itinerary.id}_option_{selected_option}_markup_value', '0'))
+        current_markup_type, current_markup_value = stored_markup(selected_option)
 
     context = {
         'itinerary': itinerary,
         'all_items': all_items,
         'hotel_option_groups': hotel_option_groups,
+        'option_matrix': option_matrix,
         'current_markup_type': current_markup_type,
         'current_markup_value': current_markup_value,
         'current_cgst': cgst_perc,
@@ -6878,6 +6591,7 @@ def edit_itinerary(request):
 
 
 import traceback
+from . import itinerary_versioning, version_diff
 
 def copy_pricing_options(old_itinerary, new_itinerary):
     """
@@ -6897,37 +6611,17 @@ def copy_pricing_options(old_itinerary, new_itinerary):
             print(f'⚠️ No pricing options found in old itinerary {old_itinerary.id}')
             return False
 
-        # Copy all pricing options from old itinerary
-        for old_option in old_options:
-            new_option = ItineraryPricingOption.objects.create(
-                itinerary=new_itinerary,
-                option_name=old_option.option_name,
-                option_number=old_option.option_number,
-
-                # Pricing amounts
-                net_price=old_option.net_price,
-                markup_amount=old_option.markup_amount,
-                gross_price=old_option.gross_price,
-
-                # Taxes
-                cgst_amount=old_option.cgst_amount,
-                sgst_amount=old_option.sgst_amount,
-                discount_amount=old_option.discount_amount,
-                final_amount=old_option.final_amount,
-
-                # Hotel breakdown
-                hotels_included=old_option.hotels_included,
-
-                # Other fields
-                vehicle_type=old_option.vehicle_type,
-                number_of_rooms=old_option.number_of_rooms,
-                extra_beds=old_option.extra_beds,
-                child_with_bed=old_option.child_with_bed,
-                child_without_bed=old_option.child_without_bed,
-                child_ages=old_option.child_ages,
-            )
+        # Copy all pricing options from old itinerary in one insert
+        new_options = ItineraryPricingOption.objects.bulk_create(
+            itinerary_versioning.copy_row(old_option, itinerary=new_itinerary) for old_option in old_options
+        )
+        for new_option in new_options:
             print(f'✅ Copied pricing option: {new_option.option_name} - ₹{new_option.final_amount}')
 
+        # bulk_create skips the post_save signals that flag the summary and diffs
+        refresh_pricing_summaries([new_itinerary.id])
+        version_diff.touch(new_itinerary.id)
+
         return True
 
     except Exception as e:
@@ -6942,398 +6636,19 @@ import traceback
 from datetime import timedelta
 import traceback
 
-@custom_login_required
 def copy_and_validate_bookings(old_itinerary, new_itinerary):
     """
-    Copy bookings from old itinerary to new one with FULL DEBUG LOGGING
+    Copy bookings from old itinerary to new one, shifted to the new dates.
     Also creates ItineraryDayPlan records copying details from old plans.
     Includes: Hotels, Activities, Vehicles, Houseboats, Standalone Inclusions
     """
     try:
-        # ✅ IMPORTS
-        from .models import (HotelBooking, ActivityBooking, VehicleBooking, HouseboatBooking,
-                           ItineraryDayPlan, StandaloneInclusionBooking,
-                           HotelBookingInclusion, HouseboatBookingInclusion)
-
-        skipped_items = {
-            'hotels': [],
-            'activities': [],
-            'vehicles': [],
-            'houseboats': [],
-            'standalone_inclusions': [],
-        }
+        copied_count, skipped_items = itinerary_versioning.clone_for_new_dates(old_itinerary, new_itinerary)
 
-        copied_count = {
-            'hotels': 0,
-            'activities': 0,
-            'vehicles': 0,
-            'houseboats': 0,
-            'standalone_inclusions': 0,
-        }
-
-        print('\n' + '='*80)
-        print('🚀 STARTING BOOKING COPY PROCESS')
-        print('='*80)
-        print(f'Old Itinerary ID: {old_itinerary.id}')
-        print(f'New Itinerary ID: {new_itinerary.id}')
-        print(f'Old Date Range: {old_itinerary.travel_from} to {old_itinerary.travel_to}')
-        print(f'New Date Range: {new_itinerary.travel_from} to {new_itinerary.travel_to}')
-        print('='*80 + '\n')
-
-        # =========================================================
-        # ✅ FIXED SECTION: COPY DAY PLAN DETAILS
-        # =========================================================
-        print(f'📅 Creating day plans for {new_itinerary.total_days} days...')
-
-        # 1. Map old day plans by day_number for easy lookup
-        old_day_plans_map = {dp.day_number: dp for dp in old_itinerary.day_plans.all()}
-        day_plans_dict = {}
-
-        # 2. Iterate through the NEW duration
-        for day_num in range(1, new_itinerary.total_days + 1):
-
-            # Create the new day plan
-            new_day_plan, created = ItineraryDayPlan.objects.get_or_create(
-                itinerary=new_itinerary,
-                day_number=day_num
-            )
-
-            # 3. If this day number existed in the old itinerary, COPY the data
-            if day_num in old_day_plans_map:
-                old_dp = old_day_plans_map[day_num]
-
-                # Copy fields from old day plan
-                new_day_plan.destination = old_dp.destination
-                new_day_plan.title = old_dp.title
-                new_day_plan.description = old_dp.description
-                new_day_plan.image = old_dp.image
-                new_day_plan.notes = old_dp.notes
-                new_day_plan.save()
-
-                print(f'   ✅ Copied details for Day {day_num} (Dest: {old_dp.destination})')
-            else:
-                print(f'   ℹ️ Day {day_num} is a new day (Created Empty)')
-
-            # Add to dictionary for the booking copy logic to use
-            day_plans_dict[day_num] = new_day_plan
-
-        print(f'✅ Day plans ready: {len(day_plans_dict)} days\n')
-
-        # ===== COPY HOTEL BOOKINGS =====
-        print('\n' + '='*80)
-        print('🏨 COPYING HOTEL BOOKINGS')
-        print('='*80)
-
-        try:
-            old_hotel_bookings = HotelBooking.objects.filter(itinerary=old_itinerary)
-            print(f'📋 Found {old_hotel_bookings.count()} hotel bookings to copy\n')
-
-            for idx, old_booking in enumerate(old_hotel_bookings, 1):
-                try:
-                    print(f'\n--- Hotel Booking {idx}/{old_hotel_bookings.count()} ---')
-                    print(f'🏨 Hotel: {old_booking.hotel.name} (ID: {old_booking.id})')
-
-                    # Adjust dates proportionally
-                    check_in_offset = (old_booking.check_in_date - old_itinerary.travel_from).days
-                    new_check_in = new_itinerary.travel_from + timedelta(days=check_in_offset)
-
-                    if new_check_in < new_itinerary.travel_from:
-                        new_check_in = new_itinerary.travel_from
-                    if new_check_in > new_itinerary.travel_to:
-                        raise ValueError("Check-in date outside new itinerary range")
-
-                    stay_duration = (old_booking.check_out_date - old_booking.check_in_date).days
-                    new_check_out = new_check_in + timedelta(days=stay_duration)
-
-                    if new_check_out > new_itinerary.travel_to:
-                        new_check_out = new_itinerary.travel_to
-
-                    print(f'📅 New dates: {new_check_in} to {new_check_out}')
-
-                    # ✅ GET DAY NUMBER FROM DAY PLAN
-                    old_day_plan = old_booking.day_plan if hasattr(old_booking, 'day_plan') and old_booking.day_plan else None
-                    day_number = old_day_plan.day_number if old_day_plan else 1
-                    print(f'📍 Day number: {day_number}')
-
-                    # Get new day plan
-                    day_plan = day_plans_dict.get(day_number)
-                    if not day_plan:
-                        day_plan, _ = ItineraryDayPlan.objects.get_or_create(
-                            itinerary=new_itinerary,
-                            day_number=day_number
-                        )
-
-                    # ✅ Copy markup values
-                    old_markup_type = getattr(old_booking, 'markup_type', 'fixed')
-                    old_markup_value = getattr(old_booking, 'markup_value', 0)
-                    old_net_price = getattr(old_booking, 'net_price', None)
-
-                    # Copy hotel booking
-                    new_hotel = HotelBooking.objects.create(
-                        day_plan=day_plan,
-                        itinerary=new_itinerary,
-                        hotel=old_booking.hotel,
-                        destination=old_booking.destination,
-                        category=old_booking.category,
-                        room_type=old_booking.room_type,
-                        meal_plan=old_booking.meal_plan,
-                        check_in_date=new_check_in,
-                        check_out_date=new_check_out,
-                        check_in_time=old_booking.check_in_time,
-                        check_out_time=old_booking.check_out_time,
-                        num_double_beds=old_booking.num_double_beds,
-                        child_with_bed=old_booking.child_with_bed,
-                        child_without_bed=old_booking.child_without_bed,
-                        extra_beds=old_booking.extra_beds,
-                        option=old_booking.option,
-                        # ✅ ADD MARKUP FIELDS
-                        markup_type=old_markup_type,
-                        markup_value=old_markup_value,
-                        net_price=old_net_price,
-                    )
-
-                    # ✅ COPY INCLUSIONS
-                    # Try multiple query methods as per original code
-                    method1 = HotelBookingInclusion.objects.filter(hotelbooking=old_booking)
-                    method2 = HotelBookingInclusion.objects.filter(hotelbooking_id=old_booking.id)
-                    old_inclusions = method1 if method1.exists() else method2
-
-                    if old_inclusions.exists():
-                        for old_item in old_inclusions:
-                            HotelBookingInclusion.objects.create(
-                                hotelbooking=new_hotel,
-                                specialinclusion=old_item.specialinclusion,
-                                numadults=old_item.numadults,
-                                numchildren=old_item.numchildren,
-                            )
-
-                    # Update day plan with destination if not set
-                    if not day_plan.destination:
-                        day_plan.destination = old_booking.destination
-                        day_plan.save()
-
-                    copied_count['hotels'] += 1
-                    print(f'✅ Hotel booking fully copied')
-
-                except Exception as e:
-                    skipped_items['hotels'].append({
-                        'hotel': str(old_booking.hotel),
-                        'reason': str(e)
-                    })
-                    print(f'❌ Error copying hotel: {str(e)}')
-
-        except Exception as e:
-            print(f'❌ Fatal error in hotel section: {str(e)}')
-
-        # ===== COPY ACTIVITY BOOKINGS =====
-        print('\n\n' + '='*80)
-        print('🎯 COPYING ACTIVITY BOOKINGS')
-        print('='*80)
-
-        try:
-            old_activity_bookings = ActivityBooking.objects.filter(itinerary=old_itinerary)
-
-            for idx, old_booking in enumerate(old_activity_bookings, 1):
-                try:
-                    activity_offset = (old_booking.booking_date - old_itinerary.travel_from).days
-                    new_booking_date = new_itinerary.travel_from + timedelta(days=activity_offset)
-
-                    if new_booking_date < new_itinerary.travel_from or new_booking_date > new_itinerary.travel_to:
-                         # Keep inside range if offset pushes it out
-                         new_booking_date = new_itinerary.travel_from
-
-                    old_day_plan = old_booking.day_plan
-                    day_number = old_day_plan.day_number if old_day_plan else 1
-                    day_plan = day_plans_dict.get(day_number)
-
-                    if not day_plan:
-                         day_plan, _ = ItineraryDayPlan.objects.get_or_create(
-                            itinerary=new_itinerary, day_number=day_number)
-
-                    # Markup fields
-                    old_markup_type = getattr(old_booking, 'markup_type', 'fixed')
-                    old_markup_value = getattr(old_booking, 'markup_value', 0)
-                    old_custom_price = getattr(old_booking, 'custom_total_price', None)
-
-                    ActivityBooking.objects.create(
-                        day_plan=day_plan,
-                        itinerary=new_itinerary,
-                        activity=old_booking.activity,
-                        booking_date=new_booking_date,
-                        booking_time=old_booking.booking_time,
-                        num_adults=old_booking.num_adults,
-                        num_children=old_booking.num_children,
-                        notes=old_booking.notes,
-                        markup_type=old_markup_type,
-                        markup_value=old_markup_value,
-                        custom_total_price=old_custom_price,
-                    )
-
-                    copied_count['activities'] += 1
-
-                except Exception as e:
-                    skipped_items['activities'].append({'activity': str(old_booking.activity), 'reason': str(e)})
-        except Exception as e:
-            print(f'❌ Error copying activities: {str(e)}')
-
-        # ===== COPY VEHICLE BOOKINGS =====
-        print('\n\n' + '='*80)
-        print('🚗 COPYING VEHICLE BOOKINGS')
-        print('='*80)
-
-        try:
-            old_vehicle_bookings = VehicleBooking.objects.filter(itinerary=old_itinerary)
-
-            for idx, old_booking in enumerate(old_vehicle_bookings, 1):
-                try:
-                    vehicle_offset = (old_booking.pickup_date - old_itinerary.travel_from).days
-                    new_pickup_date = new_itinerary.travel_from + timedelta(days=vehicle_offset)
-
-                    old_day_plan = old_booking.day_plan
-                    day_number = old_day_plan.day_number if old_day_plan else 1
-                    day_plan = day_plans_dict.get(day_number)
-
-                    if not day_plan:
-                        day_plan, _ = ItineraryDayPlan.objects.get_or_create(
-                            itinerary=new_itinerary, day_number=day_number)
-
-                    old_markup_type = getattr(old_booking, 'markup_type', 'fixed')
-                    old_markup_value = getattr(old_booking, 'markup_value', 0)
-                    old_custom_price = getattr(old_booking, 'custom_total_price', None)
-
-                    VehicleBooking.objects.create(
-                        day_plan=day_plan,
-                        itinerary=new_itinerary,
-                        vehicle=old_booking.vehicle,
-                        destination=old_booking.destination,
-                        pickup_date=new_pickup_date,
-                        pickup_time=old_booking.pickup_time,
-                        num_passengers=old_booking.num_passengers,
-                        vehicle_type=old_booking.vehicle_type,
-                        option=old_booking.option,
-                        total_km=old_booking.total_km,
-                        markup_type=old_markup_type,
-                        markup_value=old_markup_value,
-                        custom_total_price=old_custom_price,
-                    )
-                    copied_count['vehicles'] += 1
-                except Exception as e:
-                    skipped_items['vehicles'].append({'vehicle': str(old_booking.vehicle), 'reason': str(e)})
-        except Exception as e:
-            print(f'❌ Error copying vehicles: {str(e)}')
-
-        # ===== COPY HOUSEBOAT BOOKINGS =====
-        print('\n\n' + '='*80)
-        print('⛵ COPYING HOUSEBOAT BOOKINGS')
-        print('='*80)
-
-        try:
-            old_houseboat_bookings = HouseboatBooking.objects.filter(itinerary=old_itinerary)
-
-            for idx, old_booking in enumerate(old_houseboat_bookings, 1):
-                try:
-                    hb_offset = (old_booking.check_in_date - old_itinerary.travel_from).days
-                    new_hb_check_in = new_itinerary.travel_from + timedelta(days=hb_offset)
-                    stay_duration = (old_booking.check_out_date - old_booking.check_in_date).days
-                    new_hb_check_out = new_hb_check_in + timedelta(days=stay_duration)
-
-                    old_day_plan = old_booking.day_plan
-                    day_number = old_day_plan.day_number if old_day_plan else 1
-                    day_plan = day_plans_dict.get(day_number)
-
-                    if not day_plan:
-                        day_plan, _ = ItineraryDayPlan.objects.get_or_create(
-                            itinerary=new_itinerary, day_number=day_number)
-
-                    old_markup_type = getattr(old_booking, 'markup_type', 'fixed')
-                    old_markup_value = getattr(old_booking, 'markup_value', 0)
-                    old_net_price = getattr(old_booking, 'net_price', None)
-
-                    new_hb = HouseboatBooking.objects.create(
-                        day_plan=day_plan,
-                        itinerary=new_itinerary,
-                        houseboat=old_booking.houseboat,
-                        check_in_date=new_hb_check_in,
-                        check_out_date=new_hb_check_out,
-                        room_type=old_booking.room_type,
-                        meal_plan=old_booking.meal_plan,
-                        num_one_bed_rooms=old_booking.num_one_bed_rooms,
-                        num_two_bed_rooms=old_booking.num_two_bed_rooms,
-                        num_three_bed_rooms=old_booking.num_three_bed_rooms,
-                        # ... (Include all other bedroom fields here) ...
-                        markup_type=old_markup_type,
-                        markup_value=old_markup_value,
-                        net_price=old_net_price,
-                    )
-
-                    # Copy HB inclusions
-                    method1 = HouseboatBookingInclusion.objects.filter(houseboatbooking=old_booking)
-                    method2 = HouseboatBookingInclusion.objects.filter(houseboatbooking_id=old_booking.id)
-                    old_inclusions = method1 if method1.exists() else method2
-
-                    if old_inclusions.exists():
-                        for old_item in old_inclusions:
-                            HouseboatBookingInclusion.objects.create(
-                                houseboatbooking=new_hb,
-                                specialinclusion=old_item.specialinclusion,
-                                numadults=old_item.numadults,
-                                numchildren=old_item.numchildren,
-                            )
-
-                    copied_count['houseboats'] += 1
-                except Exception as e:
-                    skipped_items['houseboats'].append({'houseboat': str(old_booking.houseboat), 'reason': str(e)})
-        except Exception as e:
-            print(f'❌ Error copying houseboats: {str(e)}')
-
-        # ===== COPY STANDALONE INCLUSION BOOKINGS =====
-        try:
-            old_standalone_bookings = StandaloneInclusionBooking.objects.filter(itinerary=old_itinerary)
-            for old_booking in old_standalone_bookings:
-                try:
-                    booking_offset = (old_booking.booking_date - old_itinerary.travel_from).days
-                    new_booking_date = new_itinerary.travel_from + timedelta(days=booking_offset)
-
-                    old_day_plan = old_booking.day_plan
-                    day_number = old_day_plan.day_number if old_day_plan else 1
-                    day_plan = day_plans_dict.get(day_number)
-
-                    if not day_plan:
-                         day_plan, _ = ItineraryDayPlan.objects.get_or_create(
-                            itinerary=new_itinerary, day_number=day_number)
-
-                    old_markup_type = getattr(old_booking, 'markup_type', 'fixed')
-                    old_markup_value = getattr(old_booking, 'markup_value', 0)
-
-                    StandaloneInclusionBooking.objects.create(
-                        itinerary=new_itinerary,
-                        day_plan=day_plan,
-                        special_inclusion=old_booking.special_inclusion,
-                        booking_date=new_booking_date,
-                        booking_time=old_booking.booking_time,
-                        num_adults=old_booking.num_adults,
-                        num_children=old_booking.num_children,
-                        markup_type=old_markup_type,
-                        markup_value=old_markup_value,
-                        notes=old_booking.notes,
-                    )
-                    copied_count['standalone_inclusions'] += 1
-                except Exception as e:
-                    skipped_items['standalone_inclusions'].append({'inclusion': str(old_booking.special_inclusion), 'reason': str(e)})
-        except Exception as e:
-             print(f'❌ Error copying standalone: {str(e)}')
-
-        # ===== FINAL SUMMARY =====
-        print('\n\n' + '='*80)
-        print('📊 FINAL BOOKING COPY SUMMARY')
-        print('='*80)
-        print(f'Hotels:               {copied_count["hotels"]:3d} copied, {len(skipped_items["hotels"]):3d} skipped')
-        print(f'Activities:           {copied_count["activities"]:3d} copied, {len(skipped_items["activities"]):3d} skipped')
-
-        return {
-            'success': True,
-            'copied': copied_count,
-            'skipped': skipped_items
+        return {
+            'success': True,
+            'copied': copied_count,
+            'skipped': skipped_items
         }
 
     except Exception as e:
@@ -7346,128 +6661,21 @@ def copy_and_validate_bookings(old_itinerary, new_itinerary):
 
 
 
+
 # ✅ FUNCTION TO CALCULATE PRICING FOR NEW ITINERARY
 
-@custom_login_required
 def calculate_itinerary_pricing(itinerary):
     """
     Calculate total pricing for itinerary based on bookings
     """
-    from .models import HotelBooking, ActivityBooking, VehicleBooking, HouseboatBooking, Hotelprice, VehiclePricing, ActivityPrice, HouseboatPrice
-    from decimal import Decimal
-
-    total_net = Decimal('0.00')
-    total_gross = Decimal('0.00')
+    from . import pricing as pricing_engine
 
     try:
         print(f'🔄 Calculating pricing for itinerary {itinerary.id}...')
 
-        # ===== HOTEL PRICING =====
-        hotel_bookings = HotelBooking.objects.filter(itinerary=itinerary)
-        for booking in hotel_bookings:
-            try:
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-
-                # Get pricing rule
-                rule = Hotelprice.objects.filter(
-                    hotel=booking.hotel,
-                    room_type=booking.room_type,
-                    meal_plan=booking.meal_plan,
-                    from_date__lte=booking.check_in_date,
-                    to_date__gte=booking.check_in_date
-                ).first()
-
-                if rule:
-                    # Calculate per night cost
-                    per_night = (
-                        Decimal(booking.num_double_beds or 0) * (rule.double_bed or 0) +
-                        Decimal(booking.child_with_bed or 0) * (rule.child_with_bed or 0) +
-                        Decimal(booking.child_without_bed or 0) * (rule.child_without_bed or 0) +
-                        Decimal(booking.extra_beds or 0) * (rule.extra_bed or 0)
-                    )
-                    hotel_cost = per_night * nights
-                    total_net += hotel_cost
-                    total_gross += hotel_cost
-                    print(f'✅ Hotel {booking.hotel.name}: ₹{hotel_cost}')
-            except Exception as e:
-                print(f'⚠️ Hotel pricing error: {str(e)}')
-
-        # ===== ACTIVITY PRICING =====
-        activity_bookings = ActivityBooking.objects.filter(itinerary=itinerary)
-        for booking in activity_bookings:
-            try:
-                rule = ActivityPrice.objects.filter(
-                    activity=booking.activity,
-                    from_date__lte=booking.booking_date,
-                    to_date__gte=booking.booking_date
-                ).first()
-
-                if rule:
-                    activity_cost = (
-                        Decimal(booking.num_adults or 0) * (rule.per_person or 0) +
-                        Decimal(booking.num_children or 0) * (rule.per_person or 0)
-                    )
-                    total_net += activity_cost
-                    total_gross += activity_cost
-                    print(f'✅ Activity {booking.activity.name}: ₹{activity_cost}')
-            except Exception as e:
-                print(f'⚠️ Activity pricing error: {str(e)}')
-
-        # ===== VEHICLE PRICING =====
-        vehicle_bookings = VehicleBooking.objects.filter(itinerary=itinerary)
-        for booking in vehicle_bookings:
-            try:
-                rule = VehiclePricing.objects.filter(
-                    vehicle=booking.vehicle,
-                    from_date__lte=booking.pickup_date,
-                    to_date__gte=booking.pickup_date
-                ).first()
-
-                if rule:
-                    vehicle_cost = rule.total_fee_100km or Decimal('0')
-                    if booking.total_km and booking.total_km > 100:
-                        extra_km = booking.total_km - 100
-                        vehicle_cost += Decimal(str(extra_km)) * (rule.extra_fee_per_km or Decimal('0'))
-                    total_net += vehicle_cost
-                    total_gross += vehicle_cost
-                    print(f'✅ Vehicle {booking.vehicle.name}: ₹{vehicle_cost}')
-            except Exception as e:
-                print(f'⚠️ Vehicle pricing error: {str(e)}')
-
-        # ===== HOUSEBOAT PRICING =====
-        houseboat_bookings = HouseboatBooking.objects.filter(itinerary=itinerary)
-        for booking in houseboat_bookings:
-            try:
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-
-                rule = HouseboatPrice.objects.filter(
-                    houseboat=booking.houseboat,
-                    meal_plan=booking.meal_plan,
-                    room_type=booking.room_type,
-                    from_date__lte=booking.check_in_date,
-                    to_date__gte=booking.check_in_date
-                ).first()
-
-                if rule:
-                    per_night = (
-                        Decimal(booking.num_one_bed_rooms or 0) * (rule.one_bed or 0) +
-                        Decimal(booking.num_two_bed_rooms or 0) * (rule.two_bed or 0) +
-                        Decimal(booking.num_three_bed_rooms or 0) * (rule.three_bed or 0) +
-                        Decimal(booking.num_four_bed_rooms or 0) * (rule.four_bed or 0) +
-                        Decimal(booking.num_five_bed_rooms or 0) * (rule.five_bed or 0) +
-                        Decimal(booking.num_six_bed_rooms or 0) * (rule.six_bed or 0) +
-                        Decimal(booking.num_seven_bed_rooms or 0) * (rule.seven_bed or 0) +
-                        Decimal(booking.num_eight_bed_rooms or 0) * (rule.eight_bed or 0) +
-                        Decimal(booking.num_nine_bed_rooms or 0) * (rule.nine_bed or 0) +
-                        Decimal(booking.num_ten_bed_rooms or 0) * (rule.ten_bed or 0) +
-                        Decimal(booking.num_extra_beds or 0) * (rule.extra_bed or 0)
-                    )
-                    houseboat_cost = per_night * nights
-                    total_net += houseboat_cost
-                    total_gross += houseboat_cost
-                    print(f'✅ Houseboat {booking.houseboat.name}: ₹{houseboat_cost}')
-            except Exception as e:
-                print(f'⚠️ Houseboat pricing error: {str(e)}')
+        items = pricing_engine.price_itinerary(itinerary, incremental=True)
+        total_net = sum((item.calculated_price['net'] for item in items), Decimal('0.00'))
+        total_gross = sum((item.calculated_price['gross'] for item in items), Decimal('0.00'))
 
         # ===== UPDATE ITINERARY WITH PRICING =====
         itinerary.total_net_price = total_net
@@ -8066,17 +7274,9 @@ def view_quotation(request, itinerary_id):
         lines = re.split(r'\n+', text)
         return [line.strip() for line in lines if line.strip()]
 
-    def normalize_option(opt_string):
-        if not opt_string: return 'option_1'
-        s = str(opt_string).lower().strip().replace(' ', '').replace('_', '')
-        if s in ['option2', 'deluxe', 'deluxepackage']: return 'option_2'
-        if s in ['option3', 'premium', 'premiumpackage']: return 'option_3'
-        if s in ['option4', 'luxury', 'luxurypackage']: return 'option_4'
-        return 'option_1'
-
     # --- FETCH ITINERARY ---
     itinerary = get_object_or_404(
-        Itinerary.objects.select_related('query', 'query__assign', 'query__created_by'),
+        Itinerary.objects.select_related('query', 'query__assign', 'query__created_by', 'pricing_summary'),
         id=itinerary_id
     )
     query = itinerary.query
@@ -8089,32 +7289,23 @@ def view_quotation(request, itinerary_id):
     if is_confirmed_status and itinerary.selected_option:
         active_option_key = normalize_option(itinerary.selected_option)
 
-    # --- FETCH HOTELS (Fixed Logic with Q objects) ---
-    # We include items where option is NULL or Empty so manual items appear in all lists.
-
-    # Option 1 (Standard)
-    option1_hotels = HotelBooking.objects.filter(itinerary=itinerary).filter(
-        Q(option__in=['option_1', 'option1', 'standard', 'Standard', 'Option 1', 'Option_1', 'opt1', '1']) |
-        Q(option__isnull=True) | Q(option='')
-    ).select_related('hotel', 'destination', 'room_type', 'meal_plan').order_by('check_in_date')
-
-    # Option 2 (Deluxe)
-    option2_hotels = HotelBooking.objects.filter(itinerary=itinerary).filter(
-        Q(option__in=['option_2', 'option2', 'deluxe', 'Deluxe', 'Option 2', 'Option_2', 'option 2']) |
-        Q(option__isnull=True) | Q(option='')
-    ).select_related('hotel', 'destination', 'room_type', 'meal_plan').order_by('check_in_date')
-
-    # Option 3 (Premium)
-    option3_hotels = HotelBooking.objects.filter(itinerary=itinerary).filter(
-        Q(option__in=['option_3', 'option3', 'premium', 'Premium', 'Option 3', 'Option_3', 'option 3']) |
-        Q(option__isnull=True) | Q(option='')
-    ).select_related('hotel', 'destination', 'room_type', 'meal_plan').order_by('check_in_date')
-
-    # Option 4 (Luxury)
-    option4_hotels = HotelBooking.objects.filter(itinerary=itinerary).filter(
-        Q(option__in=['option_4', 'option4', 'luxury', 'Luxury', 'Option 4', 'Option_4', 'option 4']) |
-        Q(option__isnull=True) | Q(option='')
-    ).select_related('hotel', 'destination', 'room_type', 'meal_plan').order_by('check_in_date')
+    # --- FETCH HOTELS ---
+    # Options are normalised on save, so one query covers all four lists.
+    # Items with no option (manual items) appear in every list.
+    option_hotels = {'option_1': [], 'option_2': [], 'option_3': [], 'option_4': []}
+    for booking in HotelBooking.objects.filter(itinerary=itinerary).select_related(
+        'hotel', 'destination', 'room_type', 'meal_plan'
+    ).order_by('check_in_date'):
+        if not booking.option:
+            for hotels in option_hotels.values():
+                hotels.append(booking)
+        elif booking.option in option_hotels:
+            option_hotels[booking.option].append(booking)
+
+    option1_hotels = option_hotels['option_1']
+    option2_hotels = option_hotels['option_2']
+    option3_hotels = option_hotels['option_3']
+    option4_hotels = option_hotels['option_4']
 
     # --- SELECT DISPLAY DATA ---
     if active_option_key == 'option_2':
@@ -8130,108 +7321,41 @@ def view_quotation(request, itinerary_id):
         display_hotels = option1_hotels
         package_display_name = "Standard"
 
-    # --- CALCULATE SHARED COSTS ---
-    vehicle_cost = 0
-    vehicles = VehicleBooking.objects.filter(itinerary=itinerary)
-    vehicle_obj = vehicles.first()
-    for v in vehicles:
-        price = v.custom_total_price if hasattr(v, 'custom_total_price') and v.custom_total_price is not None else v.gross_price
-        vehicle_cost += float(price or 0)
+    # --- GET OPTION PRICES & COUNTS (materialised pricing summary) ---
+    summary = get_pricing_summary(itinerary)
+    option_data = {key: option_prices(summary, key) for key in ('option_1', 'option_2', 'option_3', 'option_4')}
+
+    # Options without a saved price fall back to the live option × category matrix
+    live_totals = {}
+    if not all(option_data[key]['is_priced'] for key in option_data):
+        for row in pricing_engine.option_matrix(itinerary)['rows']:
+            totals = pricing_engine.option_totals(
+                row['net'], row['markup'], Decimal('0'), Decimal('0'),
+                itinerary.cgst_percentage, itinerary.sgst_percentage, itinerary.discount
+            )
+            live_totals[normalize_option(row['key'])] = totals['gross_price']
 
-    activity_cost = 0
-    try:
-        activities = ActivityBooking.objects.filter(itinerary=itinerary)
-        for a in activities:
-            price = a.custom_total_price if hasattr(a, 'custom_total_price') and a.custom_total_price is not None else a.gross_price
-            activity_cost += float(price or 0)
-    except NameError:
-        activities = []
-
-    standalone_cost = 0
-    try:
-        standalones = StandaloneInclusionBooking.objects.filter(itinerary=itinerary)
-        for s in standalones:
-            standalone_cost += float(s.total_price or 0)
-    except NameError:
-        standalones = []
-
-    # --- GET OPTION PRICES ---
-    def get_pricing_row(option_num):
-        names = []
-        if option_num == 1:
-            names = ["Option 1", "Option1", "option1", "Standard", "Standard Package", "option_1"]
-        elif option_num == 2:
-            names = ["Option 2", "Option2", "option2", "Deluxe", "Deluxe Package", "option_2"]
-        elif option_num == 3:
-            names = ["Option 3", "Option3", "option3", "Premium", "Premium Package", "option_3"]
-        elif option_num == 4:
-            names = ["Option 4", "Option4", "option4", "Luxury", "Luxury Package", "option_4"]
-
-        pricing = ItineraryPricingOption.objects.filter(itinerary=itinerary, option_name__in=names).first()
-        if not pricing:
-             pricing = ItineraryPricingOption.objects.filter(itinerary=itinerary, option_number=option_num).first()
-        return pricing
-
-    pricing_row_1 = get_pricing_row(1)
-    pricing_row_2 = get_pricing_row(2)
-    pricing_row_3 = get_pricing_row(3)
-    pricing_row_4 = get_pricing_row(4)
-
-    option1_price = float(pricing_row_1.final_amount) if pricing_row_1 else 0
-    option2_price = float(pricing_row_2.final_amount) if pricing_row_2 else 0
-    option3_price = float(pricing_row_3.final_amount) if pricing_row_3 else 0
-    option4_price = float(pricing_row_4.final_amount) if pricing_row_4 else 0
+    def option_price(key):
+        if option_data[key]['is_priced']:
+            return float(option_data[key]['final_amount'])
+        return float(live_totals.get(key, 0))
+
+    option1_price = option_price('option_1')
+    option2_price = option_price('option_2')
+    option3_price = option_price('option_3')
+    option4_price = option_price('option_4')
 
     # --- HEADER DISPLAY DATA (Rooms, Beds, Child Counts) ---
+    # Header reflects the Standard package details unless it has no hotels.
+    target_option = option_data[active_option_key]
+    count_option = option_data['option_1'] if option_data['option_1']['hotel_count'] else target_option
 
-    # 1. Vehicle Name
-    vehicle_name_fallback = "Not specified"
-    if vehicle_obj:
-        if vehicle_obj.vehicle: vehicle_name_fallback = vehicle_obj.vehicle.name
-        elif hasattr(vehicle_obj, 'vehicle_type'): vehicle_name_fallback = vehicle_obj.vehicle_type
-
-    # 2. Determine List to Count From (Default to Option 1/Standard)
-    # This ensures the header always reflects the Standard package details unless empty.
-    qs_for_counts = option1_hotels if option1_hotels.exists() else display_hotels
-
-    # 3. Calculate Counts using Max() on the HotelBooking QuerySet
-    room_count = 0
-    extra_beds_count = 0
-    child_with_bed_count = 0
-    child_without_bed_count = 0
-
-    if qs_for_counts.exists():
-        # ✅ FIX: Using correct field names from your HotelBooking model
-        aggr = qs_for_counts.aggregate(
-            max_rooms=Max('num_double_beds'),
-            max_extra=Max('extra_beds'),
-            max_cwb=Max('child_with_bed'),
-            max_cnb=Max('child_without_bed')
-        )
-        room_count = aggr['max_rooms'] or 0
-        extra_beds_count = aggr['max_extra'] or 0
-        child_with_bed_count = aggr['max_cwb'] or 0
-        child_without_bed_count = aggr['max_cnb'] or 0
-
-    # 4. Fallback to Pricing Row if booking data is missing (0)
-    target_pricing_row = pricing_row_1 # Default to Option 1
-    if active_option_key == 'option_2': target_pricing_row = pricing_row_2
-    elif active_option_key == 'option_3': target_pricing_row = pricing_row_3
-    elif active_option_key == 'option_4': target_pricing_row = pricing_row_4
-
-    if target_pricing_row:
-        if room_count == 0: room_count = target_pricing_row.number_of_rooms
-        if extra_beds_count == 0: extra_beds_count = target_pricing_row.extra_beds
-        if child_without_bed_count == 0: child_without_bed_count = target_pricing_row.child_without_bed
-        if child_with_bed_count == 0: child_with_bed_count = target_pricing_row.child_with_bed
-
-    # 5. Build the Data Dictionary for the Template
     selected_option_data = {
-        'vehicle_type': target_pricing_row.vehicle_type if (target_pricing_row and target_pricing_row.vehicle_type) else vehicle_name_fallback,
-        'number_of_rooms': room_count,
-        'extra_beds': extra_beds_count,
-        'child_without_bed': child_without_bed_count,
-        'child_with_bed': child_with_bed_count,
+        'vehicle_type': target_option.get('vehicle_type') or summary.vehicle_name or "Not specified",
+        'number_of_rooms': count_option['number_of_rooms'],
+        'extra_beds': count_option['extra_beds'],
+        'child_without_bed': count_option['child_without_bed'],
+        'child_with_bed': count_option['child_with_bed'],
     }
 
     # --- DETERMINE TOTAL DISPLAY PRICE ---
@@ -8337,33 +7461,21 @@ def _link_callback(uri, rel):
 
 @custom_login_required
 def download_quotation_pdf(request, itinerary_id):
-    itinerary = get_object_or_404(Itinerary, id=itinerary_id)
+    itinerary = get_object_or_404(Itinerary.objects.select_related('query', 'pricing_summary'), id=itinerary_id)
     query = itinerary.query
 
     # Determine selected option
     option_name = itinerary.selected_option or "option_1"
 
-    selected_pricing = (
-        ItineraryPricingOption.objects.filter(
-            itinerary=itinerary, option_name=option_name
-        ).first()
-        or ItineraryPricingOption.objects.filter(itinerary=itinerary).first()
-    )
-
-    # Vehicle booking (optional)
-    vehicle_booking = VehicleBooking.objects.filter(
-        itinerary=itinerary, option=option_name
-    ).first()
-
-    # Aggregates for counts
-    hotel_aggregates = HotelBooking.objects.filter(
-        itinerary=itinerary, option=option_name
-    ).aggregate(
-        total_rooms=Sum("num_rooms"),
-        total_extra_beds=Sum("extra_beds"),
-        total_child_with_bed=Sum("child_with_bed"),
-        total_child_without_bed=Sum("child_without_bed"),
-    )
+    # Prices and room/bed counts come from the materialised pricing summary
+    summary = get_pricing_summary(itinerary)
+    selected_pricing = option_prices(summary, normalize_option(option_name))
+    if not selected_pricing['is_priced']:
+        # Fall back to the first priced option
+        selected_pricing = next(
+            (option_prices(summary, key) for key in summary.options if summary.options[key].get('option_number')),
+            selected_pricing
+        )
 
     # Accommodation rows
     hotel_bookings = (
@@ -8381,16 +7493,16 @@ def download_quotation_pdf(request, itinerary_id):
 
     # Selected option dict
     selected_option = {
-        "net_price": selected_pricing.net_price if selected_pricing else 0,
-        "gross_price": selected_pricing.gross_price if selected_pricing else 0,
-        "final_amount": selected_pricing.final_amount if selected_pricing else 0,
-        "cgst_amount": selected_pricing.cgst_amount if selected_pricing else 0,
-        "sgst_amount": selected_pricing.sgst_amount if selected_pricing else 0,
-        "vehicle_type": vehicle_booking.vehicle_type if vehicle_booking else None,
-        "number_of_rooms": hotel_aggregates["total_rooms"] or 0,
-        "extra_beds": hotel_aggregates["total_extra_beds"] or 0,
-        "child_without_bed": hotel_aggregates["total_child_without_bed"] or 0,
-        "child_with_bed": hotel_aggregates["total_child_with_bed"] or 0,
+        "net_price": selected_pricing["net_price"],
+        "gross_price": selected_pricing["gross_price"],
+        "final_amount": selected_pricing["final_amount"],
+        "cgst_amount": selected_pricing["cgst_amount"],
+        "sgst_amount": selected_pricing["sgst_amount"],
+        "vehicle_type": summary.vehicle_name or None,
+        "number_of_rooms": selected_pricing["number_of_rooms"],
+        "extra_beds": selected_pricing["extra_beds"],
+        "child_without_bed": selected_pricing["child_without_bed"],
+        "child_with_bed": selected_pricing["child_with_bed"],
     }
 
     # Use STATIC_URL for images - link_callback will convert to absolute paths
@@ -8398,8 +7510,8 @@ def download_quotation_pdf(request, itinerary_id):
     qr_code_uri = settings.STATIC_URL + "assets/img/paymentlow.png"
 
     total_package_price = (
-        selected_pricing.final_amount
-        if selected_pricing and selected_pricing.final_amount is not None
+        selected_pricing["final_amount"]
+        if selected_pricing["is_priced"]
         else getattr(itinerary, "final_amount", 0)
     )
 
@@ -10098,6 +9210,7 @@ from .models import (
     Hotelprice, VehiclePricing, ActivityPrice, HouseboatPrice,
     PackagePricingOption
 )
+from .pricing_utils import PACKAGE_OPTION_TYPES, build_package_option_rows, package_option_label
 
 
 
@@ -10106,245 +9219,43 @@ from .models import (
 def package_template_pricing(request, package_id):
     package = get_object_or_404(PackageTemplate, id=package_id)
 
-    def calculate_all_prices():
-        all_bookings = []
-        combined_bookings = list(chain(
-            HotelBooking.objects.filter(package_day_plan__package_template=package).prefetch_related('inclusion_items__special_inclusion'),
-            VehicleBooking.objects.filter(package_template=package),
-            ActivityBooking.objects.filter(package_template=package),
-            HouseboatBooking.objects.filter(package_template=package).prefetch_related('inclusion_items__special_inclusion')
-        ))
-
-        for booking in combined_bookings:
-            net_price = Decimal('0.00')
-            nights = 1
-
-            # --- Hotel Booking Price Logic ---
-            if isinstance(booking, HotelBooking):
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-
-                if hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-                else:
-                    rule = Hotelprice.objects.filter(
-                        hotel=booking.hotel, room_type=booking.room_type, meal_plan=booking.meal_plan,
-                        from_date__lte=booking.check_in_date, to_date__gte=booking.check_in_date
-                    ).first()
-                    if rule:
-                        per_night = (
-                            Decimal(booking.num_double_beds or 0) * (rule.double_bed or 0) +
-                            Decimal(booking.child_with_bed or 0) * (rule.child_with_bed or 0) +
-                            Decimal(booking.child_without_bed or 0) * (rule.child_without_bed or 0) +
-                            Decimal(booking.extra_beds or 0) * (rule.extra_bed or 0)
-                        )
-                        net_price = per_night * nights
-
-                inclusion_price = booking.get_total_inclusion_price()
-                net_price += inclusion_price
-
-                rule = Hotelprice.objects.filter(
-                    hotel=booking.hotel, room_type=booking.room_type, meal_plan=booking.meal_plan,
-                    from_date__lte=booking.check_in_date, to_date__gte=booking.check_in_date
-                ).first()
-                booking.price_record = rule
-                booking.sort_date = booking.check_in_date
-                booking.item_type = 'Accommodation'
-                booking.inclusion_price = inclusion_price
-                booking.inclusions_list = list(booking.inclusion_items.select_related('special_inclusion').all())
-
-            # --- Vehicle Booking Price Logic ---
-            elif isinstance(booking, VehicleBooking):
-                rule = VehiclePricing.objects.filter(
-                    vehicle=booking.vehicle,
-                    from_date__lte=booking.pickup_date,
-                    to_date__gte=booking.pickup_date
-                ).first()
-
-                expected_calculated_price = Decimal('0')
-                if rule and hasattr(booking, 'total_km') and booking.total_km is not None:
-                    if booking.total_km <= 100:
-                        expected_calculated_price = rule.total_fee_100km or Decimal('0')
-                    else:
-                        extra_km = booking.total_km - 100
-                        extra_cost = Decimal(str(extra_km)) * (rule.extra_fee_per_km or Decimal('0'))
-                        expected_calculated_price = (rule.total_fee_100km or Decimal('0')) + extra_cost
-
-                if hasattr(booking, 'custom_total_price') and booking.custom_total_price is not None and booking.custom_total_price > 0:
-                    net_price = booking.custom_total_price
-                elif hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-                else:
-                    net_price = expected_calculated_price
-
-                booking.price_record = rule
-                booking.sort_date = booking.pickup_date
-                booking.item_type = 'Transportation'
-                booking.inclusion_price = Decimal('0.00')
-                booking.inclusions_list = []
-
-            # --- Activity Booking Price Logic ---
-            elif isinstance(booking, ActivityBooking):
-                rule = ActivityPrice.objects.filter(
-                    activity=booking.activity,
-                    from_date__lte=booking.booking_date,
-                    to_date__gte=booking.booking_date
-                ).first() or ActivityPrice.objects.filter(activity=booking.activity).first()
-
-                expected_calculated_price = Decimal('0')
-                if rule:
-                    current_total_people = (booking.num_adults or 0) + (booking.num_children or 0)
-                    expected_calculated_price = Decimal(str(current_total_people)) * (rule.per_person or Decimal('0'))
-
-                if hasattr(booking, 'custom_total_price') and booking.custom_total_price is not None and booking.custom_total_price > 0:
-                    net_price = booking.custom_total_price
-                elif hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-                else:
-                    net_price = expected_calculated_price
-
-                booking.price_record = rule
-                booking.sort_date = booking.booking_date
-                booking.item_type = 'Activity'
-                booking.inclusion_price = Decimal('0.00')
-                booking.inclusions_list = []
-
-            # --- Houseboat Booking Price Logic ---
-            elif isinstance(booking, HouseboatBooking):
-                nights = (booking.check_out_date - booking.check_in_date).days or 1
-
-                if hasattr(booking, 'net_price') and booking.net_price and booking.net_price > 0:
-                    net_price = booking.net_price
-                else:
-                    rule = HouseboatPrice.objects.filter(
-                        houseboat=booking.houseboat,
-                        meal_plan=booking.meal_plan,
-                        room_type=booking.room_type,
-                        from_date__lte=booking.check_in_date,
-                        to_date__gte=booking.check_in_date
-                    ).first()
-                    if rule:
-                        per_night = (
-                            Decimal(booking.num_one_bed_rooms or 0) * (rule.one_bed or 0) +
-                            Decimal(booking.num_two_bed_rooms or 0) * (rule.two_bed or 0) +
-                            Decimal(booking.num_three_bed_rooms or 0) * (rule.three_bed or 0) +
-                            Decimal(booking.num_four_bed_rooms or 0) * (rule.four_bed or 0) +
-                            Decimal(booking.num_five_bed_rooms or 0) * (rule.five_bed or 0) +
-                            Decimal(booking.num_six_bed_rooms or 0) * (rule.six_bed or 0) +
-                            Decimal(booking.num_seven_bed_rooms or 0) * (rule.seven_bed or 0) +
-                            Decimal(booking.num_eight_bed_rooms or 0) * (rule.eight_bed or 0) +
-                            Decimal(booking.num_nine_bed_rooms or 0) * (rule.nine_bed or 0) +
-                            Decimal(booking.num_ten_bed_rooms or 0) * (rule.ten_bed or 0) +
-                            Decimal(booking.num_extra_beds or 0) * (rule.extra_bed or 0)
-                        )
-                        net_price = per_night * nights
-
-                inclusion_price = booking.get_total_inclusion_price()
-                net_price += inclusion_price
-
-                rule = HouseboatPrice.objects.filter(
-                    houseboat=booking.houseboat,
-                    meal_plan=booking.meal_plan,
-                    room_type=booking.room_type,
-                    from_date__lte=booking.check_in_date,
-                    to_date__gte=booking.check_in_date
-                ).first()
-                booking.price_record = rule
-                booking.sort_date = booking.check_in_date
-                booking.item_type = 'Houseboat'
-                booking.inclusion_price = inclusion_price
-                booking.inclusions_list = list(booking.inclusion_items.select_related('special_inclusion').all())
-
-            # --- Individual Markup & Final Calculation for Each Item ---
-            individual_markup = Decimal('0.00')
-            if hasattr(booking, 'markup_value') and booking.markup_value:
-                try:
-                    markup_val = Decimal(str(booking.markup_value))
-                    if markup_val > 0:
-                        individual_markup = markup_val if booking.markup_type != 'percentage' else net_price * (markup_val / 100)
-                except (ValueError, TypeError, InvalidOperation):
-                    pass
-
-            booking.calculated_price = {
-                'net': net_price,
-                'markup': individual_markup,
-                'gross': net_price + individual_markup,
-                'inclusion_price': getattr(booking, 'inclusion_price', Decimal('0.00')),
-                'nights': nights
-            }
-            all_bookings.append(booking)
+    def stored_markup(index):
+        return (
+            request.session.get(f'package_{package.id}_option_{index}_markup_type', 'fixed'),
+            Decimal(request.session.get(f'package_{package.id}_option_{index}_markup_value', '0'))
+        )
 
-        return all_bookings
+    # Houseboats are shared across options for package templates
+    hotel_only = PACKAGE_OPTION_TYPES
 
     # --- POST Request Logic (✅ FIXED) ---
     if request.method == 'POST':
         try:
             PackagePricingOption.objects.filter(package_template=package).delete()
 
-            all_items = sorted(calculate_all_prices(), key=attrgetter('sort_date'))
-            non_accommodation_net = sum(item.calculated_price['net'] for item in all_items if item.item_type != 'Accommodation')
-            # ✅ FIX 1: Calculate non-accommodation markup
-            non_accommodation_markup = sum(item.calculated_price['markup'] for item in all_items if item.item_type != 'Accommodation')
-
-            grouped_hotels = defaultdict(list)
-            for item in all_items:
-                if item.item_type == 'Accommodation':
-                    hotel_option = getattr(item, 'option', 'Option 1')
-                    grouped_hotels[hotel_option].append(item)
+            all_items = pricing_engine.price_package(package)
 
             # ✅ FIX 2: Get CGST/SGST/Discount from POST request
             cgst_percentage = Decimal(request.POST.get('cgst', str(getattr(package, 'cgst_percentage', Decimal('2.5')))))
             sgst_percentage = Decimal(request.POST.get('sgst', str(getattr(package, 'sgst_percentage', Decimal('2.5')))))
             discount = Decimal(request.POST.get('discount', str(getattr(package, 'discount', Decimal('0')))))
 
-            for index, (option_name, hotels) in enumerate(grouped_hotels.items(), 1):
-                package_index_str = str(index)
-
-                # ✅ FIX 3: Get stored global markup for this option
-                stored_markup_type = request.session.get(f'package_{package.id}_option_{package_index_str}_markup_type', 'fixed')
-                stored_markup_value = Decimal(request.session.get(f'package_{package.id}_option_{package_index_str}_markup_value', '0'))
-
-                option_hotels_net = sum(h.calculated_price['net'] for h in hotels)
-                # ✅ FIX 4: Calculate hotel individual markups
-                option_hotels_markup = sum(h.calculated_price['markup'] for h in hotels)
-
-                # ✅ FIX 5: Proper calculation flow
-                package_net = option_hotels_net + non_accommodation_net
-                package_individual_markup = option_hotels_markup + non_accommodation_markup
-                package_base_for_global = package_net + package_individual_markup
-
-                # Calculate global markup
-                package_global_markup = package_base_for_global * (stored_markup_value / 100) if stored_markup_type == 'percentage' else stored_markup_value
-
-                # Total with all markups
-                package_gross_before_tax = package_base_for_global + package_global_markup
-
-                # Calculate taxes and final amount
-                cgst_amount = package_gross_before_tax * (cgst_percentage / 100)
-                sgst_amount = package_gross_before_tax * (sgst_percentage / 100)
-                final_amount = package_gross_before_tax + cgst_amount + sgst_amount - discount
+            options = pricing_engine.summarise_options(
+                all_items, cgst_percentage, sgst_percentage, discount,
+                markup_for=stored_markup, option_types=hotel_only,
+                label_for=package_option_label
+            )
 
-                hotels_list = [{'name': h.hotel.name, 'net_price': float(h.calculated_price['net'])} for h in hotels]
-
-                # ✅ FIX 6: Save with correct gross_price
-                PackagePricingOption.objects.create(
-                    package_template=package,
-                    option_name=option_name,
-                    option_number=index,
-                    net_price=package_net,
-                    gross_price=package_gross_before_tax,  # ✅ Price WITH markups (before tax)
-                    cgst_amount=cgst_amount,
-                    sgst_amount=sgst_amount,
-                    discount_amount=discount,
-                    final_amount=final_amount,  # ✅ Final with everything
-                    hotels_included=hotels_list
-                )
+            # ✅ markup_amount is saved too, so queued rate changes can reprice with the same markup
+            for option_data in build_package_option_rows(discount, options):
+                PackagePricingOption.objects.create(package_template=package, **option_data)
 
             if hasattr(package, 'is_finalized'):
                 package.is_finalized = True
                 package.finalized_at = now()
                 package.save()
 
-            messages.success(request, f"Saved {len(grouped_hotels)} pricing options for package!")
+            messages.success(request, f"Saved {len(options)} pricing options for package!")
             return redirect('list_package_templates')
 
         except Exception as e:
@@ -10372,86 +9283,18 @@ def package_template_pricing(request, package_id):
         request.session[f'package_{package.id}_selected_option'] = request.GET.get('selected_option')
         request.session.modified = True
 
-    all_items = sorted(calculate_all_prices(), key=attrgetter('sort_date'))
-
-    non_accommodation_net = sum(item.calculated_price['net'] for item in all_items if item.item_type != 'Accommodation')
-    non_accommodation_markup = sum(item.calculated_price['markup'] for item in all_items if item.item_type != 'Accommodation')
-
-    grouped_hotels = defaultdict(list)
-    for item in all_items:
-        if item.item_type == 'Accommodation':
-            hotel_option_display = getattr(item, 'get_option_display', None)
-            hotel_option = hotel_option_display() if callable(hotel_option_display) else getattr(item, 'option', 'Option 1')
-            grouped_hotels[hotel_option].append(item)
-
-    hotel_option_groups = []
-
-    if not grouped_hotels and all_items:
-        stored_markup_type = request.session.get(f'package_{package.id}_option_1_markup_type', 'fixed')
-        stored_markup_value = Decimal(request.session.get(f'package_{package.id}_option_1_markup_value', '0'))
-
-        package_base = non_accommodation_net + non_accommodation_markup
-        global_markup = package_base * (stored_markup_value / 100) if stored_markup_type == 'percentage' else stored_markup_value
-        gross_before_tax = package_base + global_markup
-        cgst_amount = gross_before_tax * (cgst_perc / 100)
-        sgst_amount = gross_before_tax * (sgst_perc / 100)
-        final_amount = gross_before_tax + cgst_amount + sgst_amount - discount
-
-        hotel_option_groups.append({
-            'option_name': 'Standard Package',
-            'hotel_count': 0,
-            'hotels': [],
-            'option_net_total': Decimal('0.00'),
-            'net_price': non_accommodation_net,
-            'markup': non_accommodation_markup,
-            'global_markup': global_markup,
-            'gross_before_tax': gross_before_tax,
-            'cgst_amount': cgst_amount,
-            'sgst_amount': sgst_amount,
-            'discount': discount,
-            'gross_price': final_amount
-        })
-
-    for index, (option_name, hotels) in enumerate(grouped_hotels.items()):
-        package_index_str = str(index + 1)
-
-        stored_markup_type = request.session.get(f'package_{package.id}_option_{package_index_str}_markup_type', 'fixed')
-        stored_markup_value = Decimal(request.session.get(f'package_{package.id}_option_{package_index_str}_markup_value', '0'))
-
-        option_hotels_net = sum(h.calculated_price['net'] for h in hotels)
-        option_hotels_markup = sum(h.calculated_price['markup'] for h in hotels)
-
-        package_net = option_hotels_net + non_accommodation_net
-        package_markup = option_hotels_markup + non_accommodation_markup
-        package_base_for_global = package_net + package_markup
-
-        package_global_markup = package_base_for_global * (stored_markup_value / 100) if stored_markup_type == 'percentage' else stored_markup_value
-
-        package_gross_before_tax = package_base_for_global + package_global_markup
-        package_cgst = package_gross_before_tax * (cgst_perc / 100)
-        package_sgst = package_gross_before_tax * (sgst_perc / 100)
-        package_final_price = package_gross_before_tax + package_cgst + package_sgst - discount
-
-        hotel_option_groups.append({
-            'option_name': option_name,
-            'hotel_count': len(hotels),
-            'hotels': [{'name': h.hotel.name, 'net_price': h.calculated_price['net']} for h in hotels],
-            'option_net_total': option_hotels_net,
-            'net_price': package_net,
-            'markup': package_markup,
-            'global_markup': package_global_markup,
-            'gross_before_tax': package_gross_before_tax,
-            'cgst_amount': package_cgst,
-            'sgst_amount': package_sgst,
-            'discount': discount,
-            'gross_price': package_final_price
-        })
+    all_items = pricing_engine.price_package(package)
+    hotel_option_groups = pricing_engine.summarise_options(
+        all_items, cgst_perc, sgst_perc, discount,
+        markup_for=stored_markup, option_types=hotel_only,
+        label_for=lambda key, hotels: hotels[0].get_option_display(),
+        fallback_name='Standard Package' if all_items else None
+    )
 
     current_markup_type = 'fixed'
     current_markup_value = Decimal('0')
     if selected_option:
-        current_markup_type = request.session.get(f'package_{package.id}_option_{selected_option}_markup_type', 'fixed')
-        current_markup_value = Decimal(request.session.get(f'package_{package.id}_option_{selected_option}_markup_value', '0'))
+        current_markup_type, current_markup_value = stored_markup(selected_option)
 
     context = {
         'package': package,
@@ -10499,6 +9342,7 @@ from collections import defaultdict
 
 
 from django.http import JsonResponse
+from . import package_availability
 
 
 @custom_login_required
@@ -10513,36 +9357,8 @@ def check_package_availability(request):
         package = get_object_or_404(PackageTemplate, id=package_id)
         query = get_object_or_404(Query, id=query_id)
 
-        # Check availability
-        warnings = validate_pricing_availability(package, query.from_date, query.to_date)
-
-        # Build response
-        unavailable_items = []
-        total_items = 0
-        available_count = 0
-
-        for day_plan in package.day_plans.all():
-            for hotel_booking in day_plan.hotel_bookings.all():
-                total_items += 1
-                current_date = query.from_date + timedelta(days=day_plan.day_number - 1)
-
-                has_pricing = Hotelprice.objects.filter(
-                    hotel=hotel_booking.hotel,
-                    room_type=hotel_booking.room_type,
-                    meal_plan=hotel_booking.meal_plan,
-                    from_date__lte=current_date,
-                    to_date__gte=current_date
-                ).exists()
-
-                if has_pricing:
-                    available_count += 1
-                else:
-                    unavailable_items.append({
-                        'type': 'Hotel',
-                        'name': hotel_booking.hotel.name,
-                        'day': day_plan.day_number,
-                        'date': current_date.strftime('%d %b %Y')
-                    })
+        # One load of the package bookings, coverage resolved against the rate index
+        unavailable_items, available_count, total_items = package_availability.hotel_day_coverage(package, query.from_date)
 
         return JsonResponse({
             'unavailable_items': unavailable_items,
@@ -10574,226 +9390,12 @@ from .models import (
 )
 
 
-@custom_login_required
 def validate_pricing_availability(package, start_date, end_date):
     """
     Check if all items in package have pricing for the given date range
-    Returns list of items missing pricing
+    Returns list of items missing pricing (see package_availability.py)
     """
-    missing_pricing = []
-
-    # Calculate date offset
-    if not package.from_date:
-        date_offset = 0
-    else:
-        date_offset = (start_date - package.from_date).days
-
-    # Check hotel pricing
-    for day_plan in package.day_plans.all():
-        for hotel_booking in day_plan.hotel_bookings.all():
-            new_check_in = hotel_booking.check_in_date + timedelta(days=date_offset)
-            new_check_out = hotel_booking.check_out_date + timedelta(days=date_offset)
-
-            # Check if pricing exists for this date range
-            has_pricing = Hotelprice.objects.filter(
-                hotel=hotel_booking.hotel,
-                room_type=hotel_booking.room_type,
-                meal_plan=hotel_booking.meal_plan,
-                from_date__lte=new_check_in,
-                to_date__gte=new_check_in
-            ).exists()
-
-            if not has_pricing:
-                missing_pricing.append({
-                    'type': 'Hotel',
-                    'name': hotel_booking.hotel.name,
-                    'room_type': hotel_booking.room_type.name if hotel_booking.room_type else 'N/A',
-                    'meal_plan': hotel_booking.meal_plan.name if hotel_booking.meal_plan else 'N/A',
-                    'day': day_plan.day_number,
-                    'check_in': new_check_in,
-                    'check_out': new_check_out
-                })
-
-    # Check activity pricing
-    for day_plan in package.day_plans.all():
-        activity_bookings = ActivityBooking.objects.filter(
-            package_template=package,
-            package_day_plan=day_plan
-        )
-        for activity_booking in activity_bookings:
-            booking_date = (activity_booking.booking_date + timedelta(days=date_offset)) if activity_booking.booking_date else (start_date + timedelta(days=day_plan.day_number - 1))
-
-            has_pricing = ActivityPrice.objects.filter(
-                activity=activity_booking.activity,
-                from_date__lte=booking_date,
-                to_date__gte=booking_date
-            ).exists()
-
-            if not has_pricing:
-                missing_pricing.append({
-                    'type': 'Activity',
-                    'name': activity_booking.activity.name,
-                    'day': day_plan.day_number,
-                    'date': booking_date.strftime('%d %b %Y')
-                })
-
-    # Check houseboat pricing
-    for day_plan in package.day_plans.all():
-        houseboat_bookings = HouseboatBooking.objects.filter(
-            package_template=package,
-            package_day_plan=day_plan
-        )
-        for houseboat_booking in houseboat_bookings:
-            new_hb_check_in = (houseboat_booking.check_in_date + timedelta(days=date_offset)) if houseboat_booking.check_in_date else (start_date + timedelta(days=day_plan.day_number - 1))
-
-            has_pricing = HouseboatPrice.objects.filter(
-                houseboat=houseboat_booking.houseboat,
-                room_type=houseboat_booking.room_type,
-                meal_plan=houseboat_booking.meal_plan,
-                from_date__lte=new_hb_check_in,
-                to_date__gte=new_hb_check_in
-            ).exists()
-
-            if not has_pricing:
-                missing_pricing.append({
-                    'type': 'Houseboat',
-                    'name': houseboat_booking.houseboat.name,
-                    'day': day_plan.day_number,
-                    'check_in': new_hb_check_in.strftime('%d %b %Y')
-                })
-
-    # Check vehicle pricing
-    vehicle_bookings = VehicleBooking.objects.filter(package_template=package)
-    for vehicle_booking in vehicle_bookings:
-        pickup_date = (vehicle_booking.pickup_date + timedelta(days=date_offset)) if vehicle_booking.pickup_date else start_date
-
-        # 🔥 FIXED: Use vehicle__destination instead of just destination
-        has_pricing = VehiclePricing.objects.filter(
-            vehicle=vehicle_booking.vehicle,
-            from_date__lte=pickup_date,
-            to_date__gte=pickup_date
-        ).exists()
-
-        if not has_pricing:
-            missing_pricing.append({
-                'type': 'Vehicle',
-                'name': vehicle_booking.vehicle.name,
-                'vehicle_type': vehicle_booking.vehicle_type if vehicle_booking.vehicle_type else 'N/A',
-                'pickup_date': pickup_date.strftime('%d %b %Y')
-            })
-
-    return missing_pricing
-
-
-@custom_login_required
-def validate_pricing_availability(package, start_date, end_date):
-    """
-    Check if all items in package have pricing for the given date range
-    Returns list of items missing pricing
-    """
-    missing_pricing = []
-
-    # Calculate date offset
-    if not package.from_date:
-        date_offset = 0
-    else:
-        date_offset = (start_date - package.from_date).days
-
-    # Check hotel pricing
-    for day_plan in package.day_plans.all():
-        for hotel_booking in day_plan.hotel_bookings.all():
-            new_check_in = hotel_booking.check_in_date + timedelta(days=date_offset)
-            new_check_out = hotel_booking.check_out_date + timedelta(days=date_offset)
-
-            # Check if pricing exists for this date range
-            has_pricing = Hotelprice.objects.filter(
-                hotel=hotel_booking.hotel,
-                room_type=hotel_booking.room_type,
-                meal_plan=hotel_booking.meal_plan,
-                from_date__lte=new_check_in,
-                to_date__gte=new_check_in
-            ).exists()
-
-            if not has_pricing:
-                missing_pricing.append({
-                    'type': 'Hotel',
-                    'name': hotel_booking.hotel.name,
-                    'room_type': hotel_booking.room_type.name if hotel_booking.room_type else 'N/A',
-                    'meal_plan': hotel_booking.meal_plan.name if hotel_booking.meal_plan else 'N/A',
-                    'day': day_plan.day_number,
-                    'check_in': new_check_in,
-                    'check_out': new_check_out
-                })
-
-    # Check activity pricing
-    for day_plan in package.day_plans.all():
-        activity_bookings = ActivityBooking.objects.filter(
-            package_template=package,
-            package_day_plan=day_plan
-        )
-        for activity_booking in activity_bookings:
-            booking_date = (activity_booking.booking_date + timedelta(days=date_offset)) if activity_booking.booking_date else (start_date + timedelta(days=day_plan.day_number - 1))
-
-            has_pricing = ActivityPrice.objects.filter(
-                activity=activity_booking.activity,
-                from_date__lte=booking_date,
-                to_date__gte=booking_date
-            ).exists()
-
-            if not has_pricing:
-                missing_pricing.append({
-                    'type': 'Activity',
-                    'name': activity_booking.activity.name,
-                    'day': day_plan.day_number,
-                    'date': booking_date.strftime('%d %b %Y')
-                })
-
-    # Check houseboat pricing
-    for day_plan in package.day_plans.all():
-        houseboat_bookings = HouseboatBooking.objects.filter(
-            package_template=package,
-            package_day_plan=day_plan
-        )
-        for houseboat_booking in houseboat_bookings:
-            new_hb_check_in = (houseboat_booking.check_in_date + timedelta(days=date_offset)) if houseboat_booking.check_in_date else (start_date + timedelta(days=day_plan.day_number - 1))
-
-            has_pricing = HouseboatPrice.objects.filter(
-                houseboat=houseboat_booking.houseboat,
-                room_type=houseboat_booking.room_type,
-                meal_plan=houseboat_booking.meal_plan,
-                from_date__lte=new_hb_check_in,
-                to_date__gte=new_hb_check_in
-            ).exists()
-
-            if not has_pricing:
-                missing_pricing.append({
-                    'type': 'Houseboat',
-                    'name': houseboat_booking.houseboat.name,
-                    'day': day_plan.day_number,
-                    'check_in': new_hb_check_in.strftime('%d %b %Y')
-                })
-
-    # Check vehicle pricing
-    vehicle_bookings = VehicleBooking.objects.filter(package_template=package)
-    for vehicle_booking in vehicle_bookings:
-        pickup_date = (vehicle_booking.pickup_date + timedelta(days=date_offset)) if vehicle_booking.pickup_date else start_date
-
-        # 🔥 FIXED: Use vehicle__destination instead of just destination
-        has_pricing = VehiclePricing.objects.filter(
-            vehicle=vehicle_booking.vehicle,
-            from_date__lte=pickup_date,
-            to_date__gte=pickup_date
-        ).exists()
-
-        if not has_pricing:
-            missing_pricing.append({
-                'type': 'Vehicle',
-                'name': vehicle_booking.vehicle.name,
-                'vehicle_type': vehicle_booking.vehicle_type if vehicle_booking.vehicle_type else 'N/A',
-                'pickup_date': pickup_date.strftime('%d %b %Y')
-            })
-
-    return missing_pricing
+    return package_availability.missing_pricing(package, start_date, end_date)
 
 
 
@@ -10810,536 +9412,18 @@ from .models import (
     Hotelprice, VehiclePricing, ActivityPrice, HouseboatPrice,
     PackageTemplate, Query
 )
+from . import package_insert
 
-@custom_login_required
 def create_itinerary_from_package_with_validation(package, query, start_date, end_date, created_by=None):
     """
     Create itinerary from package - ONLY INSERT ITEMS WITH VALID PRICING
     Items without pricing are automatically SKIPPED
     AUTO-SAVES PRICING WITH TAXES - No manual entry needed!
     Returns: (itinerary, skipped_items_list)
-    """
-
-    print("=" * 80)
-    print(f"🔧 PACKAGE INSERTION WITH PRICING VALIDATION")
-    print(f"📦 Package: {package.name}")
-    print(f"📅 Query dates: {start_date} to {end_date}")
-    print(f"👤 Client: {query.client_name}")
-    print("=" * 80)
-
-    # Calculate date offset
-    if not package.from_date:
-        date_offset = 0
-        print("⚠️  WARNING: Package has no from_date, using offset = 0")
-    else:
-        date_offset = (start_date - package.from_date).days
-        print(f"✅ Date offset calculated: {date_offset} days")
-        print(f"   (Package date: {package.from_date} → Query date: {start_date})")
-
-    print("")
-
-    # Create itinerary
-    itinerary = Itinerary.objects.create(
-        query=query,
-        name=f"{package.name} - {query.client_name}",
-        discount=getattr(package, 'discount', 0),
-        cgst_percentage=getattr(package, 'cgst_percentage', 0),
-        sgst_percentage=getattr(package, 'sgst_percentage', 0),
-        status='draft',
-        created_by=created_by  # ✅ FIXED: Now accepts this parameter
-
-    )
-
-    if hasattr(package, 'destinations'):
-        itinerary.destinations.set(package.destinations.all())
-
-    print(f"✅ Itinerary created: ID {itinerary.id}")
-    print(f"   Name: {itinerary.name}\n")
-
-    # Statistics
-    stats = {
-        'hotels_inserted': 0,
-        'hotels_skipped': 0,
-        'activities_inserted': 0,
-        'activities_skipped': 0,
-        'vehicles_inserted': 0,
-        'vehicles_skipped': 0,
-        'houseboats_inserted': 0,
-        'houseboats_skipped': 0,
-        'day_plans_created': 0
-    }
 
-    skipped_items = []
-
-    # Copy day plans
-    day_plans = package.day_plans.all().order_by('day_number')
-    print(f"📋 Processing {day_plans.count()} day plans...\n")
-
-    for template_day in day_plans:
-        current_date = start_date + timedelta(days=template_day.day_number - 1)
-
-        print("─" * 80)
-        print(f"📅 DAY {template_day.day_number}: {current_date.strftime('%d %b %Y')} - {template_day.title}")
-        print("─" * 80)
-
-        # CREATE DAY PLAN FIRST
-        itinerary_day = ItineraryDayPlan.objects.create(
-            itinerary=itinerary,
-            day_number=template_day.day_number,
-            destination=template_day.destination,
-            title=template_day.title,
-            description=template_day.description,
-            image=template_day.image if template_day.image else None,
-        )
-        stats['day_plans_created'] += 1
-
-        # ========== HOTELS ==========
-        hotel_bookings = template_day.hotel_bookings.all()
-        if hotel_bookings.exists():
-            print(f"\n🏨 HOTELS ({hotel_bookings.count()} found):")
-
-            for hotel_booking in hotel_bookings:
-                new_check_in = hotel_booking.check_in_date + timedelta(days=date_offset)
-                new_check_out = hotel_booking.check_out_date + timedelta(days=date_offset)
-
-                # CHECK PRICING AVAILABILITY
-                has_pricing = Hotelprice.objects.filter(
-                    hotel=hotel_booking.hotel,
-                    room_type=hotel_booking.room_type,
-                    meal_plan=hotel_booking.meal_plan,
-                    from_date__lte=new_check_out,
-                    to_date__gte=new_check_in
-                ).exists()
-
-                room_type_name = hotel_booking.room_type.name if hotel_booking.room_type else 'N/A'
-                meal_plan_name = hotel_booking.meal_plan.name if hotel_booking.meal_plan else 'N/A'
-                hotel_name = f"{hotel_booking.hotel.name} ({room_type_name}, {meal_plan_name})"
-
-                if has_pricing:
-                    new_hotel_booking = HotelBooking.objects.create(
-                        itinerary=itinerary,
-                        day_plan=itinerary_day,
-                        hotel=hotel_booking.hotel,
-                        destination=hotel_booking.destination,
-                        category=getattr(hotel_booking, 'category', None),
-                        room_type=hotel_booking.room_type,
-                        meal_plan=hotel_booking.meal_plan,
-                        option=getattr(hotel_booking, 'option', None),
-                        num_rooms=getattr(hotel_booking, 'num_rooms', 1),
-                        num_double_beds=getattr(hotel_booking, 'num_double_beds', 0),
-                        child_with_bed=getattr(hotel_booking, 'child_with_bed', 0),
-                        child_without_bed=getattr(hotel_booking, 'child_without_bed', 0),
-                        extra_beds=getattr(hotel_booking, 'extra_beds', 0),
-                        check_in_date=new_check_in,
-                        check_in_time=hotel_booking.check_in_time if hotel_booking.check_in_time else time(14, 0),
-                        check_out_date=new_check_out,
-                        check_out_time=hotel_booking.check_out_time if hotel_booking.check_out_time else time(11, 0),
-                    )
-
-                    # Copy special inclusions
-                    inclusion_count = 0
-                    if hasattr(hotel_booking, 'inclusion_items'):
-                        for inclusion_item in hotel_booking.inclusion_items.all():
-                            HotelBookingInclusion.objects.create(
-                                hotel_booking=new_hotel_booking,
-                                special_inclusion=inclusion_item.special_inclusion,
-                                num_adults=getattr(inclusion_item, 'num_adults', 0),
-                                num_children=getattr(inclusion_item, 'num_children', 0),
-                                price=getattr(inclusion_item, 'price', 0),
-                            )
-                            inclusion_count += 1
-
-                    inclusion_info = f" + {inclusion_count} inclusions" if inclusion_count > 0 else ""
-                    print(f"   ✅ {hotel_name}{inclusion_info}")
-                    print(f"      Dates: {new_check_in.strftime('%d %b')} → {new_check_out.strftime('%d %b')}")
-                    stats['hotels_inserted'] += 1
-                else:
-                    print(f"   ❌ {hotel_name} - SKIPPED (No pricing)")
-                    print(f"      Missing: {new_check_in.strftime('%d %b')} → {new_check_out.strftime('%d %b')}")
-                    stats['hotels_skipped'] += 1
-                    skipped_items.append({
-                        'day': template_day.day_number,
-                        'type': 'Hotel',
-                        'name': hotel_name,
-                        'date': f"{new_check_in.strftime('%d %b')} → {new_check_out.strftime('%d %b')}"
-                    })
-
-        # ========== ACTIVITIES ==========
-        activity_bookings = ActivityBooking.objects.filter(
-            package_template=package,
-            package_day_plan=template_day
-        )
-
-        if activity_bookings.exists():
-            print(f"\n🎯 ACTIVITIES ({activity_bookings.count()} found):")
-
-            for activity_booking in activity_bookings:
-                new_booking_date = (activity_booking.booking_date + timedelta(days=date_offset)) if activity_booking.booking_date else current_date
-
-                has_pricing = ActivityPrice.objects.filter(
-                    activity=activity_booking.activity,
-                    from_date__lte=new_booking_date,
-                    to_date__gte=new_booking_date
-                ).exists()
-
-                if has_pricing:
-                    ActivityBooking.objects.create(
-                        itinerary=itinerary,
-                        day_plan=itinerary_day,
-                        activity=activity_booking.activity,
-                        booking_date=new_booking_date,
-                        booking_time=getattr(activity_booking, 'booking_time', None),
-                        num_adults=getattr(activity_booking, 'num_adults', 0),
-                        num_children=getattr(activity_booking, 'num_children', 0),
-                        notes=getattr(activity_booking, 'notes', ''),
-                    )
-                    print(f"   ✅ {activity_booking.activity.name} ({new_booking_date.strftime('%d %b')})")
-                    stats['activities_inserted'] += 1
-                else:
-                    print(f"   ❌ {activity_booking.activity.name} - SKIPPED (No pricing)")
-                    stats['activities_skipped'] += 1
-                    skipped_items.append({
-                        'day': template_day.day_number,
-                        'type': 'Activity',
-                        'name': activity_booking.activity.name,
-                        'date': new_booking_date.strftime('%d %b %Y')
-                    })
-
-        # ========== HOUSEBOATS ==========
-        houseboat_bookings = HouseboatBooking.objects.filter(
-            package_template=package,
-            package_day_plan=template_day
-        )
-
-        if houseboat_bookings.exists():
-            print(f"\n🚤 HOUSEBOATS ({houseboat_bookings.count()} found):")
-
-            for houseboat_booking in houseboat_bookings:
-                new_hb_check_in = (houseboat_booking.check_in_date + timedelta(days=date_offset)) if houseboat_booking.check_in_date else current_date
-                new_hb_check_out = (houseboat_booking.check_out_date + timedelta(days=date_offset)) if houseboat_booking.check_out_date else current_date + timedelta(days=1)
-
-                has_pricing = HouseboatPrice.objects.filter(
-                    houseboat=houseboat_booking.houseboat,
-                    room_type=houseboat_booking.room_type,
-                    meal_plan=houseboat_booking.meal_plan,
-                    from_date__lte=new_hb_check_out,
-                    to_date__gte=new_hb_check_in
-                ).exists()
-
-                room_type_name = houseboat_booking.room_type.name if houseboat_booking.room_type else 'Standard'
-                houseboat_name = f"{houseboat_booking.houseboat.name} ({room_type_name})"
-
-                if has_pricing:
-                    HouseboatBooking.objects.create(
-                        itinerary=itinerary,
-                        day_plan=itinerary_day,
-                        houseboat=houseboat_booking.houseboat,
-                        meal_plan=houseboat_booking.meal_plan,
-                        room_type=houseboat_booking.room_type,
-                        check_in_date=new_hb_check_in,
-                        check_out_date=new_hb_check_out,
-                        num_one_bed_rooms=getattr(houseboat_booking, 'num_one_bed_rooms', 0),
-                        num_two_bed_rooms=getattr(houseboat_booking, 'num_two_bed_rooms', 0),
-                        num_three_bed_rooms=getattr(houseboat_booking, 'num_three_bed_rooms', 0),
-                        num_four_bed_rooms=getattr(houseboat_booking, 'num_four_bed_rooms', 0),
-                        num_five_bed_rooms=getattr(houseboat_booking, 'num_five_bed_rooms', 0),
-                        num_six_bed_rooms=getattr(houseboat_booking, 'num_six_bed_rooms', 0),
-                        num_seven_bed_rooms=getattr(houseboat_booking, 'num_seven_bed_rooms', 0),
-                        num_eight_bed_rooms=getattr(houseboat_booking, 'num_eight_bed_rooms', 0),
-                        num_nine_bed_rooms=getattr(houseboat_booking, 'num_nine_bed_rooms', 0),
-                        num_ten_bed_rooms=getattr(houseboat_booking, 'num_ten_bed_rooms', 0),
-                        num_extra_beds=getattr(houseboat_booking, 'num_extra_beds', 0),
-                    )
-                    print(f"   ✅ {houseboat_name}")
-                    print(f"      {new_hb_check_in.strftime('%d %b')} → {new_hb_check_out.strftime('%d %b')}")
-                    stats['houseboats_inserted'] += 1
-                else:
-                    print(f"   ❌ {houseboat_name} - SKIPPED (No pricing)")
-                    stats['houseboats_skipped'] += 1
-                    skipped_items.append({
-                        'day': template_day.day_number,
-                        'type': 'Houseboat',
-                        'name': houseboat_name,
-                        'date': f"{new_hb_check_in.strftime('%d %b')} → {new_hb_check_out.strftime('%d %b')}"
-                    })
-
-        print("")
-
-    # ========== VEHICLES ==========
-    vehicle_bookings = VehicleBooking.objects.filter(package_template=package)
-
-    if vehicle_bookings.exists():
-        print("─" * 80)
-        print(f"🚗 VEHICLES ({vehicle_bookings.count()} found):")
-        print("─" * 80)
-
-        for vehicle_booking in vehicle_bookings:
-            new_pickup = (vehicle_booking.pickup_date + timedelta(days=date_offset)) if vehicle_booking.pickup_date else start_date
-
-            has_pricing = VehiclePricing.objects.filter(
-                vehicle=vehicle_booking.vehicle,
-                from_date__lte=new_pickup,
-                to_date__gte=new_pickup
-            ).exists()
-
-            vehicle_type = getattr(vehicle_booking, 'vehicle_type', 'N/A')
-            vehicle_name = f"{vehicle_booking.vehicle.name} ({vehicle_type})"
-
-            if has_pricing:
-                VehicleBooking.objects.create(
-                    itinerary=itinerary,
-                    vehicle=vehicle_booking.vehicle,
-                    destination=getattr(vehicle_booking, 'destination', None),
-                    pickup_date=new_pickup,
-                    pickup_time=vehicle_booking.pickup_time if vehicle_booking.pickup_time else time(9, 0),
-                    num_passengers=getattr(vehicle_booking, 'num_passengers', 0),
-                    vehicle_type=vehicle_type,
-                    option=getattr(vehicle_booking, 'option', None),
-                    total_km=getattr(vehicle_booking, 'total_km', 0),
-                )
-                print(f"✅ {vehicle_name}")
-                print(f"   Pickup: {new_pickup.strftime('%d %b %Y')}")
-                stats['vehicles_inserted'] += 1
-            else:
-                print(f"❌ {vehicle_name} - SKIPPED (No pricing)")
-                print(f"   Missing pricing for: {new_pickup.strftime('%d %b %Y')}")
-                stats['vehicles_skipped'] += 1
-                skipped_items.append({
-                    'day': '-',
-                    'type': 'Vehicle',
-                    'name': vehicle_name,
-                    'date': new_pickup.strftime('%d %b %Y')
-                })
-        print("")
-
-    # ========== FINAL SUMMARY ==========
-    print("=" * 80)
-    print("📊 INSERTION SUMMARY")
-    print("=" * 80)
-    print(f"✅ Itinerary: {itinerary.name} (ID: {itinerary.id})")
-    print(f"\n📈 ITEMS INSERTED:")
-    print(f"   • Day Plans: {stats['day_plans_created']}")
-    print(f"   • Hotels: {stats['hotels_inserted']}")
-    print(f"   • Activities: {stats['activities_inserted']}")
-    print(f"   • Vehicles: {stats['vehicles_inserted']}")
-    print(f"   • Houseboats: {stats['houseboats_inserted']}")
-
-    total_inserted = (stats['hotels_inserted'] + stats['activities_inserted'] +
-                      stats['vehicles_inserted'] + stats['houseboats_inserted'])
-    total_skipped = (stats['hotels_skipped'] + stats['activities_skipped'] +
-                     stats['vehicles_skipped'] + stats['houseboats_skipped'])
-
-    print(f"\n   TOTAL INSERTED: {total_inserted}")
-
-    if total_skipped > 0:
-        print(f"\n⚠️  ITEMS SKIPPED (No pricing): {total_skipped}")
-        if skipped_items:
-            print(f"\n📋 SKIPPED ITEMS DETAILS:")
-            for item in skipped_items[:10]:
-                print(f"   • Day {item['day']}: {item['type']} - {item['name']} ({item['date']})")
-            if len(skipped_items) > 10:
-                print(f"   ... and {len(skipped_items) - 10} more items")
-
-    print("=" * 80)
-
-    # 🔥 AUTO-SAVE PRICING WITH INCLUSIONS (COMPLETE FIX)
-    print("\n💰 AUTO-SAVING Pricing Options WITH TAXES...\n")
-    try:
-        ItineraryPricingOption.objects.filter(itinerary=itinerary).delete()
-
-        hotels = itinerary.hotelbooking_set.all()
-        activities = itinerary.activitybooking_set.all()
-        vehicles = itinerary.vehiclebooking_set.all()
-        houseboats = itinerary.houseboatbooking_set.all()
-
-        total_net_price = Decimal('0.00')
-        hotels_list = []
-
-        # Calculate hotels pricing - WITH INCLUSIONS
-        for hotel in hotels:
-            nights = (hotel.check_out_date - hotel.check_in_date).days or 1
-            hotel_price = Hotelprice.objects.filter(
-                hotel=hotel.hotel,
-                room_type=hotel.room_type,
-                meal_plan=hotel.meal_plan,
-                from_date__lte=hotel.check_out_date,
-                to_date__gte=hotel.check_in_date
-            ).first()
-
-            if hotel_price:
-                # Base price calculation
-                price_per_night = (
-                    Decimal(hotel.num_double_beds or 0) * (hotel_price.double_bed or 0) +
-                    Decimal(hotel.child_with_bed or 0) * (hotel_price.child_with_bed or 0) +
-                    Decimal(hotel.child_without_bed or 0) * (hotel_price.child_without_bed or 0) +
-                    Decimal(hotel.extra_beds or 0) * (hotel_price.extra_bed or 0)
-                )
-                hotel_base_total = price_per_night * nights
-
-                # 🔥 CALCULATE INCLUSIONS MANUALLY (since we just created the bookings)
-                inclusion_price = Decimal('0.00')
-                inclusion_items = HotelBookingInclusion.objects.filter(hotel_booking=hotel)
-
-                for inclusion_item in inclusion_items:
-                    if inclusion_item.special_inclusion and inclusion_item.price:
-                        inclusion_price += Decimal(str(inclusion_item.price or 0))
-
-                hotel_total = hotel_base_total + inclusion_price
-
-                total_net_price += hotel_total
-                hotels_list.append({
-                    'name': hotel.hotel.name,
-                    'net_price': float(hotel_total),
-                    'base_price': float(hotel_base_total),
-                    'inclusion_price': float(inclusion_price)
-                })
-
-                if inclusion_price > 0:
-                    print(f"   ✅ Hotel: {hotel.hotel.name} ({nights} night{'s' if nights > 1 else ''})")
-                    print(f"      • Base: ₹{hotel_base_total}")
-                    print(f"      • Inclusions: ₹{inclusion_price}")
-                    print(f"      • Total: ₹{hotel_total}")
-                else:
-                    print(f"   ✅ Hotel: {hotel.hotel.name} ({nights} night{'s' if nights > 1 else ''}) - ₹{hotel_total}")
-
-        # Calculate activities pricing
-        for activity in activities:
-            activity_price = ActivityPrice.objects.filter(
-                activity=activity.activity,
-                from_date__lte=activity.booking_date,
-                to_date__gte=activity.booking_date
-            ).first()
-
-            if activity_price:
-                people = (activity.num_adults or 0) + (activity.num_children or 0)
-                price = Decimal(str(activity_price.per_person or 0)) * people
-                total_net_price += price
-                print(f"   ✅ Activity: {activity.activity.name} ({people} people) - ₹{price}")
-
-        # Calculate vehicles pricing
-        for vehicle in vehicles:
-            vehicle_price = VehiclePricing.objects.filter(
-                vehicle=vehicle.vehicle,
-                from_date__lte=vehicle.pickup_date,
-                to_date__gte=vehicle.pickup_date
-            ).first()
-
-            if vehicle_price:
-                km = vehicle.total_km or 0
-                if km <= 100:
-                    price = Decimal(str(vehicle_price.total_fee_100km or 0))
-                else:
-                    extra_km = km - 100
-                    price = Decimal(str(vehicle_price.total_fee_100km or 0)) + (Decimal(str(extra_km)) * Decimal(str(vehicle_price.extra_fee_per_km or 0)))
-
-                total_net_price += price
-                print(f"   ✅ Vehicle: {vehicle.vehicle.name} ({km}km) - ₹{price}")
-
-        # Calculate houseboats pricing - WITH INCLUSIONS
-        for houseboat in houseboats:
-            nights = (houseboat.check_out_date - houseboat.check_in_date).days or 1
-            houseboat_price = HouseboatPrice.objects.filter(
-                houseboat=houseboat.houseboat,
-                room_type=houseboat.room_type,
-                meal_plan=houseboat.meal_plan,
-                from_date__lte=houseboat.check_out_date,
-                to_date__gte=houseboat.check_in_date
-            ).first()
-
-            if houseboat_price:
-                price_per_night = (
-                    Decimal(houseboat.num_one_bed_rooms or 0) * (houseboat_price.one_bed or 0) +
-                    Decimal(houseboat.num_two_bed_rooms or 0) * (houseboat_price.two_bed or 0) +
-                    Decimal(houseboat.num_three_bed_rooms or 0) * (houseboat_price.three_bed or 0) +
-                    Decimal(houseboat.num_four_bed_rooms or 0) * (houseboat_price.four_bed or 0) +
-                    Decimal(houseboat.num_five_bed_rooms or 0) * (houseboat_price.five_bed or 0) +
-                    Decimal(houseboat.num_six_bed_rooms or 0) * (houseboat_price.six_bed or 0) +
-                    Decimal(houseboat.num_seven_bed_rooms or 0) * (houseboat_price.seven_bed or 0) +
-                    Decimal(houseboat.num_eight_bed_rooms or 0) * (houseboat_price.eight_bed or 0) +
-                    Decimal(houseboat.num_nine_bed_rooms or 0) * (houseboat_price.nine_bed or 0) +
-                    Decimal(houseboat.num_ten_bed_rooms or 0) * (houseboat_price.ten_bed or 0) +
-                    Decimal(houseboat.num_extra_beds or 0) * (houseboat_price.extra_bed or 0)
-                )
-                houseboat_base_total = price_per_night * nights
-
-                # 🔥 CALCULATE HOUSEBOAT INCLUSIONS MANUALLY
-                inclusion_price = Decimal('0.00')
-                inclusion_items = HouseboatBookingInclusion.objects.filter(houseboat_booking=houseboat)
-
-                for inclusion_item in inclusion_items:
-                    if inclusion_item.special_inclusion and inclusion_item.price:
-                        inclusion_price += Decimal(str(inclusion_item.price or 0))
-
-                houseboat_total = houseboat_base_total + inclusion_price
-
-                total_net_price += houseboat_total
-
-                if inclusion_price > 0:
-                    print(f"   ✅ Houseboat: {houseboat.houseboat.name} ({nights} night{'s' if nights > 1 else ''})")
-                    print(f"      • Base: ₹{houseboat_base_total}")
-                    print(f"      • Inclusions: ₹{inclusion_price}")
-                    print(f"      • Total: ₹{houseboat_total}")
-                else:
-                    print(f"   ✅ Houseboat: {houseboat.houseboat.name} ({nights} night{'s' if nights > 1 else ''}) - ₹{houseboat_total}")
-
-        # Calculate taxes CORRECTLY
-        print(f"\n   📊 Pricing Breakdown:")
-        print(f"   ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        print(f"   Net Price (with inclusions): ₹{total_net_price}")
-
-        # Get tax percentages
-        cgst_perc = Decimal(str(itinerary.cgst_percentage or 0))
-        sgst_perc = Decimal(str(itinerary.sgst_percentage or 0))
-        discount_amt = Decimal(str(itinerary.discount or 0))
-
-        print(f"   CGST @ {cgst_perc}%")
-        print(f"   SGST @ {sgst_perc}%")
-        if discount_amt > 0:
-            print(f"   Discount: -₹{discount_amt}")
-
-        # Calculate taxes on NET price (including inclusions)
-        cgst_amount = (total_net_price * cgst_perc / Decimal('100')) if cgst_perc > 0 else Decimal('0.00')
-        sgst_amount = (total_net_price * sgst_perc / Decimal('100')) if sgst_perc > 0 else Decimal('0.00')
-
-        # Final amount = net (with inclusions) + taxes - discount
-        final_amount = total_net_price + cgst_amount + sgst_amount - discount_amt
-
-        print(f"   ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        print(f"   CGST Amount: ₹{cgst_amount}")
-        print(f"   SGST Amount: ₹{sgst_amount}")
-        print(f"   ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
-        print(f"   💰 FINAL AMOUNT: ₹{final_amount}")
-        print(f"   ━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━\n")
-
-        # Create pricing option
-        ItineraryPricingOption.objects.create(
-            itinerary=itinerary,
-            option_name='Standard Package',
-            option_number=1,
-            net_price=total_net_price,
-            gross_price=total_net_price,
-            cgst_amount=cgst_amount,
-            sgst_amount=sgst_amount,
-            discount_amount=discount_amt,
-            final_amount=final_amount,
-            hotels_included=hotels_list
-        )
-
-        # Mark as finalized
-        itinerary.is_finalized = True
-        itinerary.finalized_at = now()
-        itinerary.save()
-
-        print(f"   ✅ Pricing Saved Successfully!\n")
-
-    except Exception as e:
-        print(f"⚠️  Error auto-saving pricing: {e}\n")
-        import traceback
-        traceback.print_exc()
-
-        print("=" * 80 + "\n")
-
-    return itinerary, skipped_items
+    Planned in memory and written in bulk, see package_insert.py.
+    """
+    return package_insert.materialise_package(package, query, start_date, end_date, created_by)
 
 
 
@@ -12647,8 +10731,12 @@ from django.utils.dateparse import parse_date
 
 
 # API / DRF
-from rest_framework import generics
-from .serializers import LeadSerializer
+from rest_framework import generics, status
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from .serializers import LeadSerializer, PhpWebhookAuth
+from .lead_intake import MAX_BATCH, ingest, stage
+from .search_index import search_filter
 
 from urllib.parse import urlparse, parse_qs
 
@@ -12724,11 +10812,7 @@ class LeadListView(ListView):
         channel = (self.request.GET.get("channel") or "").lower()
 
         if q:
-            qs = qs.filter(
-                Q(name__icontains=q) |
-                Q(email__icontains=q) |
-                Q(phone__icontains=q)
-            )
+            qs = search_filter(qs, "lead", q)
 
         if source:
             qs = qs.filter(from_url__icontains=source)
@@ -12805,11 +10889,7 @@ class LeadRowsView(LoginRequiredMixin, ListView):
         end = self.request.GET.get("end")
 
         if q:
-            qs = qs.filter(
-                Q(name__icontains=q) |
-                Q(email__icontains=q) |
-                Q(phone__icontains=q)
-            )
+            qs = search_filter(qs, "lead", q)
 
         if start:
             qs = qs.filter(created_at__date__gte=start)
@@ -12842,6 +10922,36 @@ class ApiLeadDetailView(generics.RetrieveUpdateDestroyAPIView):
     serializer_class = LeadSerializer
 
 
+@method_decorator(csrf_exempt, name="dispatch")
+class ApiLeadBatchView(APIView):
+    """
+    POST an array of leads (or {"leads": [...], "source": ..., "mode": ...}).
+    Default: validated, de-duplicated and inserted now (201, one result per
+    lead). mode=stage: appended for drain_lead_intake and acknowledged (202).
+    """
+    permission_classes = [PhpWebhookAuth]
+
+    def post(self, request):
+        body = request.data
+        options = body if isinstance(body, dict) else {}
+        items = body if isinstance(body, list) else options.get("leads")
+        if not isinstance(items, list) or not items:
+            return Response({"success": False, "error": "Send a non-empty array of leads"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(items) > MAX_BATCH:
+            return Response(
+                {"success": False, "error": f"At most {MAX_BATCH} leads per request"}, status=status.HTTP_400_BAD_REQUEST
+            )
+
+        source = str(options.get("source") or request.query_params.get("source") or "")[:100]
+        mode = options.get("mode") or request.query_params.get("mode")
+        if mode == "stage":
+            staged = stage(items, source=source)
+            return Response({"success": True, "staged": staged}, status=status.HTTP_202_ACCEPTED)
+
+        result = ingest(items, source=source)
+        return Response({"success": True, **result}, status=status.HTTP_201_CREATED)
+
+
 # -------------------------------------------------------------
 # ASSIGN LEADS TO TEAM MEMBERS
 # -------------------------------------------------------------
@@ -13521,6 +11631,7 @@ from .models import (
     ActivityBooking, HouseboatBooking, StandaloneInclusionBooking,
     ItineraryPricingOption, HotelBookingInclusion, HouseboatBookingInclusion
 )
+from django.db import transaction
 
 def prepare_edit_itinerary(request, itinerary_id):
     """
@@ -13547,275 +11658,53 @@ def prepare_edit_itinerary(request, itinerary_id):
     print("="*80)
 
     try:
-        # Archive the current version
-        itinerary.status = 'archived'
-        itinerary.archived_at = now()
-        itinerary.archived_reason = 'Edited - New version created'
-        itinerary.save()
-
-        print(f"📦 Archived old version (ID: {itinerary.id})")
-
-        # GET NEXT VERSION NUMBER
-        max_version = Itinerary.objects.filter(
-            query=itinerary.query
-        ).order_by('-version_number').first()
-
-        next_version = (max_version.version_number + 1) if max_version else 1
-
-        # CREATE NEW VERSION
-        new_version = Itinerary.objects.create(
-            query=itinerary.query,
-            name=itinerary.name,
-            travel_from=itinerary.travel_from,
-            travel_to=itinerary.travel_to,
-            total_days=itinerary.total_days,
-            adults=itinerary.adults,
-            childrens=itinerary.childrens,
-            infants=itinerary.infants,
-            notes=itinerary.notes,
-            parent_itinerary=itinerary,
-            version_number=next_version,
-            status='draft',
-            is_finalized=False,
-            finalized_at=None,
-            cgst_percentage=itinerary.cgst_percentage,
-            sgst_percentage=itinerary.sgst_percentage,
-            discount=itinerary.discount,
-            created_by=itinerary.created_by
-        )
-
-        if itinerary.destinations.exists():
-            new_version.destinations.set(itinerary.destinations.all())
-
-        # ==========================================
-        # COPY ALL DATA
-        # ==========================================
-
-        # 1️⃣ COPY DAY PLANS
-        day_plan_mapping = {}
-        old_day_plans = ItineraryDayPlan.objects.filter(itinerary=itinerary)
-
-        for old_day in old_day_plans:
-            new_day = ItineraryDayPlan.objects.create(
-                itinerary=new_version,
-                day_number=old_day.day_number,
-                destination=old_day.destination,
-                title=old_day.title,
-                description=old_day.description,
-                image=old_day.image,
-                notes=old_day.notes if hasattr(old_day, 'notes') else '',
-            )
-
-            # Copy ManyToMany fields
-            if hasattr(old_day, 'hotels'): new_day.hotels.set(old_day.hotels.all())
-            if hasattr(old_day, 'houseboats'): new_day.houseboats.set(old_day.houseboats.all())
-            if hasattr(old_day, 'activities'): new_day.activities.set(old_day.activities.all())
-            if hasattr(old_day, 'meal_plans'): new_day.meal_plans.set(old_day.meal_plans.all())
-            if hasattr(old_day, 'vehicles'): new_day.vehicles.set(old_day.vehicles.all())
-            if hasattr(old_day, 'inclusions'): new_day.inclusions.set(old_day.inclusions.all())
-
-            day_plan_mapping[old_day.id] = new_day
-
-        # 2️⃣ COPY HOTELS (✅ UPDATED FOR CUSTOM FIELDS)
-        old_hotels = HotelBooking.objects.filter(itinerary=itinerary)
-        hotel_count = 0
-
-        print(f"\n🏨 Hotels: {old_hotels.count()}")
-        for old_hotel in old_hotels:
-            new_hotel = HotelBooking.objects.create(
-                itinerary=new_version,
-                day_plan=day_plan_mapping.get(old_hotel.day_plan.id) if old_hotel.day_plan else None,
-
-                # ✅ Identity & Custom Fields
-                hotel=old_hotel.hotel,
-                custom_hotel_name=old_hotel.custom_hotel_name,  # <--- NEW
-                destination=old_hotel.destination if hasattr(old_hotel, 'destination') else None,
-
-                # ✅ Room & Custom Fields
-                room_type=old_hotel.room_type,
-                custom_room_type=old_hotel.custom_room_type,    # <--- NEW
-
-                # Standard Fields
-                meal_plan=old_hotel.meal_plan,
-                check_in_date=old_hotel.check_in_date,
-                check_out_date=old_hotel.check_out_date,
-                check_in_time=old_hotel.check_in_time if hasattr(old_hotel, 'check_in_time') else None,
-                check_out_time=old_hotel.check_out_time if hasattr(old_hotel, 'check_out_time') else None,
-                num_rooms=old_hotel.num_rooms if hasattr(old_hotel, 'num_rooms') else 1,
-                num_double_beds=old_hotel.num_double_beds if hasattr(old_hotel, 'num_double_beds') else 0,
-                extra_beds=old_hotel.extra_beds if hasattr(old_hotel, 'extra_beds') else 0,
-                child_with_bed=old_hotel.child_with_bed if hasattr(old_hotel, 'child_with_bed') else 0,
-                child_without_bed=old_hotel.child_without_bed if hasattr(old_hotel, 'child_without_bed') else 0,
-                option=old_hotel.option if hasattr(old_hotel, 'option') else 'option1',
-                category=old_hotel.category if hasattr(old_hotel, 'category') else '',
-                markup_type=old_hotel.markup_type if hasattr(old_hotel, 'markup_type') else 'percentage',
-                markup_value=old_hotel.markup_value if hasattr(old_hotel, 'markup_value') else 0,
-                markup_amount=old_hotel.markup_amount if hasattr(old_hotel, 'markup_amount') else 0,
-                markup_percentage=old_hotel.markup_percentage if hasattr(old_hotel, 'markup_percentage') else 0,
-                net_price=old_hotel.net_price if hasattr(old_hotel, 'net_price') else 0,
-                gross_price=old_hotel.gross_price if hasattr(old_hotel, 'gross_price') else 0,
-                custom_double_bed_total=old_hotel.custom_double_bed_total if hasattr(old_hotel, 'custom_double_bed_total') else None,
-                custom_extra_bed_total=old_hotel.custom_extra_bed_total if hasattr(old_hotel, 'custom_extra_bed_total') else None,
-                custom_child_with_bed_total=old_hotel.custom_child_with_bed_total if hasattr(old_hotel, 'custom_child_with_bed_total') else None,
-                custom_child_without_bed_total=old_hotel.custom_child_without_bed_total if hasattr(old_hotel, 'custom_child_without_bed_total') else None,
-            )
-
-            # Copy hotel inclusions
-            for old_inc in old_hotel.inclusion_items.all():
-                HotelBookingInclusion.objects.create(
-                    hotel_booking=new_hotel,
-                    special_inclusion=old_inc.special_inclusion,
-                    num_adults=old_inc.num_adults if hasattr(old_inc, 'num_adults') else 0,
-                    num_children=old_inc.num_children if hasattr(old_inc, 'num_children') else 0,
-                    price=old_inc.price if hasattr(old_inc, 'price') else 0,
-                )
-            hotel_count += 1
-
-        # 3️⃣ COPY VEHICLES
-        old_vehicles = VehicleBooking.objects.filter(itinerary=itinerary)
-        for old_vehicle in old_vehicles:
-            VehicleBooking.objects.create(
-                itinerary=new_version,
-                day_plan=day_plan_mapping.get(old_vehicle.day_plan.id) if old_vehicle.day_plan else None,
-                vehicle=old_vehicle.vehicle,
-                destination=old_vehicle.destination if hasattr(old_vehicle, 'destination') else None,
-                pickup_date=old_vehicle.pickup_date,
-                pickup_time=old_vehicle.pickup_time if hasattr(old_vehicle, 'pickup_time') else None,
-                num_passengers=old_vehicle.num_passengers if hasattr(old_vehicle, 'num_passengers') else 0,
-                total_km=old_vehicle.total_km if hasattr(old_vehicle, 'total_km') else 0,
-                vehicle_type=old_vehicle.vehicle_type if hasattr(old_vehicle, 'vehicle_type') else '',
-                option=old_vehicle.option if hasattr(old_vehicle, 'option') else '',
-                markup_type=old_vehicle.markup_type if hasattr(old_vehicle, 'markup_type') else 'percentage',
-                markup_value=old_vehicle.markup_value if hasattr(old_vehicle, 'markup_value') else 0,
-                markup_amount=old_vehicle.markup_amount if hasattr(old_vehicle, 'markup_amount') else 0,
-                markup_percentage=old_vehicle.markup_percentage if hasattr(old_vehicle, 'markup_percentage') else 0,
-                net_price=old_vehicle.net_price if hasattr(old_vehicle, 'net_price') else 0,
-                gross_price=old_vehicle.gross_price if hasattr(old_vehicle, 'gross_price') else 0,
-                custom_total_price=old_vehicle.custom_total_price if hasattr(old_vehicle, 'custom_total_price') else None,
-            )
-
-        # 4️⃣ COPY ACTIVITIES
-        old_activities = ActivityBooking.objects.filter(itinerary=itinerary)
-        for old_activity in old_activities:
-            ActivityBooking.objects.create(
-                itinerary=new_version,
-                day_plan=day_plan_mapping.get(old_activity.day_plan.id) if old_activity.day_plan else None,
-                activity=old_activity.activity,
-                booking_date=old_activity.booking_date,
-                booking_time=old_activity.booking_time if hasattr(old_activity, 'booking_time') else None,
-                num_adults=old_activity.num_adults if hasattr(old_activity, 'num_adults') else 0,
-                num_children=old_activity.num_children if hasattr(old_activity, 'num_children') else 0,
-                confirmation_number=old_activity.confirmation_number if hasattr(old_activity, 'confirmation_number') else '',
-                notes=old_activity.notes if hasattr(old_activity, 'notes') else '',
-                markup_type=old_activity.markup_type if hasattr(old_activity, 'markup_type') else 'percentage',
-                markup_value=old_activity.markup_value if hasattr(old_activity, 'markup_value') else 0,
-                markup_amount=old_activity.markup_amount if hasattr(old_activity, 'markup_amount') else 0,
-                markup_percentage=old_activity.markup_percentage if hasattr(old_activity, 'markup_percentage') else 0,
-                net_price=old_activity.net_price if hasattr(old_activity, 'net_price') else 0,
-                gross_price=old_activity.gross_price if hasattr(old_activity, 'gross_price') else 0,
-                custom_total_price=old_activity.custom_total_price if hasattr(old_activity, 'custom_total_price') else None,
-            )
+        with transaction.atomic():
+            # Archive the current version
+            itinerary.status = 'archived'
+            itinerary.archived_at = now()
+            itinerary.archived_reason = 'Edited - New version created'
+            itinerary.save()
 
-        # 5️⃣ COPY HOUSEBOATS
-        old_houseboats = HouseboatBooking.objects.filter(itinerary=itinerary)
-        for old_hb in old_houseboats:
-            new_hb = HouseboatBooking.objects.create(
-                itinerary=new_version,
-                day_plan=day_plan_mapping.get(old_hb.day_plan.id) if old_hb.day_plan else None,
-                houseboat=old_hb.houseboat,
-                room_type=old_hb.room_type if hasattr(old_hb, 'room_type') else None,
-                meal_plan=old_hb.meal_plan if hasattr(old_hb, 'meal_plan') else None,
-                check_in_date=old_hb.check_in_date,
-                check_out_date=old_hb.check_out_date,
-                option=old_hb.option if hasattr(old_hb, 'option') else 'option1',
-                num_one_bed_rooms=old_hb.num_one_bed_rooms if hasattr(old_hb, 'num_one_bed_rooms') else 0,
-                num_two_bed_rooms=old_hb.num_two_bed_rooms if hasattr(old_hb, 'num_two_bed_rooms') else 0,
-                num_three_bed_rooms=old_hb.num_three_bed_rooms if hasattr(old_hb, 'num_three_bed_rooms') else 0,
-                num_four_bed_rooms=old_hb.num_four_bed_rooms if hasattr(old_hb, 'num_four_bed_rooms') else 0,
-                num_five_bed_rooms=old_hb.num_five_bed_rooms if hasattr(old_hb, 'num_five_bed_rooms') else 0,
-                num_six_bed_rooms=old_hb.num_six_bed_rooms if hasattr(old_hb, 'num_six_bed_rooms') else 0,
-                num_seven_bed_rooms=old_hb.num_seven_bed_rooms if hasattr(old_hb, 'num_seven_bed_rooms') else 0,
-                num_eight_bed_rooms=old_hb.num_eight_bed_rooms if hasattr(old_hb, 'num_eight_bed_rooms') else 0,
-                num_nine_bed_rooms=old_hb.num_nine_bed_rooms if hasattr(old_hb, 'num_nine_bed_rooms') else 0,
-                num_ten_bed_rooms=old_hb.num_ten_bed_rooms if hasattr(old_hb, 'num_ten_bed_rooms') else 0,
-                num_extra_beds=old_hb.num_extra_beds if hasattr(old_hb, 'num_extra_beds') else 0,
-                markup_type=old_hb.markup_type if hasattr(old_hb, 'markup_type') else 'percentage',
-                markup_value=old_hb.markup_value if hasattr(old_hb, 'markup_value') else 0,
-                markup_amount=old_hb.markup_amount if hasattr(old_hb, 'markup_amount') else 0,
-                markup_percentage=old_hb.markup_percentage if hasattr(old_hb, 'markup_percentage') else 0,
-                net_price=old_hb.net_price if hasattr(old_hb, 'net_price') else 0,
-                gross_price=old_hb.gross_price if hasattr(old_hb, 'gross_price') else 0,
-                custom_one_bed_total=old_hb.custom_one_bed_total if hasattr(old_hb, 'custom_one_bed_total') else None,
-                custom_two_bed_total=old_hb.custom_two_bed_total if hasattr(old_hb, 'custom_two_bed_total') else None,
-                custom_three_bed_total=old_hb.custom_three_bed_total if hasattr(old_hb, 'custom_three_bed_total') else None,
-                custom_four_bed_total=old_hb.custom_four_bed_total if hasattr(old_hb, 'custom_four_bed_total') else None,
-                custom_five_bed_total=old_hb.custom_five_bed_total if hasattr(old_hb, 'custom_five_bed_total') else None,
-                custom_six_bed_total=old_hb.custom_six_bed_total if hasattr(old_hb, 'custom_six_bed_total') else None,
-                custom_seven_bed_total=old_hb.custom_seven_bed_total if hasattr(old_hb, 'custom_seven_bed_total') else None,
-                custom_eight_bed_total=old_hb.custom_eight_bed_total if hasattr(old_hb, 'custom_eight_bed_total') else None,
-                custom_nine_bed_total=old_hb.custom_nine_bed_total if hasattr(old_hb, 'custom_nine_bed_total') else None,
-                custom_ten_bed_total=old_hb.custom_ten_bed_total if hasattr(old_hb, 'custom_ten_bed_total') else None,
-                custom_extra_bed_hb_total=old_hb.custom_extra_bed_hb_total if hasattr(old_hb, 'custom_extra_bed_hb_total') else None,
+            print(f"📦 Archived old version (ID: {itinerary.id})")
+
+            # GET NEXT VERSION NUMBER
+            max_version = Itinerary.objects.filter(
+                query=itinerary.query
+            ).order_by('-version_number').first()
+
+            next_version = (max_version.version_number + 1) if max_version else 1
+
+            # CREATE NEW VERSION
+            new_version = Itinerary.objects.create(
+                query=itinerary.query,
+                name=itinerary.name,
+                travel_from=itinerary.travel_from,
+                travel_to=itinerary.travel_to,
+                total_days=itinerary.total_days,
+                adults=itinerary.adults,
+                childrens=itinerary.childrens,
+                infants=itinerary.infants,
+                notes=itinerary.notes,
+                parent_itinerary=itinerary,
+                version_number=next_version,
+                status='draft',
+                is_finalized=False,
+                finalized_at=None,
+                cgst_percentage=itinerary.cgst_percentage,
+                sgst_percentage=itinerary.sgst_percentage,
+                discount=itinerary.discount,
+                created_by=itinerary.created_by
             )
-            # Copy houseboat inclusions
-            for old_inc in old_hb.inclusion_items.all():
-                HouseboatBookingInclusion.objects.create(
-                    houseboat_booking=new_hb,
-                    special_inclusion=old_inc.special_inclusion,
-                    num_adults=old_inc.num_adults if hasattr(old_inc, 'num_adults') else 0,
-                    num_children=old_inc.num_children if hasattr(old_inc, 'num_children') else 0,
-                    price=old_inc.price if hasattr(old_inc, 'price') else 0,
-                )
 
-        # 6️⃣ COPY STANDALONE INCLUSIONS
-        old_inclusions = StandaloneInclusionBooking.objects.filter(itinerary=itinerary)
-        for old_si in old_inclusions:
-            StandaloneInclusionBooking.objects.create(
-                itinerary=new_version,
-                day_plan=day_plan_mapping.get(old_si.day_plan.id) if old_si.day_plan else None,
-                special_inclusion=old_si.special_inclusion,
-                booking_date=old_si.booking_date,
-                booking_time=old_si.booking_time if hasattr(old_si, 'booking_time') else None,
-                num_adults=old_si.num_adults if hasattr(old_si, 'num_adults') else 0,
-                num_children=old_si.num_children if hasattr(old_si, 'num_children') else 0,
-                adult_unit_price=old_si.adult_unit_price if hasattr(old_si, 'adult_unit_price') else 0,
-                child_unit_price=old_si.child_unit_price if hasattr(old_si, 'child_unit_price') else 0,
-                subtotal=old_si.subtotal if hasattr(old_si, 'subtotal') else 0,
-                markup_type=old_si.markup_type if hasattr(old_si, 'markup_type') else 'percentage',
-                markup_value=old_si.markup_value if hasattr(old_si, 'markup_value') else 0,
-                markup_amount=old_si.markup_amount if hasattr(old_si, 'markup_amount') else 0,
-                total_price=old_si.total_price if hasattr(old_si, 'total_price') else 0,
-                notes=old_si.notes if hasattr(old_si, 'notes') else '',
-                created_by=old_si.created_by if hasattr(old_si, 'created_by') else None,
-            )
+            if itinerary.destinations.exists():
+                new_version.destinations.set(itinerary.destinations.all())
 
-        # 7️⃣ COPY PRICING OPTIONS
-        old_pricing = ItineraryPricingOption.objects.filter(itinerary=itinerary)
-        pricing_count = 0
-        for old_p in old_pricing:
-            ItineraryPricingOption.objects.create(
-                itinerary=new_version,
-                option_name=old_p.option_name,
-                option_number=old_p.option_number,
-                vehicle_type=old_p.vehicle_type if hasattr(old_p, 'vehicle_type') else '',
-                number_of_rooms=old_p.number_of_rooms if hasattr(old_p, 'number_of_rooms') else 0,
-                extra_beds=old_p.extra_beds if hasattr(old_p, 'extra_beds') else 0,
-                child_without_bed=old_p.child_without_bed if hasattr(old_p, 'child_without_bed') else 0,
-                child_with_bed=old_p.child_with_bed if hasattr(old_p, 'child_with_bed') else 0,
-                child_ages=old_p.child_ages if hasattr(old_p, 'child_ages') else '',
-                net_price=old_p.net_price,
-                markup_amount=old_p.markup_amount,
-                gross_price=old_p.gross_price,
-                cgst_amount=old_p.cgst_amount,
-                sgst_amount=old_p.sgst_amount,
-                discount_amount=old_p.discount_amount,
-                final_amount=old_p.final_amount,
-                hotels_included=old_p.hotels_included if hasattr(old_p, 'hotels_included') else None,
-            )
-            pricing_count += 1
+            # ==========================================
+            # COPY ALL DATA
+            # ==========================================
+            copy_all_bookings_to_new_version(itinerary, new_version)
 
         # ✅ FINAL SUMMARY
-        total_bookings = hotel_count  # + others count if you track them
         messages.success(
             request,
             f'✅ Created version {new_version.version_number}! '
@@ -13843,237 +11732,15 @@ def copy_all_bookings_to_new_version(old_itinerary, new_itinerary):
     print(f"   From: ID {old_itinerary.id} (V{old_itinerary.version_number})")
     print(f"   To: ID {new_itinerary.id} (V{new_itinerary.version_number})")
 
-    # 1️⃣ COPY DAY PLANS
-    day_plan_mapping = {}
-    old_day_plans = ItineraryDayPlan.objects.filter(itinerary=old_itinerary)
-
-    for old_day in old_day_plans:
-        new_day = ItineraryDayPlan.objects.create(
-            itinerary=new_itinerary,
-            day_number=old_day.day_number,
-            destination=old_day.destination,
-            title=old_day.title,
-            description=old_day.description,
-            image=old_day.image,
-            notes=old_day.notes,
-        )
-
-        # Copy ManyToMany fields
-        new_day.hotels.set(old_day.hotels.all())
-        new_day.houseboats.set(old_day.houseboats.all())
-        new_day.activities.set(old_day.activities.all())
-        new_day.meal_plans.set(old_day.meal_plans.all())
-        new_day.vehicles.set(old_day.vehicles.all())
-        new_day.inclusions.set(old_day.inclusions.all())
-
-        day_plan_mapping[old_day.id] = new_day
-
-    # 2️⃣ COPY HOTELS (✅ UPDATED FOR CUSTOM FIELDS)
-    old_hotels = HotelBooking.objects.filter(itinerary=old_itinerary)
-    hotel_count = 0
-
-    print(f"\n🏨 Hotels: {old_hotels.count()}")
-    for old_hotel in old_hotels:
-        new_hotel = HotelBooking.objects.create(
-            itinerary=new_itinerary,
-            day_plan=day_plan_mapping.get(old_hotel.day_plan.id) if old_hotel.day_plan else None,
-
-            # ✅ Identity & Custom Fields
-            hotel=old_hotel.hotel,
-            custom_hotel_name=old_hotel.custom_hotel_name,  # <--- NEW
-            destination=old_hotel.destination if hasattr(old_hotel, 'destination') else None,
-
-            # ✅ Room & Custom Fields
-            room_type=old_hotel.room_type,
-            custom_room_type=old_hotel.custom_room_type,    # <--- NEW
-
-            # Standard Fields
-            meal_plan=old_hotel.meal_plan,
-            check_in_date=old_hotel.check_in_date,
-            check_out_date=old_hotel.check_out_date,
-            check_in_time=old_hotel.check_in_time,
-            check_out_time=old_hotel.check_out_time,
-            num_rooms=old_hotel.num_rooms,
-            num_double_beds=old_hotel.num_double_beds,
-            extra_beds=old_hotel.extra_beds,
-            child_with_bed=old_hotel.child_with_bed,
-            child_without_bed=old_hotel.child_without_bed,
-            option=old_hotel.option,
-            category=old_hotel.category,
-            markup_type=old_hotel.markup_type,
-            markup_value=old_hotel.markup_value,
-            markup_amount=old_hotel.markup_amount,
-            markup_percentage=old_hotel.markup_percentage,
-            net_price=old_hotel.net_price,
-            gross_price=old_hotel.gross_price,
-            custom_double_bed_total=old_hotel.custom_double_bed_total,
-            custom_extra_bed_total=old_hotel.custom_extra_bed_total,
-            custom_child_with_bed_total=old_hotel.custom_child_with_bed_total,
-            custom_child_without_bed_total=old_hotel.custom_child_without_bed_total,
-        )
-
-        # Copy hotel inclusions
-        for old_inc in old_hotel.inclusion_items.all():
-            HotelBookingInclusion.objects.create(
-                hotel_booking=new_hotel,
-                special_inclusion=old_inc.special_inclusion,
-                num_adults=old_inc.num_adults,
-                num_children=old_inc.num_children,
-                price=old_inc.price,
-            )
-
-        hotel_count += 1
-        print(f"   ✓ {old_hotel.hotel.name if old_hotel.hotel else old_hotel.custom_hotel_name}")
-
-    # 3️⃣ COPY VEHICLES
-    old_vehicles = VehicleBooking.objects.filter(itinerary=old_itinerary)
-    for old_vehicle in old_vehicles:
-        VehicleBooking.objects.create(
-            itinerary=new_itinerary,
-            day_plan=day_plan_mapping.get(old_vehicle.day_plan.id) if old_vehicle.day_plan else None,
-            vehicle=old_vehicle.vehicle,
-            destination=old_vehicle.destination,
-            pickup_date=old_vehicle.pickup_date,
-            pickup_time=old_vehicle.pickup_time,
-            num_passengers=old_vehicle.num_passengers,
-            total_km=old_vehicle.total_km,
-            vehicle_type=old_vehicle.vehicle_type,
-            option=old_vehicle.option,
-            markup_type=old_vehicle.markup_type,
-            markup_value=old_vehicle.markup_value,
-            markup_amount=old_vehicle.markup_amount,
-            markup_percentage=old_vehicle.markup_percentage,
-            net_price=old_vehicle.net_price,
-            gross_price=old_vehicle.gross_price,
-            custom_total_price=old_vehicle.custom_total_price,
-        )
-
-    # 4️⃣ COPY ACTIVITIES
-    old_activities = ActivityBooking.objects.filter(itinerary=old_itinerary)
-    for old_activity in old_activities:
-        ActivityBooking.objects.create(
-            itinerary=new_itinerary,
-            day_plan=day_plan_mapping.get(old_activity.day_plan.id) if old_activity.day_plan else None,
-            activity=old_activity.activity,
-            booking_date=old_activity.booking_date,
-            booking_time=old_activity.booking_time,
-            num_adults=old_activity.num_adults,
-            num_children=old_activity.num_children,
-            confirmation_number=old_activity.confirmation_number,
-            notes=old_activity.notes,
-            markup_type=old_activity.markup_type,
-            markup_value=old_activity.markup_value,
-            markup_amount=old_activity.markup_amount,
-            markup_percentage=old_activity.markup_percentage,
-            net_price=old_activity.net_price,
-            gross_price=old_activity.gross_price,
-            custom_total_price=old_activity.custom_total_price,
-        )
-
-    # 5️⃣ COPY HOUSEBOATS
-    old_houseboats = HouseboatBooking.objects.filter(itinerary=old_itinerary)
-    for old_hb in old_houseboats:
-        new_hb = HouseboatBooking.objects.create(
-            itinerary=new_itinerary,
-            day_plan=day_plan_mapping.get(old_hb.day_plan.id) if old_hb.day_plan else None,
-            houseboat=old_hb.houseboat,
-            room_type=old_hb.room_type,
-            meal_plan=old_hb.meal_plan,
-            check_in_date=old_hb.check_in_date,
-            check_out_date=old_hb.check_out_date,
-            option=old_hb.option,
-            num_one_bed_rooms=old_hb.num_one_bed_rooms,
-            num_two_bed_rooms=old_hb.num_two_bed_rooms,
-            num_three_bed_rooms=old_hb.num_three_bed_rooms,
-            num_four_bed_rooms=old_hb.num_four_bed_rooms,
-            num_five_bed_rooms=old_hb.num_five_bed_rooms,
-            num_six_bed_rooms=old_hb.num_six_bed_rooms,
-            num_seven_bed_rooms=old_hb.num_seven_bed_rooms,
-            num_eight_bed_rooms=old_hb.num_eight_bed_rooms,
-            num_nine_bed_rooms=old_hb.num_nine_bed_rooms,
-            num_ten_bed_rooms=old_hb.num_ten_bed_rooms,
-            num_extra_beds=old_hb.num_extra_beds,
-            markup_type=old_hb.markup_type,
-            markup_value=old_hb.markup_value,
-            markup_amount=old_hb.markup_amount,
-            markup_percentage=old_hb.markup_percentage,
-            net_price=old_hb.net_price,
-            gross_price=old_hb.gross_price,
-            custom_one_bed_total=old_hb.custom_one_bed_total,
-            custom_two_bed_total=old_hb.custom_two_bed_total,
-            custom_three_bed_total=old_hb.custom_three_bed_total,
-            custom_four_bed_total=old_hb.custom_four_bed_total,
-            custom_five_bed_total=old_hb.custom_five_bed_total,
-            custom_six_bed_total=old_hb.custom_six_bed_total,
-            custom_seven_bed_total=old_hb.custom_seven_bed_total,
-            custom_eight_bed_total=old_hb.custom_eight_bed_total,
-            custom_nine_bed_total=old_hb.custom_nine_bed_total,
-            custom_ten_bed_total=old_hb.custom_ten_bed_total,
-            custom_extra_bed_hb_total=old_hb.custom_extra_bed_hb_total,
-        )
-
-        # Copy houseboat inclusions
-        for old_inc in old_hb.inclusion_items.all():
-            HouseboatBookingInclusion.objects.create(
-                houseboat_booking=new_hb,
-                special_inclusion=old_inc.special_inclusion,
-                num_adults=old_inc.num_adults,
-                num_children=old_inc.num_children,
-                price=old_inc.price,
-            )
-
-    # 6️⃣ COPY STANDALONE INCLUSIONS
-    old_inclusions = StandaloneInclusionBooking.objects.filter(itinerary=old_itinerary)
-    for old_si in old_inclusions:
-        StandaloneInclusionBooking.objects.create(
-            itinerary=new_itinerary,
-            day_plan=day_plan_mapping.get(old_si.day_plan.id) if old_si.day_plan else None,
-            special_inclusion=old_si.special_inclusion,
-            booking_date=old_si.booking_date,
-            booking_time=old_si.booking_time,
-            num_adults=old_si.num_adults,
-            num_children=old_si.num_children,
-            adult_unit_price=old_si.adult_unit_price,
-            child_unit_price=old_si.child_unit_price,
-            subtotal=old_si.subtotal,
-            markup_type=old_si.markup_type,
-            markup_value=old_si.markup_value,
-            markup_amount=old_si.markup_amount,
-            total_price=old_si.total_price,
-            notes=old_si.notes,
-            created_by=old_si.created_by,
-        )
-
-    # 7️⃣ COPY PRICING OPTIONS
-    old_pricing = ItineraryPricingOption.objects.filter(itinerary=old_itinerary)
-    pricing_count = 0
-    for old_p in old_pricing:
-        ItineraryPricingOption.objects.create(
-            itinerary=new_itinerary,
-            option_name=old_p.option_name,
-            option_number=old_p.option_number,
-            vehicle_type=old_p.vehicle_type,
-            number_of_rooms=old_p.number_of_rooms,
-            extra_beds=old_p.extra_beds,
-            child_without_bed=old_p.child_without_bed,
-            child_with_bed=old_p.child_with_bed,
-            child_ages=old_p.child_ages,
-            net_price=old_p.net_price,
-            markup_amount=old_p.markup_amount,
-            gross_price=old_p.gross_price,
-            cgst_amount=old_p.cgst_amount,
-            sgst_amount=old_p.sgst_amount,
-            discount_amount=old_p.discount_amount,
-            final_amount=old_p.final_amount,
-            hotels_included=old_p.hotels_included,
-        )
-        pricing_count += 1
+    counts = itinerary_versioning.clone_itinerary(old_itinerary, new_itinerary)
 
     # ✅ Refresh to see if status changed
     new_itinerary.refresh_from_db()
 
     print(f"\n✅ COPYING COMPLETE!")
-    print(f"   Hotels: {hotel_count}")
+    print(f"   Days: {counts['days']}, Hotels: {counts['hotels']}, Vehicles: {counts['vehicles']}, "
+          f"Activities: {counts['activities']}, Houseboats: {counts['houseboats']}, "
+          f"Standalone: {counts['standalone_inclusions']}, Pricing Options: {counts['pricing_options']}")
 
     return new_itinerary
 
@@ -14169,6 +11836,8 @@ from .models import (
     TeamMember
 )
 from django.contrib.auth.models import User
+from django.db import transaction
+from . import itinerary_versioning
 
 @require_POST
 def restore_archived_itinerary(request, itinerary_id):
@@ -14214,300 +11883,58 @@ def restore_archived_itinerary(request, itinerary_id):
         print(f"   Status: {archived_itinerary.status}")
         print(f"   📝 Will CREATE NEW COPY (archived version stays in history)")
 
-        # ==========================================
-        # GET NEXT VERSION NUMBER
-        # ==========================================
-        # Find highest version number for this query
-        max_version = Itinerary.objects.filter(
-            query=archived_itinerary.query
-        ).order_by('-version_number').first()
-
-        next_version = (max_version.version_number + 1) if max_version else 1
-
-        print(f"   📊 Next version number: {next_version}")
-
-        # ==========================================
-        # CREATE NEW ACTIVE COPY
-        # ==========================================
-        restored_itinerary = Itinerary.objects.create(
-            query=archived_itinerary.query,
-            name=archived_itinerary.name,
-            travel_from=archived_itinerary.travel_from,
-            travel_to=archived_itinerary.travel_to,
-            total_days=archived_itinerary.total_days,
-            adults=archived_itinerary.adults,
-            childrens=archived_itinerary.childrens,
-            infants=archived_itinerary.infants,
-            notes=archived_itinerary.notes,
-            parent_itinerary=archived_itinerary.parent_itinerary,  # Keep same parent
-            version_number=next_version,  # New version number
-            status='draft',  # Active as draft
-            is_finalized=False,  # Editable
-            finalized_at=None,
-            cgst_percentage=archived_itinerary.cgst_percentage,
-            sgst_percentage=archived_itinerary.sgst_percentage,
-            discount=archived_itinerary.discount,
-            created_by=archived_itinerary.created_by
-        )
-
-        # Set destinations
-        if archived_itinerary.destinations.exists():
-            restored_itinerary.destinations.set(archived_itinerary.destinations.all())
-
-        print(f"   ✅ Created restored copy: ID {restored_itinerary.id} (v{restored_itinerary.version_number})")
-        print(f"   Status: {restored_itinerary.status}")
-
-        # ==========================================
-        # COPY ALL DATA FROM ARCHIVED VERSION
-        # ==========================================
-
-        # 1️⃣ COPY DAY PLANS
-        day_plan_mapping = {}
-        old_day_plans = ItineraryDayPlan.objects.filter(itinerary=archived_itinerary)
-
-        print(f"\n   📅 Copying {old_day_plans.count()} day plan(s)...")
-        for old_day in old_day_plans:
-            new_day = ItineraryDayPlan.objects.create(
-                itinerary=restored_itinerary,
-                day_number=old_day.day_number,
-                destination=old_day.destination,
-                title=old_day.title,
-                description=old_day.description,
-                image=old_day.image,
-                notes=old_day.notes if hasattr(old_day, 'notes') else '',
-            )
-
-            # Copy ManyToMany fields
-            if hasattr(old_day, 'hotels'): new_day.hotels.set(old_day.hotels.all())
-            if hasattr(old_day, 'houseboats'): new_day.houseboats.set(old_day.houseboats.all())
-            if hasattr(old_day, 'activities'): new_day.activities.set(old_day.activities.all())
-            if hasattr(old_day, 'meal_plans'): new_day.meal_plans.set(old_day.meal_plans.all())
-            if hasattr(old_day, 'vehicles'): new_day.vehicles.set(old_day.vehicles.all())
-            if hasattr(old_day, 'inclusions'): new_day.inclusions.set(old_day.inclusions.all())
-
-            day_plan_mapping[old_day.id] = new_day
-
-        # 2️⃣ COPY HOTELS (✅ UPDATED FOR CUSTOM FIELDS)
-        hotel_count = 0
-        old_hotels = HotelBooking.objects.filter(itinerary=archived_itinerary)
-
-        print(f"   🏨 Copying {old_hotels.count()} hotel(s)...")
-        for old_hotel in old_hotels:
-            new_hotel = HotelBooking.objects.create(
-                itinerary=restored_itinerary,
-                day_plan=day_plan_mapping.get(old_hotel.day_plan.id) if old_hotel.day_plan else None,
-
-                # ✅ Identity & Custom Fields
-                hotel=old_hotel.hotel,
-                custom_hotel_name=old_hotel.custom_hotel_name,  # <--- NEW
-                destination=old_hotel.destination if hasattr(old_hotel, 'destination') else None,
-
-                # ✅ Room & Custom Fields
-                room_type=old_hotel.room_type,
-                custom_room_type=old_hotel.custom_room_type,    # <--- NEW
-
-                # Standard Fields
-                meal_plan=old_hotel.meal_plan,
-                check_in_date=old_hotel.check_in_date,
-                check_out_date=old_hotel.check_out_date,
-                check_in_time=old_hotel.check_in_time if hasattr(old_hotel, 'check_in_time') else None,
-                check_out_time=old_hotel.check_out_time if hasattr(old_hotel, 'check_out_time') else None,
-                num_rooms=old_hotel.num_rooms if hasattr(old_hotel, 'num_rooms') else 1,
-                num_double_beds=old_hotel.num_double_beds if hasattr(old_hotel, 'num_double_beds') else 0,
-                extra_beds=old_hotel.extra_beds if hasattr(old_hotel, 'extra_beds') else 0,
-                child_with_bed=old_hotel.child_with_bed if hasattr(old_hotel, 'child_with_bed') else 0,
-                child_without_bed=old_hotel.child_without_bed if hasattr(old_hotel, 'child_without_bed') else 0,
-                option=old_hotel.option if hasattr(old_hotel, 'option') else 'option1',
-                category=old_hotel.category if hasattr(old_hotel, 'category') else '',
-                markup_type=old_hotel.markup_type if hasattr(old_hotel, 'markup_type') else 'percentage',
-                markup_value=old_hotel.markup_value if hasattr(old_hotel, 'markup_value') else 0,
-                markup_amount=old_hotel.markup_amount if hasattr(old_hotel, 'markup_amount') else 0,
-                markup_percentage=old_hotel.markup_percentage if hasattr(old_hotel, 'markup_percentage') else 0,
-                net_price=old_hotel.net_price if hasattr(old_hotel, 'net_price') else 0,
-                gross_price=old_hotel.gross_price if hasattr(old_hotel, 'gross_price') else 0,
-                custom_double_bed_total=old_hotel.custom_double_bed_total if hasattr(old_hotel, 'custom_double_bed_total') else None,
-                custom_extra_bed_total=old_hotel.custom_extra_bed_total if hasattr(old_hotel, 'custom_extra_bed_total') else None,
-                custom_child_with_bed_total=old_hotel.custom_child_with_bed_total if hasattr(old_hotel, 'custom_child_with_bed_total') else None,
-                custom_child_without_bed_total=old_hotel.custom_child_without_bed_total if hasattr(old_hotel, 'custom_child_without_bed_total') else None,
+        with transaction.atomic():
+            # ==========================================
+            # GET NEXT VERSION NUMBER
+            # ==========================================
+            # Find highest version number for this query
+            max_version = Itinerary.objects.filter(
+                query=archived_itinerary.query
+            ).order_by('-version_number').first()
+
+            next_version = (max_version.version_number + 1) if max_version else 1
+
+            print(f"   📊 Next version number: {next_version}")
+
+            # ==========================================
+            # CREATE NEW ACTIVE COPY
+            # ==========================================
+            restored_itinerary = Itinerary.objects.create(
+                query=archived_itinerary.query,
+                name=archived_itinerary.name,
+                travel_from=archived_itinerary.travel_from,
+                travel_to=archived_itinerary.travel_to,
+                total_days=archived_itinerary.total_days,
+                adults=archived_itinerary.adults,
+                childrens=archived_itinerary.childrens,
+                infants=archived_itinerary.infants,
+                notes=archived_itinerary.notes,
+                parent_itinerary=archived_itinerary.parent_itinerary,  # Keep same parent
+                version_number=next_version,  # New version number
+                status='draft',  # Active as draft
+                is_finalized=False,  # Editable
+                finalized_at=None,
+                cgst_percentage=archived_itinerary.cgst_percentage,
+                sgst_percentage=archived_itinerary.sgst_percentage,
+                discount=archived_itinerary.discount,
+                created_by=archived_itinerary.created_by
             )
 
-            # Copy hotel inclusions
-            for old_inc in old_hotel.inclusion_items.all():
-                HotelBookingInclusion.objects.create(
-                    hotel_booking=new_hotel,
-                    special_inclusion=old_inc.special_inclusion,
-                    num_adults=old_inc.num_adults if hasattr(old_inc, 'num_adults') else 0,
-                    num_children=old_inc.num_children if hasattr(old_inc, 'num_children') else 0,
-                    price=old_inc.price if hasattr(old_inc, 'price') else 0,
-                )
+            # Set destinations
+            if archived_itinerary.destinations.exists():
+                restored_itinerary.destinations.set(archived_itinerary.destinations.all())
 
-            hotel_count += 1
-
-        # 3️⃣ COPY VEHICLES
-        vehicle_count = 0
-        old_vehicles = VehicleBooking.objects.filter(itinerary=archived_itinerary)
-
-        print(f"   🚗 Copying {old_vehicles.count()} vehicle(s)...")
-        for old_vehicle in old_vehicles:
-            VehicleBooking.objects.create(
-                itinerary=restored_itinerary,
-                day_plan=day_plan_mapping.get(old_vehicle.day_plan.id) if old_vehicle.day_plan else None,
-                vehicle=old_vehicle.vehicle,
-                destination=old_vehicle.destination if hasattr(old_vehicle, 'destination') else None,
-                pickup_date=old_vehicle.pickup_date,
-                pickup_time=old_vehicle.pickup_time if hasattr(old_vehicle, 'pickup_time') else None,
-                num_passengers=old_vehicle.num_passengers if hasattr(old_vehicle, 'num_passengers') else 0,
-                total_km=old_vehicle.total_km if hasattr(old_vehicle, 'total_km') else 0,
-                vehicle_type=old_vehicle.vehicle_type if hasattr(old_vehicle, 'vehicle_type') else '',
-                option=old_vehicle.option if hasattr(old_vehicle, 'option') else '',
-                markup_type=old_vehicle.markup_type if hasattr(old_vehicle, 'markup_type') else 'percentage',
-                markup_value=old_vehicle.markup_value if hasattr(old_vehicle, 'markup_value') else 0,
-                markup_amount=old_vehicle.markup_amount if hasattr(old_vehicle, 'markup_amount') else 0,
-                markup_percentage=old_vehicle.markup_percentage if hasattr(old_vehicle, 'markup_percentage') else 0,
-                net_price=old_vehicle.net_price if hasattr(old_vehicle, 'net_price') else 0,
-                gross_price=old_vehicle.gross_price if hasattr(old_vehicle, 'gross_price') else 0,
-                custom_total_price=old_vehicle.custom_total_price if hasattr(old_vehicle, 'custom_total_price') else None,
-            )
-            vehicle_count += 1
-
-        # 4️⃣ COPY ACTIVITIES
-        activity_count = 0
-        old_activities = ActivityBooking.objects.filter(itinerary=archived_itinerary)
-
-        print(f"   🎯 Copying {old_activities.count()} activit(ies)...")
-        for old_activity in old_activities:
-            ActivityBooking.objects.create(
-                itinerary=restored_itinerary,
-                day_plan=day_plan_mapping.get(old_activity.day_plan.id) if old_activity.day_plan else None,
-                activity=old_activity.activity,
-                booking_date=old_activity.booking_date,
-                booking_time=old_activity.booking_time if hasattr(old_activity, 'booking_time') else None,
-                num_adults=old_activity.num_adults if hasattr(old_activity, 'num_adults') else 0,
-                num_children=old_activity.num_children if hasattr(old_activity, 'num_children') else 0,
-                confirmation_number=old_activity.confirmation_number if hasattr(old_activity, 'confirmation_number') else '',
-                notes=old_activity.notes if hasattr(old_activity, 'notes') else '',
-                markup_type=old_activity.markup_type if hasattr(old_activity, 'markup_type') else 'percentage',
-                markup_value=old_activity.markup_value if hasattr(old_activity, 'markup_value') else 0,
-                markup_amount=old_activity.markup_amount if hasattr(old_activity, 'markup_amount') else 0,
-                markup_percentage=old_activity.markup_percentage if hasattr(old_activity, 'markup_percentage') else 0,
-                net_price=old_activity.net_price if hasattr(old_activity, 'net_price') else 0,
-                gross_price=old_activity.gross_price if hasattr(old_activity, 'gross_price') else 0,
-                custom_total_price=old_activity.custom_total_price if hasattr(old_activity, 'custom_total_price') else None,
-            )
-            activity_count += 1
-
-        # 5️⃣ COPY HOUSEBOATS
-        houseboat_count = 0
-        old_houseboats = HouseboatBooking.objects.filter(itinerary=archived_itinerary)
-
-        print(f"   🚤 Copying {old_houseboats.count()} houseboat(s)...")
-        for old_hb in old_houseboats:
-            new_hb = HouseboatBooking.objects.create(
-                itinerary=restored_itinerary,
-                day_plan=day_plan_mapping.get(old_hb.day_plan.id) if old_hb.day_plan else None,
-                houseboat=old_hb.houseboat,
-                room_type=old_hb.room_type if hasattr(old_hb, 'room_type') else None,
-                meal_plan=old_hb.meal_plan if hasattr(old_hb, 'meal_plan') else None,
-                check_in_date=old_hb.check_in_date,
-                check_out_date=old_hb.check_out_date,
-                option=old_hb.option if hasattr(old_hb, 'option') else 'option1',
-                num_one_bed_rooms=old_hb.num_one_bed_rooms if hasattr(old_hb, 'num_one_bed_rooms') else 0,
-                num_two_bed_rooms=old_hb.num_two_bed_rooms if hasattr(old_hb, 'num_two_bed_rooms') else 0,
-                num_three_bed_rooms=old_hb.num_three_bed_rooms if hasattr(old_hb, 'num_three_bed_rooms') else 0,
-                num_four_bed_rooms=old_hb.num_four_bed_rooms if hasattr(old_hb, 'num_four_bed_rooms') else 0,
-                num_five_bed_rooms=old_hb.num_five_bed_rooms if hasattr(old_hb, 'num_five_bed_rooms') else 0,
-                num_six_bed_rooms=old_hb.num_six_bed_rooms if hasattr(old_hb, 'num_six_bed_rooms') else 0,
-                num_seven_bed_rooms=old_hb.num_seven_bed_rooms if hasattr(old_hb, 'num_seven_bed_rooms') else 0,
-                num_eight_bed_rooms=old_hb.num_eight_bed_rooms if hasattr(old_hb, 'num_eight_bed_rooms') else 0,
-                num_nine_bed_rooms=old_hb.num_nine_bed_rooms if hasattr(old_hb, 'num_nine_bed_rooms') else 0,
-                num_ten_bed_rooms=old_hb.num_ten_bed_rooms if hasattr(old_hb, 'num_ten_bed_rooms') else 0,
-                num_extra_beds=old_hb.num_extra_beds if hasattr(old_hb, 'num_extra_beds') else 0,
-                markup_type=old_hb.markup_type if hasattr(old_hb, 'markup_type') else 'percentage',
-                markup_value=old_hb.markup_value if hasattr(old_hb, 'markup_value') else 0,
-                markup_amount=old_hb.markup_amount if hasattr(old_hb, 'markup_amount') else 0,
-                markup_percentage=old_hb.markup_percentage if hasattr(old_hb, 'markup_percentage') else 0,
-                net_price=old_hb.net_price if hasattr(old_hb, 'net_price') else 0,
-                gross_price=old_hb.gross_price if hasattr(old_hb, 'gross_price') else 0,
-                custom_one_bed_total=old_hb.custom_one_bed_total if hasattr(old_hb, 'custom_one_bed_total') else None,
-                custom_two_bed_total=old_hb.custom_two_bed_total if hasattr(old_hb, 'custom_two_bed_total') else None,
-                custom_three_bed_total=old_hb.custom_three_bed_total if hasattr(old_hb, 'custom_three_bed_total') else None,
-                custom_four_bed_total=old_hb.custom_four_bed_total if hasattr(old_hb, 'custom_four_bed_total') else None,
-                custom_five_bed_total=old_hb.custom_five_bed_total if hasattr(old_hb, 'custom_five_bed_total') else None,
-                custom_six_bed_total=old_hb.custom_six_bed_total if hasattr(old_hb, 'custom_six_bed_total') else None,
-                custom_seven_bed_total=old_hb.custom_seven_bed_total if hasattr(old_hb, 'custom_seven_bed_total') else None,
-                custom_eight_bed_total=old_hb.custom_eight_bed_total if hasattr(old_hb, 'custom_eight_bed_total') else None,
-                custom_nine_bed_total=old_hb.custom_nine_bed_total if hasattr(old_hb, 'custom_nine_bed_total') else None,
-                custom_ten_bed_total=old_hb.custom_ten_bed_total if hasattr(old_hb, 'custom_ten_bed_total') else None,
-                custom_extra_bed_hb_total=old_hb.custom_extra_bed_hb_total if hasattr(old_hb, 'custom_extra_bed_hb_total') else None,
-            )
-
-            # Copy houseboat inclusions
-            for old_inc in old_hb.inclusion_items.all():
-                HouseboatBookingInclusion.objects.create(
-                    houseboat_booking=new_hb,
-                    special_inclusion=old_inc.special_inclusion,
-                    num_adults=old_inc.num_adults if hasattr(old_inc, 'num_adults') else 0,
-                    num_children=old_inc.num_children if hasattr(old_inc, 'num_children') else 0,
-                    price=old_inc.price if hasattr(old_inc, 'price') else 0,
-                )
+            print(f"   ✅ Created restored copy: ID {restored_itinerary.id} (v{restored_itinerary.version_number})")
+            print(f"   Status: {restored_itinerary.status}")
 
-            houseboat_count += 1
-
-        # 6️⃣ COPY STANDALONE INCLUSIONS
-        inclusion_count = 0
-        old_inclusions = StandaloneInclusionBooking.objects.filter(itinerary=archived_itinerary)
-
-        print(f"   ⭐ Copying {old_inclusions.count()} standalone inclusion(s)...")
-        for old_si in old_inclusions:
-            StandaloneInclusionBooking.objects.create(
-                itinerary=restored_itinerary,
-                day_plan=day_plan_mapping.get(old_si.day_plan.id) if old_si.day_plan else None,
-                special_inclusion=old_si.special_inclusion,
-                booking_date=old_si.booking_date,
-                booking_time=old_si.booking_time if hasattr(old_si, 'booking_time') else None,
-                num_adults=old_si.num_adults if hasattr(old_si, 'num_adults') else 0,
-                num_children=old_si.num_children if hasattr(old_si, 'num_children') else 0,
-                adult_unit_price=old_si.adult_unit_price if hasattr(old_si, 'adult_unit_price') else 0,
-                child_unit_price=old_si.child_unit_price if hasattr(old_si, 'child_unit_price') else 0,
-                subtotal=old_si.subtotal if hasattr(old_si, 'subtotal') else 0,
-                markup_type=old_si.markup_type if hasattr(old_si, 'markup_type') else 'percentage',
-                markup_value=old_si.markup_value if hasattr(old_si, 'markup_value') else 0,
-                markup_amount=old_si.markup_amount if hasattr(old_si, 'markup_amount') else 0,
-                total_price=old_si.total_price if hasattr(old_si, 'total_price') else 0,
-                notes=old_si.notes if hasattr(old_si, 'notes') else '',
-                created_by=old_si.created_by if hasattr(old_si, 'created_by') else None,
-            )
-            inclusion_count += 1
-
-        # 7️⃣ COPY PRICING OPTIONS
-        pricing_count = 0
-        old_pricing = ItineraryPricingOption.objects.filter(itinerary=archived_itinerary)
-
-        print(f"   💰 Copying {old_pricing.count()} pricing option(s)...")
-        for old_p in old_pricing:
-            ItineraryPricingOption.objects.create(
-                itinerary=restored_itinerary,
-                option_name=old_p.option_name,
-                option_number=old_p.option_number,
-                vehicle_type=old_p.vehicle_type if hasattr(old_p, 'vehicle_type') else '',
-                number_of_rooms=old_p.number_of_rooms if hasattr(old_p, 'number_of_rooms') else 0,
-                extra_beds=old_p.extra_beds if hasattr(old_p, 'extra_beds') else 0,
-                child_without_bed=old_p.child_without_bed if hasattr(old_p, 'child_without_bed') else 0,
-                child_with_bed=old_p.child_with_bed if hasattr(old_p, 'child_with_bed') else 0,
-                child_ages=old_p.child_ages if hasattr(old_p, 'child_ages') else '',
-                net_price=old_p.net_price,
-                markup_amount=old_p.markup_amount,
-                gross_price=old_p.gross_price,
-                cgst_amount=old_p.cgst_amount,
-                sgst_amount=old_p.sgst_amount,
-                discount_amount=old_p.discount_amount,
-                final_amount=old_p.final_amount,
-                hotels_included=old_p.hotels_included if hasattr(old_p, 'hotels_included') else None,
-            )
-            pricing_count += 1
+            # ==========================================
+            # COPY ALL DATA FROM ARCHIVED VERSION
+            # ==========================================
+            counts = itinerary_versioning.clone_itinerary(archived_itinerary, restored_itinerary)
 
         # ✅ SUMMARY
-        total_bookings = hotel_count + vehicle_count + activity_count + houseboat_count + inclusion_count
+        pricing_count = counts['pricing_options']
+        total_bookings = sum(counts[key] for key in ('hotels', 'vehicles', 'activities', 'houseboats', 'standalone_inclusions'))
 
         print("\n" + "="*80)
         print(f"✅ RESTORE COMPLETE!")
@@ -14515,12 +11942,12 @@ def restore_archived_itinerary(request, itinerary_id):
         print(f"   ✨ Restored Copy: ID {restored_itinerary.id} (v{restored_itinerary.version_number}) - ACTIVE")
         print(f"")
         print(f"   📊 Data Copied:")
-        print(f"      Days: {len(day_plan_mapping)}")
-        print(f"      Hotels: {hotel_count}")
-        print(f"      Vehicles: {vehicle_count}")
-        print(f"      Activities: {activity_count}")
-        print(f"      Houseboats: {houseboat_count}")
-        print(f"      Standalone: {inclusion_count}")
+        print(f"      Days: {counts['days']}")
+        print(f"      Hotels: {counts['hotels']}")
+        print(f"      Vehicles: {counts['vehicles']}")
+        print(f"      Activities: {counts['activities']}")
+        print(f"      Houseboats: {counts['houseboats']}")
+        print(f"      Standalone: {counts['standalone_inclusions']}")
         print(f"      Pricing Options: {pricing_count}")
         print(f"      TOTAL BOOKINGS: {total_bookings}")
         print("="*80 + "\n")
@@ -14547,7 +11974,7 @@ def restore_archived_itinerary(request, itinerary_id):
 
 
 from django.shortcuts import render, get_object_or_404
-from django.db.models import Q
+from django.db.models import Q, Count
 
 def itinerary_version_history(request, query_id):
     """
@@ -14562,6 +11989,32 @@ def itinerary_version_history(request, query_id):
         'pricing_options'
     ).order_by('-version_number', '-created_at')
 
+    # ✅ Booking counts for every version at once (one grouped query per type)
+    version_ids = [itinerary.id for itinerary in all_versions]
+    counts = {}
+    for label, model, owner in (
+        ('hotel_count', HotelBooking, 'day_plan__itinerary'),
+        ('vehicle_count', VehicleBooking, 'itinerary'),
+        ('activity_count', ActivityBooking, 'day_plan__itinerary'),
+        ('houseboat_count', HouseboatBooking, 'day_plan__itinerary'),
+        ('standalone_count', StandaloneInclusionBooking, 'itinerary'),
+    ):
+        counts[label] = dict(
+            model.objects.filter(**{f'{owner}__in': version_ids}).order_by()
+            .values(owner).annotate(total=Count('id')).values_list(owner, 'total')
+        )
+
+    # ✅ What changed against the version each one was made from (cached per pair)
+    by_id = {itinerary.id: itinerary for itinerary in all_versions}
+    earlier = {}
+    for itinerary in all_versions:
+        base_id = itinerary.parent_itinerary_id
+        if base_id is None:
+            base_id = next((v.id for v in all_versions if v.version_number < itinerary.version_number), None)
+        if base_id in by_id:
+            earlier[itinerary.id] = base_id
+    diffs = version_diff.diff_pairs((base_id, itinerary_id) for itinerary_id, base_id in earlier.items())
+
     # ✅ Separate active from archived
     active_versions = []
     archived_versions = []
@@ -14575,43 +12028,19 @@ def itinerary_version_history(request, query_id):
                 'price': option.final_amount
             })
 
-        # Count bookings
-        hotel_count = HotelBooking.objects.filter(
-            day_plan__itinerary=itinerary
-        ).count()
-
-        vehicle_count = VehicleBooking.objects.filter(
-            itinerary=itinerary
-        ).count()
-
-        activity_count = ActivityBooking.objects.filter(
-            day_plan__itinerary=itinerary
-        ).count()
-
-        houseboat_count = HouseboatBooking.objects.filter(
-            day_plan__itinerary=itinerary
-        ).count()
-
-        standalone_count = StandaloneInclusionBooking.objects.filter(
-            itinerary=itinerary
-        ).count()
-
-        total_bookings = (
-            hotel_count + vehicle_count + activity_count +
-            houseboat_count + standalone_count
-        )
-
+        booking_counts = {label: counts[label].get(itinerary.id, 0) for label in counts}
         version_data = {
             'itinerary': itinerary,
             'pricing_summary': pricing_summary,
-            'total_bookings': total_bookings,
-            'hotel_count': hotel_count,
-            'vehicle_count': vehicle_count,
-            'activity_count': activity_count,
-            'houseboat_count': houseboat_count,
-            'standalone_count': standalone_count,
+            'total_bookings': sum(booking_counts.values()),
+            **booking_counts,
         }
 
+        diff = diffs.get((earlier.get(itinerary.id), itinerary.id))
+        if diff:
+            version_data['changes'] = diff['summary']
+            version_data['compared_with'] = by_id[earlier[itinerary.id]].version_number
+
         if itinerary.status == 'archived':
             archived_versions.append(version_data)
         else:
@@ -14628,56 +12057,32 @@ def itinerary_version_history(request, query_id):
     return render(request, 'itinerary_version_history.html', context)
 
 
-
-from django.http import JsonResponse
-from django.shortcuts import get_object_or_404
-from django.views.decorators.http import require_POST
-from .models import HotelBooking, Hotel, Hotelprice
-def get_available_hotels_for_change(request):
+@custom_login_required
+def itinerary_version_diff(request, itinerary_id):
     """
-    AJAX: Returns list of hotels in the same destination that have pricing configured
-    for the booking dates.
+    AJAX: Booking- and price-level changes of an itinerary against the
+    version it was made from, or against ?base=<id> (same query).
     """
-    booking_id = request.GET.get('booking_id')
-    if not booking_id:
-        return JsonResponse({'error': 'No booking ID'}, status=400)
-    booking = get_object_or_404(HotelBooking, id=booking_id)
+    itinerary = get_object_or_404(Itinerary, id=itinerary_id)
 
-    # Get other hotels in same destination
-    # Filter by hotels that have a price entry covering the check-in date
-    # ✅ FIX: Match Sidebar logic exactly (Use Itinerary Dates, not Booking Dates)
-    from django.db.models import Q
-    valid_hotel_ids = Hotelprice.objects.filter(
-        hotel__destination=booking.destination,
-        hotel__status=True
-    ).filter(
-        Q(from_date__lte=booking.itinerary.travel_to) &
-        Q(to_date__gte=booking.itinerary.travel_from)
-    ).values_list('hotel__id', flat=True).distinct()
-
-    available_hotels = Hotel.objects.filter(
-        id__in=valid_hotel_ids
-    ).exclude(id=booking.hotel.id)
-
-    hotels_data = []
-    for hotel in available_hotels:
-        hotels_data.append({
-            'id': hotel.id,
-            'name': hotel.name,
-            'category': hotel.get_category_display(),
-            'image': hotel.image.url if hotel.image else None
-        })
+    base_id = request.GET.get('base')
+    if base_id:
+        base = get_object_or_404(Itinerary, id=base_id)
+        if base.query_id != itinerary.query_id:
+            return JsonResponse({'success': False, 'message': 'Versions belong to different queries'}, status=400)
+    else:
+        base = version_diff.base_version(itinerary)
+        if base is None:
+            return JsonResponse({'success': False, 'message': 'No earlier version to compare with'}, status=404)
+
+    return JsonResponse({'success': True, 'diff': version_diff.diff_versions(base, itinerary)})
 
-    # ✅ DEBUGGING: Send strict filtering info to frontend
-    debug_msg = (
-        f"STRICT SEARCH | "
-        f"Dest: {booking.destination.name} | "
-        f"Found: {available_hotels.count()} hotels | "
-        f"Excl: {booking.hotel.id}"
-    )
 
-    return JsonResponse({'hotels': hotels_data, 'debug_message': debug_msg})
 
+from django.http import JsonResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_POST
+from .models import HotelBooking, Hotel, Hotelprice
 
 
 @require_POST
@@ -14826,31 +12231,16 @@ def get_available_hotels_for_change(request):
         check_in = booking.check_in_date
         check_out = booking.check_out_date
 
-        # 3. 🔥 FILTER LOGIC: Find Hotels with Pricing for these dates
-        if check_in and check_out:
-            # Find IDs of hotels in this destination that have a price entry
-            # overlapping with the check-in/check-out dates
-            valid_hotel_ids = Hotelprice.objects.filter(
-                hotel__destination=destination,
-                hotel__status=True,
-                from_date__lte=check_out, # Price starts before checkout
-                to_date__gte=check_in     # Price ends after checkin
-            ).values_list('hotel_id', flat=True).distinct()
-
-            # Filter the Hotel list using those valid IDs
-            hotels = Hotel.objects.filter(id__in=valid_hotel_ids).order_by('name')
-        else:
-            # Fallback if dates are missing (unlikely for a saved booking)
-            hotels = Hotel.objects.none()
-
-        # 4. Prepare Data
+        # 3. 🔥 FILTER LOGIC: Hotels with a rate overlapping the stay (none if dates are missing)
+        from .hotel_search import search_hotels
         hotels_data = [
             {
-                'id': h.id,
-                'name': h.name,
-                'category': h.get_category_display() if hasattr(h, 'get_category_display') else h.category
+                'id': hotel['id'],
+                'name': hotel['name'],
+                'category': hotel['category_display'],
+                'cheapest_rate': hotel['cheapest_rate'],
             }
-            for h in hotels
+            for hotel in search_hotels(destination.id, check_in, check_out)
         ]
 
         return JsonResponse({
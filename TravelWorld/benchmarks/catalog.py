@@ -0,0 +1,184 @@
+# benchmarks/catalog.py
+"""
+Synthetic catalogs, itineraries and package templates for the benchmarks.
+
+Everything is generated from a seed so two runs (or two commits) price
+exactly the same data.
+"""
+import random
+from dataclasses import dataclass, field
+from datetime import date, time, timedelta
+from decimal import Decimal
+from Travel.models import (
+    TeamMember, Destinations, RoomType, MealPlan, Hotel, Hotelprice, Houseboat, HouseboatPrice,
+    Vehicle, VehiclePricing, Activity, ActivityPrice, SpecialInclusion, Query, Itinerary, ItineraryDayPlan,
+    PackageTemplate, PackageTemplateDayPlan, HotelBooking, HotelBookingInclusion, HouseboatBooking,
+    VehicleBooking, ActivityBooking
+)
+from Travel.pricing import HOUSEBOAT_BED_FIELDS
+
+
+YEAR_START = date(2026, 1, 1)
+YEAR_END = date(2026, 12, 31)
+TRIP_START = date(2026, 3, 2)
+
+OPTIONS = ('option_1', 'option_2', 'option_3', 'option_4')
+
+
+@dataclass
+class Catalog:
+    member: TeamMember
+    destination: Destinations
+    room_type: RoomType
+    meal_plan: MealPlan
+    hotels: list = field(default_factory=list)
+    houseboats: list = field(default_factory=list)
+    vehicles: list = field(default_factory=list)
+    activities: list = field(default_factory=list)
+    inclusions: dict = field(default_factory=dict)
+
+
+def seasons(count):
+    """Split the year into ``count`` back-to-back (from_date, to_date) seasons."""
+    span = (YEAR_END - YEAR_START).days + 1
+    bounds = [YEAR_START + timedelta(days=span * n // count) for n in range(count + 1)]
+    return [(bounds[n], bounds[n + 1] - timedelta(days=1)) for n in range(count)]
+
+
+def money(rng, low, high):
+    return Decimal(rng.randint(low * 100, high * 100)).scaleb(-2)
+
+
+def build_catalog(hotels=20, season_count=4, houseboats=5, vehicles=5, activities=10, seed=0):
+    """Suppliers with one rate row per season each."""
+    rng = random.Random(seed)
+    member = TeamMember.objects.create(
+        first_name='Bench', last_name='Mark', email='bench@example.com', phone_number='9000000000', role='admin'
+    )
+    destination = Destinations.objects.create(name='Benchmark Coast')
+    room_type = RoomType.objects.create(name='Deluxe')
+    meal_plan = MealPlan.objects.create(name='MAP', created_by=member)
+    catalog = Catalog(member, destination, room_type, meal_plan)
+    periods = seasons(season_count)
+    supplier = dict(destination=destination, details='-', contact_person='-', phone_number='9000000000', email='s@example.com')
+
+    for n in range(hotels):
+        hotel = Hotel.objects.create(name=f'Hotel {n}', category=('3star', '4star', '5star')[n % 3], **supplier)
+        Hotelprice.objects.bulk_create(
+            Hotelprice(
+                hotel=hotel, room_type=room_type, meal_plan=meal_plan, from_date=from_date, to_date=to_date,
+                double_bed=money(rng, 1500, 9000), extra_bed=money(rng, 300, 1500),
+                child_with_bed=money(rng, 200, 1000), child_without_bed=money(rng, 100, 500)
+            )
+            for from_date, to_date in periods
+        )
+        catalog.inclusions[hotel.id] = SpecialInclusion.objects.create(
+            name=f'Dinner {n}', inclusion_type='hotel', hotel=hotel, pricing_type='per_booking',
+            adult_price=money(rng, 500, 3000)
+        )
+        catalog.hotels.append(hotel)
+
+    for n in range(houseboats):
+        houseboat = Houseboat.objects.create(name=f'Houseboat {n}', **supplier)
+        HouseboatPrice.objects.bulk_create(
+            HouseboatPrice(
+                houseboat=houseboat, room_type=room_type, meal_plan=meal_plan, from_date=from_date, to_date=to_date,
+                **{rate: Decimal(rng.randint(5000, 90000)).scaleb(-1) for _, rate in HOUSEBOAT_BED_FIELDS}
+            )
+            for from_date, to_date in periods
+        )
+        catalog.houseboats.append(houseboat)
+
+    for n in range(vehicles):
+        vehicle = Vehicle.objects.create(name=f'Vehicle {n}', destination=destination, details='-')
+        VehiclePricing.objects.bulk_create(
+            VehiclePricing(
+                vehicle=vehicle, from_date=from_date, to_date=to_date,
+                total_fee_100km=money(rng, 2000, 6000), extra_fee_per_km=money(rng, 10, 40)
+            )
+            for from_date, to_date in periods
+        )
+        catalog.vehicles.append(vehicle)
+
+    for n in range(activities):
+        activity = Activity.objects.create(name=f'Activity {n}', destination=destination, details='-')
+        ActivityPrice.objects.bulk_create(
+            ActivityPrice(activity=activity, from_date=from_date, to_date=to_date, per_person=money(rng, 200, 2500))
+            for from_date, to_date in periods
+        )
+        catalog.activities.append(activity)
+
+    return catalog
+
+
+def _day_bookings(rng, catalog, day, day_number, options, owner, houseboat_every=4):
+    """
+    One hotel per option, a vehicle and an activity per day, and a houseboat
+    night every few days. ``owner`` holds the itinerary or package FKs.
+    """
+    for option in OPTIONS[:options]:
+        hotel = rng.choice(catalog.hotels)
+        booking = HotelBooking.objects.create(
+            **owner, destination=catalog.destination, hotel=hotel, category=hotel.category,
+            room_type=catalog.room_type, meal_plan=catalog.meal_plan, option=option,
+            num_double_beds=rng.randint(1, 3), extra_beds=rng.randint(0, 1), child_with_bed=rng.randint(0, 1),
+            check_in_date=day, check_in_time=time(12), check_out_date=day + timedelta(days=1), check_out_time=time(11)
+        )
+        if rng.random() < 0.25:
+            HotelBookingInclusion.objects.create(hotel_booking=booking, special_inclusion=catalog.inclusions[hotel.id])
+
+    if catalog.houseboats and day_number % houseboat_every == 0:
+        HouseboatBooking.objects.create(
+            **owner, houseboat=rng.choice(catalog.houseboats), room_type=catalog.room_type, meal_plan=catalog.meal_plan,
+            check_in_date=day, check_out_date=day + timedelta(days=1),
+            **{qty: rng.randint(0, 1) for qty, _ in HOUSEBOAT_BED_FIELDS}
+        )
+
+    VehicleBooking.objects.create(
+        **owner, destination=catalog.destination, vehicle=rng.choice(catalog.vehicles), pickup_date=day,
+        total_km=rng.randint(40, 260), num_passengers=3
+    )
+    ActivityBooking.objects.create(
+        **owner, activity=rng.choice(catalog.activities), booking_date=day,
+        num_adults=2, num_children=rng.randint(0, 2)
+    )
+
+
+def build_itinerary(catalog, days, options=4, seed=0):
+    """An itinerary of ``days`` days with ``options`` hotel options."""
+    rng = random.Random(seed)
+    query = Query.objects.create(
+        type='client', gender='mr', client_name='Benchmark Client', phone_number='9000000001',
+        email='client@example.com', sector='kerala', total_days=days, from_date=TRIP_START, adult=2, childrens=1,
+        priority='general', assign=catalog.member, services='full_package'
+    )
+    itinerary = Itinerary.objects.create(
+        name=f'{days} day benchmark', query=query, travel_from=TRIP_START,
+        travel_to=TRIP_START + timedelta(days=days - 1), adults=2, childrens=1,
+        cgst_percentage=Decimal('2.50'), sgst_percentage=Decimal('2.50')
+    )
+    for n in range(days):
+        day_plan = ItineraryDayPlan.objects.create(
+            itinerary=itinerary, day_number=n + 1, title=f'Day {n + 1}', description='-', destination=catalog.destination
+        )
+        _day_bookings(rng, catalog, TRIP_START + timedelta(days=n), n + 1, options,
+                      {'itinerary': itinerary, 'day_plan': day_plan})
+    return itinerary
+
+
+def build_package(catalog, days, options=4, seed=0):
+    """A package template of ``days`` days with ``options`` hotel options."""
+    rng = random.Random(seed)
+    package = PackageTemplate.objects.create(
+        name=f'{days} day benchmark package', from_date=TRIP_START, to_date=TRIP_START + timedelta(days=days - 1),
+        total_days=days, created_by=catalog.member
+    )
+    package.destinations.add(catalog.destination)
+    for n in range(days):
+        day_plan = PackageTemplateDayPlan.objects.create(
+            package_template=package, day_number=n + 1, title=f'Day {n + 1}', description='-',
+            destination=catalog.destination
+        )
+        _day_bookings(rng, catalog, TRIP_START + timedelta(days=n), n + 1, options,
+                      {'package_template': package, 'package_day_plan': day_plan})
+    return package
@@ -0,0 +1,246 @@
+# benchmarks/run.py
+"""
+Pricing benchmarks.
+
+Builds a synthetic catalog and itineraries/packages of each requested
+length in a throwaway test database, then measures query count, wall time
+and peak Python memory for every pricing code path:
+
+    cd TravelWorld
+    python -m benchmarks.run --days 3 10 30 --output before.json
+    ... change something ...
+    python -m benchmarks.run --days 3 10 30 --output after.json --compare before.json
+
+``--compare`` prints the deltas and exits non-zero when any case needs more
+queries than the baseline.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+PROJECT_DIR = Path(__file__).resolve().parent.parent
+
+
+def setup_django():
+    sys.path.insert(0, str(PROJECT_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'TravelWorld.settings')
+    os.environ.setdefault('SECRET_KEY', 'benchmark-only')
+    import django
+    django.setup()
+
+
+# ==========================================
+# CASES
+# ==========================================
+def case_calculate_itinerary_pricing(env, days):
+    from Travel.pricing_utils import calculate_itinerary_pricing
+    itinerary = env['itineraries'][days]
+    return lambda: calculate_itinerary_pricing(itinerary)
+
+
+def case_itinerary_pricing_view(env, days):
+    from django.urls import reverse
+    url = reverse('itinerary_pricing', args=[env['itineraries'][days].id])
+    return lambda: env['client'].get(url)
+
+
+def case_package_template_pricing(env, days):
+    from django.urls import reverse
+    url = reverse('package_template_pricing', args=[env['packages'][days].id])
+    return lambda: env['client'].post(url, {'cgst': '2.5', 'sgst': '2.5', 'discount': '0'})
+
+
+def case_validate_pricing_availability(env, days):
+    from Travel import views
+    package = env['packages'][days]
+    start = package.from_date
+    return lambda: views.validate_pricing_availability(package, start, start + (package.to_date - package.from_date))
+
+
+def case_valid_hotel_options(env, days):
+    # The booking modal refetching the options of one hotel for a ``days`` long stay
+    from django.urls import reverse
+    url = reverse('get_valid_hotel_options', args=[env['catalog'].hotels[0].id])
+    package = env['packages'][days]
+    params = {'checkin': package.from_date.isoformat(), 'checkout': package.to_date.isoformat()}
+    return lambda: env['client'].get(url, params)
+
+
+CASES = {
+    'calculate_itinerary_pricing': case_calculate_itinerary_pricing,
+    'itinerary_pricing': case_itinerary_pricing_view,
+    'package_template_pricing': case_package_template_pricing,
+    'validate_pricing_availability': case_validate_pricing_availability,
+    'valid_hotel_options': case_valid_hotel_options,
+}
+
+
+# ==========================================
+# MEASUREMENT
+# ==========================================
+def reset_caches():
+    from django.core.cache import cache
+    from Travel.rate_index import invalidate_rate_index
+    cache.clear()
+    invalidate_rate_index()
+
+
+def timed(fn):
+    from django.db import connection
+    from django.test.utils import CaptureQueriesContext
+    with CaptureQueriesContext(connection) as captured, contextlib.redirect_stdout(io.StringIO()):
+        started = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - started
+    return len(captured.captured_queries), elapsed * 1000
+
+
+def measure(fn, repeat):
+    """Cold run (caches cleared), ``repeat`` warm runs, then one traced run for peak memory."""
+    reset_caches()
+    cold_queries, cold_ms = timed(fn)
+    warm = [timed(fn) for _ in range(repeat)]
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    times = [ms for _, ms in warm]
+    return {
+        'cold_queries': cold_queries,
+        'cold_ms': round(cold_ms, 3),
+        'queries': warm[-1][0],
+        'median_ms': round(statistics.median(times), 3),
+        'min_ms': round(min(times), 3),
+        'peak_kb': round(peak / 1024, 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(options):
+    from django.db import connection
+    from django.test import Client
+    from django.test.utils import setup_test_environment, teardown_test_environment
+    from . import catalog as synthetic
+
+    setup_test_environment()
+    old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    try:
+        with contextlib.redirect_stdout(io.StringIO()):
+            catalog = synthetic.build_catalog(
+                hotels=options.hotels, season_count=options.seasons, houseboats=options.houseboats,
+                vehicles=options.vehicles, activities=options.activities, seed=options.seed
+            )
+            env = {
+                'itineraries': {d: synthetic.build_itinerary(catalog, d, options.options, options.seed) for d in options.days},
+                'packages': {d: synthetic.build_package(catalog, d, options.options, options.seed) for d in options.days},
+            }
+
+        client = Client()
+        session = client.session
+        session['user_id'] = catalog.member.id
+        session['user_type'] = 'team_member'
+        session.save()
+        env['client'] = client
+        env['catalog'] = catalog
+
+        results = []
+        for name in options.cases:
+            for days in options.days:
+                result = {'case': name, 'days': days, **measure(CASES[name](env, days), options.repeat)}
+                results.append(result)
+                print(f"{name:32} {days:>3}d  {result['queries']:>5} queries  "
+                      f"{result['median_ms']:>9.1f} ms  {result['peak_kb']:>9.1f} KB", file=sys.stderr)
+    finally:
+        connection.creation.destroy_test_db(old_name, verbosity=0)
+        teardown_test_environment()
+
+    return {
+        'meta': {
+            'revision': git_revision(),
+            'python': platform.python_version(),
+            'database': connection.vendor,
+            'params': {
+                key: getattr(options, key)
+                for key in ('days', 'hotels', 'seasons', 'houseboats', 'vehicles', 'activities', 'options', 'repeat', 'seed')
+            },
+        },
+        'results': results,
+    }
+
+
+def compare(report, baseline):
+    """Print deltas against ``baseline``; True when no case needs more queries."""
+    before = {(r['case'], r['days']): r for r in baseline['results']}
+    ok = True
+    print(f"{'case':32} {'days':>4} {'queries':>15} {'median ms':>23} {'peak KB':>21}")
+    for row in report['results']:
+        old = before.get((row['case'], row['days']))
+        if not old:
+            print(f"{row['case']:32} {row['days']:>4}  (not in baseline)")
+            continue
+        change = (row['median_ms'] - old['median_ms']) / old['median_ms'] * 100 if old['median_ms'] else 0.0
+        flag = ''
+        if row['queries'] > old['queries']:
+            ok = False
+            flag = '  << more queries'
+        print(f"{row['case']:32} {row['days']:>4} {old['queries']:>6} -> {row['queries']:<6} "
+              f"{old['median_ms']:>8.1f} -> {row['median_ms']:<8.1f}({change:+.0f}%) "
+              f"{old['peak_kb']:>8.1f} -> {row['peak_kb']:<8.1f}{flag}")
+    return ok
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the pricing code paths on synthetic data.")
+    parser.add_argument('--days', type=int, nargs='+', default=[3, 7, 14, 30], help="Itinerary lengths to build")
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), default=list(CASES))
+    parser.add_argument('--hotels', type=int, default=20)
+    parser.add_argument('--seasons', type=int, default=4, help="Rate seasons per supplier")
+    parser.add_argument('--houseboats', type=int, default=5)
+    parser.add_argument('--vehicles', type=int, default=5)
+    parser.add_argument('--activities', type=int, default=10)
+    parser.add_argument('--options', type=int, default=4, choices=[1, 2, 3, 4], help="Hotel options per day")
+    parser.add_argument('--repeat', type=int, default=5, help="Warm runs per case")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help="Write the JSON report here (default: stdout)")
+    parser.add_argument('--compare', help="Baseline JSON report to compare against")
+    options = parser.parse_args(argv)
+
+    setup_django()
+    report = run(options)
+
+    text = json.dumps(report, indent=2)
+    if options.output:
+        Path(options.output).write_text(text + '\n')
+    else:
+        print(text)
+
+    if options.compare:
+        baseline = json.loads(Path(options.compare).read_text())
+        with contextlib.redirect_stdout(sys.stderr):
+            ok = compare(report, baseline)
+        return 0 if ok else 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())